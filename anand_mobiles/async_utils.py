@@ -0,0 +1,64 @@
+"""
+Support for async (ASGI) views.
+
+get_async_db() returns a Firestore AsyncClient for the running event loop. gRPC
+async channels are bound to the loop that created them, and under WSGI Django runs
+each async view in a fresh loop, so clients are kept per loop rather than shared.
+With the in-memory backend the fake's async view is shared instead.
+
+async_compatible() lets the existing sync auth decorators wrap async views: the
+token check itself does no I/O, so it runs inline and the view is awaited.
+"""
+import asyncio
+import threading
+import weakref
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from google.cloud import firestore
+
+from anand_mobiles.firebase import get_app, get_db, use_fake_firestore
+
+_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def _new_async_client():
+    app = get_app()
+    credential = app.credential.get_credential()
+    project = app.project_id or getattr(app.credential, 'project_id', None)
+    return firestore.AsyncClient(project=project, credentials=credential)
+
+
+def get_async_db():
+    """Firestore AsyncClient for the current event loop (call from inside a coroutine)"""
+    if use_fake_firestore():
+        return get_db().async_client()
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = _clients[loop] = _new_async_client()
+    return client
+
+
+def async_compatible(wrapper, view_func):
+    """
+    Return wrapper as-is for sync views, or an async view that runs it and awaits the result.
+
+    Args:
+        wrapper: A decorator's sync wrapper that either returns an error response or
+            the result of calling view_func
+        view_func: The view being decorated
+    """
+    if not iscoroutinefunction(view_func):
+        return wrapper
+
+    @wraps(view_func)
+    async def async_wrapper(request, *args, **kwargs):
+        response = wrapper(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+    return async_wrapper
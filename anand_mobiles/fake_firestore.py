@@ -0,0 +1,1426 @@
+"""
+In-memory Firestore, for running the project offline (benchmarks, load tests, tests).
+
+With FIRESTORE_BACKEND = 'memory', anand_mobiles.firebase.get_db() returns a
+FakeClient instead of a real client, and get_async_db() returns its async view. The
+fake implements the part of the client API this project uses:
+
+    - collections and subcollections, document get/set(merge)/update/create/delete,
+      add() and list_documents(), with dotted field paths in update()
+    - Increment, Maximum, Minimum, ArrayUnion, ArrayRemove, SERVER_TIMESTAMP and
+      DELETE_FIELD, and write_option() preconditions
+    - queries with where (field filters, Or/And), order_by, limit, limit_to_last,
+      offset, select, cursors (start_at/start_after/end_before/end_at from a snapshot
+      or values) and collection_group()
+    - count/sum/avg aggregation queries, get_all(), write batches (500 writes max)
+    - transactions for @firestore.transactional: reads are versioned and the commit
+      raises Aborted if a document read in the transaction changed, so the decorator
+      retries as it does against the real backend
+
+Query results follow Firestore's semantics: documents missing a filtered or ordered
+field are skipped, values of different types order null < bool < number < timestamp
+< string < bytes < reference < geopoint < array < map, ties break on the document
+path, and an inequality filter implies ordering on its field. Indexes are not
+required and not checked.
+
+Every call can be slowed down per operation (get, get_all, query, aggregation,
+commit, list_documents) to approximate network round trips; the calls are recorded
+in the request's Firestore metrics like real ones, so Server-Timing, /metrics and
+tracing work offline. Firebase Authentication is not faked: Google sign-in still
+needs a real project.
+
+Data comes from JSON fixtures (load_fixture_file): the nested collection format
+written by to_fixture(), simplified_phone_data.json (the sell-side phone catalog)
+or phone_data.json (turned into products with synthetic prices and stock), or
+from a directory written by `manage.py generate_dataset --target ndjson`.
+"""
+import asyncio
+import copy
+import json
+import math
+import random
+import string
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import cmp_to_key
+from pathlib import Path
+from time import perf_counter
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import BaseCompositeFilter, FieldFilter, Or
+
+from anand_mobiles.firestore_metrics import DELETES, QUERIES, READS, STREAMED, WRITES, current_stats
+
+ASCENDING = 'ASCENDING'
+DESCENDING = 'DESCENDING'
+MAX_BATCH_WRITES = 500
+MAX_TRANSACTION_ATTEMPTS = 5
+LATENCY_OPERATIONS = ('get', 'get_all', 'query', 'aggregation', 'commit', 'list_documents')
+# Nested subcollections of a document in fixture files
+SUBCOLLECTIONS_KEY = '__collections__'
+
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+_INEQUALITY_OPS = {'<', '<=', '>', '>=', '!=', 'not-in'}
+
+
+# --- Values ----------------------------------------------------------------------
+
+def _as_utc(value):
+    # The client sends naive datetimes as UTC and always reads back aware ones
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _type_rank(value):
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, (DocumentReference, AsyncDocumentReference)):
+        return 6
+    if hasattr(value, 'latitude') and hasattr(value, 'longitude'):
+        return 7
+    if isinstance(value, (list, tuple)):
+        return 8
+    return 9
+
+
+def _compare(left, right):
+    """Firestore's ordering of two values: -1, 0 or 1"""
+    left_rank, right_rank = _type_rank(left), _type_rank(right)
+    if left_rank != right_rank:
+        return -1 if left_rank < right_rank else 1
+    if left_rank == 2:
+        # NaN sorts before every other number and equals itself
+        left_nan, right_nan = isinstance(left, float) and math.isnan(left), isinstance(right, float) and math.isnan(right)
+        if left_nan or right_nan:
+            return (right_nan - left_nan) if left_nan != right_nan else 0
+    elif left_rank == 3:
+        left, right = _as_utc(left), _as_utc(right)
+    elif left_rank == 6:
+        left, right = left._path, right._path
+    elif left_rank == 7:
+        left, right = (left.latitude, left.longitude), (right.latitude, right.longitude)
+    elif left_rank == 8:
+        for left_item, right_item in zip(left, right):
+            result = _compare(left_item, right_item)
+            if result:
+                return result
+        left, right = len(left), len(right)
+    elif left_rank == 9:
+        for (left_key, left_item), (right_key, right_item) in zip(sorted(left.items()), sorted(right.items())):
+            result = _compare(left_key, right_key) or _compare(left_item, right_item)
+            if result:
+                return result
+        left, right = len(left), len(right)
+    return (left > right) - (left < right)
+
+
+def _equal(left, right):
+    return _type_rank(left) == _type_rank(right) and _compare(left, right) == 0
+
+
+def _split_field_path(field_path):
+    """'a.b' -> ['a', 'b']; `quoted.segments` may contain dots"""
+    if '`' not in field_path:
+        return field_path.split('.')
+    parts, current, quoted = [], '', False
+    for char in field_path:
+        if char == '`':
+            quoted = not quoted
+        elif char == '.' and not quoted:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    parts.append(current)
+    return parts
+
+
+_MISSING = object()
+
+
+def _lookup(data, parts):
+    for part in parts:
+        if not isinstance(data, dict) or part not in data:
+            return _MISSING
+        data = data[part]
+    return data
+
+
+def _transform(value, existing, commit_time):
+    """The stored value for `value` written over `existing`"""
+    if value is transforms.SERVER_TIMESTAMP:
+        return commit_time
+    if isinstance(value, transforms.Increment):
+        if isinstance(existing, (int, float)) and not isinstance(existing, bool):
+            return existing + value.value
+        return value.value
+    if isinstance(value, (transforms.Maximum, transforms.Minimum)):
+        if not isinstance(existing, (int, float)) or isinstance(existing, bool):
+            return value.value
+        pick = max if isinstance(value, transforms.Maximum) else min
+        return pick(existing, value.value)
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(existing) if isinstance(existing, list) else []
+        for item in value.values:
+            if not any(_equal(item, present) for present in result):
+                result.append(_encode(item))
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        if not isinstance(existing, list):
+            return []
+        return [item for item in existing if not any(_equal(item, removed) for removed in value.values)]
+    if isinstance(value, dict):
+        existing = existing if isinstance(existing, dict) else {}
+        return {key: _transform(item, existing.get(key), commit_time)
+                for key, item in value.items() if item is not transforms.DELETE_FIELD}
+    return _encode(value)
+
+
+def _encode(value):
+    """A detached copy of a plain value, normalized the way the backend stores it"""
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, datetime):
+        return _as_utc(value)
+    if isinstance(value, AsyncDocumentReference):
+        return value._sync
+    return value
+
+
+def _set_field(data, parts, value, commit_time):
+    for part in parts[:-1]:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = data[part] = {}
+        data = child
+    if value is transforms.DELETE_FIELD:
+        data.pop(parts[-1], None)
+    else:
+        data[parts[-1]] = _transform(value, data.get(parts[-1]), commit_time)
+
+
+def _merge(data, updates, commit_time):
+    for key, value in updates.items():
+        if isinstance(value, dict) and value and isinstance(data.get(key), dict):
+            _merge(data[key], value, commit_time)
+        else:
+            _set_field(data, [key], value, commit_time)
+
+
+# --- Storage ---------------------------------------------------------------------
+
+class _Document:
+    """A stored version; never modified once stored, so snapshots can share it"""
+    __slots__ = ('data', 'create_time', 'update_time')
+
+    def __init__(self, data, create_time, update_time):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+class _Store:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.collections = {}  # collection path tuple -> {document id: _Document}
+        self._last_time = None
+
+    def now(self):
+        """Strictly increasing commit times, so update_time preconditions are exact"""
+        with self.lock:
+            now = datetime.now(timezone.utc)
+            if self._last_time is not None and now <= self._last_time:
+                now = self._last_time + timedelta(microseconds=1)
+            self._last_time = now
+            return now
+
+    def lookup(self, path):
+        return self.collections.get(path[:-1], {}).get(path[-1])
+
+    def put(self, path, document):
+        if document is None:
+            documents = self.collections.get(path[:-1])
+            if documents is not None:
+                documents.pop(path[-1], None)
+                if not documents:
+                    del self.collections[path[:-1]]
+        else:
+            self.collections.setdefault(path[:-1], {})[path[-1]] = document
+
+
+def _split_path(path):
+    parts = []
+    for segment in path:
+        parts.extend(part for part in str(segment).split('/') if part)
+    return tuple(parts)
+
+
+def _path_of(reference):
+    return reference._path
+
+
+# --- Client ------------------------------------------------------------------------
+
+class WriteResult:
+    __slots__ = ('update_time',)
+
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class _WriteOption:
+    __slots__ = ('exists', 'last_update_time')
+
+    def __init__(self, exists=None, last_update_time=None):
+        self.exists = exists
+        self.last_update_time = last_update_time
+
+
+def _observe(call, started, operation, count=1, operation2=None, count2=0, target=None):
+    stats = current_stats()
+    if stats is not None:
+        stats.record(call, perf_counter() - started, operation, count, operation2, count2, target)
+
+
+class FakeClient:
+    """
+    Drop-in for google.cloud.firestore.Client, backed by a dict.
+
+    Args:
+        project (str): Reported as client.project
+        latency (dict): Operation -> added delay in seconds (see LATENCY_OPERATIONS)
+        jitter (float): Each delay varies uniformly by up to this fraction
+    """
+
+    def __init__(self, project='fake-project', latency=None, jitter=0.0):
+        self.project = project
+        self.latency = dict(latency or {})
+        self.jitter = jitter
+        self._store = _Store()
+        self._async = None
+
+    def _delay(self, operation):
+        seconds = self.latency.get(operation)
+        if seconds and self.jitter:
+            seconds *= 1 + random.uniform(-self.jitter, self.jitter)
+        return seconds
+
+    def _pause(self, operation):
+        seconds = self._delay(operation)
+        if seconds:
+            time.sleep(seconds)
+
+    async def _apause(self, operation):
+        seconds = self._delay(operation)
+        if seconds:
+            await asyncio.sleep(seconds)
+
+    # -- References
+
+    def collection(self, *collection_path):
+        path = _split_path(collection_path)
+        if len(path) % 2 != 1:
+            raise ValueError(f'Not a collection path: {"/".join(path)}')
+        return CollectionReference(self, path)
+
+    def document(self, *document_path):
+        path = _split_path(document_path)
+        if not path or len(path) % 2:
+            raise ValueError(f'Not a document path: {"/".join(path)}')
+        return DocumentReference(self, path)
+
+    def collection_group(self, collection_id):
+        if '/' in collection_id:
+            raise ValueError(f'Collection group IDs cannot contain "/": {collection_id}')
+        return Query(CollectionReference(self, (collection_id,)), all_descendants=True)
+
+    def collections(self):
+        with self._store.lock:
+            ids = {path[0] for path in self._store.collections}
+        return [CollectionReference(self, (collection_id,)) for collection_id in sorted(ids)]
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts=MAX_TRANSACTION_ATTEMPTS, read_only=False):
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    @staticmethod
+    def write_option(**kwargs):
+        if set(kwargs) - {'exists', 'last_update_time'} or len(kwargs) != 1:
+            raise TypeError('Exactly one of exists or last_update_time is allowed')
+        return _WriteOption(**kwargs)
+
+    def async_client(self):
+        """An AsyncClient-like view of the same data"""
+        if self._async is None:
+            self._async = AsyncFakeClient(self)
+        return self._async
+
+    # -- Reads
+
+    def _snapshot(self, reference, document, read_time, field_paths=None):
+        if document is None:
+            return DocumentSnapshot(reference, None, False, None, None, read_time)
+        return DocumentSnapshot(reference, _project(document.data, field_paths), True,
+                                document.create_time, document.update_time, read_time)
+
+    def _read(self, references, field_paths=None, transaction=None):
+        references = list({_path_of(reference): reference for reference in references}.values())
+        read_time = datetime.now(timezone.utc)
+        with self._store.lock:
+            documents = [self._store.lookup(_path_of(reference)) for reference in references]
+        if transaction is not None:
+            transaction._record_reads(zip(references, documents))
+        return [self._snapshot(reference, document, read_time, field_paths)
+                for reference, document in zip(references, documents)]
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        """Yield a snapshot per (distinct) reference"""
+        started = perf_counter()
+        self._pause('get_all')
+        snapshots = self._read(references, field_paths, transaction)
+        _observe('get_all', started, READS, len(snapshots), target=self)
+        yield from snapshots
+
+    # -- Writes
+
+    def _commit(self, writes, reads=None):
+        """Apply writes atomically; raise Aborted if a document in `reads` has changed"""
+        if len(writes) > MAX_BATCH_WRITES:
+            raise exceptions.InvalidArgument(f'A batch can contain at most {MAX_BATCH_WRITES} writes')
+        store = self._store
+        with store.lock:
+            for path, update_time in (reads or {}).items():
+                document = store.lookup(path)
+                if (document.update_time if document else None) != update_time:
+                    raise exceptions.Aborted(f'Transaction contention on {"/".join(path)}')
+            commit_time = store.now()
+            staged = {}
+            for write in writes:
+                path = write[1]
+                current = staged[path] if path in staged else store.lookup(path)
+                staged[path] = _apply_write(write, current, commit_time)
+            for path, document in staged.items():
+                store.put(path, document)
+        return [WriteResult(commit_time) for _ in writes]
+
+    # -- Fixtures
+
+    def seed(self, document_path, data):
+        """Store a document directly (no latency, metrics or write limits)"""
+        path = self.document(document_path)._path
+        with self._store.lock:
+            now = self._store.now()
+            self._store.put(path, _Document(_transform(data, None, now), now, now))
+
+    def clear(self):
+        with self._store.lock:
+            self._store.collections.clear()
+
+    def document_count(self):
+        with self._store.lock:
+            return sum(len(documents) for documents in self._store.collections.values())
+
+
+def _apply_write(write, current, commit_time):
+    kind, path, data, merge, option = write
+    name = '/'.join(path)
+    if option is not None:
+        if option.exists is True and current is None:
+            raise exceptions.NotFound(f'No document to update: {name}')
+        if option.exists is False and current is not None:
+            raise exceptions.AlreadyExists(f'Document already exists: {name}')
+        if option.last_update_time is not None and (
+                current is None or current.update_time != _as_utc(option.last_update_time)):
+            raise exceptions.FailedPrecondition(f'The stored document has changed: {name}')
+
+    if kind == 'delete':
+        return None
+    if kind == 'create':
+        if current is not None:
+            raise exceptions.AlreadyExists(f'Document already exists: {name}')
+        return _Document(_transform(data, None, commit_time), commit_time, commit_time)
+    if kind == 'update':
+        if current is None:
+            raise exceptions.NotFound(f'No document to update: {name}')
+        updated = copy.deepcopy(current.data)
+        for field_path, value in data.items():
+            _set_field(updated, _split_field_path(field_path), value, commit_time)
+        return _Document(updated, current.create_time, commit_time)
+
+    # set
+    created = current.create_time if current is not None else commit_time
+    if not merge:
+        return _Document(_transform(data, None, commit_time), created, commit_time)
+    merged = copy.deepcopy(current.data) if current is not None else {}
+    if merge is True:
+        _merge(merged, data, commit_time)
+    else:
+        for field_path in merge:
+            parts = _split_field_path(field_path)
+            value = _lookup(data, parts)
+            _set_field(merged, parts, transforms.DELETE_FIELD if value is _MISSING else value, commit_time)
+    return _Document(merged, created, commit_time)
+
+
+def _project(data, field_paths):
+    if field_paths is None:
+        return data
+    projected = {}
+    for field_path in field_paths:
+        parts = _split_field_path(field_path)
+        value = _lookup(data, parts)
+        if value is not _MISSING:
+            target = projected
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return projected
+
+
+# --- References and snapshots ----------------------------------------------------------
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, exists, create_time, update_time, read_time):
+        self._reference = reference
+        self._data = data
+        self.exists = exists
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = read_time
+
+    @property
+    def id(self):
+        return self._reference.id
+
+    @property
+    def reference(self):
+        return self._reference
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self.exists else None
+
+    def get(self, field_path):
+        if not self.exists:
+            return None
+        value = _lookup(self._data, _split_field_path(field_path))
+        if value is _MISSING:
+            raise KeyError(f'{field_path!r} is not contained in the data')
+        return copy.deepcopy(value)
+
+    def _field(self, field_path):
+        if field_path == '__name__':
+            return self._reference
+        return _lookup(self._data, _split_field_path(field_path))
+
+    def __repr__(self):
+        return f'<DocumentSnapshot {self._reference.path} exists={self.exists}>'
+
+
+class DocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+
+    @property
+    def id(self):
+        return self._path[-1]
+
+    @property
+    def path(self):
+        return '/'.join(self._path)
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self._path[:-1])
+
+    def collection(self, collection_id):
+        return CollectionReference(self._client, self._path + _split_path([collection_id]))
+
+    def collections(self):
+        depth = len(self._path)
+        with self._client._store.lock:
+            ids = {path[depth] for path in self._client._store.collections
+                   if len(path) > depth and path[:depth] == self._path}
+        return [self.collection(collection_id) for collection_id in sorted(ids)]
+
+    def get(self, field_paths=None, transaction=None):
+        started = perf_counter()
+        self._client._pause('get')
+        snapshot = self._client._read([self], field_paths, transaction)[0]
+        _observe('get', started, READS, target=self)
+        return snapshot
+
+    def _write(self, kind, data=None, merge=False, option=None):
+        batch = WriteBatch(self._client)
+        batch._add(kind, self, data, merge, option)
+        return batch.commit()[0]
+
+    def set(self, document_data, merge=False):
+        return self._write('set', document_data, merge)
+
+    def create(self, document_data):
+        return self._write('create', document_data)
+
+    def update(self, field_updates, option=None):
+        return self._write('update', field_updates, option=option)
+
+    def delete(self, option=None):
+        return self._write('delete', option=option).update_time
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other._client is self._client and other._path == self._path
+
+    def __hash__(self):
+        return hash(self._path)
+
+    def __repr__(self):
+        return f'<DocumentReference {self.path}>'
+
+    def __deepcopy__(self, memo):
+        # References are immutable; stored documents and snapshots share them
+        return self
+
+
+# --- Queries ---------------------------------------------------------------------------
+
+def _operator_name(op_string):
+    # FieldFilter turns == None / != None (and NaN) into unary operator enums
+    return op_string if isinstance(op_string, str) else op_string.name
+
+
+def _matches(snapshot, field_filter):
+    if isinstance(field_filter, BaseCompositeFilter):
+        results = (_matches(snapshot, child) for child in field_filter.filters)
+        return any(results) if isinstance(field_filter, Or) else all(results)
+    op = _operator_name(field_filter.op_string)
+    value = snapshot._field(field_filter.field_path)
+    if value is _MISSING:
+        return False
+    expected = field_filter.value
+    if op == 'IS_NULL':
+        return value is None
+    if op == 'IS_NOT_NULL':
+        return value is not None
+    if op in ('IS_NAN', 'IS_NOT_NAN'):
+        is_nan = isinstance(value, float) and math.isnan(value)
+        return is_nan if op == 'IS_NAN' else not is_nan and value is not None
+    if op == '==':
+        return _equal(value, expected)
+    if op == '!=':
+        return value is not None and not _equal(value, expected)
+    if op == 'in':
+        return any(_equal(value, item) for item in expected)
+    if op == 'not-in':
+        return value is not None and not any(_equal(value, item) for item in expected)
+    if op == 'array_contains':
+        return isinstance(value, list) and any(_equal(item, expected) for item in value)
+    if op == 'array_contains_any':
+        return isinstance(value, list) and any(_equal(item, wanted) for item in value for wanted in expected)
+    if _type_rank(value) != _type_rank(expected):
+        return False
+    result = _compare(value, expected)
+    return {'<': result < 0, '<=': result <= 0, '>': result > 0, '>=': result >= 0}[op]
+
+
+def _inequality_fields(filters):
+    for field_filter in filters:
+        if isinstance(field_filter, BaseCompositeFilter):
+            yield from _inequality_fields(field_filter.filters)
+        elif _operator_name(field_filter.op_string) in _INEQUALITY_OPS:
+            yield field_filter.field_path
+
+
+class Query:
+    def __init__(self, parent, all_descendants=False):
+        self._parent = parent
+        self._client = parent._client
+        self._all_descendants = all_descendants
+        self._filters = ()
+        self._orders = ()  # (field path, direction)
+        self._limit = None
+        self._limit_to_last = False
+        self._offset = 0
+        self._start = None  # (values or snapshot, inclusive)
+        self._end = None
+        self._projection = None
+
+    def _copy(self, **changes):
+        query = Query.__new__(Query)
+        query.__dict__.update(self.__dict__)
+        for name, value in changes.items():
+            setattr(query, '_' + name, value)
+        return query
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is None:
+            if field_path is None:
+                raise ValueError('where() needs a field path and operator, or filter=')
+            filter = FieldFilter(field_path, op_string, value)
+        elif field_path is not None:
+            raise ValueError("Can't pass in both the positional arguments and 'filter' at the same time")
+        return self._copy(filters=self._filters + (filter,))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        if direction not in (ASCENDING, DESCENDING):
+            raise ValueError(f'Invalid direction: {direction}')
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count, limit_to_last=False)
+
+    def limit_to_last(self, count):
+        return self._copy(limit=count, limit_to_last=True)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset=num_to_skip)
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, True))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, False))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, False))
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, True))
+
+    def count(self, alias=None):
+        return AggregationQuery(self).count(alias)
+
+    def sum(self, field_ref, alias=None):
+        return AggregationQuery(self).sum(field_ref, alias)
+
+    def avg(self, field_ref, alias=None):
+        return AggregationQuery(self).avg(field_ref, alias)
+
+    # -- Execution
+
+    def _candidates(self):
+        collections = self._client._store.collections
+        if not self._all_descendants:
+            return [(self._parent._path + (doc_id,), document)
+                    for doc_id, document in collections.get(self._parent._path, {}).items()]
+        collection_id = self._parent.id
+        return [(path + (doc_id,), document)
+                for path, documents in collections.items() if path[-1] == collection_id
+                for doc_id, document in documents.items()]
+
+    def _effective_orders(self):
+        orders = list(self._orders)
+        if not orders:
+            orders = [(field, ASCENDING) for field in dict.fromkeys(_inequality_fields(self._filters))]
+        last_direction = orders[-1][1] if orders else ASCENDING
+        if not any(field == '__name__' for field, _ in orders):
+            orders.append(('__name__', last_direction))
+        return orders
+
+    def _cursor_values(self, cursor, orders):
+        if isinstance(cursor, DocumentSnapshot):
+            values = [cursor._field(field) for field, _ in orders]
+            if _MISSING in values:
+                raise ValueError('The cursor snapshot is missing a field the query is ordered by')
+            return values
+        if isinstance(cursor, dict):
+            return [cursor[field] for field, _ in orders if field in cursor]
+        return list(cursor)
+
+    @staticmethod
+    def _compare_keys(left, right, orders):
+        for left_value, right_value, (_, direction) in zip(left, right, orders):
+            result = _compare(left_value, right_value)
+            if result:
+                return -result if direction == DESCENDING else result
+        return 0
+
+    def _run(self, transaction=None):
+        read_time = datetime.now(timezone.utc)
+        with self._client._store.lock:
+            candidates = self._candidates()
+        orders = self._effective_orders()
+        rows = []
+        for path, document in candidates:
+            snapshot = DocumentSnapshot(DocumentReference(self._client, path), document.data, True,
+                                        document.create_time, document.update_time, read_time)
+            if not all(_matches(snapshot, field_filter) for field_filter in self._filters):
+                continue
+            key = [snapshot._field(field) for field, _ in orders]
+            if _MISSING in key:
+                continue
+            rows.append((key, snapshot, document))
+
+        rows.sort(key=cmp_to_key(lambda left, right: self._compare_keys(left[0], right[0], orders)))
+        if self._start is not None:
+            cursor, inclusive = self._start
+            values = self._cursor_values(cursor, orders)
+            rows = [row for row in rows if (self._compare_keys(row[0], values, orders) >= 0 if inclusive
+                                            else self._compare_keys(row[0], values, orders) > 0)]
+        if self._end is not None:
+            cursor, inclusive = self._end
+            values = self._cursor_values(cursor, orders)
+            rows = [row for row in rows if (self._compare_keys(row[0], values, orders) <= 0 if inclusive
+                                            else self._compare_keys(row[0], values, orders) < 0)]
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[-self._limit:] if self._limit_to_last and self._limit else rows[:self._limit]
+
+        if transaction is not None:
+            transaction._record_reads((snapshot.reference, document) for _, snapshot, document in rows)
+        if self._projection is not None:
+            for _, snapshot, _ in rows:
+                snapshot._data = _project(snapshot._data, self._projection)
+        return [snapshot for _, snapshot, _ in rows]
+
+    def stream(self, transaction=None):
+        started = perf_counter()
+        self._client._pause('query')
+        snapshots = self._run(transaction)
+        _observe('query', started, QUERIES, 1, STREAMED, len(snapshots), self)
+        yield from snapshots
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+    def __repr__(self):
+        scope = 'collection group' if self._all_descendants else 'query on'
+        return f'<Query {scope} {self._parent.path}>'
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+        super().__init__(self)
+
+    @property
+    def id(self):
+        return self._path[-1]
+
+    @property
+    def path(self):
+        return '/'.join(self._path)
+
+    @property
+    def parent(self):
+        return DocumentReference(self._client, self._path[:-1]) if len(self._path) > 1 else None
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = ''.join(random.choices(_AUTO_ID_CHARS, k=20))
+        return DocumentReference(self._client, self._path + _split_path([document_id]))
+
+    def add(self, document_data, document_id=None):
+        reference = self.document(document_id)
+        write_result = reference.create(document_data)
+        return write_result.update_time, reference
+
+    def list_documents(self, page_size=None):
+        """Existing documents plus missing ones that have subcollections, as Firestore lists them"""
+        started = perf_counter()
+        self._client._pause('list_documents')
+        depth = len(self._path)
+        with self._client._store.lock:
+            ids = set(self._client._store.collections.get(self._path, ()))
+            ids.update(path[depth] for path in self._client._store.collections
+                       if len(path) > depth + 1 and path[:depth] == self._path)
+        _observe('list_documents', started, READS, len(ids), target=self)
+        for document_id in sorted(ids):
+            yield DocumentReference(self._client, self._path + (document_id,))
+
+    def __repr__(self):
+        return f'<CollectionReference {self.path}>'
+
+
+class AggregationResult:
+    __slots__ = ('alias', 'value', 'read_time')
+
+    def __init__(self, alias, value, read_time=None):
+        self.alias = alias
+        self.value = value
+        self.read_time = read_time
+
+    def __repr__(self):
+        return f'<AggregationResult alias={self.alias} value={self.value}>'
+
+
+class AggregationQuery:
+    def __init__(self, nested_query):
+        self._nested_query = nested_query
+        self._aggregations = []  # (kind, field path, alias)
+
+    def _add(self, kind, field_ref, alias):
+        self._aggregations.append((kind, field_ref, alias or f'field_{len(self._aggregations) + 1}'))
+        return self
+
+    def count(self, alias=None):
+        return self._add('count', None, alias)
+
+    def sum(self, field_ref, alias=None):
+        return self._add('sum', field_ref, alias)
+
+    def avg(self, field_ref, alias=None):
+        return self._add('avg', field_ref, alias)
+
+    def _results(self, transaction=None):
+        snapshots = self._nested_query._run(transaction)
+        read_time = datetime.now(timezone.utc)
+        results = []
+        for kind, field_ref, alias in self._aggregations:
+            if kind == 'count':
+                value = len(snapshots)
+            else:
+                numbers = [value for value in (snapshot._field(field_ref) for snapshot in snapshots)
+                           if isinstance(value, (int, float)) and not isinstance(value, bool)]
+                if kind == 'sum':
+                    value = sum(numbers)
+                else:
+                    value = sum(numbers) / len(numbers) if numbers else None
+            results.append(AggregationResult(alias, value, read_time))
+        return [results]
+
+    def get(self, transaction=None):
+        started = perf_counter()
+        self._nested_query._client._pause('aggregation')
+        results = self._results(transaction)
+        _observe('aggregation', started, QUERIES, 1, READS, 1, self)
+        return results
+
+    def stream(self, transaction=None):
+        yield from self.get(transaction)
+
+
+# --- Batches and transactions ------------------------------------------------------------
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []  # (kind, path, data, merge, option)
+
+    def _add(self, kind, reference, data=None, merge=False, option=None):
+        if kind in ('set', 'create', 'update') and not isinstance(data, dict):
+            raise TypeError(f'{kind}() expects a dict, got {type(data).__name__}')
+        if kind == 'update' and not data:
+            raise ValueError('Cannot update with an empty set of fields')
+        self._writes.append((kind, _path_of(reference), data, merge, option))
+
+    def set(self, reference, document_data, merge=False):
+        self._add('set', reference, document_data, merge)
+
+    def create(self, reference, document_data):
+        self._add('create', reference, document_data)
+
+    def update(self, reference, field_updates, option=None):
+        self._add('update', reference, field_updates, option=option)
+
+    def delete(self, reference, option=None):
+        self._add('delete', reference, option=option)
+
+    def _write_counts(self):
+        deletes = sum(1 for write in self._writes if write[0] == 'delete')
+        return len(self._writes) - deletes, deletes
+
+    def commit(self):
+        started = perf_counter()
+        writes, deletes = self._write_counts()
+        self._client._pause('commit')
+        try:
+            return self._client._commit(self._writes)
+        finally:
+            self._writes = []
+            _observe('commit', started, WRITES, writes, DELETES, deletes, self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+    def __len__(self):
+        return len(self._writes)
+
+
+class Transaction(WriteBatch):
+    """
+    Optimistic transaction driven by @firestore.transactional: _commit() raises
+    Aborted when a document read through the transaction changed since the read.
+    """
+
+    def __init__(self, client, max_attempts=MAX_TRANSACTION_ATTEMPTS, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._reads = {}  # path -> update_time (None when it didn't exist)
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    @property
+    def id(self):
+        return self._id
+
+    def _add(self, kind, reference, data=None, merge=False, option=None):
+        if self._read_only:
+            raise ValueError('Cannot perform write operation in read-only transaction.')
+        super()._add(kind, reference, data, merge, option)
+
+    def _record_reads(self, pairs):
+        if self._writes:
+            raise ValueError('Firestore transactions require all reads to be executed before all writes.')
+        for reference, document in pairs:
+            self._reads.setdefault(_path_of(reference), document.update_time if document else None)
+
+    def _clean_up(self):
+        self._writes = []
+        self._reads = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        if self.in_progress:
+            raise ValueError('Cannot begin a transaction that is already in progress')
+        self._id = ''.join(random.choices(_AUTO_ID_CHARS, k=16)).encode('ascii')
+
+    def _rollback(self):
+        if not self.in_progress:
+            raise ValueError('Cannot rollback a transaction that is not in progress')
+        self._clean_up()
+
+    def _commit(self):
+        if not self.in_progress:
+            raise ValueError('Cannot commit a transaction that is not in progress')
+        started = perf_counter()
+        writes, deletes = self._write_counts()
+        self._client._pause('commit')
+        try:
+            return self._client._commit(self._writes, self._reads)
+        finally:
+            _observe('commit', started, WRITES, writes, DELETES, deletes, self)
+            self._clean_up()
+
+    def commit(self):
+        raise ValueError('Transactions are committed by @firestore.transactional')
+
+    def get_all(self, references, field_paths=None):
+        return self._client.get_all(references, field_paths=field_paths, transaction=self)
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, DocumentReference):
+            return self._client.get_all([ref_or_query], transaction=self)
+        if isinstance(ref_or_query, Query):
+            return ref_or_query.stream(transaction=self)
+        raise ValueError('Value for argument "ref_or_query" must be a DocumentReference or a Query.')
+
+
+# --- Async view ----------------------------------------------------------------------------
+
+def _async_snapshot(snapshot):
+    return DocumentSnapshot(AsyncDocumentReference(snapshot._reference), snapshot._data, snapshot.exists,
+                            snapshot.create_time, snapshot.update_time, snapshot.read_time)
+
+
+class AsyncDocumentReference:
+    def __init__(self, reference):
+        self._sync = reference
+        self._client = reference._client
+        self._path = reference._path
+
+    id = property(lambda self: self._sync.id)
+    path = property(lambda self: self._sync.path)
+
+    @property
+    def parent(self):
+        return AsyncCollectionReference(self._sync.parent)
+
+    def collection(self, collection_id):
+        return AsyncCollectionReference(self._sync.collection(collection_id))
+
+    async def get(self, field_paths=None, transaction=None):
+        started = perf_counter()
+        await self._client._apause('get')
+        snapshot = self._client._read([self._sync], field_paths)[0]
+        _observe('get', started, READS, target=self)
+        return _async_snapshot(snapshot)
+
+    async def _write(self, kind, data=None, merge=False, option=None):
+        batch = AsyncWriteBatch(self._client)
+        batch._add(kind, self, data, merge, option)
+        return (await batch.commit())[0]
+
+    async def set(self, document_data, merge=False):
+        return await self._write('set', document_data, merge)
+
+    async def create(self, document_data):
+        return await self._write('create', document_data)
+
+    async def update(self, field_updates, option=None):
+        return await self._write('update', field_updates, option=option)
+
+    async def delete(self, option=None):
+        return (await self._write('delete', option=option)).update_time
+
+    def __eq__(self, other):
+        return isinstance(other, AsyncDocumentReference) and other._sync == self._sync
+
+    def __hash__(self):
+        return hash(self._path)
+
+    def __repr__(self):
+        return f'<AsyncDocumentReference {self.path}>'
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class AsyncQuery:
+    def __init__(self, query):
+        self._query = query
+        self._parent = query._parent
+        self._client = query._client
+
+    def _chain(name):
+        def method(self, *args, **kwargs):
+            return AsyncQuery(getattr(self._query, name)(*args, **kwargs))
+        method.__name__ = name
+        return method
+
+    select = _chain('select')
+    where = _chain('where')
+    order_by = _chain('order_by')
+    limit = _chain('limit')
+    limit_to_last = _chain('limit_to_last')
+    offset = _chain('offset')
+    start_at = _chain('start_at')
+    start_after = _chain('start_after')
+    end_before = _chain('end_before')
+    end_at = _chain('end_at')
+    del _chain
+
+    def count(self, alias=None):
+        return AsyncAggregationQuery(self._query.count(alias))
+
+    def sum(self, field_ref, alias=None):
+        return AsyncAggregationQuery(self._query.sum(field_ref, alias))
+
+    def avg(self, field_ref, alias=None):
+        return AsyncAggregationQuery(self._query.avg(field_ref, alias))
+
+    async def stream(self, transaction=None):
+        started = perf_counter()
+        await self._client._apause('query')
+        snapshots = self._query._run()
+        _observe('query', started, QUERIES, 1, STREAMED, len(snapshots), self)
+        for snapshot in snapshots:
+            yield _async_snapshot(snapshot)
+
+    async def get(self, transaction=None):
+        return [snapshot async for snapshot in self.stream()]
+
+
+class AsyncCollectionReference(AsyncQuery):
+    id = property(lambda self: self._query.id)
+    path = property(lambda self: self._query.path)
+
+    @property
+    def _path(self):
+        return self._query._path
+
+    @property
+    def parent(self):
+        parent = self._query.parent
+        return AsyncDocumentReference(parent) if parent is not None else None
+
+    def document(self, document_id=None):
+        return AsyncDocumentReference(self._query.document(document_id))
+
+    async def add(self, document_data, document_id=None):
+        reference = self.document(document_id)
+        write_result = await reference.create(document_data)
+        return write_result.update_time, reference
+
+    async def list_documents(self, page_size=None):
+        for reference in self._query.list_documents(page_size):
+            yield AsyncDocumentReference(reference)
+
+
+class AsyncAggregationQuery:
+    def __init__(self, aggregation_query):
+        self._sync = aggregation_query
+        self._nested_query = aggregation_query._nested_query
+
+    def count(self, alias=None):
+        self._sync.count(alias)
+        return self
+
+    def sum(self, field_ref, alias=None):
+        self._sync.sum(field_ref, alias)
+        return self
+
+    def avg(self, field_ref, alias=None):
+        self._sync.avg(field_ref, alias)
+        return self
+
+    async def get(self, transaction=None):
+        started = perf_counter()
+        await self._nested_query._client._apause('aggregation')
+        results = self._sync._results()
+        _observe('aggregation', started, QUERIES, 1, READS, 1, self)
+        return results
+
+
+class AsyncWriteBatch(WriteBatch):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.commit()
+
+    async def commit(self):
+        started = perf_counter()
+        writes, deletes = self._write_counts()
+        await self._client._apause('commit')
+        try:
+            return self._client._commit(self._writes)
+        finally:
+            self._writes = []
+            _observe('commit', started, WRITES, writes, DELETES, deletes, self)
+
+
+class AsyncFakeClient:
+    """AsyncClient-like access to a FakeClient's data (transactions are sync only)"""
+
+    def __init__(self, client):
+        self._client = client
+        self.project = client.project
+
+    def collection(self, *collection_path):
+        return AsyncCollectionReference(self._client.collection(*collection_path))
+
+    def document(self, *document_path):
+        return AsyncDocumentReference(self._client.document(*document_path))
+
+    def collection_group(self, collection_id):
+        return AsyncQuery(self._client.collection_group(collection_id))
+
+    def batch(self):
+        return AsyncWriteBatch(self._client)
+
+    write_option = staticmethod(FakeClient.write_option)
+
+    async def get_all(self, references, field_paths=None, transaction=None):
+        started = perf_counter()
+        await self._client._apause('get_all')
+        snapshots = self._client._read(references, field_paths)
+        _observe('get_all', started, READS, len(snapshots), target=self)
+        for snapshot in snapshots:
+            yield _async_snapshot(snapshot)
+
+
+# --- Fixtures ------------------------------------------------------------------------------
+
+def decode_fixture_value(client, value):
+    """Fixture JSON -> document value, turning the __timestamp__/__reference__ markers back"""
+    if isinstance(value, dict):
+        if set(value) == {'__timestamp__'}:
+            return _as_utc(datetime.fromisoformat(value['__timestamp__']))
+        if set(value) == {'__reference__'}:
+            return client.document(value['__reference__'])
+        return {key: decode_fixture_value(client, item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_fixture_value(client, item) for item in value]
+    return value
+
+
+def encode_fixture_value(value):
+    """Document value -> JSON-serializable fixture value"""
+    if isinstance(value, dict):
+        return {key: encode_fixture_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [encode_fixture_value(item) for item in value]
+    if isinstance(value, datetime):
+        return {'__timestamp__': value.isoformat()}
+    if isinstance(value, DocumentReference):
+        return {'__reference__': value.path}
+    return value
+
+
+def load_fixture(client, collections, prefix=''):
+    """
+    Seed documents from {collection: {document_id: {field: value, ...}}}.
+
+    A document's SUBCOLLECTIONS_KEY holds its subcollections in the same shape;
+    {"__timestamp__": iso} and {"__reference__": path} stand for timestamps and
+    document references.
+
+    Returns:
+        int: Documents written
+    """
+    written = 0
+    for collection_id, documents in collections.items():
+        for document_id, fields in documents.items():
+            fields = dict(fields)
+            subcollections = fields.pop(SUBCOLLECTIONS_KEY, None)
+            path = f'{prefix}{collection_id}/{document_id}'
+            if fields or not subcollections:
+                client.seed(path, decode_fixture_value(client, fields))
+                written += 1
+            if subcollections:
+                written += load_fixture(client, subcollections, prefix=f'{path}/')
+    return written
+
+
+def to_fixture(client):
+    """Every stored document in load_fixture()'s format"""
+    fixture = {}
+    with client._store.lock:
+        items = [(path + (doc_id,), document.data)
+                 for path, documents in client._store.collections.items()
+                 for doc_id, document in documents.items()]
+    for path, data in sorted(items):
+        collections = fixture
+        for index in range(0, len(path) - 2, 2):
+            document = collections.setdefault(path[index], {}).setdefault(path[index + 1], {})
+            collections = document.setdefault(SUBCOLLECTIONS_KEY, {})
+        collections.setdefault(path[-2], {}).setdefault(path[-1], {}).update(encode_fixture_value(data))
+    return fixture
+
+
+def phone_data_products(phone_data):
+    """
+    Product documents for phone_data.json (brand -> [{name, title, url, image}]).
+
+    The scrape has no prices or variants, so each phone gets two storage variants
+    with prices and stock drawn from a generator seeded with its name: the same
+    file always gives the same catalog.
+
+    Returns:
+        dict: Document ID (the product SKU) -> product data
+    """
+    from products.bulk_import import product_sku, variant_id
+
+    now = datetime.now(timezone.utc)
+    products = {}
+    for brand, phones in phone_data.items():
+        for phone in phones:
+            rng = random.Random(phone['name'])
+            base_price = rng.randrange(80, 1500) * 100
+            color = rng.choice(['Black', 'Blue', 'Silver', 'Green', 'Gold'])
+            options = []
+            for step, storage in enumerate(rng.sample(['64GB', '128GB', '256GB', '512GB'], 2)):
+                price = base_price + step * rng.randrange(20, 80) * 100
+                option = {'storage': storage, 'colors': color, 'price': float(price),
+                          'discounted_price': float(round(price * rng.uniform(0.8, 0.97), -1)),
+                          'stock': rng.randrange(0, 60)}
+                option['id'] = variant_id(option)
+                options.append(option)
+            product = {
+                'name': phone['name'],
+                'brand': brand,
+                'category': 'smartphones',
+                'description': phone.get('title', phone['name']),
+                'images': [phone['image']] if phone.get('image') else [],
+                'price': options[0]['price'],
+                'discount_price': options[0]['discounted_price'],
+                'stock': sum(option['stock'] for option in options),
+                'valid_options': options,
+                'rating': 0, 'rating_sum': 0.0, 'reviews_count': 0,
+                'reviews_keyed_by_user': True,
+                'featured': rng.random() < 0.1,
+                'created_at': now,
+                'updated_at': now,
+            }
+            products[product_sku(product)] = product
+    return products
+
+
+def load_snapshot_dir(client, path):
+    """
+    Seed from an NDJSON snapshot directory (manage.py generate_dataset --target ndjson):
+    every *.ndjson file in it, one {"path": ..., "data": ...} document per line.
+
+    Returns:
+        int: Documents written
+    """
+    written = 0
+    for file_path in sorted(Path(path).glob('*.ndjson')):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    client.seed(record['path'], decode_fixture_value(client, record['data']))
+                    written += 1
+    return written
+
+
+def load_fixture_file(client, path):
+    """
+    Seed from a JSON file: a load_fixture() fixture, simplified_phone_data.json
+    (stored as phone_catalog/catalog_data) or phone_data.json (products); or from
+    a snapshot directory, see load_snapshot_dir().
+
+    Returns:
+        int: Documents written
+    """
+    if Path(path).is_dir():
+        return load_snapshot_dir(client, path)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if set(data) == {'brands'}:
+        client.seed('phone_catalog/catalog_data', data)
+        return 1
+    if data and all(isinstance(value, list) for value in data.values()):
+        products = phone_data_products(data)
+        for product_id, product in products.items():
+            client.seed(f'products/{product_id}', product)
+        client.seed('categories/smartphones', {'name': 'Smartphones', 'image_url': None, 'redirect_url': None,
+                                               'order': 0, 'created_at': datetime.now(timezone.utc)})
+        return len(products) + 1
+    return load_fixture(client, data)
+
+
+def parse_latency(value):
+    """'get=5,query=20' (milliseconds) or a dict of the same -> {operation: seconds}"""
+    if isinstance(value, str):
+        items = (item.partition('=')[::2] for item in value.split(',') if item.strip())
+        value = {name.strip(): float(ms) for name, ms in items}
+    latency = {}
+    for operation, ms in (value or {}).items():
+        if operation not in LATENCY_OPERATIONS:
+            raise ValueError(f'Unknown Firestore operation {operation!r} (expected one of {LATENCY_OPERATIONS})')
+        latency[operation] = ms / 1000
+    return latency
+
+
+def client_from_settings():
+    """A FakeClient configured and seeded from the FIRESTORE_FAKE_* settings"""
+    from django.conf import settings
+
+    client = FakeClient(
+        project=settings.FIREBASE_DATABASE.get('PROJECT_ID', 'fake-project'),
+        latency=parse_latency(getattr(settings, 'FIRESTORE_FAKE_LATENCY_MS', '')),
+        jitter=getattr(settings, 'FIRESTORE_FAKE_LATENCY_JITTER', 0.0),
+    )
+    for path in getattr(settings, 'FIRESTORE_FAKE_FIXTURES', []):
+        load_fixture_file(client, path)
+    return client
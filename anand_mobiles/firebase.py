@@ -0,0 +1,74 @@
+"""
+Lazily initialized Firebase app and Firestore client.
+
+Nothing here touches credentials or opens a gRPC channel until the first Firestore
+call, so manage.py commands, URL loading and worker boot don't pay for it (and
+don't fail without FIREBASE_CONFIG_PATH). Modules keep a module-level `db`:
+
+    from anand_mobiles.firebase import db
+
+`db` forwards attribute access to the shared client, creating it on first use;
+get_db() returns the client itself and get_app() the initialized firebase_admin app
+(pass it to firebase_admin.auth calls, which otherwise expect the default app to
+exist already).
+
+With FIRESTORE_BACKEND = 'memory' the client is an in-memory fake
+(anand_mobiles/fake_firestore.py) and no credentials are needed for Firestore.
+"""
+import threading
+
+from django.conf import settings
+
+_app = None
+_client = None
+_lock = threading.Lock()
+
+
+def get_app():
+    """The default firebase_admin app, initialized from FIREBASE_CONFIG_PATH on first call"""
+    global _app
+    if _app is None:
+        with _lock:
+            if _app is None:
+                import firebase_admin
+                from firebase_admin import credentials
+                try:
+                    _app = firebase_admin.get_app()
+                except ValueError:
+                    cred = credentials.Certificate(settings.FIREBASE_CONFIG_PATH)
+                    _app = firebase_admin.initialize_app(cred)
+    return _app
+
+
+def get_db():
+    """The shared Firestore client"""
+    global _client
+    if _client is None:
+        app = None if use_fake_firestore() else get_app()
+        with _lock:
+            if _client is None:
+                if app is None:
+                    from anand_mobiles.fake_firestore import client_from_settings
+                    _client = client_from_settings()
+                else:
+                    from firebase_admin import firestore
+                    _client = firestore.client(app)
+    return _client
+
+
+def use_fake_firestore():
+    return getattr(settings, 'FIRESTORE_BACKEND', 'firestore') == 'memory'
+
+
+class _LazyClient:
+    """Stands in for the Firestore client until it is first used"""
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+    def __repr__(self):
+        return f'<lazy Firestore client: {_client!r}>'
+
+
+db = _LazyClient()
@@ -0,0 +1,475 @@
+"""
+Per-request accounting of Firestore operations, exported as Prometheus metrics.
+
+firebase_admin hands every module the same Firestore client, and the references,
+queries and batches built from it are separate objects, so instrumenting one client
+instance would miss most calls. install() instead wraps the few methods that talk to
+the backend (point gets, get_all, query streams, aggregation queries and commits) on
+the sync and async client classes.
+
+FirestoreMetricsMiddleware puts a RequestStats in a context variable for each
+request; the wrappers add to it only when one is set, so management commands and
+other code outside a request pay for one context-variable lookup. When the response
+is ready the request's totals are merged, under one lock, into process-wide counters
+and histograms labelled with the view name, served by the metrics view as
+Prometheus text. Counters are per process: with several workers, each scrape sees
+the worker that answered it.
+
+In DEBUG responses carry a Server-Timing header with the request's Firestore time
+and operation counts.
+"""
+import bisect
+import contextvars
+import hmac
+import threading
+from collections import defaultdict
+from functools import wraps
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+READS = 'read'
+WRITES = 'write'
+DELETES = 'delete'
+QUERIES = 'query'
+STREAMED = 'streamed'
+OPERATIONS = (READS, WRITES, DELETES, QUERIES, STREAMED)
+
+# Upper bounds in seconds; +Inf is implied
+CALL_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+UNMATCHED_VIEW = '<unmatched>'
+
+_current = contextvars.ContextVar('firestore_request_stats', default=None)
+_call_listener = None
+_installed = False
+_install_lock = threading.Lock()
+
+
+class RequestStats:
+    """Firestore operations made while handling one request"""
+    __slots__ = ('counts', 'calls', 'seconds', '_lock')
+
+    def __init__(self):
+        self.counts = dict.fromkeys(OPERATIONS, 0)
+        self.calls = []  # (call, seconds)
+        self.seconds = 0.0
+        # Views may fan out to threads (firestore_utils.run_in_parallel)
+        self._lock = threading.Lock()
+
+    def record(self, call, seconds, operation, count=1, operation2=None, count2=0, target=None):
+        with self._lock:
+            self.calls.append((call, seconds))
+            self.seconds += seconds
+            self.counts[operation] += count
+            if operation2 is not None:
+                self.counts[operation2] += count2
+        listener = _call_listener
+        if listener is not None:
+            listener(call, seconds, target, operation, count, operation2, count2)
+
+
+def current_stats():
+    """The RequestStats of the request being handled, or None"""
+    return _current.get()
+
+
+def set_call_listener(listener):
+    """
+    Also report every recorded call to listener(call, seconds, target, operation,
+    count, operation2, count2), where target is the reference, query or batch used.
+    """
+    global _call_listener
+    _call_listener = listener
+
+
+# --- Wrappers -------------------------------------------------------------------
+
+def _wrap_point_get(original):
+    @wraps(original)
+    def get(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return original(self, *args, **kwargs)
+        started = perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            # A missing document is still a billed read
+            stats.record('get', perf_counter() - started, READS, target=self)
+    return get
+
+
+def _wrap_async_point_get(original):
+    @wraps(original)
+    async def get(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return await original(self, *args, **kwargs)
+        started = perf_counter()
+        try:
+            return await original(self, *args, **kwargs)
+        finally:
+            stats.record('get', perf_counter() - started, READS, target=self)
+    return get
+
+
+def _wrap_aggregation(original, is_async=False):
+    # Billed as one read per 1000 index entries scanned, so at least one
+    if is_async:
+        @wraps(original)
+        async def get(self, *args, **kwargs):
+            stats = _current.get()
+            if stats is None:
+                return await original(self, *args, **kwargs)
+            started = perf_counter()
+            try:
+                return await original(self, *args, **kwargs)
+            finally:
+                stats.record('aggregation', perf_counter() - started, QUERIES, 1, READS, 1, self)
+        return get
+
+    @wraps(original)
+    def get(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return original(self, *args, **kwargs)
+        started = perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            stats.record('aggregation', perf_counter() - started, QUERIES, 1, READS, 1, self)
+    return get
+
+
+class _CountingStream:
+    """
+    Iterator proxy that counts documents and the time spent waiting for them.
+
+    The call is recorded once the stream is exhausted or dropped, and only if it was
+    iterated at all: query streams don't reach the backend until then.
+    """
+    __slots__ = ('_iterator', '_stats', '_call', '_is_query', '_target', '_count', '_seconds', '_started', '_done')
+
+    def __init__(self, iterator, stats, call, is_query, target):
+        self._iterator = iterator
+        self._stats = stats
+        self._target = target
+        self._call = call
+        self._is_query = is_query
+        self._count = 0
+        self._seconds = 0.0
+        self._started = False
+        self._done = False
+
+    def __getattr__(self, name):
+        # e.g. StreamGenerator.get_explain_metrics()
+        return getattr(self._iterator, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._started = True
+        started = perf_counter()
+        try:
+            item = next(self._iterator)
+        except StopIteration:
+            self._seconds += perf_counter() - started
+            self._finish()
+            raise
+        self._seconds += perf_counter() - started
+        self._count += 1
+        return item
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self._started = True
+        started = perf_counter()
+        try:
+            item = await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self._seconds += perf_counter() - started
+            self._finish()
+            raise
+        self._seconds += perf_counter() - started
+        self._count += 1
+        return item
+
+    def _finish(self):
+        if self._done or not self._started:
+            return
+        self._done = True
+        if self._is_query:
+            self._stats.record(self._call, self._seconds, QUERIES, 1, STREAMED, self._count, self._target)
+        else:
+            self._stats.record(self._call, self._seconds, READS, self._count, target=self._target)
+
+    def __del__(self):
+        self._finish()
+
+
+def _wrap_stream(original, call, is_query):
+    @wraps(original)
+    def stream(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return original(self, *args, **kwargs)
+        return _CountingStream(original(self, *args, **kwargs), stats, call, is_query, self)
+    return stream
+
+
+def _count_writes(write_pbs):
+    deletes = sum(1 for write_pb in write_pbs if 'delete' in write_pb)
+    return len(write_pbs) - deletes, deletes
+
+
+def _wrap_commit(original, is_async=False):
+    if is_async:
+        @wraps(original)
+        async def commit(self, *args, **kwargs):
+            stats = _current.get()
+            if stats is None:
+                return await original(self, *args, **kwargs)
+            writes, deletes = _count_writes(self._write_pbs)
+            started = perf_counter()
+            try:
+                return await original(self, *args, **kwargs)
+            finally:
+                stats.record('commit', perf_counter() - started, WRITES, writes, DELETES, deletes, self)
+        return commit
+
+    @wraps(original)
+    def commit(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return original(self, *args, **kwargs)
+        writes, deletes = _count_writes(self._write_pbs)
+        started = perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            stats.record('commit', perf_counter() - started, WRITES, writes, DELETES, deletes, self)
+    return commit
+
+
+def install():
+    """Instrument the Firestore client classes (idempotent)"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        from google.cloud.firestore_v1 import (
+            aggregation, async_aggregation, async_batch, async_client, async_document,
+            async_query, async_transaction, batch, client, document, query, transaction,
+        )
+
+        # DocumentReference.set/update/delete commit a one-write batch, and
+        # Transaction.get/get_all go through Client.get_all; CollectionReference and
+        # Query.get go through Query.stream, so these cover every read and write path
+        document.DocumentReference.get = _wrap_point_get(document.DocumentReference.get)
+        client.Client.get_all = _wrap_stream(client.Client.get_all, 'get_all', is_query=False)
+        query.Query.stream = _wrap_stream(query.Query.stream, 'query', is_query=True)
+        aggregation.AggregationQuery.get = _wrap_aggregation(aggregation.AggregationQuery.get)
+        batch.WriteBatch.commit = _wrap_commit(batch.WriteBatch.commit)
+        transaction.Transaction._commit = _wrap_commit(transaction.Transaction._commit)
+
+        async_document.AsyncDocumentReference.get = _wrap_async_point_get(async_document.AsyncDocumentReference.get)
+        async_client.AsyncClient.get_all = _wrap_stream(async_client.AsyncClient.get_all, 'get_all', is_query=False)
+        async_query.AsyncQuery.stream = _wrap_stream(async_query.AsyncQuery.stream, 'query', is_query=True)
+        async_aggregation.AsyncAggregationQuery.get = _wrap_aggregation(
+            async_aggregation.AsyncAggregationQuery.get, is_async=True)
+        async_batch.AsyncWriteBatch.commit = _wrap_commit(async_batch.AsyncWriteBatch.commit, is_async=True)
+        async_transaction.AsyncTransaction._commit = _wrap_commit(
+            async_transaction.AsyncTransaction._commit, is_async=True)
+        _installed = True
+
+
+# --- Process-wide registry -------------------------------------------------------
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+_registry_lock = threading.Lock()
+_operations = defaultdict(int)  # (view, operation) -> total
+_call_durations = {}  # (view, call) -> _Histogram
+_request_durations = {}  # view -> _Histogram
+_request_firestore_durations = {}  # view -> _Histogram
+
+
+def _histogram(histograms, key, buckets):
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = _Histogram(buckets)
+    return histogram
+
+
+def observe_request(view, seconds, stats):
+    """Merge one request's totals into the process-wide metrics"""
+    with _registry_lock:
+        _histogram(_request_durations, view, REQUEST_BUCKETS).observe(seconds)
+        _histogram(_request_firestore_durations, view, REQUEST_BUCKETS).observe(stats.seconds)
+        for operation, count in stats.counts.items():
+            if count:
+                _operations[(view, operation)] += count
+        for call, call_seconds in stats.calls:
+            _histogram(_call_durations, (view, call), CALL_BUCKETS).observe(call_seconds)
+
+
+def operation_totals():
+    """{view: {operation: total}} since start-up or the last reset_metrics()"""
+    totals = defaultdict(dict)
+    with _registry_lock:
+        for (view, operation), count in _operations.items():
+            totals[view][operation] = count
+    return dict(totals)
+
+
+def reset_metrics():
+    with _registry_lock:
+        _operations.clear()
+        _call_durations.clear()
+        _request_durations.clear()
+        _request_firestore_durations.clear()
+
+
+def _label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+def _render_histograms(lines, name, help_text, histograms, label_names):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key in sorted(histograms):
+        histogram = histograms[key]
+        values = key if isinstance(key, tuple) else (key,)
+        labels = _labels(**dict(zip(label_names, values)))
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{_format_bound(bound)}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram.sum!r}')
+        lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = [
+        '# HELP firestore_operations_total Firestore documents read, written and deleted, '
+        'queries run and documents streamed from queries',
+        '# TYPE firestore_operations_total counter',
+    ]
+    with _registry_lock:
+        for (view, operation) in sorted(_operations):
+            lines.append(f'firestore_operations_total{{{_labels(view=view, operation=operation)}}} '
+                         f'{_operations[(view, operation)]}')
+        _render_histograms(lines, 'firestore_call_duration_seconds',
+                           'Latency of individual Firestore calls', _call_durations, ('view', 'call'))
+        _render_histograms(lines, 'http_request_firestore_seconds',
+                           'Total Firestore time per request (concurrent calls are summed)',
+                           _request_firestore_durations, ('view',))
+        _render_histograms(lines, 'http_request_duration_seconds',
+                           'Request latency through the middleware stack', _request_durations, ('view',))
+    return '\n'.join(lines) + '\n'
+
+
+# --- Django integration ------------------------------------------------------------
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNMATCHED_VIEW
+
+
+def server_timing(stats, seconds):
+    counts = stats.counts
+    desc = (f'{counts[READS]} reads, {counts[QUERIES]} queries, {counts[STREAMED]} streamed, '
+            f'{counts[WRITES]} writes, {counts[DELETES]} deletes')
+    return (f'firestore;dur={stats.seconds * 1000:.1f};desc="{desc}", '
+            f'total;dur={seconds * 1000:.1f}')
+
+
+class FirestoreMetricsMiddleware:
+    """
+    Count each request's Firestore operations against its view. Put it first in
+    MIDDLEWARE so the request latency covers the whole stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = settings.DEBUG
+        install()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, perf_counter() - started)
+
+    def _finish(self, request, response, stats, seconds):
+        observe_request(view_name(request), seconds, stats)
+        if self.server_timing:
+            response['Server-Timing'] = server_timing(stats, seconds)
+        return response
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint.
+
+    With METRICS_TOKEN set, requires "Authorization: Bearer <METRICS_TOKEN>";
+    without it the endpoint is only served in DEBUG.
+    """
+    expected = getattr(settings, 'METRICS_TOKEN', None)
+    if expected:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied.encode(), expected.encode()):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    elif not settings.DEBUG:
+        raise Http404
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,174 @@
+"""
+Shared helpers for bulk Firestore work (sweeps, imports, bulk updates).
+"""
+import contextvars
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_SIZE = 500
+
+
+def chunked(iterable, size):
+    """Yield lists of at most `size` items from any iterable without materializing it"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def apply_operations(writer, operations):
+    """
+    Queue write operations on a WriteBatch or Transaction.
+
+    Args:
+        writer: Firestore WriteBatch or Transaction
+        operations: Iterable of tuples: ('set', ref, data[, merge]), ('update', ref, data),
+            ('create', ref, data) or ('delete', ref[, option]), where option is a
+            db.write_option() precondition
+    """
+    for operation in operations:
+        action, ref = operation[0], operation[1]
+        if action == 'set':
+            writer.set(ref, operation[2], merge=operation[3] if len(operation) > 3 else False)
+        elif action == 'update':
+            writer.update(ref, operation[2])
+        elif action == 'create':
+            writer.create(ref, operation[2])
+        elif action == 'delete':
+            writer.delete(ref, option=operation[2] if len(operation) > 2 else None)
+        else:
+            raise ValueError(f'Unknown batch operation: {action}')
+
+
+def _commit_chunk(db, operations):
+    batch = db.batch()
+    apply_operations(batch, operations)
+    batch.commit()
+    return len(operations)
+
+
+def run_in_parallel(func, items, max_workers=8):
+    """
+    Run func(item) on a thread pool over a lazily consumed iterable.
+
+    At most `max_workers * 2` items are in flight, so memory stays bounded however
+    long the iterable is. Each call runs in a copy of the caller's context, so
+    per-request state (e.g. Firestore metrics) follows the work onto the pool.
+
+    Yields:
+        tuple: (item, result, error) in completion order; error is None on success
+    """
+    in_flight = {}
+
+    def drain(return_when):
+        done, _ = wait(in_flight, return_when=return_when)
+        for future in done:
+            item = in_flight.pop(future)
+            error = future.exception()
+            yield item, (None if error else future.result()), error
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for item in items:
+            if len(in_flight) >= max_workers * 2:
+                yield from drain(FIRST_COMPLETED)
+            in_flight[executor.submit(contextvars.copy_context().run, func, item)] = item
+        while in_flight:
+            yield from drain(FIRST_COMPLETED)
+
+
+def commit_in_parallel(db, operations, batch_size=MAX_BATCH_SIZE, max_workers=8, on_commit=None):
+    """
+    Commit write operations as batches on a thread pool.
+
+    Operations are consumed lazily and at most `max_workers * 2` batches are in
+    flight, so memory stays bounded however many operations are passed.
+
+    Args:
+        db: Firestore database client
+        operations: Iterable of tuples: ('set', ref, data[, merge]), ('update', ref, data),
+            ('create', ref, data) or ('delete', ref)
+        batch_size (int): Writes per batch, capped at Firestore's limit of 500
+        max_workers (int): Number of batches committed concurrently
+        on_commit: Optional callback(chunk_index, operations, error) run after each batch
+
+    Returns:
+        dict: committed/failed write counts, batch count, errors and elapsed seconds
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    stats = {'committed': 0, 'failed': 0, 'batches': 0, 'errors': [], 'elapsed_seconds': 0.0}
+    started = time.perf_counter()
+
+    chunks = enumerate(chunked(operations, batch_size))
+    for (chunk_index, chunk), _, error in run_in_parallel(lambda item: _commit_chunk(db, item[1]), chunks, max_workers):
+        stats['batches'] += 1
+        if error is None:
+            stats['committed'] += len(chunk)
+        else:
+            stats['failed'] += len(chunk)
+            stats['errors'].append(f'Batch {chunk_index}: {error}')
+            logger.error("Batch %s of %s writes failed: %s", chunk_index, len(chunk), error)
+        if on_commit:
+            on_commit(chunk_index, chunk, error)
+
+    stats['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def stream_query_pages(query, page_size=500, order_field=None):
+    """
+    Stream a query page by page using start_after cursors.
+
+    Long single streams can time out on large collections; paging keeps each
+    request short while still yielding documents one at a time.
+
+    Args:
+        query: Firestore query (already filtered)
+        page_size (int): Documents fetched per request
+        order_field (str): Field to order by; the query must not already be ordered
+            when this is given
+
+    Yields:
+        DocumentSnapshot objects
+    """
+    if order_field:
+        query = query.order_by(order_field)
+    last_doc = None
+    while True:
+        page_query = query.limit(page_size)
+        if last_doc is not None:
+            page_query = page_query.start_after(last_doc)
+        count = 0
+        for doc in page_query.stream():
+            count += 1
+            last_doc = doc
+            yield doc
+        if count < page_size:
+            break
+
+
+def firestore_json_default(value):
+    """json.dumps default for values found in Firestore documents"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'path'):  # DocumentReference
+        return value.path
+    if hasattr(value, 'latitude') and hasattr(value, 'longitude'):  # GeoPoint
+        return {'latitude': value.latitude, 'longitude': value.longitude}
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def to_ndjson_line(record):
+    """Serialize one record as a newline-terminated JSON line"""
+    return json.dumps(record, default=firestore_json_default, ensure_ascii=False) + '\n'
@@ -0,0 +1,233 @@
+"""
+Opt-in sampling profiler for live traffic.
+
+ProfilingMiddleware profiles a random PROFILER_SAMPLE_RATE fraction of requests, plus
+any request whose X-Profile-Token header carries a valid admin JWT. While a profiled
+request runs, its thread is registered with a background sampler that reads every
+registered thread's Python stack with sys._current_frames() each
+PROFILER_INTERVAL_MS. Nothing is hooked into the request threads themselves, so
+the cost is the sampler briefly holding the GIL to walk a few stacks, and
+unprofiled requests pay only the sampling decision.
+
+Samples are wall-clock: a thread blocked on Firestore or Razorpay shows up in that
+call. Stacks are aggregated per view and exported as collapsed stacks (flamegraph.pl,
+speedscope, inferno) or a speedscope JSON document. Under ASGI the event loop thread
+is sampled: async views share it with other requests, so their samples are
+approximate, and sync views running in the executor thread are not seen.
+"""
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import jwt
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from anand_mobiles.firestore_metrics import view_name
+
+PROFILE_HEADER = 'X-Profile-Token'
+DEFAULT_INTERVAL_MS = 5
+# Frames deeper than this are cut off (keeps the walk bounded on deep recursion)
+MAX_STACK_DEPTH = 128
+
+
+class _ProfiledRequest:
+    __slots__ = ('samples',)
+
+    def __init__(self):
+        self.samples = Counter()  # tuple of code objects, root first -> count
+
+
+class Sampler:
+    """Background thread sampling the stacks of registered threads"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}  # thread id -> _ProfiledRequest
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._profiles = {}  # view -> Counter of stacks
+        self._requests = Counter()  # view -> profiled request count
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+            self._thread.start()
+
+    def start(self, thread_id):
+        profiled = _ProfiledRequest()
+        with self._lock:
+            self._active[thread_id] = profiled
+            self._ensure_running()
+        self._wake.set()
+        return profiled
+
+    def stop(self, thread_id, profiled, view):
+        with self._lock:
+            if self._active.get(thread_id) is profiled:
+                del self._active[thread_id]
+            profile = self._profiles.setdefault(view, Counter())
+            profile.update(profiled.samples)
+            self._requests[view] += 1
+
+    def _run(self):
+        while True:
+            if not self._active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, profiled in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        profiled.samples[_stack(frame)] += 1
+            del frames
+
+    def snapshot(self, view=None):
+        """({view: Counter(stack -> samples)}, {view: profiled requests})"""
+        with self._lock:
+            views = [view] if view else list(self._profiles)
+            return ({name: Counter(self._profiles[name]) for name in views if name in self._profiles},
+                    {name: self._requests[name] for name in views if name in self._requests})
+
+    def reset(self):
+        with self._lock:
+            self._profiles.clear()
+            self._requests.clear()
+
+
+def _stack(frame):
+    codes = []
+    while frame is not None and len(codes) < MAX_STACK_DEPTH:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return tuple(codes)
+
+
+def _code_name(code):
+    return getattr(code, 'co_qualname', code.co_name)  # co_qualname is 3.11+
+
+
+def frame_label(code):
+    return f'{_code_name(code)} ({code.co_filename}:{code.co_firstlineno})'
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            interval = getattr(settings, 'PROFILER_INTERVAL_MS', DEFAULT_INTERVAL_MS)
+            _sampler = Sampler(max(interval, 1) / 1000)
+        return _sampler
+
+
+# --- Export ----------------------------------------------------------------------
+
+def collapsed_stacks(profiles):
+    """Brendan Gregg's folded format, one 'view;frame;frame count' line per stack"""
+    lines = []
+    for view in sorted(profiles):
+        for stack, count in profiles[view].most_common():
+            labels = ';'.join(frame_label(code).replace(';', ':') for code in stack)
+            lines.append(f'{view};{labels} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def speedscope_document(profiles, requests, interval_ms):
+    """A speedscope file (https://www.speedscope.app) with one sampled profile per view"""
+    frames, frame_index = [], {}
+
+    def index_of(code):
+        index = frame_index.get(code)
+        if index is None:
+            index = frame_index[code] = len(frames)
+            frames.append({'name': _code_name(code), 'file': code.co_filename, 'line': code.co_firstlineno})
+        return index
+
+    documents = []
+    for view in sorted(profiles):
+        samples, weights = [], []
+        for stack, count in profiles[view].most_common():
+            samples.append([index_of(code) for code in stack])
+            weights.append(count * interval_ms)
+        documents.append({
+            'type': 'sampled',
+            'name': f'{view} ({requests.get(view, 0)} requests)',
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        })
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': 'anand_mobiles request profiles',
+        'exporter': 'anand_mobiles.profiling',
+        'shared': {'frames': frames},
+        'profiles': documents,
+    }
+
+
+# --- Middleware ----------------------------------------------------------------------
+
+def _has_profile_token(request):
+    token = request.headers.get(PROFILE_HEADER)
+    if not token:
+        return False
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        return False
+    # Admin tokens carry a username; user tokens a user_id
+    return bool(payload.get('username'))
+
+
+class ProfilingMiddleware:
+    """Profile a sample of requests; off unless PROFILER_SAMPLE_RATE or the header is used"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILER_SAMPLE_RATE', 0.0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _should_profile(self, request):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        return _has_profile_token(request)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._should_profile(request):
+            return self.get_response(request)
+        sampler = get_sampler()
+        thread_id = threading.get_ident()
+        profiled = sampler.start(thread_id)
+        try:
+            return self.get_response(request)
+        finally:
+            sampler.stop(thread_id, profiled, view_name(request))
+
+    async def __acall__(self, request):
+        if not self._should_profile(request):
+            return await self.get_response(request)
+        sampler = get_sampler()
+        thread_id = threading.get_ident()
+        profiled = sampler.start(thread_id)
+        try:
+            return await self.get_response(request)
+        finally:
+            sampler.stop(thread_id, profiled, view_name(request))
@@ -0,0 +1,135 @@
+"""
+JSON responses serialized with orjson, with Firestore types handled in one place.
+
+    from anand_mobiles.responses import JsonResponse
+
+is a drop-in replacement for django.http.JsonResponse: same arguments, same
+safe= check, plus pretty=. Values are written as DjangoJSONEncoder writes them:
+datetimes (including Firestore's DatetimeWithNanoseconds) as ECMA-262 strings with
+milliseconds and "Z" for UTC, durations in ISO 8601, Decimals and UUIDs as
+strings. Documents can be returned as they come out of to_dict(): document
+references become their path and GeoPoints {"latitude", "longitude"}.
+
+Other types can be added with register_type(). Passing encoder= or
+json_dumps_params= falls back to the stdlib json module, as does a missing
+orjson or an integer wider than 64 bits; the output is the same JSON either way,
+only the whitespace differs. One difference from Django's encoder: NaN and
+Infinity are written as null, as orjson does, where the stdlib writes the
+invalid JSON tokens NaN and Infinity.
+
+Set JSON_RESPONSE_PRETTY=True in the environment to indent every response, or
+pass pretty=True for one.
+"""
+import base64
+import datetime
+import decimal
+import json
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.functional import Promise
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+if ORJSON_AVAILABLE:
+    # Datetimes go through json_default, to be written as DjangoJSONEncoder does
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+    _PRETTY_OPTIONS = _OPTIONS | orjson.OPT_INDENT_2
+
+# type -> function returning a JSON-serializable value; subclasses use the
+# converter of their nearest registered base class
+_converters = {}
+_resolved = {}  # concrete type -> converter or None, filled on first use
+
+
+def register_type(cls, converter):
+    """Serialize instances of `cls` (and its subclasses) as converter(value)"""
+    _converters[cls] = converter
+    _resolved.clear()
+
+
+def _converter_for(value_type):
+    try:
+        return _resolved[value_type]
+    except KeyError:
+        pass
+    converter = next((_converters[cls] for cls in value_type.__mro__ if cls in _converters), None)
+    _resolved[value_type] = converter
+    return converter
+
+
+# Dates, times and durations exactly as django.http.JsonResponse wrote them
+_django_default = DjangoJSONEncoder().default
+
+register_type(datetime.datetime, _django_default)
+register_type(datetime.date, _django_default)
+register_type(datetime.time, _django_default)
+register_type(datetime.timedelta, _django_default)
+register_type(decimal.Decimal, str)
+register_type(uuid.UUID, str)
+register_type(Promise, str)
+register_type(bytes, lambda value: base64.b64encode(value).decode('ascii'))
+register_type(set, list)
+register_type(frozenset, list)
+
+
+def json_default(value):
+    """`default` hook for orjson and json.dumps"""
+    converter = _converter_for(type(value))
+    if converter is not None:
+        return converter(value)
+    # Firestore types, duck-typed so the in-memory backend's classes match too and
+    # the SDK isn't imported here
+    if hasattr(value, 'path') and hasattr(value, 'collection'):  # DocumentReference
+        return value.path
+    if hasattr(value, 'latitude') and hasattr(value, 'longitude'):  # GeoPoint
+        return {'latitude': value.latitude, 'longitude': value.longitude}
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(data, pretty=False):
+    """Serialize `data` to UTF-8 JSON bytes"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(data, default=json_default, option=_PRETTY_OPTIONS if pretty else _OPTIONS)
+        except orjson.JSONEncodeError:
+            # Integers wider than 64 bits; anything else fails the same way below
+            pass
+    return json.dumps(data, default=json_default, ensure_ascii=False, indent=2 if pretty else None).encode('utf-8')
+
+
+class JsonResponse(HttpResponse):
+    """
+    An HttpResponse that serializes `data` to JSON.
+
+    Args:
+        data: Object to serialize; must be a dict unless safe is False
+        encoder: json.JSONEncoder subclass; selects the stdlib serializer
+        safe (bool): Reject non-dict data, as django.http.JsonResponse does
+        json_dumps_params (dict): Keyword arguments for json.dumps(); selects the
+            stdlib serializer
+        pretty (bool): Indent the output; defaults to settings.JSON_RESPONSE_PRETTY
+        **kwargs: Passed to HttpResponse (status, headers, ...)
+    """
+
+    def __init__(self, data, encoder=None, safe=True, json_dumps_params=None, pretty=None, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        if pretty is None:
+            pretty = getattr(settings, 'JSON_RESPONSE_PRETTY', False)
+        kwargs.setdefault('content_type', 'application/json')
+        if encoder is not None or json_dumps_params:
+            params = dict(json_dumps_params or {})
+            if pretty:
+                params.setdefault('indent', 2)
+            content = json.dumps(data, cls=encoder or DjangoJSONEncoder, **params)
+        else:
+            content = dumps(data, pretty=pretty)
+        super().__init__(content=content, **kwargs)
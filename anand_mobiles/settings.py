@@ -12,8 +12,6 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -32,17 +30,51 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'a_default_secret_key_for_development_123!@
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DEBUG', 'True') == 'True'
 
+# Route the hottest read endpoints to their async views (set by asgi.py; under WSGI
+# every async view would run in its own event loop, so the sync views are kept)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+# Bearer token for the /metrics scrape endpoint (without one it is served only in DEBUG)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Request tracing: TRACING_EXPORTER is 'console', 'file' (JSON lines in TRACING_FILE)
+# or empty; requests slower than TRACING_SLOW_REQUEST_MS are logged either way
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', '')
+TRACING_FILE = os.getenv('TRACING_FILE', str(BASE_DIR / 'traces.jsonl'))
+TRACING_SLOW_REQUEST_MS = int(os.getenv('TRACING_SLOW_REQUEST_MS', '2000'))
+
+# Sampling profiler: fraction of requests to profile (admins can force one with an
+# X-Profile-Token header) and the stack sampling interval
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', '0'))
+PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', '5'))
+
+# Indent JSON API responses (anand_mobiles/responses.py); handy when debugging with curl
+JSON_RESPONSE_PRETTY = os.getenv('JSON_RESPONSE_PRETTY', 'False') == 'True'
+
+# Responses smaller than this many bytes are not compressed (anand_mobiles/compression.py)
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+
 # Payment gateway settings
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
 
 ALLOWED_HOSTS = ['10.0.2.2','127.0.0.1','69.62.72.199']
 
-# Initialize Firebase
+# Firebase service account; the app and Firestore client are created on first use
+# (anand_mobiles/firebase.py)
 FIREBASE_CONFIG_PATH = BASE_DIR / os.getenv('FIREBASE_CONFIG_PATH', 'config_anand.json')
-cred = credentials.Certificate(FIREBASE_CONFIG_PATH)
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+
+# 'firestore', or 'memory' for the in-memory fake (anand_mobiles/fake_firestore.py) used
+# by offline benchmarks and tests. The fake is seeded from FIRESTORE_FAKE_FIXTURES
+# (comma-separated JSON files, e.g. phone_data.json,simplified_phone_data.json, or
+# directories written by `manage.py generate_dataset --target ndjson`) and
+# adds FIRESTORE_FAKE_LATENCY_MS per call ('get=5,query=20,commit=15'), varied by up
+# to FIRESTORE_FAKE_LATENCY_JITTER (a fraction)
+FIRESTORE_BACKEND = os.getenv('FIRESTORE_BACKEND', 'firestore')
+FIRESTORE_FAKE_FIXTURES = [BASE_DIR / path.strip() for path in os.getenv('FIRESTORE_FAKE_FIXTURES', '').split(',')
+                           if path.strip()]
+FIRESTORE_FAKE_LATENCY_MS = os.getenv('FIRESTORE_FAKE_LATENCY_MS', '')
+FIRESTORE_FAKE_LATENCY_JITTER = float(os.getenv('FIRESTORE_FAKE_LATENCY_JITTER', '0'))
 
 # Application definition
 
@@ -64,6 +96,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "anand_mobiles.structured_logging.RequestIdMiddleware",  # First, so every log line of a request carries its ID
+    "anand_mobiles.firestore_metrics.FirestoreMetricsMiddleware",  # Early, so it times the whole stack
+    "anand_mobiles.tracing.TracingMiddleware",
+    "anand_mobiles.profiling.ProfilingMiddleware",
+    "anand_mobiles.compression.CompressionMiddleware",  # Above everything that reads or sets the body
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # CORS middleware
@@ -208,8 +245,47 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-request-id',
 ]
 
+# Logging: JSON lines written by a background thread (see anand_mobiles/structured_logging.py)
+# LOG_SAMPLE_RATES keeps a fraction of DEBUG/INFO records per logger, e.g. "shop_admin.utils=0.1"
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'anand_mobiles.structured_logging.JsonFormatter'},
+    },
+    'filters': {
+        'request_id': {'()': 'anand_mobiles.structured_logging.RequestIdFilter'},
+        'sampling': {
+            '()': 'anand_mobiles.structured_logging.SamplingFilter',
+            'rates': os.getenv('LOG_SAMPLE_RATES', ''),
+        },
+        'rate_limit': {
+            '()': 'anand_mobiles.structured_logging.RateLimitFilter',
+            'per_second': float(os.getenv('LOG_RATE_LIMIT_PER_SECOND', '10')),
+            'burst': int(os.getenv('LOG_RATE_LIMIT_BURST', '50')),
+        },
+    },
+    'handlers': {
+        'background': {
+            '()': 'anand_mobiles.structured_logging.BackgroundHandler',
+            'filename': os.getenv('LOG_FILE') or None,
+            'formatter': 'json',
+            'filters': ['sampling', 'rate_limit', 'request_id'],
+        },
+    },
+    'root': {
+        'handlers': ['background'],
+        'level': os.getenv('LOG_LEVEL', 'INFO'),
+    },
+    'loggers': {
+        # Replaces Django's own console handler so its records aren't written twice
+        'django': {'handlers': ['background'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -0,0 +1,255 @@
+"""
+Structured, non-blocking logging.
+
+BackgroundHandler is a QueueHandler: the request thread only runs filters and puts
+the record on a bounded queue, and a QueueListener thread formats it (JsonFormatter,
+one JSON object per line) and writes it. Arguments are kept unformatted when they
+are immutable so %-formatting also happens on the listener thread; a full queue
+drops the record and counts it instead of blocking the request.
+
+Filters, attached to the handler in settings.LOGGING:
+    RequestIdFilter - stamps record.request_id from RequestIdMiddleware
+    SamplingFilter  - keeps a fraction of DEBUG/INFO records per logger prefix
+    RateLimitFilter - token bucket per (logger, message template); the next record
+                      let through reports how many were suppressed
+
+RequestIdMiddleware takes the X-Request-ID header (or generates an ID), makes it
+available to every log record of the request and echoes it on the response.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+_LAZY_ARG_TYPES = (str, int, float, bool, type(None))
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'request_id', 'suppressed'}
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with any extra= fields included"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'module': record.module,
+            'function': record.funcName,
+            'line': record.lineno,
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        request_id = _request_id.get()
+        if request_id is None:
+            # django.request logs after the middleware has reset the contextvar,
+            # but passes the request along on the record
+            request_id = getattr(getattr(record, 'request', None), 'request_id', None)
+        record.request_id = request_id
+        return True
+
+
+def _parse_rates(value):
+    rates = {}
+    for item in value.split(','):
+        name, _, rate = item.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of DEBUG/INFO records from chatty loggers.
+
+    Args:
+        rates (dict or str): Logger name prefix -> fraction kept (0.0-1.0), or the same
+            as 'shop_admin.utils=0.1,products=0.5'; the longest matching prefix wins.
+            WARNING and above are never sampled.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = _parse_rates(rates) if isinstance(rates, str) else dict(rates or {})
+        self._resolved = {}  # logger name -> rate or None
+
+    def _rate(self, name):
+        try:
+            return self._resolved[name]
+        except KeyError:
+            pass
+        rate = None
+        for prefix in sorted(self.rates, key=len, reverse=True):
+            if name == prefix or name.startswith(prefix + '.'):
+                rate = self.rates[prefix]
+                break
+        self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate is None or random.random() < rate
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per (logger, message template), so one failing call in a loop can't
+    flood the log. Templates are the unformatted msg, so each %s call site is one key.
+
+    Args:
+        per_second (float): Sustained records per second per key
+        burst (int): Records allowed at once before limiting starts
+    """
+
+    def __init__(self, per_second=10, burst=50):
+        super().__init__()
+        self.per_second = per_second
+        self.burst = burst
+        self._buckets = {}  # key -> [tokens, last refill, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.per_second)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    Queue records for a listener thread that formats and writes them.
+
+    Args:
+        filename (str): Append to this file instead of writing to stderr
+        queue_size (int): Records buffered before new ones are dropped
+    """
+
+    def __init__(self, filename=None, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        if filename:
+            self.target = logging.FileHandler(filename, encoding='utf-8', delay=True)
+        else:
+            self.target = logging.StreamHandler(sys.stderr)
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self._stop_listener)
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """Snapshot the record without formatting it (QueueHandler's default formats here)"""
+        if record.args and not all(isinstance(arg, _LAZY_ARG_TYPES) for arg in
+                                   (record.args.values() if isinstance(record.args, dict) else record.args)):
+            # Mutable arguments could change before the listener formats them
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _stop_listener(self):
+        # Flushes the queue; safe to call more than once
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self._stop_listener()
+        self.target.close()
+        super().close()
+
+
+class RequestIdMiddleware:
+    """Correlate every log record of a request; place it first in MIDDLEWARE"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _request_id(request):
+        supplied = request.headers.get(REQUEST_ID_HEADER, '')
+        return supplied if _VALID_REQUEST_ID.match(supplied) else uuid.uuid4().hex
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.request_id = self._request_id(request)
+        token = _request_id.set(request.request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_id.reset(token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+    async def __acall__(self, request):
+        request.request_id = self._request_id(request)
+        token = _request_id.set(request.request_id)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_id.reset(token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
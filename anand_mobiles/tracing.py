@@ -0,0 +1,301 @@
+"""
+Lightweight request tracing with OpenTelemetry-shaped spans.
+
+TracingMiddleware opens a root span per request; span() and @traced open child
+spans under whatever span is current (a context variable, so the tree follows
+asyncio tasks and run_in_parallel threads). Firestore calls become child spans
+automatically through firestore_metrics, which reports every instrumented call
+with its collection and document counts.
+
+Finished traces go to the exporter named by TRACING_EXPORTER:
+    'console' - the span tree on stderr
+    'file'    - one JSON line per span (trace/span/parent IDs, start in unix nanos,
+                duration, attributes) appended to TRACING_FILE
+Independently of the exporter, any request slower than TRACING_SLOW_REQUEST_MS has
+its span tree logged as a warning. An incoming W3C traceparent header sets the
+trace ID and parent so spans line up with the caller's trace.
+"""
+import contextvars
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from anand_mobiles import firestore_metrics
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def _new_id(bits):
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+class Span:
+    """One timed operation; children are spans started while this one was current"""
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'children',
+                 'start_perf', 'start_ns', 'duration', 'error')
+
+    def __init__(self, name, parent=None, attributes=None, trace_id=None, parent_id=None, start_perf=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else (trace_id or _new_id(128))
+        self.span_id = _new_id(64)
+        self.parent_id = parent.span_id if parent is not None else parent_id
+        self.attributes = dict(attributes) if attributes else {}
+        self.children = []
+        self.start_perf = perf_counter() if start_perf is None else start_perf
+        self.start_ns = time.time_ns() - int((perf_counter() - self.start_perf) * 1e9)
+        self.duration = None
+        self.error = None
+        if parent is not None:
+            parent.children.append(self)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, end_perf=None):
+        if self.duration is None:
+            self.duration = (perf_counter() if end_perf is None else end_perf) - self.start_perf
+
+    def walk(self, depth=0):
+        """(depth, span) for this span and its descendants, in start order"""
+        yield depth, self
+        for child in sorted(self.children, key=lambda span: span.start_perf):
+            yield from child.walk(depth + 1)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'name': self.name,
+            'start_time_unix_nano': self.start_ns,
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'attributes': self.attributes,
+            'status': 'ERROR' if self.error else 'OK',
+            'error': self.error,
+        }
+
+
+class _NoopSpan:
+    """Returned outside a trace so call sites never need to check"""
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a block as a child of the current span.
+
+    Outside a traced request this yields a no-op span and costs one context-variable
+    lookup.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = Span(name, parent, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.error = f'{type(exc).__name__}: {exc}'
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def traced(name=None):
+    """Decorator form of span(); the span is named after the function by default"""
+    def decorator(func):
+        span_name = name or f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Firestore calls as child spans ----------------------------------------------
+
+_FIRESTORE_ATTRIBUTES = {
+    firestore_metrics.READS: 'firestore.reads',
+    firestore_metrics.WRITES: 'firestore.writes',
+    firestore_metrics.DELETES: 'firestore.deletes',
+    firestore_metrics.QUERIES: 'firestore.queries',
+    firestore_metrics.STREAMED: 'firestore.documents',
+}
+
+
+def _collection_of(target):
+    path = getattr(target, '_path', None)  # DocumentReference
+    if path and len(path) >= 2:
+        return path[-2]
+    parent = getattr(target, '_parent', None)  # Query
+    if parent is None:
+        parent = getattr(getattr(target, '_nested_query', None), '_parent', None)  # Aggregation
+    return getattr(parent, 'id', None)
+
+
+def _firestore_span(call, seconds, target, operation, count, operation2, count2):
+    parent = _current_span.get()
+    if parent is None:
+        return
+    end_perf = perf_counter()
+    attributes = {'db.system': 'firestore', 'db.operation': call,
+                  _FIRESTORE_ATTRIBUTES[operation]: count}
+    if operation2 is not None:
+        attributes[_FIRESTORE_ATTRIBUTES[operation2]] = count2
+    collection = _collection_of(target)
+    if collection:
+        attributes['db.collection'] = collection
+    # Reported when the call finishes; streams are timed by their time spent waiting
+    child = Span(f'firestore.{call}', parent, attributes, start_perf=end_perf - seconds)
+    child.end(end_perf)
+
+
+# --- Exporters ---------------------------------------------------------------------
+
+def format_span_tree(root):
+    lines = []
+    for depth, node in root.walk():
+        offset = (node.start_perf - root.start_perf) * 1000
+        attributes = ' '.join(f'{key}={value}' for key, value in node.attributes.items())
+        error = f' ERROR {node.error}' if node.error else ''
+        lines.append(f"{'  ' * depth}{node.name} {(node.duration or 0) * 1000:.1f}ms "
+                     f"(+{offset:.1f}ms) {attributes}{error}".rstrip())
+    return '\n'.join(lines)
+
+
+class ConsoleSpanExporter:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self._lock = threading.Lock()
+
+    def export(self, root):
+        with self._lock:
+            self.stream.write(f'trace {root.trace_id}\n{format_span_tree(root)}\n')
+            self.stream.flush()
+
+
+class JsonFileSpanExporter:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, root):
+        lines = ''.join(json.dumps(node.to_dict(), default=str) + '\n' for _, node in root.walk())
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+
+def build_exporter(name):
+    if name == 'console':
+        return ConsoleSpanExporter()
+    if name == 'file':
+        return JsonFileSpanExporter(settings.TRACING_FILE)
+    if name:
+        logger.warning("Unknown TRACING_EXPORTER %r; traces are only logged when slow", name)
+    return None
+
+
+# --- Middleware ----------------------------------------------------------------------
+
+def parse_traceparent(header):
+    """(trace_id, parent_span_id) from a W3C traceparent header, or (None, None)"""
+    parts = (header or '').split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None, None
+    return parts[1], parts[2]
+
+
+class TracingMiddleware:
+    """
+    Root span per request. Place it after FirestoreMetricsMiddleware, which supplies
+    the Firestore child spans.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.exporter = build_exporter(getattr(settings, 'TRACING_EXPORTER', ''))
+        self.slow_seconds = getattr(settings, 'TRACING_SLOW_REQUEST_MS', 2000) / 1000
+        firestore_metrics.set_call_listener(_firestore_span)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        trace_id, parent_id = parse_traceparent(request.headers.get('traceparent'))
+        root = Span(request.method, trace_id=trace_id, parent_id=parent_id,
+                    attributes={'http.method': request.method, 'http.target': request.path})
+        return root, _current_span.set(root)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        root, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_span.reset(token)
+        self._finish(request, response, root)
+        return response
+
+    async def __acall__(self, request):
+        root, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_span.reset(token)
+        self._finish(request, response, root)
+        return response
+
+    def _finish(self, request, response, root):
+        root.end()
+        view = firestore_metrics.view_name(request)
+        root.name = f'{request.method} {view}'
+        root.set_attributes(**{'http.route': view, 'http.status_code': response.status_code})
+        if root.duration >= self.slow_seconds:
+            logger.warning("Slow request %s took %.0fms (trace %s)\n%s",
+                           root.name, root.duration * 1000, root.trace_id, format_span_tree(root))
+        if self.exporter is not None:
+            try:
+                self.exporter.export(root)
+            except Exception:
+                logger.exception("Failed to export trace %s", root.trace_id)
@@ -19,6 +19,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from shop_admin.views import get_home
+from anand_mobiles.firestore_metrics import metrics
 
 
 urlpatterns = [
@@ -28,6 +30,8 @@ urlpatterns = [
     path("api/products/", include("products.urls")),
     path("api/partners/", include("shop_partners.urls")),
     path("api/sell-mobile/", include("sell_mobile.urls")),
+    path("api/home/", get_home, name="get_home"),
+    path("metrics", metrics, name="metrics"),
 ]
 
 if settings.DEBUG:
@@ -1,7 +1,7 @@
 import jwt
 from datetime import datetime, timedelta
 from django.conf import settings
-from django.http import JsonResponse
+from anand_mobiles.responses import JsonResponse
 from django.contrib.auth import get_user_model
 from functools import wraps
 
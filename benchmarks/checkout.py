@@ -0,0 +1,424 @@
+"""
+End-to-end checkout latency, throughput and Firestore cost.
+
+Drives the real views through Django's test client -- add_to_cart for each item,
+create_razorpay_order, then verify_razorpay_payment, which updates stock, clears
+the cart, records the order event and analytics and generates the invoice --
+with --concurrency threads, each checking out as its own user. Nothing leaves
+the process:
+
+    Firestore  - the in-memory backend (FIRESTORE_BACKEND=memory), seeded from
+                 --fixtures, with optional per-call latency (--firestore-latency)
+    Razorpay   - FakeRazorpay: orders and payments are kept in memory and payment
+                 signatures are real HMAC-SHA256 signatures of order_id|payment_id,
+                 checked the way the SDK checks them; --gateway-latency-ms adds an
+                 API round trip to order.create and payment.fetch
+    Cloudinary - invoice uploads return a URL without uploading; the PDF itself is
+                 rendered with wkhtmltopdf when pdfkit and the binary are installed
+
+    python benchmarks/checkout.py --checkouts 500 --concurrency 8 --items 2
+    python benchmarks/checkout.py --firestore-latency get=4,query=8,commit=10 \
+        --compare benchmarks/results/baseline.json
+
+Reports p50/p95/p99 per step (add_to_cart summed over a checkout's items) and per
+checkout, checkouts per second and Firestore operations per checkout (from the
+FirestoreMetricsMiddleware counters), and saves them as JSON (--output). With
+--compare, exits with status 1 when a latency percentile or the throughput is more
+than --threshold percent worse than the saved run; compare runs made with the same
+options on the same machine.
+"""
+import argparse
+import contextlib
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import types
+import uuid
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+STEPS = ['add_to_cart', 'create_razorpay_order', 'verify_razorpay_payment']
+PERCENTILES = (50, 95, 99)
+RAZORPAY_KEY_ID = 'rzp_test_benchmark'
+RAZORPAY_KEY_SECRET = 'benchmark-secret'
+
+
+# --- Fake Razorpay --------------------------------------------------------------------
+
+class SignatureVerificationError(Exception):
+    pass
+
+
+def payment_signature(order_id, payment_id, secret=RAZORPAY_KEY_SECRET):
+    """What Razorpay Checkout hands the browser after a successful payment"""
+    return hmac.new(secret.encode(), f'{order_id}|{payment_id}'.encode(), hashlib.sha256).hexdigest()
+
+
+class FakeRazorpay:
+    """
+    The parts of razorpay.Client the checkout views use, backed by a dict.
+
+    Args:
+        latency (float): Seconds each API call (order.create, payment.fetch) takes
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.orders = {}  # order_id -> order
+        self._lock = threading.Lock()
+        fake = self
+
+        class Client:
+            def __init__(self, auth):
+                self.secret = auth[1]
+                self.order = types.SimpleNamespace(create=fake.create_order)
+                self.payment = types.SimpleNamespace(fetch=fake.fetch_payment)
+                self.utility = types.SimpleNamespace(verify_payment_signature=self.verify_payment_signature)
+
+            def verify_payment_signature(self, params):
+                expected = payment_signature(params['razorpay_order_id'], params['razorpay_payment_id'], self.secret)
+                if not hmac.compare_digest(expected, params['razorpay_signature']):
+                    raise SignatureVerificationError('Razorpay Signature Verification Failed')
+                return True
+
+        self.module = types.ModuleType('razorpay')
+        self.module.Client = Client
+        self.module.errors = types.SimpleNamespace(SignatureVerificationError=SignatureVerificationError)
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create_order(self, data):
+        self._round_trip()
+        order = {'id': f'order_{uuid.uuid4().hex[:14]}', 'entity': 'order', 'amount': data['amount'],
+                 'currency': data.get('currency', 'INR'), 'receipt': data.get('receipt'), 'status': 'created'}
+        with self._lock:
+            self.orders[order['id']] = order
+        return order
+
+    def pay(self, order_id):
+        """Pay an order as the customer would: (payment_id, signature)"""
+        payment_id = f'pay_{uuid.uuid4().hex[:14]}'
+        with self._lock:
+            self.orders[order_id]['payment_id'] = payment_id
+        return payment_id, payment_signature(order_id, payment_id)
+
+    def fetch_payment(self, payment_id):
+        self._round_trip()
+        with self._lock:
+            order = next(order for order in self.orders.values() if order.get('payment_id') == payment_id)
+        return {'id': payment_id, 'entity': 'payment', 'order_id': order['id'], 'amount': order['amount'],
+                'currency': order['currency'], 'status': 'captured', 'method': 'card',
+                'card': {'network': 'Visa', 'last4': '1111'}}
+
+
+def fake_cloudinary_upload(pdf_buffer, filename, folder_name='invoices'):
+    pdf_buffer.seek(0)
+    pdf_buffer.read()
+    return f'https://res.cloudinary.com/benchmark/raw/upload/{folder_name}/{filename}.pdf'
+
+
+# --- Setup ------------------------------------------------------------------------------
+
+def configure_environment(args):
+    """Settings are read from the environment, so this has to run before django.setup()"""
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'anand_mobiles.settings',
+        'FIRESTORE_BACKEND': 'memory',
+        'FIRESTORE_FAKE_FIXTURES': args.fixtures,
+        'FIRESTORE_FAKE_LATENCY_MS': args.firestore_latency,
+        'RAZORPAY_KEY_ID': RAZORPAY_KEY_ID,
+        'RAZORPAY_KEY_SECRET': RAZORPAY_KEY_SECRET,
+        'LOG_LEVEL': args.log_level,
+    })
+    os.environ.setdefault('SECRET_KEY', 'checkout-benchmark-secret-key-for-hs256-tokens')
+
+
+def purchasable_variants(db):
+    """[(product_id, variant)] for every variant that has a price"""
+    variants = []
+    for product_doc in db.collection('products').stream():
+        for option in product_doc.to_dict().get('valid_options') or []:
+            if option.get('id') and (option.get('discounted_price') or option.get('price')):
+                variants.append((product_doc.id, option))
+    if not variants:
+        sys.exit('The fixtures have no products with priced valid_options variants')
+    return variants
+
+
+def create_users(db, count):
+    """[(user_id, email, address_id)] for users with a default address"""
+    users = []
+    for index in range(count):
+        user_id, address_id = f'checkout-bench-{index}', 'home'
+        email = f'{user_id}@example.com'
+        db.collection('users').document(user_id).set({
+            'email': email, 'first_name': 'Bench', 'last_name': str(index), 'phone_number': '+919800000000',
+            'auth_provider': 'email', 'created_at': datetime.now(), 'default_address_id': address_id,
+        })
+        db.collection('users').document(user_id).collection('addresses').document(address_id).set({
+            'type': 'home', 'street_address': '12, MG Road', 'city': 'Pune', 'state': 'Maharashtra',
+            'postal_code': '411001', 'phone_number': '+919800000000', 'is_default': True,
+            'created_at': datetime.now(), 'updated_at': datetime.now(),
+        })
+        users.append((user_id, email, address_id))
+    return users
+
+
+# --- Checkout ---------------------------------------------------------------------------
+
+class Shopper:
+    """One user checking out repeatedly on its own test client"""
+
+    def __init__(self, user, variants, items, gateway, rng):
+        import jwt
+        from django.conf import settings
+        from django.test import Client
+
+        self.user_id, email, self.address_id = user
+        token = jwt.encode({'user_id': self.user_id, 'email': email}, settings.SECRET_KEY, algorithm='HS256')
+        self.client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0], HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.variants = variants
+        self.items = items
+        self.gateway = gateway
+        self.rng = rng
+
+    def _post(self, step, path, body, expected, timings):
+        started = time.perf_counter()
+        response = self.client.post(path, json.dumps(body), content_type='application/json')
+        timings[step] = timings.get(step, 0.0) + time.perf_counter() - started
+        if response.status_code != expected:
+            raise CheckoutError(step, response.status_code, response.content[:200])
+        return response.json()
+
+    def checkout(self):
+        """Seconds spent in each step, raising CheckoutError on an unexpected response"""
+        timings = {}
+        cart_item_ids, amount = [], 0
+        for product_id, variant in self.rng.sample(self.variants, self.items):
+            self._post('add_to_cart', f'/api/users/cart/add/{product_id}/',
+                       {'variant_id': variant['id'], 'quantity': 1}, 200, timings)
+            cart_item_ids.append(f"{product_id}_{variant['id']}")
+            amount += variant.get('discounted_price') or variant['price']
+
+        order = self._post('create_razorpay_order', '/api/users/order/razorpay/create/', {
+            'amount': int(round(amount * 100)), 'currency': 'INR',
+            'product_ids': cart_item_ids, 'address_id': self.address_id,
+        }, 201, timings)
+
+        payment_id, signature = self.gateway.pay(order['razorpay_order_id'])
+        self._post('verify_razorpay_payment', '/api/users/order/razorpay/verify/', {
+            'order_id': order['app_order_id'], 'razorpay_order_id': order['razorpay_order_id'],
+            'razorpay_payment_id': payment_id, 'razorpay_signature': signature,
+        }, 200, timings)
+        return timings
+
+
+class CheckoutError(Exception):
+    def __init__(self, step, status, body):
+        super().__init__(f'{step} returned {status}: {body!r}')
+        self.step = step
+        self.status = status
+
+
+def run_checkouts(shoppers, count):
+    """Run `count` checkouts spread over the shoppers' threads: (timings list, errors, seconds)"""
+    remaining = itertools.count()
+    results, errors = [], {}
+    lock = threading.Lock()
+
+    def work(shopper):
+        while next(remaining) < count:
+            started = time.perf_counter()
+            try:
+                timings = shopper.checkout()
+            except CheckoutError as e:
+                with lock:
+                    key = f'{e.step}:{e.status}'
+                    errors[key] = errors.get(key, 0) + 1
+                continue
+            timings['checkout'] = time.perf_counter() - started
+            with lock:
+                results.append(timings)
+
+    threads = [threading.Thread(target=work, args=(shopper,)) for shopper in shoppers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors, time.perf_counter() - started
+
+
+# --- Results ----------------------------------------------------------------------------
+
+def percentile(samples, p):
+    """Nearest-rank percentile of sorted samples"""
+    return samples[min(len(samples) - 1, max(0, int(round(p / 100 * len(samples) + 0.5)) - 1))]
+
+
+def latency_summary(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    summary = {f'p{p}_ms': round(percentile(samples, p) * 1000, 2) for p in PERCENTILES}
+    summary['mean_ms'] = round(sum(samples) / len(samples) * 1000, 2)
+    summary['max_ms'] = round(samples[-1] * 1000, 2)
+    return summary
+
+
+def firestore_per_checkout(totals, checkouts):
+    per_step = {}
+    for step in STEPS:
+        counts = totals.get(step, {})
+        per_step[step] = {operation: round(count / checkouts, 2) for operation, count in sorted(counts.items())}
+    overall = {}
+    for counts in per_step.values():
+        for operation, count in counts.items():
+            overall[operation] = round(overall.get(operation, 0) + count, 2)
+    return {'total': overall, 'per_step': per_step}
+
+
+def git_revision():
+    with contextlib.suppress(OSError, subprocess.CalledProcessError):
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    return None
+
+
+def print_report(report):
+    print(f"{report['checkouts']} checkouts ({report['failed']} failed) at concurrency "
+          f"{report['config']['concurrency']}: {report['throughput_per_second']} checkouts/s")
+    print(f"{'step':<26}" + ''.join(f'{f"p{p} ms":>10}' for p in PERCENTILES) + f"{'mean ms':>10}")
+    for step, summary in report['latency'].items():
+        if summary:
+            print(f'{step:<26}' + ''.join(f"{summary[f'p{p}_ms']:>10}" for p in PERCENTILES)
+                  + f"{summary['mean_ms']:>10}")
+    print('Firestore ops per checkout: ' + ', '.join(
+        f'{count} {operation}' for operation, count in report['firestore_per_checkout']['total'].items()))
+    hint = ' (is pdfkit with wkhtmltopdf installed?)' if not (report['invoices'] or report['config']['skip_invoice']) else ''
+    print(f"Invoices generated: {report['invoices']} of {report['checkouts']}{hint}")
+    for key, count in report['errors'].items():
+        print(f'  error {key}: {count}')
+
+
+def compare(report, baseline, threshold):
+    """Print the change against a saved run; returns the regressions beyond `threshold` percent"""
+    regressions = []
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'} ({baseline.get('created_at')}):")
+    for step, summary in report['latency'].items():
+        for key, value in summary.items():
+            before = baseline.get('latency', {}).get(step, {}).get(key)
+            if before and key != 'max_ms':
+                change = (value - before) / before * 100
+                print(f'  {step} {key}: {before} -> {value} ({change:+.1f}%)')
+                if change > threshold and key != 'mean_ms':
+                    regressions.append(f'{step} {key} {change:+.1f}%')
+    before = baseline.get('throughput_per_second')
+    if before:
+        change = (report['throughput_per_second'] - before) / before * 100
+        print(f"  throughput: {before} -> {report['throughput_per_second']} ({change:+.1f}%)")
+        if -change > threshold:
+            regressions.append(f'throughput {change:+.1f}%')
+    for operation, count in report['firestore_per_checkout']['total'].items():
+        before = baseline.get('firestore_per_checkout', {}).get('total', {}).get(operation)
+        if before is not None and count != before:
+            print(f'  firestore {operation} per checkout: {before} -> {count}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--checkouts', type=int, default=200, help='Measured checkouts')
+    parser.add_argument('--warmup', type=int, default=10, help='Checkouts run before measuring')
+    parser.add_argument('--concurrency', type=int, default=4, help='Shoppers checking out at once')
+    parser.add_argument('--items', type=int, default=2, help='Cart items per checkout')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the items each shopper picks')
+    parser.add_argument('--fixtures', default='phone_data.json',
+                        help='FIRESTORE_FAKE_FIXTURES: JSON files or generate_dataset snapshot directories')
+    parser.add_argument('--firestore-latency', default='', help="Per-call latency in ms, e.g. 'get=4,commit=10'")
+    parser.add_argument('--gateway-latency-ms', type=float, default=0.0, help='Latency of each Razorpay API call')
+    parser.add_argument('--skip-invoice', action='store_true', help="Don't render invoice PDFs")
+    parser.add_argument('--log-level', default='CRITICAL',
+                        help='LOG_LEVEL for the run; failures are counted from the responses either way')
+    parser.add_argument('--output', default=str(BASE_DIR / 'benchmarks' / 'results' /
+                                                f"checkout-{datetime.now():%Y%m%d-%H%M%S}.json"),
+                        help='Where to save the JSON results')
+    parser.add_argument('--compare', help='Earlier JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percent slowdown in --compare that counts as a regression')
+    args = parser.parse_args()
+
+    configure_environment(args)
+    import django
+    django.setup()
+
+    from anand_mobiles.firebase import get_db
+    from anand_mobiles.firestore_metrics import operation_totals, reset_metrics
+
+    db = get_db()
+    variants = purchasable_variants(db)
+    if args.items > len(variants):
+        sys.exit(f'--items is larger than the {len(variants)} variants in the fixtures')
+    gateway = FakeRazorpay(latency=args.gateway_latency_ms / 1000)
+    rng = random.Random(args.seed)
+    shoppers = [Shopper(user, variants, args.items, gateway, random.Random(rng.random()))
+                for user in create_users(db, args.concurrency)]
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.dict(sys.modules, razorpay=gateway.module))
+        stack.enter_context(mock.patch('shop_users.views.upload_pdf_to_cloudinary_util', fake_cloudinary_upload))
+        if args.skip_invoice:
+            stack.enter_context(mock.patch('shop_users.views.generate_invoice_pdf', lambda invoice_data: None))
+
+        run_checkouts(shoppers, args.warmup)
+        reset_metrics()
+        invoices_before = len(db.collection('invoices').get())
+        results, errors, elapsed = run_checkouts(shoppers, args.checkouts)
+
+    completed = len(results)
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'checkouts': completed,
+        'failed': sum(errors.values()),
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_per_second': round(completed / elapsed, 2) if elapsed else 0.0,
+        'latency': {step: latency_summary([timings[step] for timings in results if step in timings])
+                    for step in STEPS + ['checkout']},
+        'firestore_per_checkout': firestore_per_checkout(operation_totals(), max(completed, 1)),
+        'invoices': len(db.collection('invoices').get()) - invoices_before,
+    }
+    print_report(report)
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + '\n', encoding='utf-8')
+    print(f'Results saved to {output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print('Regressions beyond {:.0f}%: {}'.format(args.threshold, ', '.join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Serialization time and memory of large JSON responses, before and after orjson.
+
+Builds a catalog payload ({"products": [...]}, as fetch_all_products returns it)
+and an order history payload ({"orders": [...]}) from the synthetic dataset
+generator, with timestamps as Firestore returns them (DatetimeWithNanoseconds),
+and renders each with:
+
+    django   - django.http.JsonResponse (json + DjangoJSONEncoder), the old path
+    orjson   - anand_mobiles.responses.JsonResponse
+    pretty   - the same with pretty=True
+
+    python benchmarks/json_serialization.py --products 5000 --orders 20000 --repeats 20
+
+Time is the median over --repeats renders of the whole response; memory is the
+peak traced by tracemalloc during one render (run separately, as tracing slows
+everything down), which is dominated by the response body and the encoder's
+intermediate strings.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+def as_firestore_values(value):
+    """Timestamps as to_dict() returns them: UTC DatetimeWithNanoseconds"""
+    from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+    if isinstance(value, dict):
+        return {key: as_firestore_values(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [as_firestore_values(item) for item in value]
+    if isinstance(value, datetime):
+        value = value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+        return DatetimeWithNanoseconds(value.year, value.month, value.day, value.hour, value.minute,
+                                       value.second, value.microsecond, tzinfo=value.tzinfo)
+    return value
+
+
+def build_payloads(products, orders, seed):
+    from shop_admin.synthetic_data import DatasetGenerator, scaled_counts
+
+    # About two orders per user; the generator stops being consumed once there are enough
+    generator = DatasetGenerator(seed=seed, counts=scaled_counts(products=products, users=orders // 2 + 1))
+    order_list = []
+    for path, data in generator.documents():
+        parts = path.split('/')
+        if len(parts) == 4 and parts[2] == 'orders':
+            order_list.append({**data, 'id': parts[3]})
+            if len(order_list) >= orders:
+                break
+    product_list = [{**product, 'id': product_id} for product_id, product in generator.products.items()]
+    return {
+        'catalog': as_firestore_values({'products': product_list}),
+        'orders': as_firestore_values({'orders': order_list, 'next_cursor': None}),
+    }
+
+
+def renderers():
+    from django.http import JsonResponse as DjangoJsonResponse
+
+    from anand_mobiles.responses import JsonResponse
+
+    return {
+        'django': lambda payload: DjangoJsonResponse(payload).content,
+        'orjson': lambda payload: JsonResponse(payload, pretty=False).content,
+        'pretty': lambda payload: JsonResponse(payload, pretty=True).content,
+    }
+
+
+def time_render(render, payload, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        render(payload)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def peak_memory(render, payload):
+    tracemalloc.start()
+    try:
+        render(payload)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--products', type=int, default=5000, help='Products in the catalog payload')
+    parser.add_argument('--orders', type=int, default=20000, help='Orders in the order history payload')
+    parser.add_argument('--repeats', type=int, default=20, help='Renders timed per payload and serializer')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'anand_mobiles.settings')
+    os.environ.setdefault('SECRET_KEY', 'json-serialization-benchmark')
+    import django
+    django.setup()
+
+    payloads = build_payloads(args.products, args.orders, args.seed)
+    print(f"{'payload':<10}{'serializer':<12}{'median ms':>11}{'peak MiB':>10}{'size MiB':>10}{'speedup':>9}")
+    for name, payload in payloads.items():
+        baseline = None
+        for serializer, render in renderers().items():
+            size = len(render(payload))  # Also warms up
+            seconds = time_render(render, payload, args.repeats)
+            peak = peak_memory(render, payload)
+            baseline = baseline or seconds
+            print(f'{name:<10}{serializer:<12}{seconds * 1000:>11.1f}{peak / 2 ** 20:>10.1f}'
+                  f'{size / 2 ** 20:>10.2f}{baseline / seconds:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Per-request cost of the checkout logging, before and after structured logging.
+
+Replays the log calls create_razorpay_order and an authenticated request make for
+an order of --items products, in two setups:
+
+    print    - the old code: print() for every debug line plus the auth decorator's
+               eagerly formatted INFO line through a plain StreamHandler
+    queued   - the new code: lazy %-style DEBUG calls (dropped at INFO), and the
+               remaining INFO line through BackgroundHandler with JSON formatting
+               on the listener thread
+
+Both write to the same sink, a file by default; pass --sink with a FIFO or a slow
+disk path to see the effect of blocking I/O on the request thread.
+
+    python benchmarks/logging_overhead.py --requests 20000 --items 5
+"""
+import argparse
+import contextlib
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from anand_mobiles.structured_logging import (  # noqa: E402
+    BackgroundHandler, JsonFormatter, RequestIdFilter, RateLimitFilter, SamplingFilter,
+)
+
+ORDER = {
+    'user_id': 'u_8f3a91c2', 'email': 'customer@example.com',
+    'product_ids': ['p_1001_v1', 'p_1002', 'p_1003_v2', 'p_1004', 'p_1005_v1'],
+    'amount': 5498900, 'address_id': 'addr_1',
+}
+
+
+def print_request(logger, items, out):
+    """The old call pattern: prints straight to stdout, eager f-string INFO"""
+    logger.info(f"User '{ORDER['email']}' authenticated successfully for POST /api/users/order/razorpay/create/")
+    print('Request data:', ORDER, file=out)
+    print(f"Processing {items} product IDs for order creation: {ORDER['product_ids']}", file=out)
+    for index in range(items):
+        print(f"Found cart item p_{index}: quantity=1, variant_id=v1", file=out)
+        print(f"Added order item: Phone {index} x 1", file=out)
+    print(f"Created preliminary order with {items} items", file=out)
+
+
+def queued_request(logger, items):
+    """The new call pattern: lazy DEBUG lines, one INFO line"""
+    logger.debug("User '%s' authenticated successfully for %s %s", ORDER['email'], 'POST',
+                 '/api/users/order/razorpay/create/')
+    logger.debug("Razorpay order request from user %s: %s", ORDER['user_id'], ORDER)
+    logger.debug("Processing %s product IDs for order creation: %s", items, ORDER['product_ids'])
+    for index in range(items):
+        logger.debug("Found cart item %s: quantity=%s, variant_id=%s", f'p_{index}', 1, 'v1')
+        logger.debug("Added order item: %s x %s", f'Phone {index}', 1)
+    logger.debug("Created preliminary order with %s items", items)
+    logger.info("Razorpay order %s created for user %s", 'order_Nx81kQ', ORDER['user_id'])
+
+
+def measure(run, requests):
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        'mean_us': round(statistics.fmean(samples) * 1e6, 2),
+        'p50_us': round(samples[len(samples) // 2] * 1e6, 2),
+        'p99_us': round(samples[int(len(samples) * 0.99)] * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--items', type=int, default=5, help='Products in the simulated order')
+    parser.add_argument('--sink', help='File (or FIFO) both setups write to; a temp file by default')
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        sink = args.sink or stack.enter_context(tempfile.TemporaryDirectory()) + '/log'
+
+        out = stack.enter_context(open(sink, 'a', buffering=1, encoding='utf-8'))
+        before = logging.getLogger('bench.print')
+        before.propagate = False
+        before.setLevel(logging.INFO)
+        before.addHandler(logging.StreamHandler(out))
+        print_stats = measure(lambda: print_request(before, args.items, out), args.requests)
+
+        after = logging.getLogger('bench.queued')
+        after.propagate = False
+        after.setLevel(logging.INFO)
+        handler = BackgroundHandler(filename=sink)
+        handler.setFormatter(JsonFormatter())
+        for log_filter in (SamplingFilter(''), RateLimitFilter(per_second=1e9, burst=10 ** 9), RequestIdFilter()):
+            handler.addFilter(log_filter)
+        after.addHandler(handler)
+        queued_stats = measure(lambda: queued_request(after, args.items), args.requests)
+        handler.close()
+
+    print(f"{'setup':<8}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+    for name, stats in (('print', print_stats), ('queued', queued_stats)):
+        print(f"{name:<8}{stats['mean_us']:>10}{stats['p50_us']:>10}{stats['p99_us']:>10}")
+    print(f"per-request logging cost: {print_stats['mean_us'] / queued_stats['mean_us']:.1f}x lower")
+
+
+if __name__ == '__main__':
+    main()
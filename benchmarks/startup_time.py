@@ -0,0 +1,85 @@
+"""
+Worker cold-start time and the imports that dominate it.
+
+Runs a fresh interpreter --runs times doing what a gunicorn worker does before its
+first request -- django.setup(), get_wsgi_application() and loading the URLconf,
+which imports every view module -- and reports the wall time. One more run under
+`python -X importtime` lists the modules with the largest cumulative import time.
+
+    python benchmarks/startup_time.py --runs 10 --top 15
+
+Compare against the previous commit with `git stash` / `git checkout` to see the
+effect of an import change. Set FIREBASE_CONFIG_PATH if settings need it; with
+lazy Firebase initialization the credentials file is not read during startup.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+COLD_START = """
+import time
+started = time.perf_counter()
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - started)
+"""
+
+# import time: self [us] | cumulative | imported package
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def _run(args, extra_env=None):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='anand_mobiles.settings', **(extra_env or {}))
+    return subprocess.run([sys.executable, *args, '-c', COLD_START], cwd=BASE_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def cold_starts(runs):
+    return [float(_run([]).stdout.strip().splitlines()[-1]) for _ in range(runs)]
+
+
+def import_times(top):
+    """(total seconds, [(cumulative us, self us, module)] for the slowest top-level imports)"""
+    result = _run(['-X', 'importtime'])
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((int(cumulative_us), int(self_us), len(indent), module))
+    total = sum(self_us for _, self_us, _, _ in entries) / 1e6
+    # Top-level entries (least indented) don't double count their children
+    top_level = min((depth for _, _, depth, _ in entries), default=0)
+    roots = sorted((e for e in entries if e[2] == top_level), reverse=True)
+    return total, [(cumulative, self_us, module) for cumulative, self_us, _, module in roots[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=10, help='Cold starts to time')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list')
+    args = parser.parse_args()
+
+    samples = cold_starts(args.runs)
+    total, slowest = import_times(args.top)
+
+    print(f"cold start over {args.runs} runs: mean {statistics.fmean(samples) * 1000:.0f} ms, "
+          f"min {min(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms")
+    print(f"total import time: {total * 1000:.0f} ms\n")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative, self_us, module in slowest:
+        print(f"{cumulative / 1000:>14.1f}{self_us / 1000:>10.1f}  {module}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Compare requests/sec of the read-heavy endpoints under WSGI and ASGI.
+
+Starts the project twice with the same number of worker processes -- gunicorn with
+sync workers (WSGI, sync views) and uvicorn (ASGI, async views) -- drives each
+with the same keep-alive load, and prints throughput and latency per endpoint.
+
+    python benchmarks/wsgi_vs_asgi.py --workers 4 --concurrency 64 --duration 20 \
+        --user-id <user_id> --email <email> --product-id <id> --order-id <id>
+
+The token for the user endpoints is signed with SECRET_KEY from the environment
+(.env is not read here), or pass one with --token. Endpoints whose IDs are not
+given are skipped. Point FIREBASE_CONFIG_PATH at a non-production project.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import jwt
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+WSGI_PORT = 8101
+ASGI_PORT = 8102
+
+
+def build_token(args):
+    if args.token:
+        return args.token
+    if not (args.user_id and args.email):
+        return None
+    secret = os.environ.get('SECRET_KEY')
+    if not secret:
+        sys.exit('Set SECRET_KEY (or pass --token) to benchmark the user endpoints')
+    return jwt.encode({'user_id': args.user_id, 'email': args.email}, secret, algorithm='HS256')
+
+
+def build_targets(args, token):
+    """(name, method, path, body, needs_auth) for each endpoint that has its inputs"""
+    targets = []
+    if args.product_id:
+        targets.append(('fetch_product_details', 'GET', f'/api/products/products/{args.product_id}/', None, False))
+    if token:
+        targets += [
+            ('get_cart', 'GET', '/api/users/cart/', None, True),
+            ('get_wishlist', 'GET', '/api/users/wishlist/', None, True),
+            ('get_user_orders', 'GET', '/api/users/orders/', None, True),
+        ]
+        if args.order_id:
+            targets.append(('get_order_details', 'GET', f'/api/users/orders/{args.order_id}/', None, True))
+    if args.quote_body:
+        with open(args.quote_body) as f:
+            targets.append(('get_quote_estimate', 'POST', '/api/sell-mobile/quote-estimate/', f.read().encode(), False))
+    return targets
+
+
+def start_server(kind, workers, threads):
+    env = dict(os.environ)
+    if kind == 'wsgi':
+        env['ASYNC_VIEWS'] = 'False'
+        command = ['gunicorn', 'anand_mobiles.wsgi:application', '--workers', str(workers),
+                   '--threads', str(threads), '--bind', f'127.0.0.1:{WSGI_PORT}', '--log-level', 'warning']
+    else:
+        env['ASYNC_VIEWS'] = 'True'
+        command = ['uvicorn', 'anand_mobiles.asgi:application', '--workers', str(workers),
+                   '--port', str(ASGI_PORT), '--log-level', 'warning', '--no-access-log']
+    return subprocess.Popen(command, cwd=BASE_DIR, env=env)
+
+
+async def wait_until_up(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+def _request_bytes(method, path, body, token):
+    headers = [f'{method} {path} HTTP/1.1', 'Host: 127.0.0.1', 'Connection: keep-alive']
+    if token:
+        headers.append(f'Authorization: Bearer {token}')
+    if body:
+        headers += ['Content-Type: application/json', f'Content-Length: {len(body)}']
+    return ('\r\n'.join(headers) + '\r\n\r\n').encode() + (body or b'')
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    version, status = status_line.split()[:2]
+    status = int(status)
+    length = None
+    # HTTP/1.0 servers close unless they say otherwise
+    keep_alive = version != b'HTTP/1.0'
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value.strip())
+        elif name == 'connection':
+            token = value.strip().lower()
+            keep_alive = token == 'keep-alive' if version == b'HTTP/1.0' else token != 'close'
+    if length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        keep_alive = False
+    return status, keep_alive
+
+
+async def _client(port, request, deadline, latencies, errors):
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors[status] = errors.get(status, 0) + 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors['connection'] = errors.get('connection', 0) + 1
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(port, request, concurrency, duration):
+    latencies, errors = [], {}
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    await asyncio.gather(*(_client(port, request, deadline, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1) if latencies else None
+
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 1) if latencies else None,
+        'errors': errors,
+    }
+
+
+async def benchmark(kind, port, targets, token, args):
+    server = start_server(kind, args.workers, args.threads)
+    try:
+        await wait_until_up(port)
+        results = {}
+        for name, method, path, body, needs_auth in targets:
+            request = _request_bytes(method, path, body, token if needs_auth else None)
+            # Warm connections, caches and the per-loop Firestore clients
+            await run_load(port, request, min(args.concurrency, 8), args.warmup)
+            results[name] = await run_load(port, request, args.concurrency, args.duration)
+            print(f'  {kind} {name}: {results[name]}', flush=True)
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes for both servers')
+    parser.add_argument('--threads', type=int, default=1, help='Threads per gunicorn worker')
+    parser.add_argument('--concurrency', type=int, default=64, help='Concurrent keep-alive connections')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of load per endpoint')
+    parser.add_argument('--warmup', type=float, default=3, help='Seconds of warm-up per endpoint')
+    parser.add_argument('--token', help='User JWT for the authenticated endpoints')
+    parser.add_argument('--user-id', help='Build a token for this user (needs SECRET_KEY)')
+    parser.add_argument('--email', help='Email claim for the built token')
+    parser.add_argument('--product-id', help='Product for fetch_product_details')
+    parser.add_argument('--order-id', help="One of the user's orders for get_order_details")
+    parser.add_argument('--quote-body', help='JSON file with a get_quote_estimate request body')
+    parser.add_argument('--output', help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    token = build_token(args)
+    targets = build_targets(args, token)
+    if not targets:
+        sys.exit('Nothing to benchmark: pass --product-id, a user (--token or --user-id/--email) or --quote-body')
+
+    results = {
+        'config': {key: getattr(args, key) for key in ('workers', 'threads', 'concurrency', 'duration')},
+        'wsgi': asyncio.run(benchmark('wsgi', WSGI_PORT, targets, token, args)),
+        'asgi': asyncio.run(benchmark('asgi', ASGI_PORT, targets, token, args)),
+    }
+
+    print(f"\n{'endpoint':<24}{'wsgi rps':>10}{'asgi rps':>10}{'speedup':>9}{'wsgi p99':>10}{'asgi p99':>10}")
+    for name, *_ in targets:
+        wsgi, asgi = results['wsgi'][name], results['asgi'][name]
+        speedup = f"{asgi['rps'] / wsgi['rps']:.2f}x" if wsgi['rps'] else '-'
+        print(f"{name:<24}{wsgi['rps']:>10}{asgi['rps']:>10}{speedup:>9}{wsgi['p99_ms']:>10}{asgi['p99_ms']:>10}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
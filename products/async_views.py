@@ -0,0 +1,36 @@
+"""
+Async versions of the hottest product endpoints, used when ASYNC_VIEWS is on (ASGI).
+
+They share their response building with the sync views in products.views; only the
+Firestore I/O differs, with independent reads issued concurrently.
+"""
+import asyncio
+
+from anand_mobiles.responses import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from anand_mobiles.async_utils import get_async_db
+from .views import recent_reviews_query, product_details_payload
+
+
+# Fetch product details
+@csrf_exempt
+async def fetch_product_details(request, product_id):
+    try:
+        adb = get_async_db()
+        product_ref = adb.collection('products').document(product_id)
+        # Product, recent reviews and the review count in one round trip
+        product_doc, review_docs, count_result = await asyncio.gather(
+            product_ref.get(),
+            recent_reviews_query(product_ref).get(),
+            product_ref.collection('reviews').count().get(),
+        )
+
+        if not product_doc.exists:
+            return JsonResponse({'error': 'Product not found'}, status=404)
+
+        total_reviews = int(count_result[0][0].value)
+        return JsonResponse({'product': product_details_payload(product_doc, review_docs, total_reviews)})
+
+    except Exception as e:
+        return JsonResponse({'error': f'Error fetching product: {str(e)}'}, status=500)
@@ -0,0 +1,508 @@
+"""
+Bulk product import.
+
+Products are read as a stream from CSV (one row per variant) or JSON (a list of
+product objects, or one object per line) and validated. Each one is then upserted
+into a document keyed by its SKU, so re-running an import updates the catalog
+instead of duplicating it.
+
+Products created before SKU keys have random document IDs. Before the first
+chunk, one projection query over the catalog maps their brand + name SKUs to those
+IDs, and incoming products that match are updated in place instead of being
+created again under the SKU. Several legacy documents with the same brand and
+name can't be told apart; such products are reported as invalid and left alone.
+
+The input is processed in chunks. For each chunk, a worker thread reads the
+existing documents with a single get_all, diffs them against the incoming data and
+commits one batch: creates for new SKUs and field-level updates for changed ones.
+The input records of finished chunks are recorded in a checkpoint file, so a
+failed run can be resumed without redoing them.
+"""
+import bisect
+import csv
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from anand_mobiles.firestore_utils import MAX_BATCH_SIZE, run_in_parallel
+from shop_admin.content_cache import bump_content_version, PRODUCTS
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_COLLECTION = 'products'
+DEFAULT_CHUNK_SIZE = 200
+MAX_REPORTED_ERRORS = 50
+MAX_REPORTED_CHANGES = 20
+
+REQUIRED_FIELDS = ['name', 'brand', 'category']
+# Fields maintained by the store itself (reviews, admin toggles); only set when a product is created
+CREATE_ONLY_FIELDS = {'rating', 'reviews', 'featured'}
+# Variant keys that are values rather than attributes identifying the variant
+VARIANT_VALUE_FIELDS = {'id', 'sku', 'price', 'discounted_price', 'stock'}
+
+# CSV headers (including the ones used by the old temp.py preprocessing) -> product fields
+CSV_COLUMN_ALIASES = {
+    'sku': 'sku',
+    'brand': 'brand',
+    'model name': 'name',
+    'name': 'name',
+    'category': 'category',
+    'description': 'description',
+    'product image url': 'images',
+    'images': 'images',
+    'specs (ram/rom/display/etc)': 'specs',
+    'warranty': 'warranty',
+    'emi options': 'emi_options',
+    'features': 'features',
+    'storage': 'variant.storage',
+    'ram': 'variant.ram',
+    'color': 'variant.colors',
+    'colors': 'variant.colors',
+    'size': 'variant.size',
+    'resolution': 'variant.resolution',
+    'price': 'variant.price',
+    'discounted price': 'variant.discounted_price',
+    'discounted_price': 'variant.discounted_price',
+    'stock': 'variant.stock',
+}
+# Multi-value CSV cells are separated by |
+CSV_LIST_FIELDS = {'images', 'features'}
+
+
+# Value in the legacy index for a SKU shared by several legacy documents
+AMBIGUOUS = object()
+
+
+class ImportErrorReport(Exception):
+    """Raised when an import cannot start (unreadable file, checkpoint mismatch)"""
+    pass
+
+
+def slugify(value):
+    return re.sub(r'[^a-z0-9]+', '-', str(value).lower()).strip('-')
+
+
+def product_sku(product):
+    """The product's SKU: an explicit `sku`, otherwise brand + name"""
+    if product.get('sku'):
+        return slugify(product['sku'])
+    brand = slugify(product.get('brand', ''))
+    name = slugify(product.get('name', ''))
+    # Names usually already start with the brand ("Samsung Galaxy S23")
+    if brand and not name.startswith(brand):
+        return f'{brand}-{name}'
+    return name
+
+
+def _variant_signature(option):
+    return tuple(sorted(
+        (key, str(value).strip().lower()) for key, value in option.items() if key not in VARIANT_VALUE_FIELDS
+    ))
+
+
+def variant_id(option):
+    """Stable variant ID from its identifying attributes, e.g. 128gb-space-black"""
+    if option.get('sku'):
+        return slugify(option['sku'])
+    return slugify('-'.join(value for _, value in _variant_signature(option))) or 'default'
+
+
+# --- Readers ---------------------------------------------------------------
+
+def read_json_products(path, read_size=64 * 1024):
+    """
+    Stream product objects from a JSON array or a JSON-lines file without loading it whole.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        position = 0
+        started = False
+        eof = False
+        while True:
+            # Skip whitespace and array punctuation between objects
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer) and buffer[position] == '[':
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                if position >= len(buffer):
+                    raise ValueError('need more data')
+                obj, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    if buffer[position:].strip():
+                        raise ImportErrorReport(f'Invalid JSON near: {buffer[position:position + 80]!r}')
+                    return
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield obj
+            position = end
+
+
+def _csv_row_to_fields(row):
+    product = {}
+    variant = {}
+    for header, value in row.items():
+        if header is None or value is None:
+            continue
+        value = value.strip()
+        if value == '':
+            continue
+        field = CSV_COLUMN_ALIASES.get(header.strip().lower(), slugify(header).replace('-', '_'))
+        if field.startswith('variant.'):
+            variant[field.split('.', 1)[1]] = value
+        elif field in CSV_LIST_FIELDS:
+            product[field] = [item.strip() for item in value.split('|') if item.strip()]
+        else:
+            product[field] = value
+    return product, variant
+
+
+def read_csv_products(path):
+    """
+    Stream products from a CSV file with one row per variant.
+
+    Rows of the same product (same SKU) must be adjacent; product-level columns
+    are taken from the first row.
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        current = None
+        current_sku = None
+        seen = set()
+        for row in csv.DictReader(f):
+            product, variant = _csv_row_to_fields(row)
+            sku = product_sku(product)
+            if sku != current_sku:
+                if current is not None:
+                    yield current
+                if sku in seen:
+                    # Reported by validation instead of silently merging
+                    product['_errors'] = [f'rows for SKU {sku} are not adjacent in the CSV']
+                seen.add(sku)
+                current, current_sku = product, sku
+                current['valid_options'] = []
+            if variant:
+                current['valid_options'].append(variant)
+        if current is not None:
+            yield current
+
+
+def read_products(path, file_format=None):
+    file_format = file_format or ('csv' if path.lower().endswith('.csv') else 'json')
+    if file_format == 'csv':
+        return read_csv_products(path)
+    if file_format == 'json':
+        return read_json_products(path)
+    raise ImportErrorReport(f'Unsupported format: {file_format}')
+
+
+# --- Validation ------------------------------------------------------------
+
+def _to_number(value, cast, field, errors):
+    if value is None or value == '':
+        return None
+    try:
+        number = cast(float(value)) if cast is int else cast(value)
+    except (TypeError, ValueError):
+        errors.append(f'{field} must be a number')
+        return None
+    if number < 0:
+        errors.append(f'{field} must not be negative')
+    return number
+
+
+def validate_product(product):
+    """
+    Validate and normalise one incoming product.
+
+    Returns:
+        tuple: (normalised product dict with `sku`, list of error strings)
+    """
+    errors = list(product.pop('_errors', []))
+    product = dict(product)
+    for field in REQUIRED_FIELDS:
+        if not product.get(field):
+            errors.append(f'missing required field: {field}')
+
+    for field, cast in (('price', float), ('discount_price', float), ('stock', int)):
+        if field in product:
+            product[field] = _to_number(product[field], cast, field, errors)
+
+    for field in ('images', 'features'):
+        if field in product:
+            value = product[field]
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                errors.append(f'{field} must be a list of strings')
+            product[field] = value
+
+    if 'specifications' in product and not isinstance(product['specifications'], dict):
+        errors.append('specifications must be an object')
+
+    options = product.get('valid_options') or []
+    if not isinstance(options, list):
+        errors.append('valid_options must be a list')
+        options = []
+    seen_variants = set()
+    normalised_options = []
+    for index, option in enumerate(options, start=1):
+        if not isinstance(option, dict):
+            errors.append(f'variant {index} must be an object')
+            continue
+        option = dict(option)
+        for field, cast in (('price', float), ('discounted_price', float), ('stock', int)):
+            if field in option:
+                option[field] = _to_number(option[field], cast, f'variant {index} {field}', errors)
+        signature = _variant_signature(option)
+        if signature in seen_variants:
+            errors.append(f'variant {index} duplicates another variant')
+        seen_variants.add(signature)
+        normalised_options.append(option)
+    if options:
+        product['valid_options'] = normalised_options
+    elif 'valid_options' in product:
+        product.pop('valid_options')
+
+    product['sku'] = product_sku(product)
+    if not product['sku']:
+        errors.append('cannot derive a SKU (needs sku, or brand and name)')
+    return product, errors
+
+
+# --- Diffing ---------------------------------------------------------------
+
+def _assign_variant_ids(product, existing):
+    """Give each variant a stable ID, reusing the ID of the matching existing variant"""
+    existing_ids = {}
+    for option in (existing or {}).get('valid_options') or []:
+        if isinstance(option, dict) and option.get('id'):
+            existing_ids[_variant_signature(option)] = option['id']
+    for option in product.get('valid_options') or []:
+        if not option.get('id'):
+            option['id'] = existing_ids.get(_variant_signature(option)) or variant_id(option)
+
+
+def diff_product(product, existing):
+    """
+    Compare an incoming product with the stored document.
+
+    Returns:
+        tuple: ('create' | 'update' | 'unchanged', payload) where payload is the full
+        document for creates and only the changed top-level fields for updates
+    """
+    _assign_variant_ids(product, existing)
+    if existing is None:
+        return 'create', product
+    changes = {
+        field: value for field, value in product.items()
+        if field not in CREATE_ONLY_FIELDS and existing.get(field) != value
+    }
+    return ('update', changes) if changes else ('unchanged', None)
+
+
+# --- Checkpointing ---------------------------------------------------------
+
+class Checkpoint:
+    """
+    Input records already imported, persisted to a JSON file after every chunk.
+
+    Records are identified by their 1-based position in the input and stored as
+    sorted [first, last] ranges. Positions don't depend on chunk_size or on which
+    records are skipped as invalid or ambiguous, so a resumed run may chunk the
+    rest of the file differently.
+    """
+    VERSION = 2
+
+    def __init__(self, path, source_path):
+        self.path = path
+        stat = os.stat(source_path)
+        self.fingerprint = {'source': os.path.abspath(source_path), 'size': stat.st_size, 'mtime': stat.st_mtime,
+                            'version': self.VERSION}
+        self.ranges = []
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved.get('fingerprint') != self.fingerprint:
+            raise ImportErrorReport(
+                f'Checkpoint {self.path} belongs to a different version of the input file or of the importer; '
+                'delete it or run with restart'
+            )
+        self.ranges = [tuple(item) for item in saved.get('completed_records', [])]
+
+    def is_done(self, position):
+        index = bisect.bisect_right(self.ranges, (position, float('inf'))) - 1
+        return index >= 0 and self.ranges[index][0] <= position <= self.ranges[index][1]
+
+    def mark_done(self, positions):
+        if not self.path:
+            return
+        with self._lock:
+            merged = []
+            for first, last in sorted(self.ranges + [(position, position) for position in positions]):
+                if merged and first <= merged[-1][1] + 1:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+                else:
+                    merged.append((first, last))
+            self.ranges = merged
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'fingerprint': self.fingerprint, 'completed_records': [list(item) for item in merged]}, f)
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# --- Import ----------------------------------------------------------------
+
+def legacy_product_ids(db):
+    """
+    Map the SKUs of products stored under random IDs to their document IDs.
+
+    One projection query over the catalog. SKUs that already have a SKU-keyed
+    document are left out, so that document keeps receiving the updates.
+
+    Returns:
+        dict: sku -> document ID, or AMBIGUOUS when several documents share the SKU
+    """
+    index = {}
+    document_ids = set()
+    query = db.collection(PRODUCTS_COLLECTION).select(['sku', 'brand', 'name'])
+    for doc in query.stream():
+        document_ids.add(doc.id)
+        sku = product_sku(doc.to_dict() or {})
+        if sku and sku != doc.id:
+            index[sku] = AMBIGUOUS if sku in index else doc.id
+    return {sku: doc_id for sku, doc_id in index.items() if sku not in document_ids}
+
+
+def _process_chunk(db, chunk, dry_run, legacy_ids):
+    collection = db.collection(PRODUCTS_COLLECTION)
+    refs = [collection.document(legacy_ids.get(product['sku'], product['sku'])) for product in chunk]
+    existing = {doc.id: doc.to_dict() for doc in db.get_all(refs) if doc.exists}
+
+    result = {'created': 0, 'updated': 0, 'unchanged': 0, 'changes': []}
+    batch = db.batch()
+    for ref, product in zip(refs, chunk):
+        action, payload = diff_product(product, existing.get(ref.id))
+        if action == 'create':
+            batch.set(ref, payload)
+            result['created'] += 1
+        elif action == 'update':
+            batch.update(ref, payload)
+            result['updated'] += 1
+            result['changes'].append({'sku': product['sku'], 'id': ref.id, 'fields': sorted(payload)})
+        else:
+            result['unchanged'] += 1
+    if not dry_run and (result['created'] or result['updated']):
+        batch.commit()
+    return result
+
+
+def import_products(db, path, file_format=None, dry_run=False, checkpoint_path=None, restart=False,
+                    chunk_size=DEFAULT_CHUNK_SIZE, max_workers=8):
+    """
+    Import products from a CSV or JSON file as SKU-keyed upserts.
+
+    Args:
+        db: Firestore database client
+        path (str): CSV or JSON file
+        file_format (str): 'csv' or 'json'; guessed from the extension when omitted
+        dry_run (bool): Validate and diff against Firestore without writing
+        checkpoint_path (str): File recording finished chunks; None disables resuming
+        restart (bool): Ignore and remove an existing checkpoint
+        chunk_size (int): Products per get_all + batch commit (max 500)
+        max_workers (int): Chunks processed concurrently
+
+    Returns:
+        dict: Report with counts, errors, sample changes and throughput
+
+    Raises:
+        ImportErrorReport: If the file or checkpoint cannot be used
+    """
+    if not os.path.exists(path):
+        raise ImportErrorReport(f'File not found: {path}')
+    chunk_size = max(1, min(chunk_size, MAX_BATCH_SIZE))
+
+    checkpoint = Checkpoint(None if dry_run else checkpoint_path, path)
+    if restart:
+        checkpoint.clear()
+    checkpoint.load()
+
+    report = {
+        'dry_run': dry_run, 'total': 0, 'invalid': 0, 'created': 0, 'updated': 0, 'unchanged': 0,
+        'resumed': 0, 'failed': 0, 'errors': [], 'changes': [],
+    }
+    started = time.perf_counter()
+    legacy_ids = legacy_product_ids(db)
+
+    def add_error(message):
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append(message)
+
+    def valid_chunks():
+        chunk, positions = [], []
+        chunk_index = 0
+        seen_skus = set()
+        for position, raw in enumerate(read_products(path, file_format), start=1):
+            report['total'] += 1
+            product, errors = validate_product(raw if isinstance(raw, dict) else {'_errors': ['not an object']})
+            if not errors and product['sku'] in seen_skus:
+                errors = [f"duplicate SKU {product['sku']} in input"]
+            if not errors and legacy_ids.get(product['sku']) is AMBIGUOUS:
+                errors = [f"matches several existing products with the same brand and name (SKU {product['sku']})"]
+            if errors:
+                report['invalid'] += 1
+                add_error(f"Record {position} ({product.get('name', 'Unknown')}): {'; '.join(errors)}")
+                continue
+            seen_skus.add(product['sku'])
+            if checkpoint.is_done(position):
+                report['resumed'] += 1
+                continue
+            chunk.append(product)
+            positions.append(position)
+            if len(chunk) >= chunk_size:
+                yield chunk_index, chunk, positions
+                chunk, positions, chunk_index = [], [], chunk_index + 1
+        if chunk:
+            yield chunk_index, chunk, positions
+
+    work = lambda item: _process_chunk(db, item[1], dry_run, legacy_ids)
+    for (chunk_index, chunk, positions), result, error in run_in_parallel(work, valid_chunks(), max_workers):
+        if error is not None:
+            report['failed'] += len(chunk)
+            add_error(f'Chunk {chunk_index} ({len(chunk)} products) failed: {error}')
+            logger.error("Product import chunk %s failed: %s", chunk_index, error)
+            continue
+        for key in ('created', 'updated', 'unchanged'):
+            report[key] += result[key]
+        report['changes'].extend(result['changes'][:MAX_REPORTED_CHANGES - len(report['changes'])])
+        checkpoint.mark_done(positions)
+
+    # A clean run leaves nothing to resume
+    if not dry_run and report['failed'] == 0:
+        checkpoint.clear()
+    if not dry_run and (report['created'] or report['updated']):
+        bump_content_version(db, PRODUCTS)
+
+    elapsed = time.perf_counter() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['products_per_second'] = round(report['total'] / elapsed, 1) if elapsed else None
+    return report
@@ -0,0 +1,61 @@
+"""
+Bulk import products from a CSV or JSON file.
+
+    python manage.py import_products products/products.json --dry-run
+    python manage.py import_products catalog.csv --workers 8
+
+Re-running after a failure resumes from the checkpoint file next to the input.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from anand_mobiles.firebase import db  # Shared Firestore client, created on first use
+from products.bulk_import import import_products, ImportErrorReport, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Upsert products from a CSV or JSON file, keyed by SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (one row per variant) or JSON/JSON-lines file')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Input format (default: from extension)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and diff without writing')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: <path>.checkpoint.json)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Products per batch')
+        parser.add_argument('--workers', type=int, default=8, help='Batches processed in parallel')
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            report = import_products(
+                db, options['path'],
+                file_format=options['format'],
+                dry_run=options['dry_run'],
+                checkpoint_path=options['checkpoint'] or f"{options['path']}.checkpoint.json",
+                restart=options['restart'],
+                chunk_size=options['chunk_size'],
+                max_workers=options['workers'],
+            )
+        except ImportErrorReport as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        prefix = 'Dry run: ' if report['dry_run'] else ''
+        self.stdout.write(
+            f"{prefix}{report['total']} records: {report['created']} created, {report['updated']} updated, "
+            f"{report['unchanged']} unchanged, {report['invalid']} invalid, {report['failed']} failed"
+        )
+        if report['resumed']:
+            self.stdout.write(f"Skipped {report['resumed']} records imported by a previous run")
+        for change in report['changes']:
+            self.stdout.write(f"  ~ {change['sku']}: {', '.join(change['fields'])}")
+        for error in report['errors']:
+            self.stderr.write(f'  ! {error}')
+        self.stdout.write(f"{report['elapsed_seconds']}s ({report['products_per_second']} products/s)")
+        if report['failed']:
+            raise CommandError('Some chunks failed; re-run the same command to resume')
@@ -0,0 +1,71 @@
+"""
+Move legacy helpful_users arrays on reviews into helpful_votes/{user_id} documents.
+
+    python manage.py migrate_helpful_votes [--dry-run] [--workers 8]
+
+Vote documents are written before the array is removed, so an interrupted run can
+simply be re-run. Reviews without a helpful_count get one, which also makes them
+visible to the helpful sort on review listings.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from firebase_admin import firestore
+
+from anand_mobiles.firebase import get_db
+from anand_mobiles.firestore_utils import MAX_BATCH_SIZE, chunked, run_in_parallel, stream_query_pages
+from products.reviews import REVIEWS_COLLECTION
+from products.review_votes import VOTES_COLLECTION
+
+
+class Command(BaseCommand):
+    help = 'Convert helpful_users arrays on reviews into per-user vote documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Count what would change without writing')
+        parser.add_argument('--workers', type=int, default=8, help='Reviews migrated in parallel')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        dry_run = options['dry_run']
+
+        def migrate(review_doc):
+            review_data = review_doc.to_dict()
+            voters = review_data.get('helpful_users')
+            if voters is None and 'helpful_count' in review_data:
+                return 0, False
+            voters = voters or []
+            if dry_run:
+                return len(voters), True
+
+            votes = review_doc.reference.collection(VOTES_COLLECTION)
+            # Leave room for the review update in the final batch
+            for chunk in chunked(voters, MAX_BATCH_SIZE - 1):
+                batch = db.batch()
+                for user_id in chunk:
+                    batch.set(votes.document(user_id), {'user_id': user_id, 'migrated_at': datetime.now()}, merge=True)
+                batch.commit()
+
+            review_update = {'helpful_users': firestore.DELETE_FIELD}
+            if 'helpful_count' not in review_data:
+                review_update['helpful_count'] = len(voters)
+            review_doc.reference.update(review_update)
+            return len(voters), True
+
+        reviews = stream_query_pages(db.collection_group(REVIEWS_COLLECTION))
+        counts = {'reviews': 0, 'migrated': 0, 'votes': 0, 'failed': 0}
+        for review_doc, result, error in run_in_parallel(migrate, reviews, options['workers']):
+            counts['reviews'] += 1
+            if error is not None:
+                counts['failed'] += 1
+                self.stderr.write(f'{review_doc.reference.path}: {error}')
+                continue
+            votes, migrated = result
+            counts['votes'] += votes
+            counts['migrated'] += 1 if migrated else 0
+
+        prefix = 'Dry run: ' if dry_run else ''
+        self.stdout.write(
+            f"{prefix}scanned {counts['reviews']} reviews, migrated {counts['migrated']} "
+            f"({counts['votes']} votes), {counts['failed']} failed"
+        )
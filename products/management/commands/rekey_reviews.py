@@ -0,0 +1,149 @@
+"""
+Move reviews with random document IDs to products/{product_id}/reviews/{user_id}.
+
+    python manage.py rekey_reviews [--dry-run] [--workers 8]
+
+For each product the command:
+  * copies each legacy review, with its reports, helpful votes and counter shards,
+    to the user-keyed ID; report IDs become {new_review_id}_{reporter};
+  * moves the review's moderation queue entry;
+  * deletes the old documents only after the copies are committed;
+  * recomputes rating_sum / reviews_count / rating exactly and marks the product
+    reviews_keyed_by_user, which turns off the legacy duplicate query in add_review.
+
+Reviews without a user_id, or a second review by the same user, are left in place
+and listed so they can be handled by hand. Re-running is safe.
+"""
+from django.core.management.base import BaseCommand
+
+from anand_mobiles.firebase import get_db
+from anand_mobiles.firestore_utils import MAX_BATCH_SIZE, chunked, run_in_parallel
+from products.reviews import (
+    REVIEWS_COLLECTION,
+    REPORTS_COLLECTION,
+    MODERATION_QUEUE_COLLECTION,
+    moderation_queue_id,
+    report_doc_id,
+    _aggregate_update,
+)
+from products.review_votes import VOTES_COLLECTION, SHARDS_COLLECTION
+
+
+class Command(BaseCommand):
+    help = 'Rekey product reviews by user ID and recompute product rating aggregates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would move without writing')
+        parser.add_argument('--workers', type=int, default=8, help='Products processed in parallel')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        dry_run = options['dry_run']
+        totals = {'products': 0, 'moved': 0, 'skipped': 0, 'failed': 0}
+
+        products = db.collection('products').select(['reviews_keyed_by_user']).stream()
+        work = lambda product_doc: self._rekey_product(db, product_doc.reference, dry_run)
+        for product_doc, result, error in run_in_parallel(work, products, options['workers']):
+            totals['products'] += 1
+            if error is not None:
+                totals['failed'] += 1
+                self.stderr.write(f'{product_doc.id}: {error}')
+                continue
+            moved, skipped = result
+            totals['moved'] += moved
+            totals['skipped'] += len(skipped)
+            for message in skipped:
+                self.stdout.write(self.style.WARNING(f'  {product_doc.id}: {message}'))
+
+        prefix = 'Dry run: ' if dry_run else ''
+        self.stdout.write(
+            f"{prefix}{totals['products']} products, {totals['moved']} reviews rekeyed, "
+            f"{totals['skipped']} skipped, {totals['failed']} products failed"
+        )
+
+    @staticmethod
+    def _commit(db, operations):
+        for chunk in chunked(operations, MAX_BATCH_SIZE):
+            batch = db.batch()
+            for action, ref, *data in chunk:
+                if action == 'set':
+                    batch.set(ref, data[0])
+                else:
+                    batch.delete(ref)
+            batch.commit()
+
+    def _rekey_product(self, db, product_ref, dry_run):
+        reviews = list(product_ref.collection(REVIEWS_COLLECTION).stream())
+        # DocumentSnapshot.get() raises KeyError on a missing field; legacy reviews may lack user_id
+        keyed = {review.id: review.to_dict() for review in reviews
+                 if review.id == (review.to_dict().get('user_id') or None)}
+        keyed_ids = set(keyed)
+        skipped = []
+        moved = 0
+        rating_sum = 0.0
+        kept = 0
+
+        for review in reviews:
+            review_data = review.to_dict()
+            user_id = review_data.get('user_id')
+            if review.id == user_id:
+                rating_sum += review_data.get('rating') or 0
+                kept += 1
+                continue
+            if user_id in keyed and keyed[user_id] == review_data:
+                # Left over from an interrupted run: the copy exists and is already counted
+                moved += 1
+                if not dry_run:
+                    self._move_review(db, product_ref, review, user_id)
+                continue
+            if not user_id:
+                skipped.append(f'review {review.id} has no user_id')
+            elif user_id in keyed_ids:
+                skipped.append(f'review {review.id} is a second review by user {user_id}')
+            else:
+                keyed_ids.add(user_id)
+                moved += 1
+                rating_sum += review_data.get('rating') or 0
+                kept += 1
+                if not dry_run:
+                    self._move_review(db, product_ref, review, user_id)
+                continue
+            # Skipped reviews still count towards the product rating
+            rating_sum += review_data.get('rating') or 0
+            kept += 1
+
+        if not dry_run:
+            # Products without reviews keep their catalog rating
+            update = _aggregate_update(rating_sum, kept) if kept else {}
+            # Duplicates left behind still need the legacy duplicate query in add_review
+            update['reviews_keyed_by_user'] = not skipped
+            product_ref.update(update)
+        return moved, skipped
+
+    def _move_review(self, db, product_ref, review, user_id):
+        old_ref = review.reference
+        new_ref = product_ref.collection(REVIEWS_COLLECTION).document(user_id)
+        copies = [('set', new_ref, review.to_dict())]
+        deletes = []
+
+        for report in old_ref.collection(REPORTS_COLLECTION).stream():
+            reporter = (report.to_dict() or {}).get('user_id') or report.id
+            copies.append(('set', new_ref.collection(REPORTS_COLLECTION).document(report_doc_id(user_id, reporter)), report.to_dict()))
+            deletes.append(('delete', report.reference))
+        for collection_name in (VOTES_COLLECTION, SHARDS_COLLECTION):
+            for doc in old_ref.collection(collection_name).stream():
+                copies.append(('set', new_ref.collection(collection_name).document(doc.id), doc.to_dict()))
+                deletes.append(('delete', doc.reference))
+
+        queue = db.collection(MODERATION_QUEUE_COLLECTION)
+        old_entry = queue.document(moderation_queue_id(product_ref.id, review.id)).get()
+        if old_entry.exists:
+            entry = old_entry.to_dict()
+            entry['review_id'] = user_id
+            copies.append(('set', queue.document(moderation_queue_id(product_ref.id, user_id)), entry))
+            deletes.append(('delete', old_entry.reference))
+
+        deletes.append(('delete', old_ref))
+        # Copies first: an interrupted run leaves duplicates that the next run overwrites
+        self._commit(db, copies)
+        self._commit(db, deletes)
@@ -0,0 +1,165 @@
+"""
+Helpful votes on reviews.
+
+Each vote is a document products/{product_id}/reviews/{review_id}/helpful_votes/{user_id},
+so "has this user voted" is a single document read and a review's size no longer grows
+with its popularity. The review keeps a `helpful_count` counter that list responses use.
+
+Most reviews are updated in a transaction that toggles the vote document and adjusts
+helpful_count together. Once a review passes SHARD_THRESHOLD votes it is switched to a
+sharded counter: votes increment one of HELPFUL_SHARDS shard documents, and the shards
+are folded back into helpful_count at most every FOLD_INTERVAL_SECONDS. This keeps
+writes to the review document itself well under Firestore's sustained per-document rate.
+
+Reviews created before this change may still carry a `helpful_users` array; a vote by a
+user in that array is treated as an existing vote, and migrate_helpful_votes converts the
+arrays into vote documents.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+from google.cloud import firestore
+
+from .reviews import review_ref, ReviewNotFoundError
+
+VOTES_COLLECTION = 'helpful_votes'
+SHARDS_COLLECTION = 'helpful_count_shards'
+HELPFUL_SHARDS = 10
+SHARD_THRESHOLD = 500
+FOLD_INTERVAL_SECONDS = 10
+
+
+def vote_ref(db, product_id, review_id, user_id):
+    return review_ref(db, product_id, review_id).collection(VOTES_COLLECTION).document(user_id)
+
+
+def has_voted(db, product_id, review_id, user_id, review_data=None):
+    """Whether the user marked the review helpful: one document read"""
+    if vote_ref(db, product_id, review_id, user_id).get().exists:
+        return True
+    # Reviews not yet migrated keep their votes in the helpful_users array
+    return user_id in ((review_data or {}).get('helpful_users') or [])
+
+
+@firestore.transactional
+def _toggle_unsharded(transaction, review_doc_ref, vote_doc_ref, user_id):
+    review_doc = review_doc_ref.get(transaction=transaction)
+    if not review_doc.exists:
+        raise ReviewNotFoundError(review_doc_ref.id)
+    review_data = review_doc.to_dict()
+    if review_data.get('helpful_shards'):
+        # Promoted to a sharded counter since the caller looked; let it retry on that path
+        return None
+
+    vote_exists = vote_doc_ref.get(transaction=transaction).exists
+    legacy_vote = user_id in (review_data.get('helpful_users') or [])
+    current = review_data.get('helpful_count')
+    if current is None:
+        current = len(review_data.get('helpful_users') or [])
+
+    update = {}
+    if vote_exists or legacy_vote:
+        if vote_exists:
+            transaction.delete(vote_doc_ref)
+        if legacy_vote:
+            update['helpful_users'] = firestore.ArrayRemove([user_id])
+        new_count = max(current - 1, 0)
+        added = False
+    else:
+        transaction.create(vote_doc_ref, {'user_id': user_id, 'created_at': datetime.now()})
+        new_count = current + 1
+        added = True
+
+    update['helpful_count'] = new_count
+    remaining_legacy = [voter for voter in (review_data.get('helpful_users') or []) if voter != user_id]
+    # Shard only migrated reviews: the sharded path doesn't read the legacy array
+    if new_count >= SHARD_THRESHOLD and not remaining_legacy:
+        # Popular review: later votes go to the shards, on top of this base count
+        update['helpful_shards'] = HELPFUL_SHARDS
+        update['helpful_count_base'] = new_count
+        update['helpful_folded_at'] = datetime.now()
+    transaction.update(review_doc_ref, update)
+    return added, new_count
+
+
+@firestore.transactional
+def _toggle_sharded(transaction, review_doc_ref, vote_doc_ref, user_id, shard_count):
+    # The review document itself is not read, so votes don't contend on it
+    vote_exists = vote_doc_ref.get(transaction=transaction).exists
+    shard_ref = review_doc_ref.collection(SHARDS_COLLECTION).document(str(random.randrange(shard_count)))
+    if vote_exists:
+        transaction.delete(vote_doc_ref)
+    else:
+        transaction.create(vote_doc_ref, {'user_id': user_id, 'created_at': datetime.now()})
+    transaction.set(shard_ref, {'count': firestore.Increment(-1 if vote_exists else 1)}, merge=True)
+    return not vote_exists
+
+
+def fold_helpful_shards(review_doc_ref, review_data):
+    """Write base + sum(shards) to helpful_count and return it"""
+    total = review_data.get('helpful_count_base') or 0
+    for shard in review_doc_ref.collection(SHARDS_COLLECTION).stream():
+        total += shard.get('count') or 0
+    total = max(total, 0)
+    review_doc_ref.update({'helpful_count': total, 'helpful_folded_at': datetime.now()})
+    return total
+
+
+def _fold_due(review_data):
+    folded_at = review_data.get('helpful_folded_at')
+    if not folded_at:
+        return True
+    if folded_at.tzinfo is not None:
+        now = datetime.now(timezone.utc)
+    else:
+        now = datetime.now()
+    return now - folded_at >= timedelta(seconds=FOLD_INTERVAL_SECONDS)
+
+
+def toggle_helpful_vote(db, product_id, review_id, user_id):
+    """
+    Add or remove a user's helpful vote on a review.
+
+    Returns:
+        tuple: (True if the vote was added / False if removed, helpful_count)
+
+    Raises:
+        ReviewNotFoundError: If the review does not exist
+    """
+    review_doc_ref = review_ref(db, product_id, review_id)
+    vote_doc_ref = vote_ref(db, product_id, review_id, user_id)
+
+    review_doc = review_doc_ref.get()
+    if not review_doc.exists:
+        raise ReviewNotFoundError(review_id)
+    review_data = review_doc.to_dict()
+
+    if not review_data.get('helpful_shards'):
+        result = _toggle_unsharded(db.transaction(), review_doc_ref, vote_doc_ref, user_id)
+        if result is not None:
+            return result
+        review_data = review_doc_ref.get().to_dict()
+
+    added = _toggle_sharded(db.transaction(), review_doc_ref, vote_doc_ref, user_id, review_data['helpful_shards'])
+    if _fold_due(review_data):
+        helpful_count = fold_helpful_shards(review_doc_ref, review_data)
+    else:
+        # Approximate until the next fold
+        helpful_count = max((review_data.get('helpful_count') or 0) + (1 if added else -1), 0)
+    return added, helpful_count
+
+
+def delete_review_votes(db, product_id, review_id):
+    """Delete a review's vote and counter shard documents (before deleting the review)"""
+    review_doc_ref = review_ref(db, product_id, review_id)
+    batch = db.batch()
+    pending = 0
+    for collection_name in (VOTES_COLLECTION, SHARDS_COLLECTION):
+        for doc_ref in review_doc_ref.collection(collection_name).list_documents():
+            batch.delete(doc_ref)
+            pending += 1
+            if pending >= 500:
+                batch.commit()
+                batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
@@ -0,0 +1,501 @@
+"""
+Review listing and moderation helpers.
+
+Reviews live in products/{product_id}/reviews. Per-product listings query that
+subcollection; admin listings span the catalog with collection_group('reviews')
+instead of streaming every product. Both are paged with start_after cursors and
+need the composite indexes declared in firestore.indexes.json.
+
+Reports are stored under each review as reports/{review_id}_{user_id}, so checking
+for a duplicate report is a single document read. Each report increments the review's
+reported_count and updates its moderation_queue/{product_id}_{review_id} entry in the
+same transaction, which lets admins page through the queue directly.
+"""
+import base64
+from datetime import datetime, timedelta
+
+from google.cloud import firestore
+
+REVIEWS_COLLECTION = 'reviews'
+REPORTS_COLLECTION = 'reports'
+MODERATION_QUEUE_COLLECTION = 'moderation_queue'
+DEFAULT_REVIEWS_PAGE_SIZE = 10
+MAX_REVIEWS_PAGE_SIZE = 50
+
+# Sort name -> order_by clauses; created_at breaks ties so pages are stable
+REVIEW_SORTS = {
+    'recent': [('created_at', firestore.Query.DESCENDING)],
+    'helpful': [('helpful_count', firestore.Query.DESCENDING), ('created_at', firestore.Query.DESCENDING)],
+    'rating': [('rating', firestore.Query.DESCENDING), ('created_at', firestore.Query.DESCENDING)],
+}
+
+
+class ReviewQueryError(Exception):
+    """Raised for invalid listing parameters (sort, cursor, filters)"""
+    pass
+
+
+class ReviewNotFoundError(Exception):
+    """Raised when acting on a review that does not exist"""
+    pass
+
+
+class AlreadyReportedError(Exception):
+    """Raised when a user reports the same review twice"""
+    pass
+
+
+def page_size(value, default=DEFAULT_REVIEWS_PAGE_SIZE):
+    try:
+        return max(1, min(int(value or default), MAX_REVIEWS_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ReviewQueryError('limit must be an integer')
+
+
+def format_review(review_doc, product_id=None):
+    review_data = review_doc.to_dict()
+    review_data['id'] = review_doc.id
+    if product_id:
+        review_data['product_id'] = product_id
+    # Responses carry only the counter, never the voters
+    helpful_users = review_data.pop('helpful_users', None)
+    if 'helpful_count' not in review_data:
+        review_data['helpful_count'] = len(helpful_users or [])
+    for field in ('helpful_shards', 'helpful_count_base', 'helpful_folded_at'):
+        review_data.pop(field, None)
+    if review_data.get('created_at') and hasattr(review_data['created_at'], 'isoformat'):
+        review_data['created_at'] = review_data['created_at'].isoformat()
+    return review_data
+
+
+def _run_page(query, limit):
+    docs = list(query.limit(limit + 1).stream())
+    has_more = len(docs) > limit
+    return docs[:limit], has_more
+
+
+def list_product_reviews(db, product_id, sort='recent', start_after=None, limit=DEFAULT_REVIEWS_PAGE_SIZE):
+    """
+    One page of a product's reviews.
+
+    Args:
+        db: Firestore database client
+        product_id (str): Product document ID
+        sort (str): One of REVIEW_SORTS
+        start_after (str): Review ID of the last review on the previous page
+        limit (int): Page size
+
+    Returns:
+        tuple: (list of review dicts, cursor for the next page or None)
+    """
+    if sort not in REVIEW_SORTS:
+        raise ReviewQueryError(f'Invalid sort. Must be one of {list(REVIEW_SORTS)}')
+    reviews_ref = db.collection('products').document(product_id).collection(REVIEWS_COLLECTION)
+    query = reviews_ref
+    for field, direction in REVIEW_SORTS[sort]:
+        query = query.order_by(field, direction=direction)
+    if start_after:
+        cursor_doc = reviews_ref.document(start_after).get()
+        if not cursor_doc.exists:
+            raise ReviewQueryError('Invalid cursor')
+        query = query.start_after(cursor_doc)
+
+    docs, has_more = _run_page(query, limit)
+    reviews = [format_review(doc) for doc in docs]
+    return reviews, (docs[-1].id if has_more and docs else None)
+
+
+def encode_review_cursor(review_doc):
+    return base64.urlsafe_b64encode(review_doc.reference.path.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_review_cursor(db, cursor):
+    try:
+        path = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+    except (ValueError, UnicodeDecodeError):
+        raise ReviewQueryError('Invalid cursor')
+    parts = path.split('/')
+    # Only ever resolve products/{product_id}/reviews/{review_id}
+    if len(parts) != 4 or parts[0] != 'products' or parts[2] != REVIEWS_COLLECTION:
+        raise ReviewQueryError('Invalid cursor')
+    cursor_doc = db.document(path).get()
+    if not cursor_doc.exists:
+        raise ReviewQueryError('Invalid cursor')
+    return cursor_doc
+
+
+def build_admin_reviews_query(db, min_reported=None, verified=None, date_from=None, date_to=None):
+    """
+    Collection-group query over all reviews with the admin filters applied.
+
+    Args:
+        min_reported (int): Only reviews reported at least this many times
+        verified (bool): Filter on is_verified
+        date_from, date_to (str): YYYY-MM-DD bounds on created_at (inclusive)
+    """
+    query = db.collection_group(REVIEWS_COLLECTION)
+    if verified is not None:
+        query = query.where(filter=firestore.FieldFilter('is_verified', '==', verified))
+    if min_reported:
+        query = query.where(filter=firestore.FieldFilter('reported_count', '>=', min_reported))
+    try:
+        if date_from:
+            query = query.where(filter=firestore.FieldFilter('created_at', '>=', datetime.strptime(date_from, '%Y-%m-%d')))
+        if date_to:
+            end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+            query = query.where(filter=firestore.FieldFilter('created_at', '<', end))
+    except ValueError:
+        raise ReviewQueryError('from and to must be dates in YYYY-MM-DD format')
+    return query
+
+
+def list_all_reviews(db, min_reported=None, verified=None, date_from=None, date_to=None,
+                     start_after=None, limit=DEFAULT_REVIEWS_PAGE_SIZE, with_total=False):
+    """
+    One page of reviews across every product, newest first (most reported first
+    when filtering by min_reported).
+
+    Returns:
+        tuple: (list of review dicts with product_id/product_name, next cursor or None,
+        total matching reviews or None)
+    """
+    query = build_admin_reviews_query(db, min_reported, verified, date_from, date_to)
+    total = None
+    if with_total:
+        # Aggregation query: one read per 1000 index entries instead of reading every review
+        total = int(query.count().get()[0][0].value)
+
+    if min_reported:
+        query = query.order_by('reported_count', direction=firestore.Query.DESCENDING)
+    query = query.order_by('created_at', direction=firestore.Query.DESCENDING)
+    if start_after:
+        query = query.start_after(_decode_review_cursor(db, start_after))
+
+    docs, has_more = _run_page(query, limit)
+
+    # Product names for this page only, in one batched read
+    product_refs = {doc.reference.parent.parent.path: doc.reference.parent.parent for doc in docs}
+    product_names = {
+        product_doc.id: (product_doc.to_dict() or {}).get('name', 'Unknown Product')
+        for product_doc in db.get_all(list(product_refs.values()))
+        if product_doc.exists
+    } if product_refs else {}
+
+    reviews = []
+    for doc in docs:
+        product_id = doc.reference.parent.parent.id
+        review_data = format_review(doc, product_id)
+        review_data['product_name'] = product_names.get(product_id, 'Unknown Product')
+        reviews.append(review_data)
+
+    next_cursor = encode_review_cursor(docs[-1]) if has_more and docs else None
+    return reviews, next_cursor, total
+
+
+def parse_bool(value):
+    if value is None or value == '':
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ReviewQueryError('verified must be true or false')
+
+
+# --- Reporting and moderation ----------------------------------------------
+
+def review_ref(db, product_id, review_id):
+    return db.collection('products').document(product_id).collection(REVIEWS_COLLECTION).document(review_id)
+
+
+def report_doc_id(review_id, user_id):
+    return f'{review_id}_{user_id}'
+
+
+def moderation_queue_id(product_id, review_id):
+    return f'{product_id}_{review_id}'
+
+
+def _queue_entry(product_id, review_id, review_data):
+    """Review fields copied onto its queue entry so the queue can be listed on its own"""
+    return {
+        'product_id': product_id,
+        'review_id': review_id,
+        'review_user_id': review_data.get('user_id'),
+        'review_title': review_data.get('title'),
+        'review_rating': review_data.get('rating'),
+        'review_created_at': review_data.get('created_at'),
+    }
+
+
+@firestore.transactional
+def _report_in_transaction(transaction, db, product_id, review_id, user_id, reason):
+    review_doc_ref = review_ref(db, product_id, review_id)
+    report_ref = review_doc_ref.collection(REPORTS_COLLECTION).document(report_doc_id(review_id, user_id))
+    queue_ref = db.collection(MODERATION_QUEUE_COLLECTION).document(moderation_queue_id(product_id, review_id))
+
+    # All reads happen before any write in a transaction
+    review_doc = review_doc_ref.get(transaction=transaction)
+    if not review_doc.exists:
+        raise ReviewNotFoundError(review_id)
+    review_data = review_doc.to_dict()
+    if report_ref.get(transaction=transaction).exists:
+        raise AlreadyReportedError(review_id)
+    if review_data.get('reported_count'):
+        # Reports made before deterministic IDs have random IDs; only those reviews need the query
+        legacy_query = review_doc_ref.collection(REPORTS_COLLECTION).where(
+            filter=firestore.FieldFilter('user_id', '==', user_id)
+        ).limit(1)
+        if list(transaction.get(legacy_query)):
+            raise AlreadyReportedError(review_id)
+    queue_doc = queue_ref.get(transaction=transaction)
+
+    now = datetime.now()
+    reported_count = (review_data.get('reported_count') or 0) + 1
+    report_data = {'user_id': user_id, 'created_at': now}
+    if reason:
+        report_data['reason'] = reason
+    transaction.create(report_ref, report_data)
+    transaction.update(review_doc_ref, {'reported_count': firestore.Increment(1)})
+
+    queue_update = _queue_entry(product_id, review_id, review_data)
+    queue_update.update({
+        'reported_count': reported_count,
+        'last_reported_at': now,
+        # A new report puts a dismissed review back in front of the moderators
+        'status': 'pending',
+    })
+    if not queue_doc.exists:
+        queue_update['first_reported_at'] = now
+    transaction.set(queue_ref, queue_update, merge=True)
+    return report_ref.id, reported_count
+
+
+def report_review(db, product_id, review_id, user_id, reason=None):
+    """
+    Record a user's report on a review and update the moderation queue atomically.
+
+    Returns:
+        tuple: (report document ID, new reported_count)
+
+    Raises:
+        ReviewNotFoundError: If the review does not exist
+        AlreadyReportedError: If this user already reported the review
+    """
+    return _report_in_transaction(db.transaction(), db, product_id, review_id, user_id, reason)
+
+
+def delete_review_reports(db, product_id, review_id):
+    """Delete a review's reports and its moderation queue entry (before deleting the review)"""
+    review_doc_ref = review_ref(db, product_id, review_id)
+    batch = db.batch()
+    pending = 0
+    for report in review_doc_ref.collection(REPORTS_COLLECTION).list_documents():
+        batch.delete(report)
+        pending += 1
+        if pending >= 500:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    batch.delete(db.collection(MODERATION_QUEUE_COLLECTION).document(moderation_queue_id(product_id, review_id)))
+    batch.commit()
+
+
+def list_moderation_queue(db, status='pending', start_after=None, limit=DEFAULT_REVIEWS_PAGE_SIZE,
+                          reports_per_review=10, with_total=False):
+    """
+    One page of the moderation queue, most reported first.
+
+    Args:
+        status (str): Queue status to list ('pending', 'dismissed') or None for all
+        start_after (str): Queue entry ID of the last entry on the previous page
+        reports_per_review (int): Latest reports included with each entry
+        with_total (bool): Also count the entries with this status
+
+    Returns:
+        tuple: (list of queue entries with current review data and reports, next cursor or None,
+        total matching entries or None)
+    """
+    queue_collection = db.collection(MODERATION_QUEUE_COLLECTION)
+    query = queue_collection
+    if status:
+        query = query.where(filter=firestore.FieldFilter('status', '==', status))
+    total = None
+    if with_total:
+        total = int(query.count().get()[0][0].value)
+    query = query.order_by('reported_count', direction=firestore.Query.DESCENDING) \
+                 .order_by('last_reported_at', direction=firestore.Query.DESCENDING)
+    if start_after:
+        cursor_doc = queue_collection.document(start_after).get()
+        if not cursor_doc.exists:
+            raise ReviewQueryError('Invalid cursor')
+        query = query.start_after(cursor_doc)
+
+    docs, has_more = _run_page(query, limit)
+    entries = [dict(doc.to_dict(), id=doc.id) for doc in docs]
+
+    # Current review and product documents for the page in one batched read
+    review_refs = [review_ref(db, entry['product_id'], entry['review_id']) for entry in entries]
+    product_refs = {entry['product_id']: db.collection('products').document(entry['product_id']) for entry in entries}
+    snapshots = {
+        snapshot.reference.path: snapshot
+        for snapshot in (db.get_all(review_refs + list(product_refs.values())) if entries else [])
+    }
+
+    results = []
+    for entry, ref in zip(entries, review_refs):
+        review_doc = snapshots.get(ref.path)
+        if review_doc is not None and review_doc.exists:
+            review_data = format_review(review_doc, entry['product_id'])
+        else:
+            review_data = {'id': entry['review_id'], 'product_id': entry['product_id'], 'deleted': True}
+        product_doc = snapshots.get(product_refs[entry['product_id']].path)
+        review_data['product_name'] = (
+            (product_doc.to_dict() or {}).get('name', 'Unknown Product')
+            if product_doc is not None and product_doc.exists else 'Unknown Product'
+        )
+        review_data['reported_count'] = entry.get('reported_count', review_data.get('reported_count'))
+        review_data['moderation_status'] = entry.get('status')
+        review_data['queue_id'] = entry['id']
+        for field in ('first_reported_at', 'last_reported_at'):
+            if entry.get(field) and hasattr(entry[field], 'isoformat'):
+                review_data[field] = entry[field].isoformat()
+
+        reports = []
+        reports_query = ref.collection(REPORTS_COLLECTION) \
+            .order_by('created_at', direction=firestore.Query.DESCENDING).limit(reports_per_review)
+        for report_doc in reports_query.stream():
+            report_data = report_doc.to_dict()
+            report_data['id'] = report_doc.id
+            if report_data.get('created_at') and hasattr(report_data['created_at'], 'isoformat'):
+                report_data['created_at'] = report_data['created_at'].isoformat()
+            reports.append(report_data)
+        review_data['reports'] = reports
+        results.append(review_data)
+
+    return results, (docs[-1].id if has_more and docs else None), total
+
+
+# --- Writing reviews ---------------------------------------------------------
+
+class ProductNotFoundError(Exception):
+    """Raised when reviewing a product that does not exist"""
+    pass
+
+
+class AlreadyReviewedError(Exception):
+    """Raised when a user reviews the same product twice"""
+    pass
+
+
+def _rating_aggregates(product_data):
+    """(rating_sum, reviews_count) for a product, estimated from the average for legacy products"""
+    count = product_data.get('reviews_count') or 0
+    rating_sum = product_data.get('rating_sum')
+    if rating_sum is None:
+        rating_sum = (product_data.get('rating') or 0) * count
+    return float(rating_sum), int(count)
+
+
+def _aggregate_update(rating_sum, count):
+    return {
+        'rating_sum': rating_sum,
+        'reviews_count': count,
+        'rating': round(rating_sum / count, 2) if count > 0 else 0,
+    }
+
+
+@firestore.transactional
+def _add_review_in_transaction(transaction, db, product_id, user_id, review_data):
+    product_ref = db.collection('products').document(product_id)
+    new_review_ref = product_ref.collection(REVIEWS_COLLECTION).document(user_id)
+
+    product_doc = product_ref.get(transaction=transaction)
+    if not product_doc.exists:
+        raise ProductNotFoundError(product_id)
+    product_data = product_doc.to_dict()
+    if new_review_ref.get(transaction=transaction).exists:
+        raise AlreadyReviewedError(product_id)
+    if not product_data.get('reviews_keyed_by_user') and product_data.get('reviews_count'):
+        # Reviews written before rekey_reviews ran have random IDs
+        legacy_query = product_ref.collection(REVIEWS_COLLECTION).where(
+            filter=firestore.FieldFilter('user_id', '==', user_id)
+        ).limit(1)
+        if list(transaction.get(legacy_query)):
+            raise AlreadyReviewedError(product_id)
+
+    rating_sum, count = _rating_aggregates(product_data)
+    aggregates = _aggregate_update(rating_sum + review_data['rating'], count + 1)
+    transaction.create(new_review_ref, review_data)
+    transaction.update(product_ref, aggregates)
+    return new_review_ref.id, aggregates
+
+
+def add_review(db, product_id, user_id, review_data):
+    """
+    Create the user's review (ID = user_id) and update the product rating in one transaction.
+
+    At most three reads: the product, the review slot and, for products whose reviews
+    were not rekeyed yet, one legacy duplicate query.
+
+    Returns:
+        tuple: (review ID, dict with rating, rating_sum and reviews_count)
+
+    Raises:
+        ProductNotFoundError, AlreadyReviewedError
+    """
+    return _add_review_in_transaction(db.transaction(), db, product_id, user_id, review_data)
+
+
+def has_reviewed(db, product_id, user_id):
+    """
+    Whether the user reviewed the product, by the same rules as add_review.
+
+    One document read once the product's reviews are keyed by user; before that,
+    also the product and one legacy duplicate query.
+    """
+    if review_ref(db, product_id, user_id).get().exists:
+        return True
+    product_ref = db.collection('products').document(product_id)
+    product_doc = product_ref.get()
+    product_data = product_doc.to_dict() if product_doc.exists else {}
+    if product_data.get('reviews_keyed_by_user') or not product_data.get('reviews_count'):
+        return False
+    # Reviews written before rekey_reviews ran have random IDs
+    legacy_query = product_ref.collection(REVIEWS_COLLECTION).where(
+        filter=firestore.FieldFilter('user_id', '==', user_id)
+    ).limit(1)
+    return bool(list(legacy_query.stream()))
+
+
+@firestore.transactional
+def _delete_review_in_transaction(transaction, db, product_id, review_id):
+    product_ref = db.collection('products').document(product_id)
+    review_doc_ref = product_ref.collection(REVIEWS_COLLECTION).document(review_id)
+
+    product_doc = product_ref.get(transaction=transaction)
+    review_doc = review_doc_ref.get(transaction=transaction)
+    if not product_doc.exists:
+        raise ProductNotFoundError(product_id)
+    if not review_doc.exists:
+        raise ReviewNotFoundError(review_id)
+
+    rating_sum, count = _rating_aggregates(product_doc.to_dict())
+    rating = review_doc.to_dict().get('rating') or 0
+    count = max(count - 1, 0)
+    aggregates = _aggregate_update(max(rating_sum - rating, 0) if count else 0, count)
+    transaction.delete(review_doc_ref)
+    transaction.update(product_ref, aggregates)
+    return aggregates
+
+
+def delete_review(db, product_id, review_id):
+    """
+    Delete a review and take its rating out of the product aggregates in one transaction.
+
+    Returns:
+        dict: rating, rating_sum and reviews_count after the deletion
+
+    Raises:
+        ProductNotFoundError, ReviewNotFoundError
+    """
+    return _delete_review_in_transaction(db.transaction(), db, product_id, review_id)
@@ -1,3 +1,147 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from anand_mobiles import fake_firestore
+from products import review_votes
+from products.bulk_import import import_products, ImportErrorReport
+
+
+@override_settings(FIRESTORE_BACKEND='memory')
+class ImportProductsTests(SimpleTestCase):
+    """import_products against the in-memory Firestore backend"""
+
+    def setUp(self):
+        self.db = fake_firestore.FakeClient()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'products.json')
+        self.checkpoint_path = f'{self.path}.checkpoint.json'
+
+    def write_products(self, products):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for product in products:
+                f.write(json.dumps(product) + '\n')
+
+    def run_import(self, **kwargs):
+        kwargs.setdefault('max_workers', 1)
+        return import_products(self.db, self.path, checkpoint_path=self.checkpoint_path, **kwargs)
+
+    def product_ids(self):
+        return sorted(doc.id for doc in self.db.collection('products').stream())
+
+    def test_a_resumed_run_imports_only_the_records_left_over(self):
+        self.write_products([
+            {'name': f'Phone {number}', 'brand': 'Acme', 'category': 'smartphones', 'price': 100 + number}
+            for number in range(1, 6)
+        ])
+        commit = fake_firestore.WriteBatch.commit
+        commits = []
+
+        def second_commit_fails(batch):
+            commits.append(batch)
+            if len(commits) == 2:
+                raise RuntimeError('unavailable')
+            return commit(batch)
+
+        with mock.patch.object(fake_firestore.WriteBatch, 'commit', second_commit_fails):
+            report = self.run_import(chunk_size=2)
+
+        self.assertEqual((report['created'], report['failed']), (3, 2))
+        self.assertEqual(self.product_ids(), ['acme-phone-1', 'acme-phone-2', 'acme-phone-5'])
+        with open(self.checkpoint_path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['completed_records'], [[1, 2], [5, 5]])
+
+        # A different chunk size doesn't change which records are left
+        report = self.run_import(chunk_size=3)
+
+        self.assertEqual((report['resumed'], report['created'], report['failed']), (3, 2, 0))
+        self.assertEqual(self.product_ids(), [f'acme-phone-{number}' for number in range(1, 6)])
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_a_changed_input_file_refuses_the_checkpoint(self):
+        self.write_products([{'name': 'Phone 1', 'brand': 'Acme', 'category': 'smartphones'}])
+        with open(self.checkpoint_path, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': {'source': self.path}, 'completed_records': [[1, 1]]}, f)
+
+        with self.assertRaisesMessage(ImportErrorReport, 'delete it or run with restart'):
+            self.run_import()
+        self.assertEqual(self.run_import(restart=True)['created'], 1)
+
+    def test_legacy_products_are_updated_in_place(self):
+        self.db.seed('products/random-id-1', {'name': 'Galaxy S23', 'brand': 'Samsung', 'category': 'smartphones',
+                                              'price': 700})
+        self.db.seed('products/random-id-2', {'name': 'Pixel 8', 'brand': 'Google', 'category': 'smartphones'})
+        self.db.seed('products/random-id-3', {'name': 'Pixel 8', 'brand': 'Google', 'category': 'smartphones'})
+        self.write_products([
+            {'name': 'Galaxy S23', 'brand': 'Samsung', 'category': 'smartphones', 'price': 650},
+            {'name': 'Pixel 8', 'brand': 'Google', 'category': 'smartphones', 'price': 600},
+            {'name': 'Nord 3', 'brand': 'OnePlus', 'category': 'smartphones', 'price': 400},
+        ])
+
+        report = self.run_import()
+
+        self.assertEqual((report['updated'], report['created'], report['invalid']), (1, 1, 1))
+        self.assertIn('matches several existing products', report['errors'][0])
+        self.assertEqual(self.db.document('products/random-id-1').get().get('price'), 650)
+        self.assertEqual(self.product_ids(), ['oneplus-nord-3', 'random-id-1', 'random-id-2', 'random-id-3'])
+
+
+@override_settings(FIRESTORE_BACKEND='memory')
+@mock.patch('products.review_votes.SHARD_THRESHOLD', 3)
+class HelpfulVoteTests(SimpleTestCase):
+    """toggle_helpful_vote against the in-memory Firestore backend, with a threshold of 3 votes"""
+
+    review_path = 'products/p1/reviews/r1'
+
+    def setUp(self):
+        self.db = fake_firestore.FakeClient()
+        self.db.seed('products/p1', {'name': 'Phone'})
+        self.db.seed(self.review_path, {'user_id': 'author', 'rating': 5, 'helpful_count': 0})
+
+    def review(self):
+        return self.db.document(self.review_path).get().to_dict()
+
+    def shard_total(self):
+        return sum(shard.get('count') for shard in
+                   self.db.collection(f'{self.review_path}/{review_votes.SHARDS_COLLECTION}').stream())
+
+    def vote(self, user_id):
+        return review_votes.toggle_helpful_vote(self.db, 'p1', 'r1', user_id)
+
+    def test_votes_below_the_threshold_update_the_review_directly(self):
+        self.assertEqual(self.vote('u1'), (True, 1))
+        self.assertTrue(review_votes.has_voted(self.db, 'p1', 'r1', 'u1'))
+        self.assertEqual(self.vote('u1'), (False, 0))
+        self.assertFalse(review_votes.has_voted(self.db, 'p1', 'r1', 'u1'))
+        self.assertNotIn('helpful_shards', self.review())
+
+    def test_a_popular_review_switches_to_shards_that_fold_into_helpful_count(self):
+        for user_id in ('u1', 'u2', 'u3'):
+            self.vote(user_id)
+        review = self.review()
+        self.assertEqual((review['helpful_shards'], review['helpful_count_base']), (review_votes.HELPFUL_SHARDS, 3))
+
+        with mock.patch('products.review_votes._fold_due', return_value=False):
+            self.assertEqual(self.vote('u4'), (True, 4))
+            self.assertEqual(self.vote('u5'), (True, 4))
+            self.assertEqual(self.vote('u1'), (False, 2))
+        # Between folds the review document isn't written
+        self.assertEqual(self.review()['helpful_count'], 3)
+        self.assertEqual(self.shard_total(), 1)
+
+        with mock.patch('products.review_votes._fold_due', return_value=True):
+            self.assertEqual(self.vote('u6'), (True, 5))
+        self.assertEqual(self.review()['helpful_count'], 5)
+        self.assertEqual(self.shard_total(), 2)
+
+    def test_reviews_with_legacy_voters_are_not_sharded(self):
+        self.db.seed(self.review_path, {'user_id': 'author', 'helpful_users': ['u1', 'u2', 'u3']})
+
+        self.assertEqual(self.vote('u4'), (True, 4))
+        self.assertNotIn('helpful_shards', self.review())
+        self.assertEqual(self.vote('u1'), (False, 3))
+        self.assertEqual(self.review()['helpful_users'], ['u2', 'u3'])
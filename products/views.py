@@ -1,5 +1,5 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from anand_mobiles.responses import JsonResponse
 # Remove import of Product model as we're using Firestore now
 # from .models import Product
 import csv
@@ -8,71 +8,47 @@ import csv
 from django.core.paginator import Paginator
 from django.views.decorators.csrf import csrf_exempt
 from django.core.serializers import serialize
-from anand_mobiles.settings import db # Import the Firestore client
+from anand_mobiles.firebase import db  # Shared Firestore client, created on first use
 from google.cloud import firestore # Import firestore for Query constants
 import json # Import json for parsing specifications
+import logging
+from .bulk_import import import_products, ImportErrorReport
+from .reviews import list_product_reviews, format_review, page_size, ReviewQueryError
+from shop_admin.content_cache import bump_content_version, PRODUCTS
+from shop_admin.utils import admin_required
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
 
 @csrf_exempt
+@admin_required
 def insert_products_from_csv(request):
-    # Path to the JSON file
+    """Import ./products/products.json as SKU-keyed upserts (POST; ?dry_run=1 to only report the diff)"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Only POST method allowed for importing products.'},
+                            status=405)
     file_path = './products/products.json'
-    
+    dry_run = request.GET.get('dry_run', '').lower() in ('1', 'true', 'yes')
+
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            products_data = json.load(f)
-    except FileNotFoundError:
-        return JsonResponse({'status': 'error', 'message': f"JSON file not found at {file_path}"}, status=404)
-    except json.JSONDecodeError:
-        return JsonResponse({'status': 'error', 'message': 'Error decoding JSON file'}, status=400)
+        report = import_products(db, file_path, dry_run=dry_run, checkpoint_path=f'{file_path}.checkpoint.json')
+    except ImportErrorReport as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': f"An error occurred: {str(e)}"}, status=500)
-    
-    if not isinstance(products_data, list):
-        return JsonResponse({'status': 'error', 'message': 'JSON data should be a list of products'}, status=400)
-    
-    success_count = 0
-    error_count = 0
-    errors = []
-    
-    # Add batch processing for better performance
-    batch = db.batch()
-    batch_size = 0
-    batch_limit = 500  # Firestore batch limit is 500
-    
-    for product in products_data:
-        try:
-            # Create a new document reference
-            doc_ref = db.collection('products').document()
-            
-            # Add the product data to the batch
-            batch.set(doc_ref, product)
-            batch_size += 1
-            
-            # If we've reached the batch limit, commit and start a new batch
-            if batch_size >= batch_limit:
-                batch.commit()
-                batch = db.batch()
-                batch_size = 0
-            
-            success_count += 1
-        except Exception as e:
-            error_count += 1
-            errors.append(f"Error adding product '{product.get('name', 'Unknown')}': {str(e)}")
-    
-    # Commit any remaining products in the batch
-    if batch_size > 0:
-        batch.commit()
-    
-    if error_count > 0:
+
+    summary = (f"{report['created']} created, {report['updated']} updated, "
+               f"{report['unchanged']} unchanged, {report['invalid']} invalid, {report['failed']} failed")
+    if report['invalid'] or report['failed']:
         return JsonResponse({
             'status': 'partial_success',
-            'message': f'Successfully added {success_count} products to Firebase. Failed to add {error_count} products.',
-            'errors': errors
+            'message': f'Imported products with errors: {summary}.',
+            'errors': report['errors'],
+            'report': report
         }, status=207)  # 207 Multi-Status
-    
-    return JsonResponse({'status': 'success', 'message': f'Successfully added all {success_count} products to Firebase Firestore.'})
+
+    return JsonResponse({'status': 'success', 'message': f'Imported {report["total"]} products: {summary}.', 'report': report})
 
 # Fetch products by category
 def fetch_products_by_category(request, category):
@@ -140,7 +116,7 @@ def transform_product_structure(product_data):
 
 # Search and filter products
 def search_and_filter_products(request):
-    print("Called search_and_filter_products")
+    logger.debug("search_and_filter_products %s", request.GET.urlencode())
     try:
         query = request.GET.get('query', '')
         brand = request.GET.get('brand', '')
@@ -192,48 +168,79 @@ def search_and_filter_products(request):
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': f"Error searching products: {str(e)}"}, status=500)
 
+RECENT_REVIEWS_LIMIT = 5
+
+
+def recent_reviews_query(product_ref):
+    """The most recent reviews embedded in product details"""
+    return product_ref.collection('reviews').order_by('created_at', direction=firestore.Query.DESCENDING).limit(RECENT_REVIEWS_LIMIT)
+
+
+def product_details_payload(product_doc, review_docs, total_reviews):
+    """Build the product details response from the product, its recent reviews and the review count"""
+    # Convert the document to a dictionary
+    product_data = product_doc.to_dict()
+    product_data['id'] = product_doc.id  # Add the document ID
+    
+    reviews = [format_review(review_doc) for review_doc in review_docs]
+    
+    # If no reviews found in subcollection, check if they're embedded in the product document (fallback)
+    if not reviews and 'reviews' in product_data and isinstance(product_data['reviews'], list):
+        reviews = product_data['reviews']
+    
+    # Add reviews to product data
+    product_data['reviews'] = reviews
+    product_data['total_reviews'] = total_reviews
+    # Further pages come from /products/<id>/reviews/?start_after=<reviews_next_cursor>
+    product_data['reviews_next_cursor'] = reviews[-1]['id'] if total_reviews > len(reviews) and reviews else None
+    return product_data
+
 # Fetch product details
 @csrf_exempt
 def fetch_product_details(request, product_id):
     try:
         # Get the product document from Firestore
-        product_doc = db.collection('products').document(product_id).get()
+        product_ref = db.collection('products').document(product_id)
+        product_doc = product_ref.get()
         
         if not product_doc.exists:
             return JsonResponse({'error': 'Product not found'}, status=404)
         
-        # Convert the document to a dictionary
-        product_data = product_doc.to_dict()
-        product_data['id'] = product_doc.id  # Add the document ID
-        
         # Get reviews from subcollection (limit to recent 5 for product details)
-        reviews = []
-        reviews_ref = db.collection('products').document(product_id).collection('reviews').order_by('created_at', direction=firestore.Query.DESCENDING).limit(5).stream()
+        review_docs = recent_reviews_query(product_ref).stream()
         
-        for review_doc in reviews_ref:
-            review_data = review_doc.to_dict()
-            review_data['id'] = review_doc.id
-            if 'created_at' in review_data and review_data['created_at']:
-                review_data['created_at'] = review_data['created_at'].isoformat()
-            reviews.append(review_data)
+        # Get total review count with an aggregation query instead of streaming every review
+        count_result = product_ref.collection('reviews').count().get()
+        total_reviews = int(count_result[0][0].value)
         
-        # If no reviews found in subcollection, check if they're embedded in the product document (fallback)
-        if not reviews and 'reviews' in product_data and isinstance(product_data['reviews'], list):
-            reviews = product_data['reviews']
-        
-        # Add reviews to product data
-        product_data['reviews'] = reviews
-        
-        # Get total review count
-        all_reviews = db.collection('products').document(product_id).collection('reviews').stream()
-        total_reviews = len(list(all_reviews))
-        product_data['total_reviews'] = total_reviews
-        
-        return JsonResponse({'product': product_data})
+        return JsonResponse({'product': product_details_payload(product_doc, review_docs, total_reviews)})
     
     except Exception as e:
         return JsonResponse({'error': f'Error fetching product: {str(e)}'}, status=500)
 
+# Fetch a page of reviews for a product
+@csrf_exempt
+def fetch_product_reviews(request, product_id):
+    """Paged reviews for a product (?sort=recent|helpful|rating&start_after=<review_id>&limit=)"""
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    try:
+        sort = request.GET.get('sort', 'recent')
+        limit = page_size(request.GET.get('limit'))
+        reviews, next_cursor = list_product_reviews(
+            db, product_id, sort=sort, start_after=request.GET.get('start_after'), limit=limit
+        )
+        return JsonResponse({
+            'product_id': product_id,
+            'sort': sort,
+            'reviews': reviews,
+            'next_cursor': next_cursor
+        })
+    except ReviewQueryError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': f"Error fetching reviews: {str(e)}"}, status=500)
+
 # Fetch all products
 @csrf_exempt
 def fetch_all_products(request):
@@ -308,6 +315,7 @@ def add_product(request):
                 return JsonResponse({'status': 'error', 'message': f"Missing required fields: {', '.join(missing_fields)}"}, status=400)
 
             doc_ref = db.collection('products').add(product_data)
+            bump_content_version(db, PRODUCTS)
             return JsonResponse({'status': 'success', 'message': 'Product added successfully to Firebase', 'product_id': doc_ref[1].id})
         except ValueError as e:
             return JsonResponse({'status': 'error', 'message': f"Invalid data format: {str(e)}"}, status=400)
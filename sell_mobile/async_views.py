@@ -0,0 +1,40 @@
+"""
+Async version of the quote estimate endpoint, used when ASYNC_VIEWS is on (ASGI).
+"""
+import json
+
+from anand_mobiles.responses import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from anand_mobiles.async_utils import get_async_db
+from .views import quote_request_error, quote_estimate_response
+
+
+@csrf_exempt
+async def get_quote_estimate(request):
+    """Get an estimated price quote without creating an inquiry record."""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            error_response = quote_request_error(data)
+            if error_response is not None:
+                return error_response
+
+            catalog_doc = await get_async_db().collection('phone_catalog').document('catalog_data').get()
+            return quote_estimate_response(data, catalog_doc)
+
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Invalid JSON data'
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'An error occurred: {str(e)}'
+            }, status=500)
+
+    return JsonResponse({
+        'status': 'error',
+        'message': 'Only POST method allowed'
+    }, status=405)
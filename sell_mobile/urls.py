@@ -15,6 +15,10 @@ from .views import (
     manage_faq_detail,         # For GET, PUT, DELETE specific FAQ by ID
     get_quote_estimate         # For quote estimation without creating inquiry
 )
+from django.conf import settings
+
+if settings.ASYNC_VIEWS:
+    from .async_views import get_quote_estimate
 
 urlpatterns = [
     # Sell Mobile Listings & Details
@@ -1,12 +1,13 @@
-from django.http import JsonResponse
+from anand_mobiles.responses import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from anand_mobiles.settings import db  # Import the Firestore client
+from anand_mobiles.firebase import db  # Shared Firestore client, created on first use
 from google.cloud import firestore  # Import firestore for Query constants
 import json
 from datetime import datetime
 from shop_users.utils import user_required
 from pathlib import Path # Ensure Path is imported
 import os # For joining paths
+from shop_admin.content_cache import cached_json_response, bump_content_version, FAQS
 
 # Create your views here.
 
@@ -817,20 +818,23 @@ def manage_faqs(request):
     GET: Fetches all FAQs.
     POST: Adds a new FAQ.
     """
+    def load_faqs():
+        faqs_ref = db.collection('sell_mobile_faqs').order_by('created_at', direction=firestore.Query.ASCENDING)
+        faqs = []
+        for doc in faqs_ref.stream():
+            faq_data = doc.to_dict()
+            faq_data['id'] = doc.id
+            # Ensure timestamps are ISO format strings if they are datetime objects
+            if 'created_at' in faq_data and isinstance(faq_data['created_at'], datetime):
+                faq_data['created_at'] = faq_data['created_at'].isoformat()
+            if 'updated_at' in faq_data and isinstance(faq_data['updated_at'], datetime):
+                faq_data['updated_at'] = faq_data['updated_at'].isoformat()
+            faqs.append(faq_data)
+        return {'status': 'success', 'faqs': faqs}, 200
+
     if request.method == 'GET':
         try:
-            faqs_ref = db.collection('sell_mobile_faqs').order_by('created_at', direction=firestore.Query.ASCENDING)
-            faqs = []
-            for doc in faqs_ref.stream():
-                faq_data = doc.to_dict()
-                faq_data['id'] = doc.id
-                # Ensure timestamps are ISO format strings if they are datetime objects
-                if 'created_at' in faq_data and isinstance(faq_data['created_at'], datetime):
-                    faq_data['created_at'] = faq_data['created_at'].isoformat()
-                if 'updated_at' in faq_data and isinstance(faq_data['updated_at'], datetime):
-                    faq_data['updated_at'] = faq_data['updated_at'].isoformat()
-                faqs.append(faq_data)
-            return JsonResponse({'status': 'success', 'faqs': faqs})
+            return cached_json_response(request, db, FAQS, load_faqs)
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
@@ -851,6 +855,7 @@ def manage_faqs(request):
             }
             doc_ref = db.collection('sell_mobile_faqs').document()
             doc_ref.set(faq_data)
+            bump_content_version(db, FAQS)
             return JsonResponse({'status': 'success', 'message': 'FAQ added successfully.', 'id': doc_ref.id}, status=201)
         except json.JSONDecodeError:
             return JsonResponse({'status': 'error', 'message': 'Invalid JSON data.'}, status=400)
@@ -896,10 +901,12 @@ def manage_faq_detail(request, faq_id):
 
             update_data['updated_at'] = datetime.now().isoformat()
             faq_ref.update(update_data)
+            bump_content_version(db, FAQS)
             return JsonResponse({'status': 'success', 'message': 'FAQ updated successfully.'})
 
         elif request.method == 'DELETE':
             faq_ref.delete()
+            bump_content_version(db, FAQS)
             return JsonResponse({'status': 'success', 'message': 'FAQ deleted successfully.'})
         
         else:
@@ -910,6 +917,174 @@ def manage_faq_detail(request, faq_id):
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
+def quote_request_error(data):
+    """Validate a quote request body; returns an error response or None"""
+    required_fields = ['phone_model_id', 'selected_storage', 'selected_ram', 'questionnaire_answers']
+
+    for field in required_fields:
+        if field not in data:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Missing required field: {field}'
+            }, status=400)
+
+    questionnaire_answers = data['questionnaire_answers']
+
+    # Validate questionnaire answers structure
+    if not isinstance(questionnaire_answers, dict):
+        return JsonResponse({
+            'status': 'error',
+            'message': 'questionnaire_answers must be a dictionary.'
+        }, status=400)
+    return None
+
+def quote_estimate_response(data, catalog_doc):
+    """Price a validated quote request against the phone catalog document"""
+    if not catalog_doc.exists:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Phone catalog not found.'
+        }, status=404)
+
+    phone_model_id = data['phone_model_id']
+    selected_storage = data['selected_storage']
+    selected_ram = data['selected_ram']
+    questionnaire_answers = data['questionnaire_answers']
+
+    catalog_data = catalog_doc.to_dict()
+
+    # Find the phone model in the catalog
+    phone_data = None
+    brand = None
+    phone_series = None
+
+    for brand_key, brand_data in catalog_data.get('brands', {}).items():
+        for series_key, series_data in brand_data.get('phone_series', {}).items():
+            if phone_model_id in series_data.get('phones', {}):
+                phone_data = series_data['phones'][phone_model_id]
+                brand = brand_key
+                phone_series = series_key
+                break
+        if phone_data:
+            break
+
+    if not phone_data:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Phone model "{phone_model_id}" not found in catalog.'
+        }, status=404)
+
+    # Validate storage and RAM options
+    variant_options = phone_data.get('variant_options', {})
+    variant_prices = phone_data.get('variant_prices', {})
+
+    available_storage = variant_options.get('storage', [])
+    if selected_storage not in available_storage:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Invalid storage option: {selected_storage}. Available options: {available_storage}'
+        }, status=400)
+
+    available_ram = variant_options.get('ram', [])
+    if selected_ram not in available_ram:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Invalid RAM option: {selected_ram}. Available options: {available_ram}'
+        }, status=400)
+
+    # Validate variant combination
+    if (selected_storage not in variant_prices or 
+        selected_ram not in variant_prices.get(selected_storage, {})):
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Variant combination {selected_storage}/{selected_ram} is not available for this phone model.'
+        }, status=400)
+
+    # Get base price
+    base_price = variant_prices[selected_storage][selected_ram]
+    estimated_price = base_price
+
+    # Build question validation map
+    question_groups = phone_data.get('question_groups', {})
+    question_id_to_options = {}
+    for group_name, group_data in question_groups.items():
+        for question in group_data.get('questions', []):
+            question_id = question.get('id')
+            if question_id:
+                question_id_to_options[question_id] = {
+                    'options': [opt.get('label') for opt in question.get('options', [])],
+                    'type': question.get('type', 'multi_choice')
+                }
+
+    # Validate and apply questionnaire answers
+    applied_modifiers = []
+    for question_id, user_answers in questionnaire_answers.items():
+        if question_id not in question_id_to_options:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Invalid question ID: {question_id}'
+            }, status=400)
+
+        if not isinstance(user_answers, list):
+            user_answers = [user_answers]
+
+        question_info = question_id_to_options[question_id]
+        valid_options = question_info['options']
+        question_type = question_info['type']
+
+        # Validate answer format
+        if question_type == 'single_choice' and len(user_answers) > 1:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Question "{question_id}" is single choice but multiple answers provided'
+            }, status=400)
+
+        # Validate and apply price modifiers
+        for user_answer in user_answers:
+            if user_answer not in valid_options:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': f'Invalid answer "{user_answer}" for question "{question_id}". Valid options: {valid_options}'
+                }, status=400)
+
+            # Find and apply price modifier
+            for group_name, group_data in question_groups.items():
+                for question in group_data.get('questions', []):
+                    if question.get('id') == question_id:
+                        for option in question.get('options', []):
+                            if option.get('label') == user_answer:
+                                price_modifier = option.get('price_modifier', 0)
+                                estimated_price += price_modifier
+                                applied_modifiers.append({
+                                    'question_id': question_id,
+                                    'answer': user_answer,
+                                    'modifier': price_modifier
+                                })
+                                break
+                        break
+                else:
+                    continue
+                break
+
+    return JsonResponse({
+        'status': 'success',
+        'quote_estimate': {
+            'phone_model_id': phone_model_id,
+            'brand': brand,
+            'phone_series': phone_series,
+            'phone_display_name': phone_data.get('display_name', phone_model_id),
+            'selected_variant': {
+                'storage': selected_storage,
+                'ram': selected_ram
+            },
+            'base_price': base_price,
+            'estimated_price': estimated_price,
+            'price_difference': estimated_price - base_price,
+            'applied_modifiers': applied_modifiers,
+            'timestamp': datetime.now().isoformat()
+        }
+    })
+
 @csrf_exempt
 def get_quote_estimate(request):
     """
@@ -919,171 +1094,13 @@ def get_quote_estimate(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            
-            required_fields = ['phone_model_id', 'selected_storage', 'selected_ram', 'questionnaire_answers']
-            
-            for field in required_fields:
-                if field not in data:
-                    return JsonResponse({
-                        'status': 'error',
-                        'message': f'Missing required field: {field}'
-                    }, status=400)
-            
-            phone_model_id = data['phone_model_id']
-            selected_storage = data['selected_storage']
-            selected_ram = data['selected_ram']
-            questionnaire_answers = data['questionnaire_answers']
-            
-            # Validate questionnaire answers structure
-            if not isinstance(questionnaire_answers, dict):
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'questionnaire_answers must be a dictionary.'
-                }, status=400)
+            error_response = quote_request_error(data)
+            if error_response is not None:
+                return error_response
             
             # Get phone catalog data
-            catalog_ref = db.collection('phone_catalog').document('catalog_data')
-            catalog_doc = catalog_ref.get()
-            
-            if not catalog_doc.exists:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Phone catalog not found.'
-                }, status=404)
-            
-            catalog_data = catalog_doc.to_dict()
-            
-            # Find the phone model in the catalog
-            phone_data = None
-            brand = None
-            phone_series = None
-            
-            for brand_key, brand_data in catalog_data.get('brands', {}).items():
-                for series_key, series_data in brand_data.get('phone_series', {}).items():
-                    if phone_model_id in series_data.get('phones', {}):
-                        phone_data = series_data['phones'][phone_model_id]
-                        brand = brand_key
-                        phone_series = series_key
-                        break
-                if phone_data:
-                    break
-            
-            if not phone_data:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': f'Phone model "{phone_model_id}" not found in catalog.'
-                }, status=404)
-            
-            # Validate storage and RAM options
-            variant_options = phone_data.get('variant_options', {})
-            variant_prices = phone_data.get('variant_prices', {})
-            
-            available_storage = variant_options.get('storage', [])
-            if selected_storage not in available_storage:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': f'Invalid storage option: {selected_storage}. Available options: {available_storage}'
-                }, status=400)
-            
-            available_ram = variant_options.get('ram', [])
-            if selected_ram not in available_ram:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': f'Invalid RAM option: {selected_ram}. Available options: {available_ram}'
-                }, status=400)
-            
-            # Validate variant combination
-            if (selected_storage not in variant_prices or 
-                selected_ram not in variant_prices.get(selected_storage, {})):
-                return JsonResponse({
-                    'status': 'error',
-                    'message': f'Variant combination {selected_storage}/{selected_ram} is not available for this phone model.'
-                }, status=400)
-            
-            # Get base price
-            base_price = variant_prices[selected_storage][selected_ram]
-            estimated_price = base_price
-            
-            # Build question validation map
-            question_groups = phone_data.get('question_groups', {})
-            question_id_to_options = {}
-            for group_name, group_data in question_groups.items():
-                for question in group_data.get('questions', []):
-                    question_id = question.get('id')
-                    if question_id:
-                        question_id_to_options[question_id] = {
-                            'options': [opt.get('label') for opt in question.get('options', [])],
-                            'type': question.get('type', 'multi_choice')
-                        }
-            
-            # Validate and apply questionnaire answers
-            applied_modifiers = []
-            for question_id, user_answers in questionnaire_answers.items():
-                if question_id not in question_id_to_options:
-                    return JsonResponse({
-                        'status': 'error',
-                        'message': f'Invalid question ID: {question_id}'
-                    }, status=400)
-                
-                if not isinstance(user_answers, list):
-                    user_answers = [user_answers]
-                
-                question_info = question_id_to_options[question_id]
-                valid_options = question_info['options']
-                question_type = question_info['type']
-                
-                # Validate answer format
-                if question_type == 'single_choice' and len(user_answers) > 1:
-                    return JsonResponse({
-                        'status': 'error',
-                        'message': f'Question "{question_id}" is single choice but multiple answers provided'
-                    }, status=400)
-                
-                # Validate and apply price modifiers
-                for user_answer in user_answers:
-                    if user_answer not in valid_options:
-                        return JsonResponse({
-                            'status': 'error',
-                            'message': f'Invalid answer "{user_answer}" for question "{question_id}". Valid options: {valid_options}'
-                        }, status=400)
-                    
-                    # Find and apply price modifier
-                    for group_name, group_data in question_groups.items():
-                        for question in group_data.get('questions', []):
-                            if question.get('id') == question_id:
-                                for option in question.get('options', []):
-                                    if option.get('label') == user_answer:
-                                        price_modifier = option.get('price_modifier', 0)
-                                        estimated_price += price_modifier
-                                        applied_modifiers.append({
-                                            'question_id': question_id,
-                                            'answer': user_answer,
-                                            'modifier': price_modifier
-                                        })
-                                        break
-                                break
-                        else:
-                            continue
-                        break
-            
-            return JsonResponse({
-                'status': 'success',
-                'quote_estimate': {
-                    'phone_model_id': phone_model_id,
-                    'brand': brand,
-                    'phone_series': phone_series,
-                    'phone_display_name': phone_data.get('display_name', phone_model_id),
-                    'selected_variant': {
-                        'storage': selected_storage,
-                        'ram': selected_ram
-                    },
-                    'base_price': base_price,
-                    'estimated_price': estimated_price,
-                    'price_difference': estimated_price - base_price,
-                    'applied_modifiers': applied_modifiers,
-                    'timestamp': datetime.now().isoformat()
-                }
-            })
+            catalog_doc = db.collection('phone_catalog').document('catalog_data').get()
+            return quote_estimate_response(data, catalog_doc)
             
         except json.JSONDecodeError:
             return JsonResponse({
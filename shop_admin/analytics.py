@@ -0,0 +1,230 @@
+"""
+Sales analytics rollups.
+
+Each finalized (paid) order is folded into two documents:
+    analytics_daily/{YYYY-MM-DD}
+    analytics_monthly/{YYYY-MM}
+
+Both hold the same shape:
+    revenue, order_count, units_sold
+    products.{product_id}: {name, units, revenue, variants.{variant_id}: units}
+    payment_methods.{method}: order count
+    delivery_status.{status}: order count (orders of that period by current delivery status)
+
+Writes use set(merge=True) with firestore.Increment so concurrent checkouts never
+overwrite each other. The dashboard reads only these documents; the
+rebuild_analytics command recomputes them from order history.
+"""
+import logging
+from datetime import datetime, timezone
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+DAILY_COLLECTION = 'analytics_daily'
+MONTHLY_COLLECTION = 'analytics_monthly'
+
+# Key used for orders/items without a variant, payment method or delivery status
+DEFAULT_VARIANT_KEY = 'default'
+UNKNOWN_PAYMENT_METHOD = 'unknown'
+INITIAL_DELIVERY_STATUS = 'pending'
+
+
+def bucket_datetime(value):
+    """
+    Normalise an order timestamp to the naive wall-clock time it was written with.
+
+    Orders are stamped with naive datetime.now(), which Firestore stores as UTC and
+    returns timezone-aware; converting back keeps incremental and rebuilt buckets equal.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, str):
+        try:
+            return bucket_datetime(datetime.fromisoformat(value))
+        except ValueError:
+            return None
+    return None
+
+
+def day_key(value):
+    return value.strftime('%Y-%m-%d')
+
+
+def month_key(value):
+    return value.strftime('%Y-%m')
+
+
+def order_bucket_time(order_data):
+    """The time an order counts towards: payment capture, falling back to creation"""
+    payment_details = order_data.get('payment_details') or {}
+    return bucket_datetime(payment_details.get('captured_at')) or bucket_datetime(order_data.get('created_at'))
+
+
+def is_finalized(order_data):
+    """Whether an order has been paid and therefore belongs in the rollups"""
+    payment_details = order_data.get('payment_details') or {}
+    return bool(payment_details.get('razorpay_payment_id')) and order_data.get('status') != 'payment_failed'
+
+
+def order_revenue(order_data):
+    revenue = order_data.get('total_amount_calculated')
+    if revenue is None:
+        revenue = order_data.get('total_amount') or 0
+    return float(revenue)
+
+
+def _rollup_refs(db, bucket_time):
+    return (
+        db.collection(DAILY_COLLECTION).document(day_key(bucket_time)),
+        db.collection(MONTHLY_COLLECTION).document(month_key(bucket_time)),
+    )
+
+
+def build_order_increment(order_data):
+    """Build the merge payload that adds one finalized order to a rollup document"""
+    products = {}
+    units_sold = 0
+    for item in order_data.get('order_items') or []:
+        product_id = item.get('product_id')
+        if not product_id:
+            continue
+        quantity = int(item.get('quantity') or 0)
+        item_revenue = float(item.get('total_item_price') or (item.get('price') or 0) * quantity)
+        variant_key = item.get('variant_id') or DEFAULT_VARIANT_KEY
+        units_sold += quantity
+
+        product_entry = products.setdefault(product_id, {'variants': {}})
+        if item.get('name'):
+            product_entry['name'] = item['name']
+        # Two items of the same product in one order: add them up before wrapping in Increment
+        product_entry['_units'] = product_entry.get('_units', 0) + quantity
+        product_entry['_revenue'] = product_entry.get('_revenue', 0) + item_revenue
+        product_entry['variants'][variant_key] = product_entry['variants'].get(variant_key, 0) + quantity
+
+    for product_entry in products.values():
+        product_entry['units'] = firestore.Increment(product_entry.pop('_units'))
+        product_entry['revenue'] = firestore.Increment(product_entry.pop('_revenue'))
+        product_entry['variants'] = {
+            variant_key: firestore.Increment(units) for variant_key, units in product_entry['variants'].items()
+        }
+
+    payment_method = (order_data.get('payment_details') or {}).get('method') or UNKNOWN_PAYMENT_METHOD
+    delivery_status = order_data.get('delivery_status') or INITIAL_DELIVERY_STATUS
+
+    return {
+        'revenue': firestore.Increment(order_revenue(order_data)),
+        'order_count': firestore.Increment(1),
+        'units_sold': firestore.Increment(units_sold),
+        'products': products,
+        'payment_methods': {payment_method: firestore.Increment(1)},
+        'delivery_status': {delivery_status: firestore.Increment(1)},
+        'updated_at': datetime.now(),
+    }
+
+
+def record_finalized_order(db, order_data):
+    """
+    Fold a newly paid order into its daily and monthly rollups.
+
+    Failures are logged and swallowed: analytics must never fail a checkout.
+    The rollups can always be recomputed with `manage.py rebuild_analytics`.
+
+    Args:
+        db: Firestore database client
+        order_data (dict): The order as it is after payment (items, totals, payment_details)
+    """
+    try:
+        bucket_time = order_bucket_time(order_data) or datetime.now()
+        payload = build_order_increment(order_data)
+        batch = db.batch()
+        for rollup_ref in _rollup_refs(db, bucket_time):
+            batch.set(rollup_ref, payload, merge=True)
+        batch.commit()
+    except Exception as e:
+        logger.error(f"Error updating analytics rollups: {str(e)}")
+
+
+def record_delivery_status_change(db, order_data, new_status):
+    """
+    Move a finalized order from its previous delivery status count to the new one.
+
+    Args:
+        db: Firestore database client
+        order_data (dict): The order as it was before the status change
+        new_status (str): The new delivery status
+    """
+    if not is_finalized(order_data):
+        return
+    previous_status = order_data.get('delivery_status') or INITIAL_DELIVERY_STATUS
+    if previous_status == new_status:
+        return
+    try:
+        bucket_time = order_bucket_time(order_data)
+        if bucket_time is None:
+            return
+        payload = {
+            'delivery_status': {
+                previous_status: firestore.Increment(-1),
+                new_status: firestore.Increment(1),
+            },
+            'updated_at': datetime.now(),
+        }
+        batch = db.batch()
+        for rollup_ref in _rollup_refs(db, bucket_time):
+            batch.set(rollup_ref, payload, merge=True)
+        batch.commit()
+    except Exception as e:
+        logger.error(f"Error updating delivery status rollups: {str(e)}")
+
+
+def _merge_counts(target, source):
+    for key, value in (source or {}).items():
+        target[key] = target.get(key, 0) + (value or 0)
+
+
+def summarize_rollups(rollups, top_products=10):
+    """
+    Combine rollup documents into dashboard totals.
+
+    Args:
+        rollups (list): Rollup dicts (daily or monthly) for the period
+        top_products (int): Number of best-selling products to return
+
+    Returns:
+        dict: totals, payment method mix, delivery status counts and top products
+    """
+    summary = {
+        'revenue': 0.0,
+        'order_count': 0,
+        'units_sold': 0,
+        'average_order_value': 0.0,
+        'payment_methods': {},
+        'delivery_status': {},
+    }
+    products = {}
+    for rollup in rollups:
+        summary['revenue'] += rollup.get('revenue') or 0
+        summary['order_count'] += rollup.get('order_count') or 0
+        summary['units_sold'] += rollup.get('units_sold') or 0
+        _merge_counts(summary['payment_methods'], rollup.get('payment_methods'))
+        _merge_counts(summary['delivery_status'], rollup.get('delivery_status'))
+        for product_id, product_data in (rollup.get('products') or {}).items():
+            product_entry = products.setdefault(product_id, {
+                'product_id': product_id, 'name': None, 'units': 0, 'revenue': 0.0, 'variants': {}
+            })
+            product_entry['name'] = product_data.get('name') or product_entry['name']
+            product_entry['units'] += product_data.get('units') or 0
+            product_entry['revenue'] += product_data.get('revenue') or 0
+            _merge_counts(product_entry['variants'], product_data.get('variants'))
+
+    summary['revenue'] = round(summary['revenue'], 2)
+    if summary['order_count']:
+        summary['average_order_value'] = round(summary['revenue'] / summary['order_count'], 2)
+    ranked = sorted(products.values(), key=lambda product: product['units'], reverse=True)
+    for product in ranked:
+        product['revenue'] = round(product['revenue'], 2)
+    summary['top_products'] = ranked[:top_products]
+    return summary
@@ -0,0 +1,162 @@
+"""
+In-memory cache for storefront content: banners, logo, footer, pages, FAQs and
+categories. Products are versioned the same way for the composite home payload.
+
+This content is read on every page view and changes a few times a month, so public
+GETs are served from process memory. Every admin mutation calls
+bump_content_version(section), which increments a per-section counter in
+settings/content_versions. Each process re-reads that one document at most every
+VERSION_CHECK_INTERVAL seconds (immediately after a local bump), and reloads a
+section from Firestore only when its version has moved.
+
+Responses carry a strong ETag (a hash of the exact response body) and a
+Cache-Control header; a request whose If-None-Match matches gets a 304 without a body.
+Each entry also keeps the compressed variants of its body, which
+CompressionMiddleware fills on first use, so a hot entry is compressed only once.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from django.http import HttpResponse, HttpResponseNotModified
+from firebase_admin import firestore
+
+from anand_mobiles.responses import dumps
+
+VERSIONS_DOCUMENT = ('settings', 'content_versions')
+VERSION_CHECK_INTERVAL = 5
+DEFAULT_MAX_AGE = 60
+MAX_ENTRIES = 512
+
+BANNERS = 'banners'
+LOGO = 'logo'
+FOOTER = 'footer'
+PAGES = 'pages'
+FAQS = 'faqs'
+CATEGORIES = 'categories'
+PRODUCTS = 'products'
+SECTIONS = (BANNERS, LOGO, FOOTER, PAGES, FAQS, CATEGORIES, PRODUCTS)
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # (section, key) -> (version, status, body, etag, compressed variants)
+_versions = {'checked_at': 0.0, 'values': {}, 'bumps': 0}
+
+
+def _versions_ref(db):
+    collection, document = VERSIONS_DOCUMENT
+    return db.collection(collection).document(document)
+
+
+def section_version(db, section):
+    """Current version of a section, re-read from Firestore at most every VERSION_CHECK_INTERVAL"""
+    now = time.monotonic()
+    with _lock:
+        if now - _versions['checked_at'] < VERSION_CHECK_INTERVAL:
+            return _versions['values'].get(section, 0)
+        bumps = _versions['bumps']
+
+    snapshot = _versions_ref(db).get()
+    values = snapshot.to_dict() if snapshot.exists else {}
+    values = {name: values.get(name) or 0 for name in SECTIONS}
+    with _lock:
+        # A local bump during the read may not be in this snapshot; don't trust it for long
+        if _versions['bumps'] == bumps:
+            _versions['values'] = values
+            _versions['checked_at'] = now
+    return values.get(section, 0)
+
+
+def bump_content_version(db, section):
+    """Mark a section as changed, for this process immediately and for others within VERSION_CHECK_INTERVAL"""
+    _versions_ref(db).set({section: firestore.Increment(1), 'updated_at': datetime.now()}, merge=True)
+    with _lock:
+        _versions['checked_at'] = 0.0
+        _versions['bumps'] += 1
+        for cache_key in [cache_key for cache_key in _entries if cache_key[0] == section]:
+            del _entries[cache_key]
+
+
+def clear_content_cache():
+    with _lock:
+        _entries.clear()
+        _versions['checked_at'] = 0.0
+        _versions['values'] = {}
+
+
+def json_body(payload):
+    return dumps(payload)
+
+
+def body_etag(body):
+    return '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def _if_none_match(request):
+    header = request.headers.get('If-None-Match') or ''
+    # Weak comparison: CompressionMiddleware sends W/ on compressed responses
+    return {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
+
+
+def cached_json_response(request, db, section, loader, key='', max_age=DEFAULT_MAX_AGE):
+    """
+    Serve loader()'s JSON from memory while the section's version is unchanged.
+
+    Args:
+        request: The GET request (used for If-None-Match)
+        db: Firestore database client
+        section (str): One of SECTIONS
+        loader (callable): Returns (payload dict, status code) from Firestore
+        key (str): Distinguishes entries within a section, e.g. a page path
+        max_age (int): Seconds clients may reuse the response; 0 makes them revalidate every time
+
+    Returns:
+        HttpResponse: 200 with ETag and Cache-Control, 304 on a matching If-None-Match,
+        or the loader's non-200 status uncached by clients
+    """
+    version = section_version(db, section)
+    cache_key = (section, key)
+    with _lock:
+        entry = _entries.get(cache_key)
+        if entry is not None and entry[0] == version:
+            _entries.move_to_end(cache_key)
+        else:
+            entry = None
+
+    if entry is None:
+        payload, status = loader()
+        body = json_body(payload)
+        entry = (version, status, body, body_etag(body), {})
+        with _lock:
+            _entries[cache_key] = entry
+            _entries.move_to_end(cache_key)
+            while len(_entries) > MAX_ENTRIES:
+                _entries.popitem(last=False)
+
+    _, status, body, etag, variants = entry
+    if status != 200:
+        return HttpResponse(body, status=status, content_type='application/json')
+    return conditional_json_response(request, body, etag, max_age, variants)
+
+
+def conditional_json_response(request, body, etag, max_age=DEFAULT_MAX_AGE, variants=None):
+    """
+    A 200 with ETag and Cache-Control, or a 304 if the client already has this ETag.
+
+    `variants` is the dict kept with a cached body for its compressed forms
+    (anand_mobiles/compression.py).
+    """
+    if max_age:
+        cache_control = f'public, max-age={max_age}'
+    else:
+        cache_control = 'no-cache'
+    match = _if_none_match(request)
+    if etag in match or '*' in match:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+        response.compressed_variants = variants
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,250 @@
+"""
+Streaming exports of orders, users, products and phone inquiries.
+
+Documents are read page by page with start_after cursors and written out one row at
+a time from a generator, so a StreamingHttpResponse over these never holds more than
+a page of documents (plus one output chunk) in memory.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from anand_mobiles.firestore_utils import stream_query_pages, firestore_json_default
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_PAGE_SIZE = 500
+# Rows are grouped into chunks of about this many bytes before being sent
+CHUNK_SIZE = 64 * 1024
+
+# Columns derived from the document path rather than its fields
+ID_COLUMN = 'id'
+USER_ID_COLUMN = 'user_id'
+
+EXPORT_DATASETS = {
+    'orders': {
+        'collection_group': 'orders',
+        'date_field': 'created_at',
+        'columns': [
+            'id', 'user_id', 'status', 'delivery_status', 'created_at', 'total_amount',
+            'total_amount_calculated', 'currency', 'razorpay_order_id',
+            'payment_details.method', 'payment_details.razorpay_payment_id', 'payment_details.status',
+            'assigned_partner_id', 'assigned_partner_name', 'address.city', 'address.state',
+            'address.postal_code', 'order_items', 'invoice_id',
+        ],
+        'excluded_fields': {'payment_details.razorpay_signature'},
+    },
+    'users': {
+        'collection': 'users',
+        'date_field': 'created_at',
+        'columns': ['id', 'email', 'first_name', 'last_name', 'phone_number', 'auth_provider', 'is_banned', 'created_at'],
+        'excluded_fields': {'password'},
+    },
+    'products': {
+        'collection': 'products',
+        'date_field': None,
+        'columns': [
+            'id', 'name', 'brand', 'category', 'price', 'discount_price', 'discount', 'stock',
+            'featured', 'rating', 'valid_options',
+        ],
+        'excluded_fields': set(),
+    },
+    'inquiries': {
+        'collection': 'phone_inquiries',
+        'date_field': 'created_at',
+        # sell_mobile stores inquiry timestamps as ISO strings
+        'date_as_string': True,
+        'columns': [
+            'id', 'user_id', 'buyer_phone', 'brand', 'phone_series', 'phone_model', 'phone_display_name',
+            'selected_storage', 'selected_ram', 'estimated_price', 'base_price', 'status', 'address',
+            'created_at', 'updated_at',
+        ],
+        'excluded_fields': set(),
+    },
+}
+
+
+class ExportError(Exception):
+    """Raised for invalid export parameters"""
+    pass
+
+
+def parse_date_range(date_from, date_to):
+    """
+    Parse ?from=YYYY-MM-DD&to=YYYY-MM-DD into [start, end) datetimes; `to` is inclusive.
+
+    Raises:
+        ExportError: If a date is not in YYYY-MM-DD format or the range is reversed
+    """
+    try:
+        start = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+        end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1) if date_to else None
+    except ValueError:
+        raise ExportError('from and to must be dates in YYYY-MM-DD format')
+    if start and end and start >= end:
+        raise ExportError('from must not be after to')
+    return start, end
+
+
+def build_export_query(db, dataset, start=None, end=None, fields=None):
+    """
+    Build the Firestore query for a dataset and return it with the field to page by.
+
+    Returns:
+        tuple: (query, order_field) where order_field is None to page by document ID
+    """
+    spec = EXPORT_DATASETS[dataset]
+    if spec.get('collection_group'):
+        query = db.collection_group(spec['collection_group'])
+    else:
+        query = db.collection(spec['collection'])
+
+    order_field = None
+    if start or end:
+        date_field = spec['date_field']
+        if not date_field:
+            raise ExportError(f'{dataset} cannot be filtered by date')
+        if spec.get('date_as_string'):
+            start = start.isoformat() if start else None
+            end = end.isoformat() if end else None
+        if start:
+            query = query.where(date_field, '>=', start)
+        if end:
+            query = query.where(date_field, '<', end)
+        # Range filters require ordering by the same field
+        order_field = date_field
+
+    if fields:
+        top_level = {field.split('.')[0] for field in fields if field != ID_COLUMN}
+        if order_field:
+            # start_after cursors read the ordering field from the previous page's last snapshot
+            top_level.add(order_field)
+        top_level = sorted(top_level)
+        if top_level:
+            query = query.select(top_level)
+    return query, order_field
+
+
+def _get_path(data, path):
+    value = data
+    for part in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _drop_path(data, path):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+def export_record(doc, dataset):
+    """Turn a snapshot into an export dict with the virtual id/user_id columns and sensitive fields removed"""
+    data = doc.to_dict() or {}
+    for path in EXPORT_DATASETS[dataset]['excluded_fields']:
+        _drop_path(data, path)
+    record = {ID_COLUMN: doc.id}
+    if dataset == 'orders':
+        # users/{user_id}/orders/{order_id}
+        record[USER_ID_COLUMN] = doc.reference.parent.parent.id
+    record.update(data)
+    return record
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=firestore_json_default, ensure_ascii=False)
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return firestore_json_default(value)
+
+
+class _Echo:
+    """File-like object whose write() just returns the line, for csv.writer"""
+    def write(self, value):
+        return value
+
+
+def csv_lines(records, columns):
+    """Yield CSV lines (header first); nested fields are read by dotted column names"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for record in records:
+        yield writer.writerow([_csv_value(_get_path(record, column)) for column in columns])
+
+
+def ndjson_lines(records, columns=None):
+    """Yield one JSON document per line, optionally projected to the given columns"""
+    for record in records:
+        if columns:
+            record = {column: _get_path(record, column) for column in columns}
+        yield json.dumps(record, default=firestore_json_default, ensure_ascii=False) + '\n'
+
+
+def chunked_bytes(lines, chunk_size=CHUNK_SIZE):
+    """Join small lines into chunks of roughly chunk_size bytes"""
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a byte stream on the fly into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 writes the gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(db, dataset, export_format='csv', start=None, end=None, fields=None, compress=False):
+    """
+    Build the byte generator for an export.
+
+    Args:
+        db: Firestore database client
+        dataset (str): One of EXPORT_DATASETS
+        export_format (str): 'csv' or 'ndjson'
+        start, end (datetime): Optional [start, end) range on the dataset's date field
+        fields (list): Columns to export (dotted paths allowed); defaults to the dataset columns for CSV
+        compress (bool): gzip the output
+
+    Returns:
+        generator of bytes
+
+    Raises:
+        ExportError: For unknown datasets/formats or unsupported date filters
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise ExportError(f'Unknown export: {dataset}. Must be one of {sorted(EXPORT_DATASETS)}')
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f'Invalid format. Must be one of {list(EXPORT_FORMATS)}')
+
+    columns = fields or (EXPORT_DATASETS[dataset]['columns'] if export_format == 'csv' else None)
+    # Query errors (e.g. date filters on products) surface here, before streaming starts
+    query, order_field = build_export_query(db, dataset, start, end, fields=columns)
+
+    records = (
+        export_record(doc, dataset)
+        for doc in stream_query_pages(query, page_size=EXPORT_PAGE_SIZE, order_field=order_field)
+    )
+    lines = csv_lines(records, columns) if export_format == 'csv' else ndjson_lines(records, columns)
+    chunks = chunked_bytes(lines)
+    return gzip_chunks(chunks) if compress else chunks
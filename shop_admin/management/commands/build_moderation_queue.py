@@ -0,0 +1,68 @@
+"""
+Backfill moderation_queue entries for reviews reported before the queue existed.
+
+    python manage.py build_moderation_queue [--dry-run]
+
+Existing queue entries are left untouched, so the command is safe to re-run.
+"""
+from django.core.management.base import BaseCommand
+from firebase_admin import firestore
+
+from anand_mobiles.firebase import get_db
+from anand_mobiles.firestore_utils import commit_in_parallel, stream_query_pages
+from products.reviews import (
+    REVIEWS_COLLECTION,
+    REPORTS_COLLECTION,
+    MODERATION_QUEUE_COLLECTION,
+    moderation_queue_id,
+    _queue_entry,
+)
+
+
+class Command(BaseCommand):
+    help = 'Create moderation queue entries for already reported reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be queued without writing')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        queue = db.collection(MODERATION_QUEUE_COLLECTION)
+        reported = db.collection_group(REVIEWS_COLLECTION).where(
+            filter=firestore.FieldFilter('reported_count', '>', 0)
+        )
+        counts = {'reported': 0, 'queued': 0, 'existing': 0}
+
+        def operations():
+            for review_doc in stream_query_pages(reported, order_field='reported_count'):
+                counts['reported'] += 1
+                product_id = review_doc.reference.parent.parent.id
+                queue_ref = queue.document(moderation_queue_id(product_id, review_doc.id))
+                if queue_ref.get().exists:
+                    counts['existing'] += 1
+                    continue
+
+                report_times = [
+                    report.get('created_at') for report in
+                    review_doc.reference.collection(REPORTS_COLLECTION).select(['created_at']).stream()
+                    if report.get('created_at')
+                ]
+                entry = _queue_entry(product_id, review_doc.id, review_doc.to_dict())
+                entry.update({
+                    'reported_count': len(report_times) or review_doc.get('reported_count'),
+                    'first_reported_at': min(report_times) if report_times else None,
+                    'last_reported_at': max(report_times) if report_times else None,
+                    'status': 'pending',
+                })
+                counts['queued'] += 1
+                if not options['dry_run']:
+                    yield ('set', queue_ref, entry)
+
+        stats = commit_in_parallel(db, operations())
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(
+            f"{prefix}{counts['reported']} reported reviews, {counts['queued']} queued, "
+            f"{counts['existing']} already in the queue"
+        )
+        for error in stats['errors']:
+            self.stderr.write(error)
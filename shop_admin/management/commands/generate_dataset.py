@@ -0,0 +1,126 @@
+"""
+Generate a synthetic dataset shaped like production, for load tests and sizing.
+
+    python manage.py generate_dataset --scale 10 --seed 42 --target emulator
+    python manage.py generate_dataset --scale 10 --target ndjson --out-dir /tmp/dataset-10x
+
+Products (with valid_options variants), users with addresses, carts, wishlists and
+orders (with their event history), reviews with reports and moderation queue
+entries, delivery partners, and sell-mobile listings and inquiries against the
+phone_catalog document. See shop_admin/synthetic_data.py for the distributions.
+
+Targets:
+    firestore - the configured project (FIREBASE_CONFIG_PATH, or the in-memory
+                backend with FIRESTORE_BACKEND=memory)
+    emulator  - a Firestore emulator at --emulator-host, no credentials needed
+    ndjson    - one <collection>.ndjson file per collection ID in --out-dir, one
+                {"path", "data"} line per document; FIRESTORE_FAKE_FIXTURES accepts
+                the directory
+
+Documents are written with set(), so re-running with the same seed overwrites
+rather than duplicates the users, products and reviews. The analytics rollups are
+not generated: run rebuild_analytics afterwards.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from anand_mobiles.fake_firestore import encode_fixture_value
+from anand_mobiles.firebase import get_db
+from anand_mobiles.firestore_utils import MAX_BATCH_SIZE, commit_in_parallel
+from shop_admin.synthetic_data import DatasetGenerator, scaled_counts
+
+TARGETS = ['firestore', 'emulator', 'ndjson']
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic, seeded dataset into Firestore, the emulator or NDJSON files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiplier on the base counts (300 products, 1000 users, ...)')
+        parser.add_argument('--products', type=int, help='Number of products, overriding --scale')
+        parser.add_argument('--users', type=int, help='Number of users, overriding --scale')
+        parser.add_argument('--zipf-s', type=float, default=1.1,
+                            help='Zipf exponent of product popularity (0 = uniform, higher = more skewed)')
+        parser.add_argument('--orders-per-user', type=float, default=2.0, help='Mean orders per user')
+        parser.add_argument('--max-orders-per-user', type=int, default=50, help='Cap on orders per user')
+        parser.add_argument('--cart-items', type=float, default=1.5, help='Mean cart items per user')
+        parser.add_argument('--wishlist-items', type=float, default=2.0, help='Mean wishlist items per user')
+        parser.add_argument('--reviews-per-user', type=float, default=0.5, help='Mean reviews per user')
+        parser.add_argument('--report-rate', type=float, default=0.03, help='Fraction of reviews that get reported')
+        parser.add_argument('--days', type=int, default=365, help='Spread timestamps over this many past days')
+        parser.add_argument('--target', choices=TARGETS, default='firestore', help='Where to write the dataset')
+        parser.add_argument('--emulator-host', default=os.getenv('FIRESTORE_EMULATOR_HOST', 'localhost:8080'),
+                            help='host:port of the Firestore emulator')
+        parser.add_argument('--project', default=os.getenv('GOOGLE_CLOUD_PROJECT', 'demo-anand-mobiles'),
+                            help='Project ID used with the emulator')
+        parser.add_argument('--out-dir', help='Directory for the NDJSON snapshot')
+        parser.add_argument('--workers', type=int, default=8, help='Batches committed in parallel')
+        parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE, help='Writes per batch')
+
+    def handle(self, *args, **options):
+        if options['target'] == 'ndjson' and not options['out_dir']:
+            raise CommandError('--out-dir is required with --target ndjson')
+
+        counts = scaled_counts(options['scale'], products=options['products'], users=options['users'])
+        generator = DatasetGenerator(
+            seed=options['seed'],
+            counts=counts,
+            zipf_s=options['zipf_s'],
+            orders_per_user=options['orders_per_user'],
+            max_orders_per_user=options['max_orders_per_user'],
+            cart_items=options['cart_items'],
+            wishlist_items=options['wishlist_items'],
+            reviews_per_user=options['reviews_per_user'],
+            report_rate=options['report_rate'],
+            days=options['days'],
+        )
+        self.stdout.write('Generating ' + ', '.join(f'{count} {name}' for name, count in counts.items()))
+        started = time.perf_counter()
+
+        if options['target'] == 'ndjson':
+            stats = self._write_ndjson(generator.documents(), Path(options['out_dir']))
+        else:
+            db = self._emulator_client(options) if options['target'] == 'emulator' else get_db()
+            operations = (('set', db.document(path), data) for path, data in generator.documents())
+            stats = commit_in_parallel(db, operations, batch_size=options['batch_size'],
+                                       max_workers=options['workers'])
+
+        for kind, count in sorted(generator.written.items()):
+            self.stdout.write(f'  {kind}: {count}')
+        for error in stats['errors']:
+            self.stderr.write(error)
+        elapsed = time.perf_counter() - started
+        message = f"Wrote {stats['committed']} documents in {elapsed:.1f}s ({stats['committed'] / elapsed:.0f}/s)"
+        if stats['failed']:
+            self.stdout.write(self.style.ERROR(f"{message}, {stats['failed']} failed"))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def _emulator_client(self, options):
+        # The client library connects to the emulator, without credentials, when this is set
+        os.environ['FIRESTORE_EMULATOR_HOST'] = options['emulator_host']
+        from google.cloud import firestore
+        return firestore.Client(project=options['project'])
+
+    def _write_ndjson(self, documents, out_dir):
+        out_dir.mkdir(parents=True, exist_ok=True)
+        files = {}
+        written = 0
+        try:
+            for path, data in documents:
+                collection_id = path.split('/')[-2]
+                if collection_id not in files:
+                    files[collection_id] = open(out_dir / f'{collection_id}.ndjson', 'w', encoding='utf-8')
+                record = {'path': path, 'data': encode_fixture_value(data)}
+                files[collection_id].write(json.dumps(record, ensure_ascii=False) + '\n')
+                written += 1
+        finally:
+            for f in files.values():
+                f.close()
+        return {'committed': written, 'failed': 0, 'errors': []}
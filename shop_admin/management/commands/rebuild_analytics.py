@@ -0,0 +1,151 @@
+"""
+Recompute the analytics_daily / analytics_monthly rollups from order history.
+
+Orders are streamed page by page with a collection-group query, flattened into
+order and item tables, and aggregated with pandas group-bys. The resulting
+documents replace the existing rollups; rollups for periods that no longer have
+any orders are deleted.
+
+    python manage.py rebuild_analytics [--dry-run]
+"""
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from anand_mobiles.firebase import get_db
+from anand_mobiles.firestore_utils import commit_in_parallel, stream_query_pages
+from shop_admin.analytics import (
+    DAILY_COLLECTION,
+    MONTHLY_COLLECTION,
+    DEFAULT_VARIANT_KEY,
+    UNKNOWN_PAYMENT_METHOD,
+    INITIAL_DELIVERY_STATUS,
+    day_key,
+    month_key,
+    is_finalized,
+    order_bucket_time,
+    order_revenue,
+)
+
+ORDER_COLUMNS = ['day', 'month', 'revenue', 'payment_method', 'delivery_status']
+ITEM_COLUMNS = ['day', 'month', 'product_id', 'variant_id', 'name', 'units', 'revenue']
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily and monthly sales rollups from all orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=500, help='Orders read per query page')
+        parser.add_argument('--workers', type=int, default=8, help='Batches committed in parallel')
+        parser.add_argument('--dry-run', action='store_true', help='Aggregate and report without writing')
+
+    def handle(self, *args, **options):
+        # pandas is only needed here, keep it out of the web process imports
+        import pandas as pd
+
+        db = get_db()
+        started = time.perf_counter()
+
+        order_rows, item_rows = self._load_rows(db, options['page_size'])
+        orders = pd.DataFrame(order_rows, columns=ORDER_COLUMNS)
+        items = pd.DataFrame(item_rows, columns=ITEM_COLUMNS)
+        self.stdout.write(f'Loaded {len(orders)} finalized orders, {len(items)} items '
+                          f'in {time.perf_counter() - started:.2f}s')
+
+        product_names = items.dropna(subset=['name']).groupby('product_id')['name'].last().to_dict()
+        rollups = {
+            DAILY_COLLECTION: self._aggregate(orders, items, 'day', product_names),
+            MONTHLY_COLLECTION: self._aggregate(orders, items, 'month', product_names),
+        }
+        for collection_name, docs in rollups.items():
+            self.stdout.write(f'  {collection_name}: {len(docs)} documents')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: nothing written'))
+            return
+
+        def operations():
+            for collection_name, docs in rollups.items():
+                collection = db.collection(collection_name)
+                for doc_ref in collection.list_documents():
+                    if doc_ref.id not in docs:
+                        yield ('delete', doc_ref)
+                for key, doc_data in docs.items():
+                    yield ('set', collection.document(key), doc_data)
+
+        stats = commit_in_parallel(db, operations(), max_workers=options['workers'])
+        if stats['failed']:
+            for error in stats['errors']:
+                self.stderr.write(error)
+            self.stdout.write(self.style.ERROR(f"{stats['failed']} writes failed"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt rollups with {stats['committed']} writes in {time.perf_counter() - started:.2f}s"
+            ))
+
+    def _load_rows(self, db, page_size):
+        order_rows = []
+        item_rows = []
+        for order_doc in stream_query_pages(db.collection_group('orders'), page_size=page_size):
+            order_data = order_doc.to_dict()
+            if not is_finalized(order_data):
+                continue
+            bucket_time = order_bucket_time(order_data)
+            if bucket_time is None:
+                continue
+            day, month = day_key(bucket_time), month_key(bucket_time)
+            order_rows.append((
+                day, month, order_revenue(order_data),
+                (order_data.get('payment_details') or {}).get('method') or UNKNOWN_PAYMENT_METHOD,
+                order_data.get('delivery_status') or INITIAL_DELIVERY_STATUS,
+            ))
+            for item in order_data.get('order_items') or []:
+                if not item.get('product_id'):
+                    continue
+                quantity = int(item.get('quantity') or 0)
+                item_rows.append((
+                    day, month, item['product_id'], item.get('variant_id') or DEFAULT_VARIANT_KEY,
+                    item.get('name'), quantity,
+                    float(item.get('total_item_price') or (item.get('price') or 0) * quantity),
+                ))
+        return order_rows, item_rows
+
+    @staticmethod
+    def _aggregate(orders, items, period, product_names):
+        """Group orders and items by period and build one rollup document per period"""
+        docs = {}
+        if orders.empty:
+            return docs
+
+        totals = orders.groupby(period).agg(revenue=('revenue', 'sum'), order_count=('revenue', 'size'))
+        for key, row in totals.iterrows():
+            docs[key] = {
+                'revenue': float(row['revenue']),
+                'order_count': int(row['order_count']),
+                'units_sold': 0,
+                'products': {},
+                'payment_methods': {},
+                'delivery_status': {},
+                'updated_at': datetime.now(),
+            }
+
+        for (key, method), count in orders.groupby([period, 'payment_method']).size().items():
+            docs[key]['payment_methods'][method] = int(count)
+        for (key, status), count in orders.groupby([period, 'delivery_status']).size().items():
+            docs[key]['delivery_status'][status] = int(count)
+
+        if not items.empty:
+            for key, units in items.groupby(period)['units'].sum().items():
+                docs[key]['units_sold'] = int(units)
+            product_totals = items.groupby([period, 'product_id']).agg(units=('units', 'sum'), revenue=('revenue', 'sum'))
+            for (key, product_id), row in product_totals.iterrows():
+                product_entry = {'units': int(row['units']), 'revenue': float(row['revenue']), 'variants': {}}
+                if product_names.get(product_id):
+                    product_entry['name'] = product_names[product_id]
+                docs[key]['products'][product_id] = product_entry
+            variant_units = items.groupby([period, 'product_id', 'variant_id'])['units'].sum()
+            for (key, product_id, variant_id), units in variant_units.items():
+                docs[key]['products'][product_id]['variants'][variant_id] = int(units)
+
+        return docs
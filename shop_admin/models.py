@@ -1,10 +1,9 @@
 from django.db import models
 from django.conf import settings
-from firebase_admin import firestore
 import uuid
 
-# Get Firebase client from settings
-db = firestore.client()
+# Shared Firestore client, created on first use
+from anand_mobiles.firebase import db
 
 # Create your models here.
 class ShopAdmin:
@@ -1,8 +1,66 @@
 from django.db import models
 from firebase_admin import firestore
+from .content_cache import bump_content_version, PAGES
+
+# Shared Firestore client, created on first use
+from anand_mobiles.firebase import db
+
+# One document with {path, title, is_custom} for every page, so listing pages
+# doesn't stream every page's full content
+PAGE_INDEX_DOCUMENT = ('settings', 'page_index')
+PAGE_INDEX_FIELDS = ['page_path', 'title', 'is_custom']
+
+
+def _page_index_ref():
+    collection, document = PAGE_INDEX_DOCUMENT
+    return db.collection(collection).document(document)
+
+
+def page_index_entry(page_data):
+    return {
+        'path': page_data.get('page_path', ''),
+        'title': page_data.get('title', ''),
+        'is_custom': page_data.get('is_custom', False)
+    }
+
+
+def index_page(batch, page_data):
+    """Add or refresh a page's entry in the index as part of the caller's batch"""
+    batch.set(_page_index_ref(), {
+        'pages': {page_data['page_path']: page_index_entry(page_data)},
+        'updated_at': firestore.SERVER_TIMESTAMP
+    }, merge=True)
+
+
+def unindex_page(batch, page_path):
+    """Remove a page's entry from the index as part of the caller's batch"""
+    batch.set(_page_index_ref(), {
+        'pages': {page_path: firestore.DELETE_FIELD},
+        'updated_at': firestore.SERVER_TIMESTAMP
+    }, merge=True)
+
+
+def rebuild_page_index():
+    """Build the index from a query that reads only the index fields"""
+    pages = {}
+    for doc in db.collection(PageContent.COLLECTION_NAME).select(PAGE_INDEX_FIELDS).stream():
+        data = doc.to_dict()
+        data.setdefault('page_path', doc.id)
+        pages[doc.id] = page_index_entry(data)
+    _page_index_ref().set({'pages': pages, 'updated_at': firestore.SERVER_TIMESTAMP})
+    return pages
+
+
+def list_indexed_pages():
+    """Page metadata for every page: one document read once the index exists"""
+    index_doc = _page_index_ref().get()
+    if index_doc.exists:
+        pages = index_doc.to_dict().get('pages') or {}
+    else:
+        pages = rebuild_page_index()
+    # Document-ID order, as streaming the collection returned them
+    return [pages[doc_id] for doc_id in sorted(pages)]
 
-# Get Firebase client
-db = firestore.client()
 
 class PageContent:
     """
@@ -29,13 +87,18 @@ class PageContent:
         """Save the page content to Firestore"""
         from datetime import datetime
         doc_ref = db.collection(self.COLLECTION_NAME).document(self.doc_id)
-        doc_ref.set({
+        page_data = {
             'page_path': self.page_path,
             'content': self.content,
             'last_updated': datetime.now(),
             'title': self.title,
             'is_custom': self.is_custom
-        })
+        }
+        batch = db.batch()
+        batch.set(doc_ref, page_data)
+        index_page(batch, page_data)
+        batch.commit()
+        bump_content_version(db, PAGES)
         return self
     
     @classmethod
@@ -93,7 +156,11 @@ class PageContent:
         """Delete the page content from Firestore"""
         if not self.doc_id:
             return False
-        db.collection(self.COLLECTION_NAME).document(self.doc_id).delete()
+        batch = db.batch()
+        batch.delete(db.collection(self.COLLECTION_NAME).document(self.doc_id))
+        unindex_page(batch, self.doc_id)
+        batch.commit()
+        bump_content_version(db, PAGES)
         return True
     
     def to_dict(self):
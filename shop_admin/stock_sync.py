@@ -0,0 +1,230 @@
+"""
+Bulk stock and price sync for the nightly warehouse feed.
+
+Rows of (product_id, variant_id, stock, price, discounted_price) are grouped by
+product. Each chunk of up to 500 products is read with one get_all, every row
+is applied to the product in memory, and the chunk is committed as one batch.
+Chunks are processed in parallel.
+
+Each product update carries a last_update_time precondition, so a checkout that
+changes a product between our read and our commit is never overwritten. If that
+happens the whole batch is rejected; the chunk's products are then written one by
+one, each re-read and re-applied up to PRODUCT_ATTEMPTS times, so a hot product
+only fails its own rows.
+"""
+import copy
+import csv
+import io
+import json
+import time
+
+from google.api_core import exceptions
+
+from anand_mobiles.firestore_utils import MAX_BATCH_SIZE, chunked, run_in_parallel
+
+MAX_SYNC_ROWS = 10000
+PRODUCT_ATTEMPTS = 5
+
+# Row field -> (product-level field, variant field)
+NUMERIC_FIELDS = {
+    'stock': ('stock', 'stock'),
+    'price': ('price', 'price'),
+    'discounted_price': ('discount_price', 'discounted_price'),
+}
+
+
+class StockSyncError(Exception):
+    """Raised when the request body cannot be parsed into rows"""
+    pass
+
+
+def parse_sync_rows(body, content_type='', file_format=None):
+    """
+    Parse a JSON list (or {"rows": [...]}) or a CSV with a header row.
+
+    Raises:
+        StockSyncError: For malformed input or too many rows
+    """
+    is_csv = file_format == 'csv' or 'csv' in (content_type or '')
+    try:
+        text = body.decode('utf-8-sig') if isinstance(body, bytes) else body
+        if is_csv:
+            rows = [
+                {key.strip(): (value.strip() if value and value.strip() else None)
+                 for key, value in row.items() if key}
+                for row in csv.DictReader(io.StringIO(text))
+            ]
+        else:
+            data = json.loads(text)
+            rows = data.get('rows') if isinstance(data, dict) else data
+    except (UnicodeDecodeError, ValueError, csv.Error) as e:
+        raise StockSyncError(f'Could not parse {"CSV" if is_csv else "JSON"} body: {e}')
+
+    if not isinstance(rows, list) or not rows:
+        raise StockSyncError('Provide a non-empty list of rows')
+    if len(rows) > MAX_SYNC_ROWS:
+        raise StockSyncError(f'Too many rows ({len(rows)}); the limit is {MAX_SYNC_ROWS} per request')
+    return rows
+
+
+def _validate_row(row):
+    if not isinstance(row, dict):
+        return None, 'row must be an object'
+    product_id = str(row.get('product_id') or '').strip()
+    if not product_id:
+        return None, 'product_id is required'
+    values = {}
+    for field in NUMERIC_FIELDS:
+        raw = row.get(field)
+        if raw is None or raw == '':
+            continue
+        try:
+            value = int(float(raw)) if field == 'stock' else float(raw)
+        except (TypeError, ValueError):
+            return None, f'{field} must be a number'
+        if value < 0:
+            return None, f'{field} cannot be negative'
+        values[field] = value
+    if not values:
+        return None, 'at least one of stock, price or discounted_price is required'
+    variant_id = str(row.get('variant_id') or '').strip() or None
+    return {'product_id': product_id, 'variant_id': variant_id, 'values': values}, None
+
+
+def _apply_rows(product_data, rows):
+    """Apply rows to a copy of the product; returns (update payload or None, row results)"""
+    options = copy.deepcopy(product_data.get('valid_options') or [])
+    options_by_id = {option.get('id'): option for option in options if isinstance(option, dict)}
+    top_level = {}
+    options_changed = False
+    row_results = {}
+
+    for index, row in rows:
+        if row['variant_id']:
+            option = options_by_id.get(row['variant_id'])
+            if option is None:
+                row_results[index] = {'status': 'error', 'error': 'Variant not found'}
+                continue
+            changed = False
+            for field, value in row['values'].items():
+                variant_field = NUMERIC_FIELDS[field][1]
+                if option.get(variant_field) != value:
+                    option[variant_field] = value
+                    changed = True
+            options_changed = options_changed or changed
+        else:
+            changed = False
+            for field, value in row['values'].items():
+                product_field = NUMERIC_FIELDS[field][0]
+                if top_level.get(product_field, product_data.get(product_field)) != value:
+                    top_level[product_field] = value
+                    changed = True
+        row_results[index] = {'status': 'updated' if changed else 'unchanged'}
+
+    payload = dict(top_level)
+    if options_changed:
+        payload['valid_options'] = options
+    return payload or None, row_results
+
+
+def _not_found(rows):
+    return {index: {'status': 'error', 'error': 'Product not found'} for index, _ in rows}
+
+
+def _sync_product(db, ref, rows):
+    """Read, apply and write one product, re-reading it when a concurrent write wins"""
+    for _ in range(PRODUCT_ATTEMPTS):
+        snapshot = ref.get()
+        if not snapshot.exists:
+            return _not_found(rows)
+        payload, row_results = _apply_rows(snapshot.to_dict(), rows)
+        if not payload:
+            return row_results
+        try:
+            ref.update(payload, option=db.write_option(last_update_time=snapshot.update_time))
+            return row_results
+        except exceptions.FailedPrecondition:
+            continue
+    return {index: {'status': 'error', 'error': 'Product kept changing during the sync; retry this row'}
+            for index, _ in rows}
+
+
+def _sync_chunk(db, chunk):
+    """Read, apply and commit one chunk of (product_id, rows) pairs"""
+    refs = [db.collection('products').document(product_id) for product_id, _ in chunk]
+    snapshots = {snapshot.id: snapshot for snapshot in db.get_all(refs)}
+    batch = db.batch()
+    pending_writes = 0
+    results = {}
+    for ref, (product_id, rows) in zip(refs, chunk):
+        snapshot = snapshots.get(product_id)
+        if snapshot is None or not snapshot.exists:
+            results.update(_not_found(rows))
+            continue
+        payload, row_results = _apply_rows(snapshot.to_dict(), rows)
+        results.update(row_results)
+        if payload:
+            batch.update(ref, payload, option=db.write_option(last_update_time=snapshot.update_time))
+            pending_writes += 1
+    if not pending_writes:
+        return results
+    try:
+        batch.commit()
+        return results
+    except exceptions.FailedPrecondition:
+        pass
+    # A product changed since we read it and the whole batch was rejected; write the
+    # products one by one so only one that keeps changing fails
+    for ref, (_, rows) in zip(refs, chunk):
+        results.update(_sync_product(db, ref, rows))
+    return results
+
+
+def sync_stock(db, rows, max_workers=8):
+    """
+    Apply stock/price rows across many products.
+
+    Args:
+        db: Firestore database client
+        rows (list): Dicts with product_id, optional variant_id (product-level fields are
+            updated when omitted) and any of stock, price, discounted_price
+        max_workers (int): Chunks processed concurrently
+
+    Returns:
+        tuple: (per-row results in input order, summary dict)
+    """
+    started = time.perf_counter()
+    results = [None] * len(rows)
+    by_product = {}
+    for index, raw_row in enumerate(rows):
+        row, error = _validate_row(raw_row)
+        if error:
+            results[index] = {'status': 'error', 'error': error}
+            continue
+        by_product.setdefault(row['product_id'], []).append((index, row))
+
+    chunks = chunked(by_product.items(), MAX_BATCH_SIZE)
+    for chunk, chunk_results, error in run_in_parallel(lambda chunk: _sync_chunk(db, chunk), chunks, max_workers):
+        if error is not None:
+            chunk_results = {
+                index: {'status': 'error', 'error': f'Commit failed: {error}'}
+                for _, product_rows in chunk for index, _ in product_rows
+            }
+        for index, result in chunk_results.items():
+            results[index] = result
+
+    for index, result in enumerate(results):
+        raw_row = rows[index] if isinstance(rows[index], dict) else {}
+        result['row'] = index
+        result['product_id'] = raw_row.get('product_id')
+        result['variant_id'] = raw_row.get('variant_id')
+
+    summary = {
+        'rows': len(rows),
+        'products': len(by_product),
+        'updated': sum(1 for result in results if result['status'] == 'updated'),
+        'unchanged': sum(1 for result in results if result['status'] == 'unchanged'),
+        'errors': sum(1 for result in results if result['status'] == 'error'),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    return results, summary
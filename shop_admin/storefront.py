@@ -0,0 +1,221 @@
+"""
+Storefront content loaders and the composite home-screen payload.
+
+Each loader reads one section from Firestore and returns a (payload, status) pair
+in the shape its standalone endpoint has always returned. The endpoints serve them
+through content_cache; build_home_payload combines them for GET /api/home/.
+
+The home payload keeps one copy of every section with the section's content
+version. A request checks all versions with one (usually cached) read of
+settings/content_versions, reloads only the sections whose version moved,
+concurrently, and re-serializes the payload under a new ETag. Product stock and
+ratings also change on checkout and review writes, which don't bump a version, so
+the products section is additionally reloaded after PRODUCTS_MAX_AGE seconds.
+"""
+import copy
+import threading
+import time
+from datetime import datetime
+
+from anand_mobiles.firestore_utils import run_in_parallel
+from .content_cache import (
+    section_version,
+    json_body,
+    body_etag,
+    BANNERS,
+    LOGO,
+    FOOTER,
+    CATEGORIES,
+    PRODUCTS
+)
+
+PRODUCTS_MAX_AGE = 60
+HOME_SECTIONS = (BANNERS, CATEGORIES, PRODUCTS, LOGO, FOOTER)
+POSITION_ORDER = {'hero': 0, 'home-middle': 1, 'home-bottom': 2, 'category-top': 3, 'sidebar': 4}
+
+DEFAULT_FOOTER_CONFIG = {
+    'company_info': {
+        'description': 'Your trusted electronics partner offering the latest mobiles, laptops, and accessories at competitive prices with excellent customer service.',
+        'logo_url': '',
+        'enabled': True
+    },
+    'contact_info': {
+        'phone': '1800-123-4567',
+        'email': 'info@anandmobiles.com',
+        'address': '123 Retail Park, Main Street, Bhopal, MP - 462001',
+        'hours': 'Mon-Sat: 10:00 AM - 8:00 PM',
+        'enabled': False
+    },
+    'social_links': [
+        {'name': 'Facebook', 'url': 'https://facebook.com', 'icon': 'FaFacebookF', 'enabled': True},
+        {'name': 'Twitter', 'url': 'https://twitter.com', 'icon': 'FaTwitter', 'enabled': True},
+        {'name': 'Instagram', 'url': 'https://instagram.com', 'icon': 'FaInstagram', 'enabled': True},
+        {'name': 'YouTube', 'url': 'https://youtube.com', 'icon': 'FaYoutube', 'enabled': True},
+        {'name': 'LinkedIn', 'url': 'https://linkedin.com', 'icon': 'FaLinkedinIn', 'enabled': True}
+    ],
+    'quick_links': [
+        {'name': 'Home', 'path': '/', 'enabled': True},
+        {'name': 'About', 'path': '/about', 'enabled': True},
+        {'name': 'Contact', 'path': '/contact', 'enabled': True}
+    ],
+    'customer_service_links': [
+        {'name': 'Track Your Order', 'path': '/track-order', 'enabled': True},
+        {'name': 'Bulk Orders', 'path': '/bulk-order', 'enabled': True}
+    ],
+    'policy_links': [
+        {'name': 'Terms & Conditions', 'path': '/terms-conditions', 'enabled': True},
+        {'name': 'Cancellation & Refund Policy', 'path': '/cancellation-refund-policy', 'enabled': True},
+        {'name': 'Privacy Policy', 'path': '/privacy-policy', 'enabled': True},
+        {'name': 'Shipping & Delivery Policy', 'path': '/shipping-delivery-policy', 'enabled': True}
+    ],
+    'know_more_links': [
+        {'name': 'Our Stores', 'path': '/our-stores', 'enabled': True},
+        {'name': 'Service Center', 'url': 'https://www.poorvika.com/service-center', 'enabled': True}
+    ],
+    'footer_policy_links': [
+        {'name': 'Privacy Policy', 'path': '/privacy-policy', 'enabled': True},
+        {'name': 'Terms of Use', 'path': '/terms-conditions', 'enabled': True},
+        {'name': 'Warranty Policy', 'path': '/warranty-policy', 'enabled': True}
+    ],
+    'whatsapp': {
+        'number': '1234567890',
+        'channel_url': 'https://whatsapp.com/channel/YOUR_CHANNEL_ID_HERE',
+        'enabled': True
+    },
+    'copyright': {
+        'text': 'Copyright © Anand mobiles | All Rights Reserved',
+        'developer_name': 'Byteversal.in',
+        'developer_url': 'https://byteversal.in/',
+        'enabled': True
+    }
+}
+
+
+def load_banners(db):
+    banners = []
+    for doc in db.collection('banners').stream():
+        banner_data = doc.to_dict()
+        banner_data['id'] = doc.id
+        banners.append(banner_data)
+    # Sort by created_at if available, otherwise by position
+    banners.sort(key=lambda x: x.get('created_at', x.get('position', 'hero')))
+    return {'banners': banners}, 200
+
+
+def load_public_banners(db):
+    banners = []
+    for doc in db.collection('banners').where('is_active', '==', True).stream():
+        banner_data = doc.to_dict()
+        banner_data['id'] = doc.id
+        banners.append(banner_data)
+    banners.sort(key=lambda x: (
+        POSITION_ORDER.get(x.get('position', 'hero'), 999),
+        x.get('created_at', datetime.min)
+    ))
+    return {'banners': banners}, 200
+
+
+def load_logo(db):
+    settings_doc = db.collection('settings').document('general').get()
+    if not settings_doc.exists:
+        return {'error': 'Settings not found'}, 404
+    return {'logo_url': settings_doc.to_dict().get('logo_url', '')}, 200
+
+
+def load_footer(db):
+    footer_doc = db.collection('settings').document('footer').get()
+    if footer_doc.exists:
+        footer_data = footer_doc.to_dict()
+    else:
+        footer_data = copy.deepcopy(DEFAULT_FOOTER_CONFIG)
+    return {'footer_config': footer_data}, 200
+
+
+def load_categories(db):
+    categories = []
+    for doc in db.collection('categories').order_by('name').stream():
+        category_data = doc.to_dict()
+        category_data['id'] = doc.id
+        categories.append(category_data)
+    return {'categories': categories}, 200
+
+
+def load_products(db):
+    # Imported here: products.views pulls in the Firestore client from settings
+    from products.views import transform_product_structure
+
+    products = []
+    for doc in db.collection('products').stream():
+        product_data = doc.to_dict()
+        product_data['id'] = doc.id
+        products.append(transform_product_structure(product_data))
+    return {'products': products}, 200
+
+
+def _home_sections(loaded):
+    """Map each loaded section onto its keys in the home payload"""
+    products = loaded[PRODUCTS].get('products', [])
+    return {
+        'banners': loaded[BANNERS].get('banners', []),
+        'categories': loaded[CATEGORIES].get('categories', []),
+        'featured_products': [product for product in products if product.get('featured')],
+        'products': products,
+        'logo_url': loaded[LOGO].get('logo_url'),
+        'footer_config': loaded[FOOTER].get('footer_config'),
+    }
+
+
+HOME_LOADERS = {
+    BANNERS: load_public_banners,  # Only active banners; load_banners is the admin list
+    CATEGORIES: load_categories,
+    PRODUCTS: load_products,
+    LOGO: load_logo,
+    FOOTER: load_footer,
+}
+
+_home_lock = threading.Lock()
+_home = {'sections': {}, 'response': None}  # sections: name -> (version, loaded_at, payload)
+
+
+def _stale_sections(versions, now):
+    stale = []
+    for name in HOME_SECTIONS:
+        cached = _home['sections'].get(name)
+        if cached is None or cached[0] != versions[name]:
+            stale.append(name)
+        elif name == PRODUCTS and now - cached[1] >= PRODUCTS_MAX_AGE:
+            stale.append(name)
+    return stale
+
+
+def build_home_payload(db):
+    """
+    Return the serialized home payload and its ETag, rebuilding only stale sections.
+
+    Returns:
+        tuple: (JSON body bytes, ETag, dict for its compressed variants)
+    """
+    versions = {name: section_version(db, name) for name in HOME_SECTIONS}
+    response = _home['response']
+    if response is not None and not _stale_sections(versions, time.monotonic()):
+        return response
+
+    # One rebuild at a time; requests waiting here usually find it already done
+    with _home_lock:
+        now = time.monotonic()
+        stale = _stale_sections(versions, now)
+        if stale or _home['response'] is None:
+            sections = dict(_home['sections'])
+            loaders = lambda name: HOME_LOADERS[name](db)[0]
+            for name, payload, error in run_in_parallel(loaders, stale, max_workers=len(HOME_SECTIONS)):
+                if error is not None:
+                    raise error
+                sections[name] = (versions[name], now, payload)
+            body = json_body(_home_sections({name: cached[2] for name, cached in sections.items()}))
+            _home.update(sections=sections, response=(body, body_etag(body), {}))
+        return _home['response']
+
+
+def clear_home_payload():
+    with _home_lock:
+        _home.update(sections={}, response=None)
@@ -0,0 +1,577 @@
+"""
+Synthetic datasets shaped like the production data, for load tests and sizing.
+
+DatasetGenerator yields (document path, data) pairs lazily, in an order that
+keeps memory flat however many users are generated: the catalog and partners
+first, then each user with everything under it (addresses, cart, wishlist,
+orders with their events) plus the reviews and reports they wrote, then the
+sell-side listings and inquiries, and finally the products, carrying the rating
+aggregates of the reviews generated for them.
+
+Everything is drawn from one random.Random(seed): the same seed and options give
+the same documents, apart from timestamps, which are relative to `now`.
+
+Distributions:
+    - product popularity is Zipfian: the i-th most popular product is picked with
+      weight 1 / i**zipf_s, for cart, wishlist, order and review picks alike
+    - orders, cart items, wishlist items and reviews per user are geometric with
+      the given mean (most users have a few, some have many), orders capped at
+      max_orders_per_user
+    - order status, payment method and delivery progress follow fixed mixes close
+      to what the shop sees (see ORDER_STATUS_WEIGHTS and DELIVERY_STATUS_WEIGHTS)
+"""
+import bisect
+import itertools
+import json
+import math
+import random
+import string
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+from products.bulk_import import product_sku, variant_id
+from products.reviews import REVIEWS_COLLECTION, REPORTS_COLLECTION, MODERATION_QUEUE_COLLECTION, \
+    report_doc_id, moderation_queue_id, _queue_entry, _aggregate_update
+from shop_users.addresses import ADDRESSES_COLLECTION, DEFAULT_ADDRESS_FIELD, address_snapshot
+from shop_users.order_events import EVENTS_COLLECTION, _event_doc_id, _current_status
+
+# Documents per unit of --scale; scale 10 is "10x the shop today"
+BASE_COUNTS = {
+    'products': 300,
+    'users': 1000,
+    'partners': 5,
+    'sell_listings': 150,
+    'inquiries': 300,
+}
+
+# Every synthetic user has this password
+USER_PASSWORD = 'loadtest-password'
+
+ORDER_STATUS_WEIGHTS = {'payment_successful': 0.85, 'pending_payment': 0.10, 'payment_failed': 0.05}
+DELIVERY_STATUS_WEIGHTS = {'delivered': 0.55, 'out_for_delivery': 0.1, 'assigned': 0.15, 'pending': 0.15,
+                           'cancelled': 0.05}
+# Statuses a delivery moves through once a partner is assigned
+DELIVERY_PROGRESS = ['assigned', 'out_for_delivery', 'delivered']
+PAYMENT_METHOD_WEIGHTS = {'upi': 0.5, 'card': 0.3, 'netbanking': 0.12, 'wallet': 0.08}
+CARD_NETWORKS = ['Visa', 'MasterCard', 'RuPay', 'Amex']
+CARRIERS = ['Delhivery', 'BlueDart', 'Ekart', 'DTDC']
+# Later editions of a phone, used once every phone in phone_data.json is taken
+EDITIONS = ['5G', 'Pro', 'Lite', 'Plus', 'Refurbished']
+STORAGES = ['64GB', '128GB', '256GB', '512GB']
+COLORS = ['Black', 'Blue', 'Silver', 'Green', 'Gold', 'Purple', 'White']
+CITIES = [
+    ('Mumbai', 'Maharashtra', '400'), ('Pune', 'Maharashtra', '411'), ('Delhi', 'Delhi', '110'),
+    ('Bengaluru', 'Karnataka', '560'), ('Chennai', 'Tamil Nadu', '600'), ('Hyderabad', 'Telangana', '500'),
+    ('Kolkata', 'West Bengal', '700'), ('Ahmedabad', 'Gujarat', '380'), ('Jaipur', 'Rajasthan', '302'),
+    ('Lucknow', 'Uttar Pradesh', '226'),
+]
+STREETS = ['MG Road', 'Station Road', 'Park Street', 'Link Road', 'Ring Road', 'Church Street', 'Market Lane']
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Ananya', 'Diya', 'Isha', 'Kabir', 'Meera', 'Rohan', 'Saanvi',
+               'Arjun', 'Priya', 'Rahul', 'Neha', 'Karan', 'Pooja', 'Vikram', 'Sneha', 'Aman', 'Riya']
+LAST_NAMES = ['Sharma', 'Verma', 'Patel', 'Iyer', 'Reddy', 'Gupta', 'Singh', 'Nair', 'Das', 'Mehta', 'Khan']
+REVIEW_TITLES = {
+    5: ['Excellent phone', 'Totally worth it', 'Best purchase this year'],
+    4: ['Very good', 'Great value for money', 'Happy with it'],
+    3: ['Decent', 'Average performance', 'Okay for the price'],
+    2: ['Not great', 'Battery disappoints', 'Expected more'],
+    1: ['Poor quality', 'Stopped working', 'Do not buy'],
+}
+RATING_WEIGHTS = [0.05, 0.07, 0.13, 0.3, 0.45]  # ratings 1-5
+REPORT_REASONS = ['spam', 'offensive', 'irrelevant', 'fake review', None]
+LISTING_STATUSES = {'pending': 0.6, 'approved': 0.2, 'rejected': 0.1, 'completed': 0.1}
+
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+
+
+def scaled_counts(scale=1.0, **overrides):
+    """BASE_COUNTS times `scale`, with explicit counts (not None) taking precedence"""
+    counts = {name: max(1, int(round(count * scale))) for name, count in BASE_COUNTS.items()}
+    counts.update({name: value for name, value in overrides.items() if value is not None})
+    return counts
+
+
+class ZipfPicker:
+    """
+    Pick items with probability proportional to 1 / rank**s.
+
+    Ranks are a shuffle of the items, so popularity doesn't follow the input order
+    (e.g. all of one brand first).
+    """
+
+    def __init__(self, rng, items, s=1.1):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(itertools.accumulate(1 / rank ** s for rank in range(1, len(self.items) + 1)))
+
+    def _index(self):
+        index = bisect.bisect(self.cum_weights, self.rng.random() * self.cum_weights[-1])
+        return min(index, len(self.items) - 1)
+
+    def pick(self):
+        return self.items[self._index()]
+
+    def sample(self, k):
+        """Up to k distinct items (fewer if the draws keep repeating), most popular first"""
+        picked = set()
+        for _ in range(k * 4):
+            if len(picked) >= k:
+                break
+            picked.add(self._index())
+        return [self.items[index] for index in sorted(picked)]
+
+
+class DatasetGenerator:
+    """
+    Args:
+        seed (int): Seed for every random choice
+        counts (dict): Documents per kind, see scaled_counts()
+        zipf_s (float): Zipf exponent for product popularity; 0 is uniform
+        orders_per_user (float): Mean orders per user
+        max_orders_per_user (int): Cap on orders per user
+        cart_items (float): Mean cart items per user
+        wishlist_items (float): Mean wishlist items per user
+        reviews_per_user (float): Mean reviews written per user
+        report_rate (float): Fraction of reviews reported at least once
+        days (int): Orders, reviews and sign-ups are spread over this many days
+        now (datetime): Newest timestamp; defaults to the current time
+        phone_data_path (str): Product names (phone_data.json)
+        catalog_path (str): Sell-side phone catalog (simplified_phone_data.json)
+    """
+
+    def __init__(self, seed=0, counts=None, zipf_s=1.1, orders_per_user=2.0, max_orders_per_user=50,
+                 cart_items=1.5, wishlist_items=2.0, reviews_per_user=0.5, report_rate=0.03, days=365,
+                 now=None, phone_data_path=None, catalog_path=None):
+        self.rng = random.Random(seed)
+        self.counts = counts or scaled_counts()
+        self.zipf_s = zipf_s
+        self.orders_per_user = orders_per_user
+        self.max_orders_per_user = max_orders_per_user
+        self.cart_items = cart_items
+        self.wishlist_items = wishlist_items
+        self.reviews_per_user = reviews_per_user
+        self.report_rate = report_rate
+        self.days = days
+        self.now = (now or datetime.now()).replace(microsecond=0)
+        self.phone_data_path = phone_data_path or settings.BASE_DIR / 'phone_data.json'
+        self.catalog_path = catalog_path or settings.BASE_DIR / 'simplified_phone_data.json'
+        self.written = {}
+
+    # --- Helpers -----------------------------------------------------------------------
+
+    def _auto_id(self, length=20):
+        return ''.join(self.rng.choices(_AUTO_ID_CHARS, k=length))
+
+    def _geometric(self, mean, cap=None):
+        """0, 1, 2, ... with the given mean; most draws are small"""
+        if mean <= 0:
+            return 0
+        p = 1 / (mean + 1)
+        count = int(math.log(1 - self.rng.random()) / math.log(1 - p))
+        return min(count, cap) if cap is not None else count
+
+    def _weighted(self, weights):
+        return self.rng.choices(list(weights), weights=list(weights.values()))[0]
+
+    def _time_between(self, start, end=None):
+        end = end or self.now
+        if end <= start:
+            return end
+        return start + timedelta(seconds=self.rng.randrange(int((end - start).total_seconds()) + 1))
+
+    def _past(self, days=None):
+        return self._time_between(self.now - timedelta(days=days or self.days))
+
+    def _phone_number(self):
+        return f'+91{self.rng.choice("6789")}{self.rng.randrange(10 ** 8, 10 ** 9)}'
+
+    def _emit(self, path, data):
+        kind = path.split('/')[-2]
+        self.written[kind] = self.written.get(kind, 0) + 1
+        return path, data
+
+    # --- Catalog -----------------------------------------------------------------------
+
+    def _build_products(self):
+        with open(self.phone_data_path, 'r', encoding='utf-8') as f:
+            phone_data = json.load(f)
+        phones = [(brand, phone) for brand, brand_phones in phone_data.items() for phone in brand_phones]
+        self.rng.shuffle(phones)
+        products = {}
+        for index in range(self.counts['products']):
+            brand, phone = phones[index % len(phones)]
+            edition = index // len(phones)
+            name = phone['name']
+            if edition:
+                name = f"{name} {EDITIONS[(edition - 1) % len(EDITIONS)]}"
+                if edition > len(EDITIONS):
+                    name = f'{name} {edition // len(EDITIONS) + 1}'
+            base_price = self.rng.randrange(60, 1600) * 100
+            options = []
+            for step, storage in enumerate(sorted(self.rng.sample(STORAGES, self.rng.randint(1, 3)),
+                                                  key=STORAGES.index)):
+                for color in self.rng.sample(COLORS, self.rng.randint(1, 2)):
+                    price = base_price + step * self.rng.randrange(20, 80) * 100
+                    option = {'storage': storage, 'colors': color, 'price': float(price),
+                              'discounted_price': float(round(price * self.rng.uniform(0.8, 0.97), -1)),
+                              'stock': self.rng.choice([0, self.rng.randrange(1, 100)])}
+                    option['id'] = variant_id(option)
+                    options.append(option)
+            created_at = self._past()
+            product = {
+                'name': name,
+                'brand': brand,
+                'category': 'refurbished' if 'Refurbished' in name else 'smartphones',
+                'description': phone.get('title', name),
+                'images': [phone['image']] if phone.get('image') else [],
+                'features': [],
+                'price': options[0]['price'],
+                'discount_price': options[0]['discounted_price'],
+                'stock': sum(option['stock'] for option in options),
+                'valid_options': options,
+                'featured': self.rng.random() < 0.05,
+                'created_at': created_at,
+                'updated_at': self._time_between(created_at),
+            }
+            products[product_sku(product)] = product
+        return products
+
+    def _categories(self):
+        for order, (category_id, name) in enumerate([('smartphones', 'Smartphones'),
+                                                     ('refurbished', 'Refurbished')]):
+            yield self._emit(f'categories/{category_id}', {
+                'name': name, 'image_url': None, 'redirect_url': f'/category/{category_id}',
+                'order': order, 'created_at': self.now, 'updated_at': self.now,
+            })
+
+    def _partners(self):
+        for _ in range(self.counts['partners']):
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            partner_id = self._auto_id()
+            self.partner_ids.append(partner_id)
+            yield self._emit(f'delivery_partners/{partner_id}', {
+                'email': f'{first}.{last}.{partner_id[:6]}@partners.example.com'.lower(),
+                'password': self.password_hash,
+                'name': f'{first} {last}',
+                'phone': self._phone_number(),
+                'is_verified': True,
+                'created_at': self._past(),
+            })
+
+    # --- Users -------------------------------------------------------------------------
+
+    def _address(self, name, phone_number, created_at):
+        city, state, pin_prefix = self.rng.choice(CITIES)
+        address = {
+            'type': self._weighted({'home': 0.7, 'work': 0.25, 'other': 0.05}),
+            'street_address': f'{self.rng.randrange(1, 400)}, {self.rng.choice(STREETS)}',
+            'city': city,
+            'state': state,
+            'postal_code': f'{pin_prefix}{self.rng.randrange(1000):03d}',
+            'phone_number': phone_number,
+            'name': name,
+            'is_default': False,
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+        if self.rng.random() < 0.3:
+            address['landmark'] = f'Near {self.rng.choice(["City Mall", "Metro Station", "Post Office"])}'
+        return address
+
+    def _pick_variants(self, count):
+        """[(product_id, product, option)] for `count` distinct popular products"""
+        picked = []
+        for product_id in self.popularity.sample(count):
+            product = self.products[product_id]
+            picked.append((product_id, product, self.rng.choice(product['valid_options'])))
+        return picked
+
+    def _user(self, user_id):
+        first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+        phone_number = self._phone_number()
+        signed_up = self._past()
+        user_path = f'users/{user_id}'
+
+        addresses = {}
+        for _ in range(1 + self._geometric(0.5, cap=5)):
+            address_id = self._auto_id()
+            addresses[address_id] = self._address(f'{first} {last}', phone_number, self._time_between(signed_up))
+        default_id = next(iter(addresses))
+        addresses[default_id]['is_default'] = True
+
+        email = f'{first}.{last}.{user_id[:8]}@example.com'.lower()
+        yield self._emit(user_path, {
+            'email': email,
+            'password': self.password_hash,
+            'first_name': first,
+            'last_name': last,
+            'phone_number': phone_number,
+            'auth_provider': 'email',
+            'created_at': signed_up,
+            DEFAULT_ADDRESS_FIELD: default_id,
+        })
+        for address_id, address in addresses.items():
+            yield self._emit(f'{user_path}/{ADDRESSES_COLLECTION}/{address_id}', address)
+
+        for product_id, _, option in self._pick_variants(self._geometric(self.cart_items, cap=20)):
+            added_at = self._time_between(signed_up)
+            yield self._emit(f"{user_path}/cart/{product_id}_{option['id']}", {
+                'product_id': product_id, 'variant_id': option['id'],
+                'quantity': self.rng.choices([1, 2, 3], weights=[0.85, 0.12, 0.03])[0],
+                'added_at': added_at, 'updated_at': added_at,
+            })
+        for product_id, _, option in self._pick_variants(self._geometric(self.wishlist_items, cap=50)):
+            yield self._emit(f"{user_path}/wishlist/{product_id}_{option['id']}", {
+                'product_id': product_id, 'variant_id': option['id'], 'added_at': self._time_between(signed_up),
+            })
+
+        ordered = set()
+        for _ in range(self._geometric(self.orders_per_user, cap=self.max_orders_per_user)):
+            address_id = self.rng.choice(list(addresses))
+            yield from self._order(user_id, signed_up, address_id, addresses[address_id], ordered)
+
+        for product_id, _, _ in self._pick_variants(self._geometric(self.reviews_per_user, cap=20)):
+            yield from self._review(user_id, email, product_id, signed_up, product_id in ordered)
+
+    # --- Orders ------------------------------------------------------------------------
+
+    def _event(self, seq, status, description, timestamp, **details):
+        event = {'seq': seq, 'status': status, 'description': description, 'timestamp': timestamp}
+        event.update({key: value for key, value in details.items() if value is not None})
+        return event
+
+    def _order(self, user_id, signed_up, address_id, address, ordered):
+        order_id = self._auto_id()
+        order_path = f'users/{user_id}/orders/{order_id}'
+        created_at = self._time_between(signed_up)
+        order_items = []
+        for product_id, product, option in self._pick_variants(self._geometric(0.4, cap=4) + 1):
+            quantity = self.rng.choices([1, 2], weights=[0.9, 0.1])[0]
+            price = option['discounted_price']
+            order_items.append({
+                'product_id': product_id, 'variant_id': option['id'], 'name': product['name'],
+                'image_url': product['images'][0] if product['images'] else None, 'brand': product['brand'],
+                'variant_details': {'storage': option['storage'], 'colors': option['colors']},
+                'quantity': quantity, 'price': price, 'total_item_price': price * quantity,
+            })
+        total_amount = sum(item['total_item_price'] for item in order_items)
+        status = self._weighted(ORDER_STATUS_WEIGHTS)
+
+        order = {
+            'razorpay_order_id': f'order_{self._auto_id(14)}',
+            'user_id': user_id,
+            'product_ids': [item['product_id'] for item in order_items],
+            'order_items': order_items,
+            'address': address_snapshot(address_id, address),
+            'address_id': address_id,
+            'total_amount': total_amount,
+            'currency': 'INR',
+            'status': status,
+            'created_at': created_at,
+            'estimated_delivery': created_at + timedelta(days=10),
+            'tracking_info': {'carrier': None, 'tracking_number': None, 'tracking_url': None},
+            'payment_details': {},
+        }
+        events = [self._event(1, 'pending_payment', 'Order created, awaiting payment', created_at)]
+        paid_at = created_at + timedelta(minutes=self.rng.randrange(1, 15))
+        if status == 'payment_failed':
+            events.append(self._event(2, 'payment_failed', 'Payment verification failed', paid_at))
+            order['updated_at'] = paid_at
+        elif status == 'payment_successful':
+            method = self._weighted(PAYMENT_METHOD_WEIGHTS)
+            order['payment_details'] = {
+                'razorpay_payment_id': f'pay_{self._auto_id(14)}',
+                'razorpay_signature': self._auto_id(64).lower(),
+                'method': method,
+                'status': 'captured',
+                'captured_at': paid_at,
+                'card_network': self.rng.choice(CARD_NETWORKS) if method == 'card' else None,
+                'card_last4': f'{self.rng.randrange(10000):04d}' if method == 'card' else None,
+            }
+            order['total_amount_calculated'] = total_amount
+            order['updated_at'] = paid_at
+            events.append(self._event(2, 'payment_successful', 'Payment received successfully', paid_at))
+            events.extend(self._delivery_events(order, paid_at, len(events)))
+        if status == 'payment_successful':
+            ordered.update(order['product_ids'])
+        yield from self._order_documents(order_path, order, events)
+
+    def _delivery_events(self, order, paid_at, seq):
+        """Delivery progress of a paid order, applied to `order` and returned as events"""
+        delivery_status = self._weighted(DELIVERY_STATUS_WEIGHTS)
+        # Recent orders can't be delivered yet
+        if self.now - paid_at < timedelta(days=2) and delivery_status in ('delivered', 'out_for_delivery'):
+            delivery_status = 'assigned'
+        if delivery_status == 'pending':
+            return []
+        events = []
+        timestamp = paid_at
+        if delivery_status == 'cancelled':
+            timestamp = self._time_between(paid_at, min(self.now, paid_at + timedelta(days=2)))
+            order.update({'delivery_status': 'cancelled', 'last_updated_by_admin_at': timestamp})
+            return [self._event(seq + 1, 'cancelled', 'Order cancelled by admin.', timestamp, updated_by='admin')]
+
+        partner_id = self.rng.choice(self.partner_ids)
+        timestamp = self._time_between(paid_at, min(self.now, paid_at + timedelta(days=1)))
+        order.update({'delivery_status': 'assigned', 'assigned_partner_id': partner_id, 'assigned_at': timestamp,
+                      'last_updated_by_admin_at': timestamp})
+        seq += 1
+        events.append(self._event(seq, None, f'Order assigned to delivery partner (ID: {partner_id}) by admin.',
+                                  timestamp, updated_by='admin', assigned_partner_id=partner_id))
+        for next_status in DELIVERY_PROGRESS[1:DELIVERY_PROGRESS.index(delivery_status) + 1]:
+            timestamp = self._time_between(timestamp, min(self.now, timestamp + timedelta(days=4)))
+            seq += 1
+            order.update({'delivery_status': next_status, 'last_updated_by_partner_at': timestamp})
+            if next_status == 'out_for_delivery':
+                carrier = self.rng.choice(CARRIERS)
+                order['tracking_info'] = {'carrier': carrier, 'tracking_number': self._auto_id(12).upper(),
+                                          'tracking_url': None}
+            else:
+                order['delivered_at'] = timestamp
+            events.append(self._event(seq, next_status, f'Order status updated to {next_status} by delivery partner.',
+                                      timestamp, updated_by='partner', partner_id=partner_id))
+        return events
+
+    def _order_documents(self, order_path, order, events):
+        status = order['status']
+        for event in events:
+            status = event.get('status') or status
+        order['event_count'] = len(events)
+        order['current_status'] = _current_status(events[-1], status)
+        yield self._emit(order_path, order)
+        for event in events:
+            yield self._emit(f"{order_path}/{EVENTS_COLLECTION}/{_event_doc_id(event['seq'])}", event)
+
+    # --- Reviews -----------------------------------------------------------------------
+
+    def _review(self, user_id, email, product_id, signed_up, verified):
+        rating = self.rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0]
+        created_at = self._time_between(signed_up)
+        review_path = f'products/{product_id}/{REVIEWS_COLLECTION}/{user_id}'
+        review = {
+            'user_id': user_id,
+            'email': email,
+            'rating': rating,
+            'title': self.rng.choice(REVIEW_TITLES[rating]),
+            'comment': f'{self.rng.choice(REVIEW_TITLES[rating])}. Using it for {self.rng.randint(1, 12)} months.',
+            'created_at': created_at,
+            'is_verified': verified,
+            'reported_count': 0,
+            'helpful_count': self._geometric(1.5, cap=500),
+        }
+        reports = []
+        if self.rng.random() < self.report_rate:
+            reporters = [self.rng.choice(self.user_ids) for _ in range(1 + self._geometric(1.0, cap=10))]
+            for reporter_id in dict.fromkeys(reporters):
+                if reporter_id != user_id:
+                    reports.append((reporter_id, self._time_between(created_at)))
+        review['reported_count'] = len(reports)
+        yield self._emit(review_path, review)
+
+        rating_sum, count = self.ratings.get(product_id, (0.0, 0))
+        self.ratings[product_id] = (rating_sum + rating, count + 1)
+        if not reports:
+            return
+        for reporter_id, reported_at in reports:
+            yield self._emit(f'{review_path}/{REPORTS_COLLECTION}/{report_doc_id(user_id, reporter_id)}', {
+                'user_id': reporter_id, 'created_at': reported_at, 'reason': self.rng.choice(REPORT_REASONS),
+            })
+        report_times = [reported_at for _, reported_at in reports]
+        entry = _queue_entry(product_id, user_id, review)
+        entry.update({'reported_count': len(reports), 'first_reported_at': min(report_times),
+                      'last_reported_at': max(report_times), 'status': 'pending'})
+        yield self._emit(f'{MODERATION_QUEUE_COLLECTION}/{moderation_queue_id(product_id, user_id)}', entry)
+
+    # --- Sell side ---------------------------------------------------------------------
+
+    def _catalog_phones(self, catalog):
+        phones = []
+        for brand, brand_data in catalog.get('brands', {}).items():
+            for series, series_data in brand_data.get('phone_series', {}).items():
+                for model_id, phone in series_data.get('phones', {}).items():
+                    if phone.get('variant_prices'):
+                        phones.append((brand, series, model_id, phone))
+        return phones
+
+    def _sell_quote(self, phone):
+        """(storage, ram, base price, {question_id: [labels]}, price after the answers)"""
+        storage = self.rng.choice(list(phone['variant_prices']))
+        ram = self.rng.choice(list(phone['variant_prices'][storage]))
+        base_price = phone['variant_prices'][storage][ram]
+        answers, price = {}, base_price
+        for group in phone.get('question_groups', {}).values():
+            for question in group.get('questions', []):
+                options = question.get('options', [])
+                if not options:
+                    continue
+                if question.get('type') == 'single_choice':
+                    chosen = [options[min(self._geometric(0.4), len(options) - 1)]]
+                else:
+                    chosen = [option for option in options if self.rng.random() < 0.15]
+                answers[question['id']] = [option['label'] for option in chosen]
+                price += sum(option.get('price_modifier', 0) for option in chosen)
+        return storage, ram, base_price, answers, price
+
+    def _sell_side(self, catalog):
+        phones = self._catalog_phones(catalog)
+        if not phones:
+            return
+        picker = ZipfPicker(self.rng, phones, self.zipf_s)
+        for _ in range(self.counts['sell_listings']):
+            brand, series, model_id, phone = picker.pick()
+            storage, ram, base_price, answers, price = self._sell_quote(phone)
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            created_at = self._past()
+            yield self._emit(f'sell_mobile_listings/{self._auto_id()}', {
+                'user_name': f'{first} {last}', 'phone_number': self._phone_number(),
+                'email': f'{first}.{last}@example.com'.lower(), 'location': self.rng.choice(CITIES)[0],
+                'brand': brand, 'phone_series': series, 'phone_model': model_id,
+                'selected_variant': {'storage': storage, 'ram': ram}, 'question_answers': answers,
+                'calculated_price': price, 'base_price': base_price,
+                'status': self._weighted(LISTING_STATUSES),
+                'created_at': created_at.isoformat(), 'updated_at': created_at.isoformat(),
+            })
+        for _ in range(self.counts['inquiries']):
+            brand, series, model_id, phone = picker.pick()
+            storage, ram, base_price, answers, price = self._sell_quote(phone)
+            city, state, pin_prefix = self.rng.choice(CITIES)
+            created_at = self._past()
+            yield self._emit(f'phone_inquiries/{self._auto_id()}', {
+                'phone_model_id': model_id, 'user_id': self.rng.choice(self.user_ids),
+                'address': {'street_address': f'{self.rng.randrange(1, 400)}, {self.rng.choice(STREETS)}',
+                            'city': city, 'state': state, 'postal_code': f'{pin_prefix}{self.rng.randrange(1000):03d}'},
+                'buyer_phone': self._phone_number(), 'selected_storage': storage, 'selected_ram': ram,
+                'questionnaire_answers': answers, 'brand': brand, 'phone_series': series,
+                'phone_model': model_id, 'phone_display_name': phone.get('display_name', model_id),
+                'estimated_price': price, 'base_price': base_price,
+                'status': self._weighted(LISTING_STATUSES),
+                'created_at': created_at.isoformat(), 'updated_at': created_at.isoformat(),
+            })
+
+    # --- Entry point -------------------------------------------------------------------
+
+    def documents(self):
+        """Yield (path, data) for the whole dataset; counts end up in self.written"""
+        self.written = {}
+        self.password_hash = make_password(USER_PASSWORD)  # Hashing is slow, every user shares one
+        self.products = self._build_products()
+        self.popularity = ZipfPicker(self.rng, list(self.products), self.zipf_s)
+        self.user_ids = [self._auto_id(28) for _ in range(self.counts['users'])]
+        self.partner_ids = []
+        self.ratings = {}
+
+        with open(self.catalog_path, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+        yield self._emit('phone_catalog/catalog_data', catalog)
+        yield from self._categories()
+        yield from self._partners()
+        for user_id in self.user_ids:
+            yield from self._user(user_id)
+        yield from self._sell_side(catalog)
+
+        for product_id, product in self.products.items():
+            product.update(_aggregate_update(*self.ratings.get(product_id, (0.0, 0))))
+            product['reviews_keyed_by_user'] = True
+            yield self._emit(f'products/{product_id}', product)
@@ -1,3 +1,102 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from anand_mobiles import fake_firestore
+from shop_admin.stock_sync import PRODUCT_ATTEMPTS, sync_stock
+
+
+@override_settings(FIRESTORE_BACKEND='memory')
+class SyncStockTests(SimpleTestCase):
+    """sync_stock against the in-memory Firestore backend"""
+
+    def setUp(self):
+        self.db = fake_firestore.FakeClient()
+        self.db.seed('products/p1', {'name': 'Phone', 'stock': 5, 'price': 100, 'valid_options': [
+            {'id': 'v1', 'stock': 1, 'price': 100},
+            {'id': 'v2', 'stock': 2, 'price': 120},
+        ]})
+        self.db.seed('products/p2', {'name': 'Case', 'stock': 10, 'price': 10, 'discount_price': 8})
+
+    def product(self, product_id):
+        return self.db.document(f'products/{product_id}').get().to_dict()
+
+    def test_rows_are_grouped_by_product_and_applied_to_variants_and_product_fields(self):
+        results, summary = sync_stock(self.db, [
+            {'product_id': 'p1', 'variant_id': 'v1', 'stock': 4},
+            {'product_id': 'p2', 'discounted_price': 7},
+            {'product_id': 'p1', 'variant_id': 'v2', 'price': 120},
+            {'product_id': 'p1', 'stock': 9},
+            {'product_id': 'p1', 'variant_id': 'v9', 'stock': 1},
+            {'product_id': 'p3', 'stock': 1},
+        ])
+
+        self.assertEqual([result['status'] for result in results],
+                         ['updated', 'updated', 'unchanged', 'updated', 'error', 'error'])
+        self.assertEqual(results[4]['error'], 'Variant not found')
+        self.assertEqual(results[5]['error'], 'Product not found')
+        self.assertEqual(summary['products'], 3)
+        p1 = self.product('p1')
+        self.assertEqual(p1['stock'], 9)
+        self.assertEqual([option['stock'] for option in p1['valid_options']], [4, 2])
+        self.assertEqual(self.product('p2')['discount_price'], 7)
+
+    def test_a_concurrent_write_is_kept_and_the_row_reapplied(self):
+        get_all = self.db.get_all
+
+        def checkout_after_read(*args, **kwargs):
+            snapshots = list(get_all(*args, **kwargs))
+            # Something else writes p1 between the sync's read and its commit
+            self.db.document('products/p1').update({'name': 'Phone (checked out)'})
+            return snapshots
+
+        with mock.patch.object(self.db, 'get_all', side_effect=checkout_after_read):
+            results, summary = sync_stock(self.db, [
+                {'product_id': 'p1', 'stock': 7},
+                {'product_id': 'p2', 'stock': 11},
+            ])
+
+        self.assertEqual(summary['errors'], 0, results)
+        p1 = self.product('p1')
+        self.assertEqual((p1['name'], p1['stock']), ('Phone (checked out)', 7))
+        self.assertEqual(self.product('p2')['stock'], 11)
+
+    def test_a_product_that_keeps_changing_fails_only_its_own_rows(self):
+        get = fake_firestore.DocumentReference.get
+        reads = []
+
+        def always_changing(ref, *args, **kwargs):
+            snapshot = get(ref, *args, **kwargs)
+            if ref.id == 'p1':
+                reads.append(snapshot)
+                ref.update({'name': f'Phone {len(reads)}'})
+            return snapshot
+
+        get_all = self.db.get_all
+
+        def checkout_after_read(*args, **kwargs):
+            snapshots = list(get_all(*args, **kwargs))
+            self.db.document('products/p1').update({'name': 'Phone 0'})
+            return snapshots
+
+        with mock.patch.object(self.db, 'get_all', side_effect=checkout_after_read), \
+                mock.patch.object(fake_firestore.DocumentReference, 'get', always_changing):
+            results, summary = sync_stock(self.db, [
+                {'product_id': 'p1', 'stock': 7},
+                {'product_id': 'p2', 'stock': 11},
+            ])
+
+        self.assertEqual(len(reads), PRODUCT_ATTEMPTS)
+        self.assertEqual([result['status'] for result in results], ['error', 'updated'])
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(self.product('p1')['stock'], 5)
+        self.assertEqual(self.product('p2')['stock'], 11)
+
+    def test_other_errors_are_not_retried(self):
+        with mock.patch.object(fake_firestore.WriteBatch, 'commit', side_effect=RuntimeError('unavailable')) as commit:
+            results, summary = sync_stock(self.db, [{'product_id': 'p2', 'stock': 11}])
+
+        self.assertEqual(commit.call_count, 1)
+        self.assertEqual(results[0]['status'], 'error')
+        self.assertIn('unavailable', results[0]['error'])
+        self.assertEqual(self.product('p2')['stock'], 10)
@@ -15,8 +15,13 @@ urlpatterns = [
     path('products/edit/<str:product_id>/', edit_product, name='edit_product'),
     path('products/<str:product_id>/update-variant-stock/', update_variant_stock, name='update_variant_stock'),
     path('products/upload-image/', upload_product_image, name='upload_product_image'),
+    path('products/stock/bulk/', bulk_update_stock, name='bulk_update_stock'),
     path('users/ban/<str:user_id>/', ban_user, name='ban_user'),path('users/<str:user_id>/', get_user_by_id, name='get_user_by_id'),    path('users/<str:user_id>/orders/<str:order_id>/assign-partner/', assign_order_to_delivery_partner, name='assign_order_to_delivery_partner'),
     path('users/<str:user_id>/orders/<str:order_id>/edit/', edit_order, name='edit_order'),
+    path('users/<str:user_id>/orders/<str:order_id>/events/', get_order_events, name='get_order_events'),
+    path('dashboard/', get_dashboard, name='get_dashboard'),
+    path('exports/<str:dataset>/', export_data, name='export_data'),
+    path('profiles/', get_profiles, name='get_profiles'),
     
     # Banner management URLs
     path('banners/', get_all_banners, name='get_all_banners'),
@@ -31,6 +36,7 @@ urlpatterns = [
     # Review management URLs
     path('reviews/', get_all_product_reviews, name='get_all_product_reviews'),
     path('reviews/reported/', get_reported_reviews, name='get_reported_reviews'),
+    path('reviews/<str:product_id>/<str:review_id>/dismiss/', dismiss_reported_review, name='dismiss_reported_review'),
     path('reviews/<str:product_id>/<str:review_id>/delete/', delete_review, name='delete_review'),
 
     # Logo management URLs
@@ -7,14 +7,14 @@ import subprocess
 from functools import wraps
 from typing import Dict, Optional
 from pathlib import Path
-from django.http import JsonResponse
+from django.conf import settings
+from anand_mobiles.responses import JsonResponse
 from anand_mobiles.settings import SECRET_KEY
-import cloudinary
+from anand_mobiles.async_utils import async_compatible
+from anand_mobiles.tracing import span, traced
 from anand_mobiles.settings import CLOUDINARY_URL
-import cloudinary.uploader
 import io
 from django.template.loader import render_to_string
-import pdfkit
 from datetime import datetime
 import uuid
 
@@ -77,6 +77,7 @@ def get_wkhtmltopdf_config():
     
     if wkhtmltopdf_path:
         try:
+            import pdfkit  # Deferred: only invoice generation needs it
             return pdfkit.configuration(wkhtmltopdf=wkhtmltopdf_path)
         except Exception as e:
             logger.warning(f"Failed to create pdfkit configuration: {e}")
@@ -131,14 +132,14 @@ def admin_required(view_func):
         auth_header = request.headers.get('Authorization')
         # Check for missing or malformed authorization header
         if not auth_header:
-            logger.warning(f"Admin access attempt without authorization header from {request.META.get('REMOTE_ADDR')}")
+            logger.warning("Admin access attempt without authorization header from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Authorization header required',
                 'code': 'AUTH_HEADER_MISSING'
             }, status=401)
         
         if not auth_header.startswith('Bearer '):
-            logger.warning(f"Admin access attempt with invalid authorization format from {request.META.get('REMOTE_ADDR')}")
+            logger.warning("Admin access attempt with invalid authorization format from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Invalid authorization format. Expected: Bearer <token>',
                 'code': 'AUTH_FORMAT_INVALID'
@@ -150,7 +151,7 @@ def admin_required(view_func):
             if not token.strip():
                 raise IndexError("Empty token")
         except IndexError:
-            logger.warning(f"Admin access attempt with empty token from {request.META.get('REMOTE_ADDR')}")
+            logger.warning("Admin access attempt with empty token from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Authorization token is empty',
                 'code': 'TOKEN_EMPTY'
@@ -163,7 +164,7 @@ def admin_required(view_func):
             # Validate required fields in token
             username = payload.get('username')
             if not username:
-                logger.warning(f"Admin token missing username field from {request.META.get('REMOTE_ADDR')}")
+                logger.warning("Admin token missing username field from %s", request.META.get('REMOTE_ADDR'))
                 return JsonResponse({
                     'error': 'Invalid token: missing username',
                     'code': 'TOKEN_INVALID_PAYLOAD'
@@ -173,33 +174,34 @@ def admin_required(view_func):
             request.admin = username
             request.admin_payload = payload
             
-            logger.info(f"Admin '{username}' authenticated successfully for {request.method} {request.path}")
+            logger.debug("Admin '%s' authenticated successfully for %s %s", username, request.method, request.path)
             
             # Continue to the protected view
             return view_func(request, *args, **kwargs)
             
         except jwt.ExpiredSignatureError:
-            logger.info(f"Admin access attempt with expired token from {request.META.get('REMOTE_ADDR')}")
+            logger.info("Admin access attempt with expired token from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Authentication token has expired',
                 'code': 'TOKEN_EXPIRED'
             }, status=401)
             
         except jwt.InvalidTokenError as e:
-            logger.warning(f"Admin access attempt with invalid token from {request.META.get('REMOTE_ADDR')}: {str(e)}")
+            logger.warning("Admin access attempt with invalid token from %s: %s", request.META.get('REMOTE_ADDR'), e)
             return JsonResponse({
                 'error': 'Invalid authentication token',
                 'code': 'TOKEN_INVALID'
             }, status=401)
             
         except Exception as e:
-            logger.error(f"Unexpected authentication error from {request.META.get('REMOTE_ADDR')}: {str(e)}")
+            logger.error("Unexpected authentication error from %s: %s", request.META.get('REMOTE_ADDR'), e)
             return JsonResponse({
                 'error': 'Authentication service error',
                 'code': 'AUTH_SERVICE_ERROR'
             }, status=401)
     
-    return wrapper
+    # Async views get an async wrapper around the same checks
+    return async_compatible(wrapper, view_func)
 
 def upload_image_to_cloudinary_util(image_file, folder_name="shop_images"):
     """
@@ -219,22 +221,24 @@ def upload_image_to_cloudinary_util(image_file, folder_name="shop_images"):
     try:
         # Configure Cloudinary using CLOUDINARY_URL from settings.py
         if CLOUDINARY_URL:
+            import cloudinary.uploader  # Deferred: the SDK is slow to import
             cloudinary.config(cloudinary_url=CLOUDINARY_URL, secure=True)
         else:
             logger.error("CLOUDINARY_URL is not set in settings.")
             return None
 
-        upload_result = cloudinary.uploader.upload(
-            image_file,
-            folder=folder_name,
-            # Additional upload options can be added here
-        )
+        with span('cloudinary.upload', folder=folder_name, resource_type='image',
+                  bytes=getattr(image_file, 'size', None)):
+            upload_result = cloudinary.uploader.upload(
+                image_file,
+                folder=folder_name,
+                # Additional upload options can be added here
+            )
         
         secure_url = upload_result.get('secure_url')
         
         if secure_url:
-            logger.info(f"Image uploaded successfully to Cloudinary: {secure_url}")
-            print('secure url', secure_url)
+            logger.info("Image uploaded to Cloudinary: %s", secure_url)
             return secure_url
         else:
             logger.error("Failed to upload image to Cloudinary. No secure_url in response.")
@@ -243,6 +247,7 @@ def upload_image_to_cloudinary_util(image_file, folder_name="shop_images"):
         logger.error(f"Error uploading image to Cloudinary: {str(e)}")
         return None
 
+@traced('invoice.generate_pdf')
 def generate_invoice_pdf(invoice_data):
     """
     Generates a PDF invoice from HTML template using the provided invoice data.
@@ -278,7 +283,8 @@ def generate_invoice_pdf(invoice_data):
         }
           # Render HTML template
         try:
-            html_string = render_to_string('invoice_template.html', context)
+            with span('invoice.render_template'):
+                html_string = render_to_string('invoice_template.html', context)
             logger.info("HTML template rendered successfully")
             
             # Debug: Log a sample of the HTML content (first 500 characters)
@@ -288,6 +294,8 @@ def generate_invoice_pdf(invoice_data):
             logger.error(f"Failed to render HTML template: {str(template_error)}")
             raise PDFGenerationError(f"Template rendering failed: {str(template_error)}")
         
+        import pdfkit
+
         # Try with configuration first
         config = get_wkhtmltopdf_config()
         pdf_options = get_pdf_options()
@@ -297,12 +305,14 @@ def generate_invoice_pdf(invoice_data):
         if config:
             try:
                 logger.info("Trying pdfkit with custom configuration")
-                pdf_bytes = pdfkit.from_string(
-                    html_string,
-                    False,  # Don't write to file, return bytes
-                    options=pdf_options,
-                    configuration=config,
-                )
+                with span('wkhtmltopdf.from_string', configured=True, html_bytes=len(html_string)) as pdf_span:
+                    pdf_bytes = pdfkit.from_string(
+                        html_string,
+                        False,  # Don't write to file, return bytes
+                        options=pdf_options,
+                        configuration=config,
+                    )
+                    pdf_span.set_attribute('pdf_bytes', len(pdf_bytes) if pdf_bytes else 0)
                 
                 if pdf_bytes and isinstance(pdf_bytes, bytes) and len(pdf_bytes) > 100:
                     logger.info(f"PDF generated with configuration. Size: {len(pdf_bytes)} bytes")
@@ -331,11 +341,13 @@ def generate_invoice_pdf(invoice_data):
                     "disable-smart-shrinking": True,
                 }
                 
-                pdf_bytes = pdfkit.from_string(
-                    html_string,
-                    False,
-                    options=basic_options
-                )
+                with span('wkhtmltopdf.from_string', configured=False, html_bytes=len(html_string)) as pdf_span:
+                    pdf_bytes = pdfkit.from_string(
+                        html_string,
+                        False,
+                        options=basic_options
+                    )
+                    pdf_span.set_attribute('pdf_bytes', len(pdf_bytes) if pdf_bytes else 0)
                 
                 if pdf_bytes and isinstance(pdf_bytes, bytes) and len(pdf_bytes) > 100:
                     logger.info(f"PDF generated with basic options. Size: {len(pdf_bytes)} bytes")
@@ -375,6 +387,7 @@ def generate_invoice_pdf(invoice_data):
     logger.error("PDF generation failed")
     raise PDFGenerationError("Failed to generate PDF with pdfkit. Please ensure wkhtmltopdf is installed.")
 
+@traced('cloudinary.upload_pdf')
 def upload_pdf_to_cloudinary_util(pdf_buffer, filename, folder_name="invoices"):
     """
     Uploads a PDF file buffer to Cloudinary and returns its secure URL.
@@ -395,6 +408,7 @@ def upload_pdf_to_cloudinary_util(pdf_buffer, filename, folder_name="invoices"):
     try:
         # Configure Cloudinary using CLOUDINARY_URL from settings.py
         if CLOUDINARY_URL:
+            import cloudinary.uploader  # Deferred: the SDK is slow to import
             cloudinary.config(cloudinary_url=CLOUDINARY_URL, secure=True)
         else:
             logger.error("CLOUDINARY_URL is not set in settings.")
@@ -424,21 +438,21 @@ def upload_pdf_to_cloudinary_util(pdf_buffer, filename, folder_name="invoices"):
             upload_buffer = io.BytesIO(pdf_bytes)
             upload_buffer.seek(0)
             
-            upload_result = cloudinary.uploader.upload(
-                upload_buffer,
-                resource_type="raw",  # Use 'raw' for PDF files instead of 'auto'
-                folder=folder_name,
-                public_id=filename,
-                format="pdf",
-                use_filename=True,
-                unique_filename=False
-            )
+            with span('cloudinary.upload', method='direct', folder=folder_name, bytes=len(pdf_bytes)):
+                upload_result = cloudinary.uploader.upload(
+                    upload_buffer,
+                    resource_type="raw",  # Use 'raw' for PDF files instead of 'auto'
+                    folder=folder_name,
+                    public_id=filename,
+                    format="pdf",
+                    use_filename=True,
+                    unique_filename=False
+                )
             
             secure_url = upload_result.get('secure_url')
             
             if secure_url:
-                logger.info(f"PDF uploaded successfully to Cloudinary (method 1): {secure_url}")
-                print('secure url (method 1)', secure_url)
+                logger.info("PDF uploaded to Cloudinary (method 1): %s", secure_url)
                 return secure_url
             else:
                 logger.warning("Method 1 failed - no secure_url in response")
@@ -461,21 +475,21 @@ def upload_pdf_to_cloudinary_util(pdf_buffer, filename, folder_name="invoices"):
             upload_buffer = io.BytesIO(pdf_bytes)
             upload_buffer.seek(0)
             
-            upload_result = cloudinary.uploader.upload(
-                upload_buffer,
-                resource_type="auto",  # Let Cloudinary auto-detect
-                folder=folder_name,
-                public_id=filename,
-                use_filename=True,
-                unique_filename=False,
-                allowed_formats=["pdf"]
-            )
+            with span('cloudinary.upload', method='auto', folder=folder_name, bytes=len(pdf_bytes)):
+                upload_result = cloudinary.uploader.upload(
+                    upload_buffer,
+                    resource_type="auto",  # Let Cloudinary auto-detect
+                    folder=folder_name,
+                    public_id=filename,
+                    use_filename=True,
+                    unique_filename=False,
+                    allowed_formats=["pdf"]
+                )
             
             secure_url = upload_result.get('secure_url')
             
             if secure_url:
-                logger.info(f"PDF uploaded successfully to Cloudinary (method 3): {secure_url}")
-                print('secure url (method 3)', secure_url)
+                logger.info("PDF uploaded to Cloudinary (method 3): %s", secure_url)
                 return secure_url
                 
         except Exception as method3_error:
@@ -510,6 +524,7 @@ def upload_pdf_to_cloudinary_base64(pdf_buffer, filename, folder_name="invoices"
     try:
         # Configure Cloudinary using CLOUDINARY_URL from settings.py
         if CLOUDINARY_URL:
+            import cloudinary.uploader  # Deferred: the SDK is slow to import
             cloudinary.config(cloudinary_url=CLOUDINARY_URL, secure=True)
         else:
             logger.error("CLOUDINARY_URL is not set in settings.")
@@ -538,18 +553,18 @@ def upload_pdf_to_cloudinary_base64(pdf_buffer, filename, folder_name="invoices"
         pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
         data_uri = f"data:application/pdf;base64,{pdf_base64}"
         
-        upload_result = cloudinary.uploader.upload(
-            data_uri,
-            resource_type="raw",
-            folder=folder_name,
-            public_id=filename,
-            format="pdf",
-            use_filename=True,
-            unique_filename=False
-        )
+        with span('cloudinary.upload', method='base64', folder=folder_name, bytes=len(data_uri)):
+            upload_result = cloudinary.uploader.upload(
+                data_uri,
+                resource_type="raw",
+                folder=folder_name,
+                public_id=filename,
+                format="pdf",
+                use_filename=True,
+                unique_filename=False
+            )
         
         secure_url = upload_result.get('secure_url')
-        print('base64 secure url', secure_url)
         
         if secure_url:
             logger.info(f"PDF uploaded successfully to Cloudinary using base64: {secure_url}")
@@ -612,6 +627,7 @@ def create_invoice_data(order_data, user_data, order_items):
         logger.error(f"Error creating invoice data: {str(e)}")
         return None
 
+@traced('invoice.save_to_firestore')
 def save_invoice_to_firestore(db, user_id, invoice_data, pdf_url):
     """
     Saves invoice information to Firestore invoices collection.
@@ -672,8 +688,11 @@ def save_pdf_to_disk_debug(pdf_buffer, filename="debug_invoice.pdf"):
         filename (str): The filename to save as
         
     Returns:
-        str: The file path if saved successfully, None otherwise
+        str: The file path if saved successfully, None otherwise (always None
+        unless DEBUG is on)
     """
+    if not settings.DEBUG:
+        return None
     try:
         import tempfile
         
@@ -688,8 +707,7 @@ def save_pdf_to_disk_debug(pdf_buffer, filename="debug_invoice.pdf"):
         with open(file_path, 'wb') as f:
             f.write(pdf_buffer.getvalue())
         
-        logger.info(f"Debug PDF saved to: {file_path}")
-        print(f"Debug PDF saved to: {file_path}")
+        logger.debug("Debug PDF saved to: %s", file_path)
         return file_path
         
     except Exception as e:
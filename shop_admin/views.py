@@ -1,20 +1,70 @@
-from django.http import JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from anand_mobiles.responses import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from .models import ShopAdmin
 from django.contrib.auth.hashers import make_password, check_password
 import json
 import jwt
+import time
 from .utils import admin_required, upload_image_to_cloudinary_util
+from anand_mobiles.profiling import get_sampler, collapsed_stacks, speedscope_document
 from anand_mobiles.settings import SECRET_KEY
-from firebase_admin import firestore
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
-from .page_models import PageContent
+from .page_models import PageContent, index_page, unindex_page, list_indexed_pages
+from .analytics import (
+    record_delivery_status_change,
+    summarize_rollups,
+    DAILY_COLLECTION,
+    MONTHLY_COLLECTION
+)
+from .exports import stream_export, parse_date_range, ExportError
+from .stock_sync import parse_sync_rows, sync_stock, StockSyncError
+from products.reviews import (
+    list_all_reviews,
+    list_moderation_queue,
+    delete_review_reports,
+    delete_review as delete_product_review,
+    moderation_queue_id,
+    page_size,
+    parse_bool,
+    ReviewQueryError,
+    ReviewNotFoundError,
+    ProductNotFoundError,
+    MODERATION_QUEUE_COLLECTION
+)
+from products.review_votes import delete_review_votes
+from .content_cache import (
+    cached_json_response,
+    conditional_json_response,
+    bump_content_version,
+    BANNERS,
+    LOGO,
+    FOOTER,
+    PAGES,
+    CATEGORIES,
+    PRODUCTS
+)
+from .storefront import (
+    build_home_payload,
+    load_banners,
+    load_public_banners,
+    load_logo,
+    load_footer,
+    load_categories
+)
+from shop_users.order_events import (
+    record_order_event,
+    list_order_events,
+    split_tracking_info_update,
+    OrderNotFoundError,
+    DEFAULT_EVENTS_PAGE_SIZE
+)
 
 logger = logging.getLogger(__name__)
 
-# Get Firebase client
-db = firestore.client()
+# Shared Firestore client, created on first use
+from anand_mobiles.firebase import db
 
 # Create your views here.
 @csrf_exempt
@@ -149,16 +199,38 @@ def edit_order(request, user_id, order_id):
             return JsonResponse({'error': 'User ID is required in the path.'}, status=400)
 
         order_ref = db.collection('users').document(user_id).collection('orders').document(order_id)
-        
-        if not order_ref.get().exists:
-            return JsonResponse({'error': f'Order not found for user {user_id}!'}, status=404)
 
-        
+        # Never rewrite the whole tracking_info map (and its legacy history array)
+        split_tracking_info_update(data)
         data['last_updated_by_admin_at'] = datetime.now()
-        
-        # Update order in Firebase
-        order_ref.update(data)
+
+        new_status = data.get('status') or data.get('delivery_status')
+        previous_order = None
+        if data.get('delivery_status'):
+            # Needed to move the order between delivery status counts in the rollups
+            previous_snapshot = order_ref.get()
+            if not previous_snapshot.exists:
+                return JsonResponse({'error': f'Order not found for user {user_id}!'}, status=404)
+            previous_order = previous_snapshot.to_dict()
+        if new_status:
+            # Status changes are appended to the order's event log atomically with the update
+            record_order_event(
+                db, order_ref, new_status,
+                f'Order status updated to {new_status} by admin.',
+                order_updates=data,
+                updated_by='admin',
+                admin_id=request.admin_payload.get('admin_id'),
+                notes=data.get('notes')
+            )
+            if previous_order is not None:
+                record_delivery_status_change(db, previous_order, data['delivery_status'])
+        else:
+            if not order_ref.get().exists:
+                return JsonResponse({'error': f'Order not found for user {user_id}!'}, status=404)
+            order_ref.update(data)
         return JsonResponse({'message': 'Order updated successfully!', 'user_id': user_id, 'order_id': order_id}, status=200)
+    except OrderNotFoundError:
+        return JsonResponse({'error': f'Order not found for user {user_id}!'}, status=404)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
@@ -183,10 +255,6 @@ def assign_order_to_delivery_partner(request, user_id, order_id):
             return JsonResponse({'error': 'User ID is required in the path.'}, status=400)
 
         order_ref = db.collection('users').document(user_id).collection('orders').document(order_id)
-        order_doc = order_ref.get()
-
-        if not order_doc.exists:
-            return JsonResponse({'error': f'Order not found for user {user_id}!'}, status=404)
 
         # Check if partner exists and is verified
         partner_ref = db.collection('delivery_partners').document(partner_id)
@@ -207,35 +275,131 @@ def assign_order_to_delivery_partner(request, user_id, order_id):
             'last_updated_by_admin_at': datetime.now() # Uses server-side timestamp
         }
         
-        order_data = order_doc.to_dict()
-        # Ensure status_update_history is initialized if it doesn't exist
-        tracking_info = order_data.get('tracking_info', {})
-        status_update_history = tracking_info.get('status_history', [])
-        
-        status_update_history.append({
-            'timestamp': datetime.now(),  # Use client-side timestamp for history entries
-            'updated_by': 'admin',
-            'admin_id': request.admin_payload.get('admin_id'), 
-            'assigned_partner_id': partner_id,
-            'assigned_partner_name': partner_name, # Add partner name to history
-            'description': f'Order assigned to delivery partner {partner_name} (ID: {partner_id}) by admin.'
-        })
-        
-        # Ensure tracking_info structure is correctly updated
-        if 'tracking_info' not in order_data:
-            order_data['tracking_info'] = {}
-        order_data['tracking_info']['status_history'] = status_update_history
-        
-        # Merge update_data with the modified tracking_info
-        update_data['tracking_info'] = order_data['tracking_info']
-        
-        order_ref.update(update_data)
+        # Assignment doesn't change the order status, it's recorded as an event only
+        record_order_event(
+            db, order_ref, None,
+            f'Order assigned to delivery partner {partner_name} (ID: {partner_id}) by admin.',
+            order_updates=update_data,
+            updated_by='admin',
+            admin_id=request.admin_payload.get('admin_id'),
+            assigned_partner_id=partner_id,
+            assigned_partner_name=partner_name
+        )
         return JsonResponse({'message': f'Order {order_id} for user {user_id} assigned to partner {partner_name} (ID: {partner_id}) successfully!'}, status=200)
+    except OrderNotFoundError:
+        return JsonResponse({'error': f'Order not found for user {user_id}!'}, status=404)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@csrf_exempt
+@admin_required
+def get_order_events(request, user_id, order_id):
+    """Page through the status events of a user's order, newest first (?before=<cursor>&limit=)"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method!'}, status=405)
+    try:
+        before = request.GET.get('before')
+        limit = request.GET.get('limit', DEFAULT_EVENTS_PAGE_SIZE)
+        try:
+            before = int(before) if before else None
+            limit = int(limit)
+        except ValueError:
+            return JsonResponse({'error': 'before and limit must be integers'}, status=400)
+
+        order_ref = db.collection('users').document(user_id).collection('orders').document(order_id)
+        order_doc = order_ref.get()
+        if not order_doc.exists:
+            return JsonResponse({'error': f'Order not found for user {user_id}!'}, status=404)
+
+        events, next_cursor = list_order_events(order_ref, order_doc.to_dict(), before_seq=before, limit=limit)
+        return JsonResponse({'user_id': user_id, 'order_id': order_id, 'events': events, 'next_cursor': next_cursor}, status=200)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@admin_required
+def export_data(request, dataset):
+    """
+    Stream an export of orders, users, products or inquiries.
+
+    Query params:
+    - format: csv (default) or ndjson
+    - from, to: YYYY-MM-DD date range on created_at (inclusive)
+    - fields: comma separated columns, dotted paths for nested fields
+    - gzip: 1 to compress the download
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method!'}, status=405)
+    try:
+        export_format = request.GET.get('format', 'csv').lower()
+        compress = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+        fields = [field.strip() for field in request.GET.get('fields', '').split(',') if field.strip()]
+        start, end = parse_date_range(request.GET.get('from'), request.GET.get('to'))
+
+        chunks = stream_export(db, dataset, export_format, start=start, end=end, fields=fields or None, compress=compress)
+
+        filename = f"{dataset}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+        if compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        else:
+            content_type = 'text/csv; charset=utf-8' if export_format == 'csv' else 'application/x-ndjson; charset=utf-8'
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    except ExportError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'Error exporting {dataset}: {str(e)}'}, status=500)
+
+@csrf_exempt
+@admin_required
+def get_dashboard(request):
+    """Sales dashboard built from the analytics rollups (?days=30&months=12)"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method!'}, status=405)
+    try:
+        try:
+            days = max(1, min(int(request.GET.get('days', 30)), 366))
+            months = max(1, min(int(request.GET.get('months', 12)), 36))
+        except ValueError:
+            return JsonResponse({'error': 'days and months must be integers'}, status=400)
+
+        today = datetime.now().date()
+        day_keys = [(today - timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(days - 1, -1, -1)]
+        month_keys = []
+        year, month = today.year, today.month
+        for _ in range(months):
+            month_keys.append(f'{year:04d}-{month:02d}')
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        month_keys.reverse()
+
+        # One batched read per collection; days without orders have no document
+        daily_refs = [db.collection(DAILY_COLLECTION).document(key) for key in day_keys]
+        monthly_refs = [db.collection(MONTHLY_COLLECTION).document(key) for key in month_keys]
+        daily_rollups = {doc.id: doc.to_dict() for doc in db.get_all(daily_refs) if doc.exists}
+        monthly_rollups = {doc.id: doc.to_dict() for doc in db.get_all(monthly_refs) if doc.exists}
+
+        def series_point(key, rollup):
+            return {
+                'period': key,
+                'revenue': round(rollup.get('revenue') or 0, 2),
+                'order_count': rollup.get('order_count') or 0,
+                'units_sold': rollup.get('units_sold') or 0,
+            }
+
+        return JsonResponse({
+            'range': {'from': day_keys[0], 'to': day_keys[-1], 'days': days, 'months': months},
+            'summary': summarize_rollups(list(daily_rollups.values())),
+            'daily': [series_point(key, daily_rollups.get(key, {})) for key in day_keys],
+            'monthly': [series_point(key, monthly_rollups.get(key, {})) for key in month_keys],
+        }, status=200)
+    except Exception as e:
+        return JsonResponse({'error': f'Error fetching dashboard: {str(e)}'}, status=500)
+
 # Additional admin functions using Firebase
 
 @csrf_exempt
@@ -270,6 +434,34 @@ def delete_admin(request, admin_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@csrf_exempt
+@admin_required
+def get_profiles(request):
+    """
+    Aggregated stacks from the sampling profiler (this worker process only).
+
+    GET query params:
+    - format: collapsed (default, flamegraph/speedscope text) or speedscope (JSON)
+    - view: only this view name
+    DELETE clears the collected profiles.
+    """
+    sampler = get_sampler()
+    if request.method == 'DELETE':
+        sampler.reset()
+        return JsonResponse({'message': 'Profiles cleared'})
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method!'}, status=405)
+
+    profiles, requests = sampler.snapshot(request.GET.get('view') or None)
+    profile_format = request.GET.get('format', 'collapsed').lower()
+    if profile_format == 'speedscope':
+        response = JsonResponse(speedscope_document(profiles, requests, sampler.interval * 1000))
+        response['Content-Disposition'] = 'attachment; filename="profiles.speedscope.json"'
+        return response
+    if profile_format != 'collapsed':
+        return JsonResponse({'error': 'format must be collapsed or speedscope'}, status=400)
+    return HttpResponse(collapsed_stacks(profiles), content_type='text/plain; charset=utf-8')
+
 ## Views for product management
 
 @csrf_exempt
@@ -283,6 +475,7 @@ def delete_product(request, product_id):
         product_ref = db.collection('products').document(product_id)
         if product_ref.get().exists:
             product_ref.delete()
+            bump_content_version(db, PRODUCTS)
             return JsonResponse({'message': 'Product deleted successfully!'}, status=200)
         else:
             return JsonResponse({'error': 'Product not found!'}, status=404)
@@ -314,6 +507,7 @@ def toggle_featured_product(request, product_id):
 
         # Update the product in Firebase
         product_ref.update({'featured': new_featured})
+        bump_content_version(db, PRODUCTS)
 
         return JsonResponse({'message': 'Product featured status updated!', 'featured': new_featured}, status=200)
     except Exception as e:
@@ -391,6 +585,7 @@ def add_product(request):
         # Add product to Firebase
         # The document ID will be auto-generated by Firestore
         product_ref, doc_ref = db.collection('products').add(data)
+        bump_content_version(db, PRODUCTS)
         return JsonResponse({'message': 'Product added successfully!', 'product_id': doc_ref.id}, status=201)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
@@ -460,6 +655,7 @@ def edit_product(request, product_id):
 
         # Update product in Firebase
         product_ref.update(data)
+        bump_content_version(db, PRODUCTS)
         return JsonResponse({'message': 'Product updated successfully!', 'product_id': product_id}, status=200)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
@@ -522,18 +718,8 @@ def get_all_banners(request):
     if request.method != 'GET':
         return JsonResponse({'error': 'Invalid request method!'}, status=405)
     try:
-        # Get banners from Firebase
-        banners_ref = db.collection('banners')
-        docs = banners_ref.stream()
-        banners = []
-        for doc in docs:
-            banner_data = doc.to_dict()
-            banner_data['id'] = doc.id
-            banners.append(banner_data)
-        
-        # Sort by created_at if available, otherwise by position
-        banners.sort(key=lambda x: x.get('created_at', x.get('position', 'hero')))
-        return JsonResponse({'banners': banners}, status=200)
+        # Also used by the admin panel, so clients revalidate every time (a cheap 304)
+        return cached_json_response(request, db, BANNERS, lambda: load_banners(db), key='all', max_age=0)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -580,6 +766,7 @@ def add_banner(request):
         
         # Add banner to Firebase
         doc_ref = db.collection('banners').add(banner_data)[1]
+        bump_content_version(db, BANNERS)
         return JsonResponse({'message': 'Banner added successfully!', 'banner_id': doc_ref.id}, status=201)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -621,6 +808,7 @@ def edit_banner(request, banner_id):
             
         # Update banner in Firebase
         banner_ref.update(data)
+        bump_content_version(db, BANNERS)
         return JsonResponse({'message': 'Banner updated successfully!', 'banner_id': banner_id}, status=200)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
@@ -639,6 +827,7 @@ def delete_banner(request, banner_id):
         banner_ref = db.collection('banners').document(banner_id)
         if banner_ref.get().exists:
             banner_ref.delete()
+            bump_content_version(db, BANNERS)
             return JsonResponse({'message': 'Banner deleted successfully!'}, status=200)
         else:
             return JsonResponse({'error': 'Banner not found!'}, status=404)
@@ -671,6 +860,7 @@ def toggle_banner_active(request, banner_id):
             'active': new_active,
             'updated_at': datetime.now()
         })
+        bump_content_version(db, BANNERS)
 
         return JsonResponse({'message': 'Banner status updated!', 'active': new_active}, status=200)
     except Exception as e:
@@ -682,131 +872,117 @@ def get_public_banners(request):
     if request.method != 'GET':
         return JsonResponse({'error': 'Invalid request method!'}, status=405)
     try:
-        # Get only active banners from Firebase
-        banners_ref = db.collection('banners').where('is_active', '==', True)
-        docs = banners_ref.stream()
-        
-        banners = []
-        for doc in docs:
-            banner_data = doc.to_dict()
-            banner_data['id'] = doc.id
-            banners.append(banner_data)
-        
-        # Sort by position and created_at
-        position_order = {'hero': 0, 'home-middle': 1, 'home-bottom': 2, 'category-top': 3, 'sidebar': 4}
-        banners.sort(key=lambda x: (
-            position_order.get(x.get('position', 'hero'), 999),
-            x.get('created_at', datetime.min)
-        ))
-        
-        return JsonResponse({'banners': banners}, status=200)
+        return cached_json_response(request, db, BANNERS, lambda: load_public_banners(db), key='public')
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+## Composite storefront endpoint
+
+@csrf_exempt
+def get_home(request):
+    """Banners, categories, featured products, products, logo and footer in one response"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method!'}, status=405)
+    try:
+        # Only sections whose content version moved are re-read from Firestore
+        body, etag, variants = build_home_payload(db)
+        return conditional_json_response(request, body, etag, variants=variants)
+    except Exception as e:
+        logger.error(f"Error building home payload: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
 ## Views for review management
 
+def _admin_review_filters(request):
+    """Read the shared review listing filters from the query string"""
+    min_reported = request.GET.get('min_reported')
+    try:
+        min_reported = int(min_reported) if min_reported else None
+    except ValueError:
+        raise ReviewQueryError('min_reported must be an integer')
+    return {
+        'min_reported': min_reported,
+        'verified': parse_bool(request.GET.get('verified')),
+        'date_from': request.GET.get('from'),
+        'date_to': request.GET.get('to'),
+        'start_after': request.GET.get('start_after'),
+        'limit': page_size(request.GET.get('limit'), default=20),
+    }
+
 @csrf_exempt
 @admin_required
 def get_all_product_reviews(request):
-    """Get all reviews for products that have at least one review with all review details"""
+    """Get a page of reviews across all products
+
+    Query params: min_reported, verified (true/false), from, to (YYYY-MM-DD),
+    start_after (cursor from the previous page), limit
+    """
     if request.method != 'GET':
         return JsonResponse({'error': 'Invalid request method!'}, status=405)
     
     try:
-        # Get all products from Firebase
-        products_ref = db.collection('products').stream()
-        
-        all_reviews = []
-        
-        for product_doc in products_ref:
-            product_data = product_doc.to_dict()
-            product_id = product_doc.id
-            
-            # Get reviews for this product
-            reviews_ref = db.collection('products').document(product_id).collection('reviews').order_by('created_at', direction='DESCENDING').stream()
-            
-            product_reviews = []
-            for review_doc in reviews_ref:
-                review_data = review_doc.to_dict()
-                review_data['id'] = review_doc.id
-                review_data['product_id'] = product_id
-                review_data['product_name'] = product_data.get('name', 'Unknown Product')
-                
-                # Format the created_at timestamp
-                if 'created_at' in review_data and review_data['created_at']:
-                    review_data['created_at'] = review_data['created_at'].isoformat()
-                
-                product_reviews.append(review_data)
-            
-            # Only include products that have reviews
-            if product_reviews:
-                all_reviews.extend(product_reviews)
-        
-        # Sort all reviews by created_at (most recent first)
-        all_reviews.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        
+        filters = _admin_review_filters(request)
+        reviews, next_cursor, total_count = list_all_reviews(db, with_total=True, **filters)
         return JsonResponse({
-            'reviews': all_reviews,
-            'total_count': len(all_reviews)
+            'reviews': reviews,
+            'total_count': total_count,
+            'next_cursor': next_cursor
         }, status=200)
-        
+    except ReviewQueryError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'error': f'Error fetching reviews: {str(e)}'}, status=500)
 
 @csrf_exempt
 @admin_required
 def get_reported_reviews(request):
-    """Get all reviews that have been reported by users"""
+    """Get a page of the review moderation queue, most reported first
+
+    Query params: status (pending (default), dismissed or all), start_after, limit
+    """
     if request.method != 'GET':
         return JsonResponse({'error': 'Invalid request method!'}, status=405)
     
     try:
-        # Get all products from Firebase
-        products_ref = db.collection('products').stream()
-        
-        reported_reviews = []
-        
-        for product_doc in products_ref:
-            product_data = product_doc.to_dict()
-            product_id = product_doc.id
-            
-            # Get reviews for this product that have been reported
-            reviews_ref = db.collection('products').document(product_id).collection('reviews').where('reported_count', '>', 0).order_by('reported_count', direction='DESCENDING').stream()
-            
-            for review_doc in reviews_ref:
-                review_data = review_doc.to_dict()
-                review_data['id'] = review_doc.id
-                review_data['product_id'] = product_id
-                review_data['product_name'] = product_data.get('name', 'Unknown Product')
-                
-                # Format the created_at timestamp
-                if 'created_at' in review_data and review_data['created_at']:
-                    review_data['created_at'] = review_data['created_at'].isoformat()
-                
-                # Get report details
-                reports_ref = db.collection('products').document(product_id).collection('reviews').document(review_doc.id).collection('reports').stream()
-                reports = []
-                for report_doc in reports_ref:
-                    report_data = report_doc.to_dict()
-                    report_data['id'] = report_doc.id
-                    if 'created_at' in report_data and report_data['created_at']:
-                        report_data['created_at'] = report_data['created_at'].isoformat()
-                    reports.append(report_data)
-                
-                review_data['reports'] = reports
-                reported_reviews.append(review_data)
-        
-        # Sort by reported_count (highest first) then by created_at
-        reported_reviews.sort(key=lambda x: (x.get('reported_count', 0), x.get('created_at', '')), reverse=True)
-        
+        status = request.GET.get('status', 'pending')
+        if status not in ('pending', 'dismissed', 'all'):
+            return JsonResponse({'error': 'status must be pending, dismissed or all'}, status=400)
+        reported_reviews, next_cursor, total_count = list_moderation_queue(
+            db,
+            status=None if status == 'all' else status,
+            start_after=request.GET.get('start_after'),
+            limit=page_size(request.GET.get('limit'), default=20),
+            with_total=True
+        )
         return JsonResponse({
             'reported_reviews': reported_reviews,
-            'total_count': len(reported_reviews)
+            'total_count': total_count,
+            'next_cursor': next_cursor
         }, status=200)
-        
+    except ReviewQueryError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'error': f'Error fetching reported reviews: {str(e)}'}, status=500)
 
+@csrf_exempt
+@admin_required
+def dismiss_reported_review(request, product_id, review_id):
+    """Keep a reported review and take it off the moderation queue"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method!'}, status=405)
+    try:
+        queue_ref = db.collection(MODERATION_QUEUE_COLLECTION).document(moderation_queue_id(product_id, review_id))
+        if not queue_ref.get().exists:
+            return JsonResponse({'error': 'Review is not in the moderation queue'}, status=404)
+        queue_ref.update({
+            'status': 'dismissed',
+            'dismissed_at': datetime.now(),
+            'dismissed_by': request.admin_payload.get('admin_id')
+        })
+        return JsonResponse({'message': 'Review dismissed from the moderation queue'}, status=200)
+    except Exception as e:
+        return JsonResponse({'error': f'Error dismissing review: {str(e)}'}, status=500)
+
 @csrf_exempt
 @admin_required
 def delete_review(request, product_id, review_id):
@@ -815,53 +991,23 @@ def delete_review(request, product_id, review_id):
         return JsonResponse({'error': 'Invalid request method!'}, status=405)
     
     try:
-        # Check if product exists
-        product_doc = db.collection('products').document(product_id).get()
-        if not product_doc.exists:
-            return JsonResponse({'error': 'Product not found'}, status=404)
-        
-        # Check if review exists
-        review_doc_ref = db.collection('products').document(product_id).collection('reviews').document(review_id)
-        review_doc = review_doc_ref.get()
-        
-        if not review_doc.exists:
-            return JsonResponse({'error': 'Review not found'}, status=404)
-        
-        # Delete all reports in the review's reports subcollection
-        reports_ref = review_doc_ref.collection('reports').stream()
-        for report_doc in reports_ref:
-            report_doc.reference.delete()
-        
-        # Delete the review document
-        review_doc_ref.delete()
-        
-        # Recalculate product's average rating and review count after deletion
-        remaining_reviews_ref = db.collection('products').document(product_id).collection('reviews').stream()
-        total_rating = 0
-        review_count = 0
-        
-        for remaining_review_doc in remaining_reviews_ref:
-            remaining_review = remaining_review_doc.to_dict()
-            total_rating += remaining_review.get('rating', 0)
-            review_count += 1
-        
-        # Update product document with new rating and review count
-        if review_count > 0:
-            average_rating = round(total_rating / review_count, 2)
-        else:
-            average_rating = 0
-            
-        db.collection('products').document(product_id).update({
-            'rating': average_rating,
-            'reviews_count': review_count
-        })
+        # Delete the review and update the product rating/count in one transaction
+        aggregates = delete_product_review(db, product_id, review_id)
+
+        # Then clean up its reports, moderation queue entry and helpful votes
+        delete_review_reports(db, product_id, review_id)
+        delete_review_votes(db, product_id, review_id)
         
         return JsonResponse({
             'message': 'Review deleted successfully',
-            'updated_rating': average_rating,
-            'total_reviews': review_count
+            'updated_rating': aggregates['rating'],
+            'total_reviews': aggregates['reviews_count']
         }, status=200)
         
+    except ProductNotFoundError:
+        return JsonResponse({'error': 'Product not found'}, status=404)
+    except ReviewNotFoundError:
+        return JsonResponse({'error': 'Review not found'}, status=404)
     except Exception as e:
         return JsonResponse({'error': f'Error deleting review: {str(e)}'}, status=500)
 
@@ -949,6 +1095,7 @@ def upload_logo(request):
             'updated_at': datetime.now(),
             'updated_by': request.admin
         }, merge=True)
+        bump_content_version(db, LOGO)
         
         return JsonResponse({
             'message': 'Logo uploaded successfully',
@@ -966,18 +1113,7 @@ def get_logo(request):
         return JsonResponse({'error': 'Invalid request method!'}, status=405)
     
     try:
-        # Get logo URL from settings in Firebase
-        settings_ref = db.collection('settings').document('general')
-        settings_doc = settings_ref.get()
-        
-        if not settings_doc.exists:
-            return JsonResponse({'error': 'Settings not found'}, status=404)
-            
-        settings_data = settings_doc.to_dict()
-        logo_url = settings_data.get('logo_url', '')
-        
-        return JsonResponse({'logo_url': logo_url}, status=200)
-        
+        return cached_json_response(request, db, LOGO, lambda: load_logo(db))
     except Exception as e:
         logger.error(f"Error fetching logo: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
@@ -1006,6 +1142,7 @@ def delete_logo(request):
             'updated_at': datetime.now(),
             'updated_by': request.admin
         })
+        bump_content_version(db, LOGO)
         
         # Here you could also delete the image from Cloudinary if needed
         # For now, we'll just remove the reference
@@ -1028,13 +1165,7 @@ def get_all_categories(request):
         return JsonResponse({'error': 'Invalid request method!'}, status=405)
     
     try:
-        categories_ref = db.collection('categories').order_by('name').stream()
-        categories = []
-        for doc in categories_ref:
-            category_data = doc.to_dict()
-            category_data['id'] = doc.id
-            categories.append(category_data)
-        return JsonResponse({'categories': categories}, status=200)
+        return cached_json_response(request, db, CATEGORIES, lambda: load_categories(db))
     except Exception as e:
         logger.error(f"Error fetching categories: {str(e)}")
         return JsonResponse({'error': f'Error fetching categories: {str(e)}'}, status=500)
@@ -1066,6 +1197,7 @@ def add_category(request):
             'order': data.get('order', 0),  # Default order to 0 if not provided
         }
         category_ref.set(category_data)
+        bump_content_version(db, CATEGORIES)
         category_data['id'] = category_ref.id
         return JsonResponse({'message': 'Category added successfully!', 'category': category_data}, status=201)
     except json.JSONDecodeError:
@@ -1103,6 +1235,7 @@ def edit_category(request, category_id):
 
         update_data['updated_at'] = datetime.now()
         category_ref.update(update_data)
+        bump_content_version(db, CATEGORIES)
         
         updated_category = category_ref.get().to_dict()
         updated_category['id'] = category_id
@@ -1244,6 +1377,7 @@ def update_variant_stock(request, product_id):
         
         # Update the product with new variant stock
         product_ref.update({'valid_options': valid_options})
+        bump_content_version(db, PRODUCTS)
         
         return JsonResponse({
             'message': 'Variant stock updated successfully!',
@@ -1256,6 +1390,40 @@ def update_variant_stock(request, product_id):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@csrf_exempt
+@admin_required
+def bulk_update_stock(request):
+    """Update stock and prices for many products/variants in one call
+
+    Accepts a JSON list (or {"rows": [...]}) or a CSV body (Content-Type: text/csv or ?format=csv)
+    with the columns product_id, variant_id, stock, price, discounted_price.
+    Rows without a variant_id update the product-level stock/price/discount_price.
+
+    Example:
+    [
+        {"product_id": "apple-iphone-13", "variant_id": "black-128gb", "stock": 40},
+        {"product_id": "apple-iphone-13", "variant_id": "black-256gb", "stock": 12, "discounted_price": 64900}
+    ]
+    """
+    if request.method != 'PATCH':
+        return JsonResponse({'error': 'Invalid request method! Use PATCH.'}, status=405)
+    try:
+        started = time.perf_counter()
+        rows = parse_sync_rows(request.body, request.content_type, request.GET.get('format'))
+        results, summary = sync_stock(db, rows)
+        if summary['updated']:
+            bump_content_version(db, PRODUCTS)
+        summary['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return JsonResponse({
+            'message': f"Processed {summary['rows']} rows across {summary['products']} products",
+            'summary': summary,
+            'results': results
+        }, status=207 if summary['errors'] else 200)
+    except StockSyncError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
 ## Views for footer management
 
 @csrf_exempt
@@ -1265,72 +1433,7 @@ def get_footer_config(request):
         return JsonResponse({'error': 'Invalid request method!'}, status=405)
     
     try:
-        # Get footer settings from Firebase
-        footer_ref = db.collection('settings').document('footer')
-        footer_doc = footer_ref.get()
-        
-        if footer_doc.exists:
-            footer_data = footer_doc.to_dict()
-        else:
-            # Default footer configuration
-            footer_data = {
-                'company_info': {
-                    'description': 'Your trusted electronics partner offering the latest mobiles, laptops, and accessories at competitive prices with excellent customer service.',
-                    'logo_url': '',
-                    'enabled': True
-                },
-                'contact_info': {
-                    'phone': '1800-123-4567',
-                    'email': 'info@anandmobiles.com',
-                    'address': '123 Retail Park, Main Street, Bhopal, MP - 462001',
-                    'hours': 'Mon-Sat: 10:00 AM - 8:00 PM',
-                    'enabled': False
-                },
-                'social_links': [
-                    {'name': 'Facebook', 'url': 'https://facebook.com', 'icon': 'FaFacebookF', 'enabled': True},
-                    {'name': 'Twitter', 'url': 'https://twitter.com', 'icon': 'FaTwitter', 'enabled': True},
-                    {'name': 'Instagram', 'url': 'https://instagram.com', 'icon': 'FaInstagram', 'enabled': True},
-                    {'name': 'YouTube', 'url': 'https://youtube.com', 'icon': 'FaYoutube', 'enabled': True},
-                    {'name': 'LinkedIn', 'url': 'https://linkedin.com', 'icon': 'FaLinkedinIn', 'enabled': True}
-                ],
-                'quick_links': [
-                    {'name': 'Home', 'path': '/', 'enabled': True},
-                    {'name': 'About', 'path': '/about', 'enabled': True},
-                    {'name': 'Contact', 'path': '/contact', 'enabled': True}
-                ],
-                'customer_service_links': [
-                    {'name': 'Track Your Order', 'path': '/track-order', 'enabled': True},
-                    {'name': 'Bulk Orders', 'path': '/bulk-order', 'enabled': True}
-                ],
-                'policy_links': [
-                    {'name': 'Terms & Conditions', 'path': '/terms-conditions', 'enabled': True},
-                    {'name': 'Cancellation & Refund Policy', 'path': '/cancellation-refund-policy', 'enabled': True},
-                    {'name': 'Privacy Policy', 'path': '/privacy-policy', 'enabled': True},
-                    {'name': 'Shipping & Delivery Policy', 'path': '/shipping-delivery-policy', 'enabled': True}
-                ],
-                'know_more_links': [
-                    {'name': 'Our Stores', 'path': '/our-stores', 'enabled': True},
-                    {'name': 'Service Center', 'url': 'https://www.poorvika.com/service-center', 'enabled': True}
-                ],
-                'footer_policy_links': [
-                    {'name': 'Privacy Policy', 'path': '/privacy-policy', 'enabled': True},
-                    {'name': 'Terms of Use', 'path': '/terms-conditions', 'enabled': True},
-                    {'name': 'Warranty Policy', 'path': '/warranty-policy', 'enabled': True}
-                ],
-                'whatsapp': {
-                    'number': '1234567890',
-                    'channel_url': 'https://whatsapp.com/channel/YOUR_CHANNEL_ID_HERE',
-                    'enabled': True
-                },
-                'copyright': {
-                    'text': 'Copyright © Anand mobiles | All Rights Reserved',
-                    'developer_name': 'Byteversal.in',
-                    'developer_url': 'https://byteversal.in/',
-                    'enabled': True
-                }
-            }
-        
-        return JsonResponse({'footer_config': footer_data}, status=200)
+        return cached_json_response(request, db, FOOTER, lambda: load_footer(db))
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -1351,6 +1454,7 @@ def update_footer_config(request):
         # Update footer settings in Firebase
         footer_ref = db.collection('settings').document('footer')
         footer_ref.set(footer_config)
+        bump_content_version(db, FOOTER)
         
         return JsonResponse({'message': 'Footer configuration updated successfully!'}, status=200)
     except json.JSONDecodeError:
@@ -1407,6 +1511,7 @@ def update_social_link(request, link_index):
         
         # Update in Firebase
         footer_ref.set(footer_data)
+        bump_content_version(db, FOOTER)
         
         return JsonResponse({'message': 'Social link updated successfully!'}, status=200)
     except json.JSONDecodeError:
@@ -1462,6 +1567,7 @@ def add_footer_link(request):
         
         # Update in Firebase
         footer_ref.set(footer_data)
+        bump_content_version(db, FOOTER)
         
         return JsonResponse({'message': 'Footer link added successfully!'}, status=200)
     except json.JSONDecodeError:
@@ -1498,6 +1604,7 @@ def delete_footer_link(request, section, link_index):
         
         # Update in Firebase
         footer_ref.set(footer_data)
+        bump_content_version(db, FOOTER)
         
         return JsonResponse({'message': 'Footer link deleted successfully!'}, status=200)
     except Exception as e:
@@ -1534,6 +1641,7 @@ def toggle_footer_section(request, section):
         
         # Update in Firebase
         footer_ref.set(footer_data)
+        bump_content_version(db, FOOTER)
         
         return JsonResponse({'message': f'Footer section {section} updated successfully!'}, status=200)
     except json.JSONDecodeError:
@@ -1603,8 +1711,12 @@ def update_page_content(request, page_path):
                 'is_custom': is_custom
             }
             
-            # Update the document
-            doc_ref.set(page_data)
+            # Update the document and its entry in the page index together
+            batch = db.batch()
+            batch.set(doc_ref, page_data)
+            index_page(batch, page_data)
+            batch.commit()
+            bump_content_version(db, PAGES)
             
             # Return response
             return JsonResponse({
@@ -1638,8 +1750,12 @@ def delete_page_content(request, page_path):
         if not data.get('is_custom', False):
             return JsonResponse({'error': 'Only custom pages can be deleted'}, status=403)
             
-        # Delete the page directly from Firebase
-        doc_ref.delete()
+        # Delete the page and its page index entry
+        batch = db.batch()
+        batch.delete(doc_ref)
+        unindex_page(batch, page_path)
+        batch.commit()
+        bump_content_version(db, PAGES)
         return JsonResponse({'message': 'Page deleted successfully'}, status=200)
     except Exception as e:
         logger.error(f"Error deleting page content: {str(e)}")
@@ -1649,19 +1765,19 @@ def delete_page_content(request, page_path):
 @csrf_exempt
 def public_get_page_content(request, page_path):
     """Public endpoint to get page content by path."""
+    def load_page():
+        # Directly access Firebase
+        doc_ref = db.collection('page_contents').document(page_path)
+        doc = doc_ref.get()
+        
+        if doc.exists:
+            data = doc.to_dict()
+            return {'content': data.get('content', '')}, 200
+        return {'content': ''}, 200
+
     if request.method == 'GET':
         try:
-            # Directly access Firebase
-            doc_ref = db.collection('page_contents').document(page_path)
-            doc = doc_ref.get()
-            
-            if doc.exists:
-                data = doc.to_dict()
-                return JsonResponse({
-                    'content': data.get('content', '')
-                })
-            else:
-                return JsonResponse({'content': ''})
+            return cached_json_response(request, db, PAGES, load_page, key=page_path)
         except Exception as e:
             logger.error(f"Error retrieving public page content: {str(e)}")
             return JsonResponse({'error': f'Failed to retrieve page content: {str(e)}'}, status=500)
@@ -1671,23 +1787,14 @@ def public_get_page_content(request, page_path):
 @csrf_exempt
 def list_all_pages(request):
     """Public endpoint to list all available pages."""
+    def load_pages():
+        # One read of the page index instead of streaming every page's content
+        return {'pages': list_indexed_pages()}, 200
+
     if request.method == 'GET':
         try:
-            # Get direct reference to the Firebase collection
-            page_collection = db.collection('page_contents')
-            page_docs = page_collection.stream()
-            
-            # Format the response
-            pages = []
-            for doc in page_docs:
-                data = doc.to_dict()
-                pages.append({
-                    'path': data.get('page_path', ''),
-                    'title': data.get('title', ''),
-                    'is_custom': data.get('is_custom', False)
-                })
-            
-            return JsonResponse({'pages': pages}, status=200)
+            # Page paths and the page list share a section, so one bump refreshes both
+            return cached_json_response(request, db, PAGES, load_pages, key='__list__')
         except Exception as e:
             logger.error(f"Error listing pages: {str(e)}")
             return JsonResponse({'error': f'Failed to list pages: {str(e)}'}, status=500)
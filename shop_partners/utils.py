@@ -1,8 +1,9 @@
 import jwt
 import logging
 from functools import wraps
-from django.http import JsonResponse
+from anand_mobiles.responses import JsonResponse
 from anand_mobiles.settings import SECRET_KEY # Assuming SECRET_KEY is in your project settings
+from anand_mobiles.async_utils import async_compatible
 
 # Set up logger for Partner authentication
 logger = logging.getLogger(__name__)
@@ -21,14 +22,14 @@ def partner_required(view_func):
         auth_header = request.headers.get('Authorization')
         
         if not auth_header:
-            logger.warning(f"Partner access attempt without authorization header from {request.META.get('REMOTE_ADDR')}")
+            logger.warning("Partner access attempt without authorization header from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Authorization header required',
                 'code': 'AUTH_HEADER_MISSING'
             }, status=401)
         
         if not auth_header.startswith('Bearer '):
-            logger.warning(f"Partner access attempt with invalid authorization format from {request.META.get('REMOTE_ADDR')}")
+            logger.warning("Partner access attempt with invalid authorization format from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Invalid authorization format. Expected: Bearer <token>',
                 'code': 'AUTH_FORMAT_INVALID'
@@ -39,7 +40,7 @@ def partner_required(view_func):
             if not token.strip():
                 raise IndexError("Empty token")
         except IndexError:
-            logger.warning(f"Partner access attempt with empty token from {request.META.get('REMOTE_ADDR')}")
+            logger.warning("Partner access attempt with empty token from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Authorization token is empty',
                 'code': 'TOKEN_EMPTY'
@@ -52,7 +53,7 @@ def partner_required(view_func):
             partner_id = payload.get('partner_id')
 
             if not email or not partner_id:
-                logger.warning(f"Partner token missing required fields (email or partner_id) from {request.META.get('REMOTE_ADDR')}")
+                logger.warning("Partner token missing required fields (email or partner_id) from %s", request.META.get('REMOTE_ADDR'))
                 return JsonResponse({
                     'error': 'Invalid token: missing required fields',
                     'code': 'TOKEN_INVALID_PAYLOAD'
@@ -62,29 +63,30 @@ def partner_required(view_func):
             request.partner_id = partner_id
             request.partner_payload = payload
             
-            logger.info(f"Partner '{email}' (ID: {partner_id}) authenticated successfully for {request.method} {request.path}")
+            logger.debug("Partner '%s' (ID: %s) authenticated successfully for %s %s", email, partner_id, request.method, request.path)
             
             return view_func(request, *args, **kwargs)
             
         except jwt.ExpiredSignatureError:
-            logger.info(f"Partner access attempt with expired token from {request.META.get('REMOTE_ADDR')}")
+            logger.info("Partner access attempt with expired token from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Authentication token has expired',
                 'code': 'TOKEN_EXPIRED'
             }, status=401)
             
         except jwt.InvalidTokenError as e:
-            logger.warning(f"Partner access attempt with invalid token from {request.META.get('REMOTE_ADDR')}: {str(e)}")
+            logger.warning("Partner access attempt with invalid token from %s: %s", request.META.get('REMOTE_ADDR'), e)
             return JsonResponse({
                 'error': 'Invalid authentication token',
                 'code': 'TOKEN_INVALID'
             }, status=401)
             
         except Exception as e:
-            logger.error(f"Unexpected partner authentication error from {request.META.get('REMOTE_ADDR')}: {str(e)}")
+            logger.error("Unexpected partner authentication error from %s: %s", request.META.get('REMOTE_ADDR'), e)
             return JsonResponse({
                 'error': 'Authentication service error',
                 'code': 'AUTH_SERVICE_ERROR'
             }, status=401)
     
-    return wrapper
+    # Async views get an async wrapper around the same checks
+    return async_compatible(wrapper, view_func)
@@ -1,15 +1,16 @@
-from django.http import JsonResponse
+from anand_mobiles.responses import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 import jwt
 from datetime import datetime, timedelta
-from firebase_admin import firestore
 from anand_mobiles.settings import SECRET_KEY # Assuming SECRET_KEY is in your project settings
 from .utils import partner_required # Import the new decorator
 from shop_admin.utils import admin_required # For admin verification
+from shop_users.order_events import record_order_event
+from shop_admin.analytics import record_delivery_status_change
 
-# Get Firebase client
-db = firestore.client()
+# Shared Firestore client, created on first use
+from anand_mobiles.firebase import db
 PARTNERS_COLLECTION = 'delivery_partners'
 
 @csrf_exempt
@@ -285,10 +286,8 @@ def update_order_status_by_partner(request, order_id): # Renamed from update_del
             if order_data.get('delivery_status') in ['delivered', 'cancelled_by_admin', 'cancelled_by_user']:
                  return JsonResponse({'error': f'Order is already in a final state: {order_data.get("delivery_status")}'}, status=400)
 
-            # Update the delivery status and add a timestamped history entry
-            # Use tracking_info.status_history to align with admin logic
-            tracking_info = order_data.get('tracking_info', {})
-            status_history = tracking_info.get('status_history', [])            # Add new status entry to tracking_info.status_history
+            # Status history is appended to the order's event log rather than
+            # rewriting tracking_info.status_history
             status_description = f'Order status updated to {new_status} by delivery partner.'
             
             # Handle 'other' status and extract the custom status text
@@ -300,37 +299,18 @@ def update_order_status_by_partner(request, order_id): # Renamed from update_del
             else:
                 history_entry_status = new_status
             
-            history_entry = {
-                'timestamp': datetime.now(),
-                'updated_by': 'partner',
-                'partner_id': partner_id,
-                'status': history_entry_status,
-                'description': status_description
-            }
-            
-            if notes:
-                history_entry['notes'] = notes
-            if estimated_delivery:
-                history_entry['estimated_delivery'] = estimated_delivery
-            status_history.append(history_entry)            # Get the existing tracking info or create a new one
-            tracking_info = order_data.get('tracking_info', {})
-            
-            # Set the status history
-            tracking_info['status_history'] = status_history
-            
             # Prepare the update payload
             update_payload = {
                 'delivery_status': new_status,
-                'tracking_info': tracking_info,
                 'last_updated_by_partner_at': datetime.now() # Specific timestamp for partner update
             }
             
             # If carrier and tracking number are provided, add them to tracking_info
             if carrier:
-                update_payload['tracking_info']['carrier'] = carrier
+                update_payload['tracking_info.carrier'] = carrier
             
             if tracking_number:
-                update_payload['tracking_info']['tracking_number'] = tracking_number
+                update_payload['tracking_info.tracking_number'] = tracking_number
                 # Create a tracking URL if carrier is recognized
                 if carrier and carrier.lower() in ['fedex', 'ups', 'usps', 'dhl']:
                     tracking_url = ""
@@ -344,7 +324,7 @@ def update_order_status_by_partner(request, order_id): # Renamed from update_del
                         tracking_url = f"https://www.dhl.com/en/express/tracking.html?AWB={tracking_number}"
                     
                     if tracking_url:
-                        update_payload['tracking_info']['tracking_url'] = tracking_url
+                        update_payload['tracking_info.tracking_url'] = tracking_url
             
             # If estimated delivery date is provided, add it to the update payload
             if estimated_delivery:
@@ -354,7 +334,15 @@ def update_order_status_by_partner(request, order_id): # Renamed from update_del
             if new_status == 'delivered':
                 update_payload['delivered_at'] = datetime.now()
             
-            order_ref.update(update_payload)
+            record_order_event(
+                db, order_ref, history_entry_status, status_description,
+                order_updates=update_payload,
+                updated_by='partner',
+                partner_id=partner_id,
+                notes=notes or None,
+                estimated_delivery=estimated_delivery
+            )
+            record_delivery_status_change(db, order_data, new_status)
             return JsonResponse({'message': f'Delivery status for order {order_id} updated to {new_status}.'})
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
@@ -0,0 +1,200 @@
+"""
+Saved addresses and the user's default address.
+
+The default address is tracked as `default_address_id` on the user document.
+Adding, updating, deleting or switching the default runs in one transaction that
+reads the user document, writes the address, moves the pointer and flips
+`is_default` on the old and new default: one write per affected address, no
+query over the addresses collection.
+
+`is_default` is still kept on each address document so existing clients that read
+it keep working, but the pointer is the source of truth. Users created before the
+pointer existed have no `default_address_id` field; for them the legacy
+is_default query runs once, inside the transaction, and the pointer is written
+on their next address change.
+
+Orders embed an address_snapshot() when they are created, so order detail never
+needs to read the address collection.
+"""
+from datetime import datetime
+from firebase_admin import firestore
+
+ADDRESSES_COLLECTION = 'addresses'
+DEFAULT_ADDRESS_FIELD = 'default_address_id'
+ADDRESS_FIELDS = ['type', 'street_address', 'city', 'state', 'postal_code', 'phone_number']
+# Extra fields some clients send and orders should keep
+OPTIONAL_ADDRESS_FIELDS = ['name', 'landmark']
+
+
+class AddressNotFoundError(Exception):
+    """Raised when an address does not exist for the user"""
+    pass
+
+
+def user_ref(db, user_id):
+    return db.collection('users').document(user_id)
+
+
+def address_ref(db, user_id, address_id):
+    return user_ref(db, user_id).collection(ADDRESSES_COLLECTION).document(address_id)
+
+
+def address_snapshot(address_id, address_data):
+    """Copy of an address to embed in an order"""
+    snapshot = {
+        field: address_data.get(field)
+        for field in ADDRESS_FIELDS + OPTIONAL_ADDRESS_FIELDS
+        if address_data.get(field) is not None
+    }
+    snapshot['id'] = address_id
+    return snapshot
+
+
+def _current_default_id(transaction, user_doc_ref, user_data):
+    if DEFAULT_ADDRESS_FIELD in user_data:
+        return user_data[DEFAULT_ADDRESS_FIELD]
+    # Not migrated yet: find the flagged address the old way
+    legacy_query = user_doc_ref.collection(ADDRESSES_COLLECTION).where('is_default', '==', True).limit(1)
+    for addr_doc in transaction.get(legacy_query):
+        return addr_doc.id
+    return None
+
+
+def _move_default(transaction, user_doc_ref, previous_id, new_id):
+    """Point the user at new_id (or None) and flip is_default on the affected addresses"""
+    addresses = user_doc_ref.collection(ADDRESSES_COLLECTION)
+    if previous_id and previous_id != new_id:
+        transaction.update(addresses.document(previous_id), {'is_default': False})
+    transaction.set(user_doc_ref, {DEFAULT_ADDRESS_FIELD: new_id}, merge=True)
+
+
+def _read_user(transaction, user_doc_ref):
+    user_doc = user_doc_ref.get(transaction=transaction)
+    return user_doc.to_dict() if user_doc.exists else {}
+
+
+@firestore.transactional
+def _add_address(transaction, user_doc_ref, new_address_ref, payload, make_default):
+    user_data = _read_user(transaction, user_doc_ref)
+    previous_id = _current_default_id(transaction, user_doc_ref, user_data)
+    payload['is_default'] = bool(make_default)
+    transaction.create(new_address_ref, payload)
+    if make_default:
+        _move_default(transaction, user_doc_ref, previous_id, new_address_ref.id)
+    elif DEFAULT_ADDRESS_FIELD not in user_data:
+        _move_default(transaction, user_doc_ref, None, previous_id)
+    return payload
+
+
+def add_address(db, user_id, data, make_default=False):
+    """
+    Create an address, optionally making it the user's default.
+
+    Returns:
+        tuple: (address_id, stored address dict)
+    """
+    now = datetime.now()
+    payload = {field: data[field] for field in ADDRESS_FIELDS + OPTIONAL_ADDRESS_FIELDS if field in data}
+    payload['created_at'] = now
+    payload['updated_at'] = now
+    user_doc_ref = user_ref(db, user_id)
+    new_address_ref = user_doc_ref.collection(ADDRESSES_COLLECTION).document()
+    stored = _add_address(db.transaction(), user_doc_ref, new_address_ref, payload, make_default)
+    return new_address_ref.id, stored
+
+
+@firestore.transactional
+def _update_address(transaction, user_doc_ref, target_ref, updates, make_default):
+    user_data = _read_user(transaction, user_doc_ref)
+    previous_id = _current_default_id(transaction, user_doc_ref, user_data)
+    target_doc = target_ref.get(transaction=transaction)
+    if not target_doc.exists:
+        raise AddressNotFoundError(target_ref.id)
+
+    updates = dict(updates)
+    if make_default is True:
+        updates['is_default'] = True
+        _move_default(transaction, user_doc_ref, previous_id, target_ref.id)
+    elif make_default is False and previous_id == target_ref.id:
+        updates['is_default'] = False
+        _move_default(transaction, user_doc_ref, None, None)
+    else:
+        updates['is_default'] = previous_id == target_ref.id
+        if DEFAULT_ADDRESS_FIELD not in user_data:
+            _move_default(transaction, user_doc_ref, None, previous_id)
+    transaction.update(target_ref, updates)
+
+    address_data = target_doc.to_dict()
+    address_data.update(updates)
+    return address_data
+
+
+def update_address(db, user_id, address_id, updates, make_default=None):
+    """
+    Update an address's fields and, when make_default is True/False, its default status.
+
+    Raises:
+        AddressNotFoundError: If the address does not exist
+
+    Returns:
+        dict: The address after the update
+    """
+    updates = dict(updates)
+    updates['updated_at'] = datetime.now()
+    user_doc_ref = user_ref(db, user_id)
+    return _update_address(db.transaction(), user_doc_ref, address_ref(db, user_id, address_id), updates, make_default)
+
+
+def set_default_address(db, user_id, address_id):
+    """
+    Make an address the user's default.
+
+    Raises:
+        AddressNotFoundError: If the address does not exist
+    """
+    return update_address(db, user_id, address_id, {}, make_default=True)
+
+
+@firestore.transactional
+def _delete_address(transaction, user_doc_ref, target_ref):
+    user_data = _read_user(transaction, user_doc_ref)
+    previous_id = _current_default_id(transaction, user_doc_ref, user_data)
+    if not target_ref.get(transaction=transaction).exists:
+        raise AddressNotFoundError(target_ref.id)
+    transaction.delete(target_ref)
+    if previous_id == target_ref.id:
+        # No automatic replacement; the user picks a new default
+        _move_default(transaction, user_doc_ref, None, None)
+    elif DEFAULT_ADDRESS_FIELD not in user_data:
+        _move_default(transaction, user_doc_ref, None, previous_id)
+
+
+def delete_address(db, user_id, address_id):
+    """
+    Delete an address, clearing the default pointer if it was the default.
+
+    Raises:
+        AddressNotFoundError: If the address does not exist
+    """
+    _delete_address(db.transaction(), user_ref(db, user_id), address_ref(db, user_id, address_id))
+
+
+def list_addresses(db, user_id):
+    """All of a user's addresses, default first"""
+    user_doc_ref = user_ref(db, user_id)
+    user_doc = user_doc_ref.get()
+    user_data = user_doc.to_dict() if user_doc.exists else {}
+
+    addresses = []
+    for addr_doc in user_doc_ref.collection(ADDRESSES_COLLECTION).stream():
+        address_data = addr_doc.to_dict()
+        address_data['id'] = addr_doc.id
+        addresses.append(address_data)
+
+    if DEFAULT_ADDRESS_FIELD in user_data:
+        default_id = user_data[DEFAULT_ADDRESS_FIELD]
+        for address_data in addresses:
+            address_data['is_default'] = address_data['id'] == default_id
+    # Stable sort keeps the remaining addresses in document order
+    addresses.sort(key=lambda address_data: not address_data.get('is_default'))
+    return addresses
@@ -0,0 +1,108 @@
+"""
+Async versions of the read-heavy user endpoints, used when ASYNC_VIEWS is on (ASGI).
+
+Response building is shared with shop_users.views; here the per-item product reads
+and the order/event reads are issued concurrently with asyncio.gather.
+"""
+import asyncio
+
+from anand_mobiles.responses import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from anand_mobiles.async_utils import get_async_db
+from shop_users.utils import user_required
+from shop_users.order_events import events_page_query, assemble_events_page
+from .views import (
+    cart_item_payload,
+    wishlist_item_payload,
+    order_summary_payload,
+    order_details_payload,
+    user_orders_query
+)
+
+
+async def _join_products(adb, item_docs):
+    """Fetch each distinct product referenced by the items concurrently"""
+    product_ids = list(dict.fromkeys(item_doc.to_dict().get('product_id') for item_doc in item_docs))
+    product_docs = await asyncio.gather(
+        *(adb.collection('products').document(product_id).get() for product_id in product_ids)
+    )
+    return dict(zip(product_ids, product_docs))
+
+
+@user_required
+@csrf_exempt
+async def get_cart(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    try:
+        adb = get_async_db()
+        item_docs = await adb.collection('users').document(request.user_id).collection('cart').get()
+        products = await _join_products(adb, item_docs)
+        cart = [cart_item_payload(item_doc, products[item_doc.to_dict().get('product_id')]) for item_doc in item_docs]
+        return JsonResponse({'cart': cart}, status=200)
+
+    except Exception as e:
+        return JsonResponse({'error': f'Error getting cart: {str(e)}'}, status=500)
+
+
+@user_required
+@csrf_exempt
+async def get_wishlist(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    try:
+        adb = get_async_db()
+        item_docs = await adb.collection('users').document(request.user_id).collection('wishlist').get()
+        products = await _join_products(adb, item_docs)
+        wishlist = [wishlist_item_payload(item_doc, products[item_doc.to_dict().get('product_id')]) for item_doc in item_docs]
+        return JsonResponse({'wishlist': wishlist}, status=200)
+
+    except Exception as e:
+        return JsonResponse({'error': f'Error getting wishlist: {str(e)}'}, status=500)
+
+
+@user_required
+@csrf_exempt
+async def get_user_orders(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    try:
+        order_docs = await user_orders_query(get_async_db(), request.user_id).get()
+        return JsonResponse({'orders': [order_summary_payload(order_doc) for order_doc in order_docs]}, status=200)
+
+    except Exception as e:
+        return JsonResponse({'error': f'Error fetching orders: {str(e)}'}, status=500)
+
+
+@user_required
+@csrf_exempt
+async def get_order_details(request, order_id):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    try:
+        user_id = request.user_id
+        order_doc_ref = get_async_db().collection('users').document(user_id).collection('orders').document(order_id)
+        # The latest event page is fetched alongside the order; it is ignored for
+        # orders that predate the event log
+        order_doc, event_docs = await asyncio.gather(
+            order_doc_ref.get(),
+            events_page_query(order_doc_ref).get(),
+        )
+
+        if not order_doc.exists:
+            return JsonResponse({'error': 'Order not found or access denied'}, status=404)
+
+        order_data = order_doc.to_dict()
+        if order_data.get('user_id') != user_id:
+            return JsonResponse({'error': 'Order not found or access denied'}, status=404)
+
+        status_history, next_cursor = assemble_events_page(event_docs, order_data)
+        return JsonResponse({'order_details': order_details_payload(order_data, status_history, next_cursor)}, status=200)
+
+    except Exception as e:
+        return JsonResponse({'error': f'Error fetching order details: {str(e)}'}, status=500)
@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
 from firebase_admin import auth as firebase_auth
+from anand_mobiles.firebase import get_app
 from firebase_admin.exceptions import FirebaseError
 
 User = get_user_model()
@@ -18,7 +19,7 @@ class FirebaseAuthenticationBackend(ModelBackend):
             
         try:
             # Verify the Firebase ID token
-            decoded_token = firebase_auth.verify_id_token(firebase_id_token)
+            decoded_token = firebase_auth.verify_id_token(firebase_id_token, app=get_app())
             uid = decoded_token['uid']
             
             # Try to find user with this Firebase UID
@@ -28,7 +29,7 @@ class FirebaseAuthenticationBackend(ModelBackend):
             except User.DoesNotExist:
                 # If user doesn't exist, we need to create one based on the Firebase user
                 try:
-                    firebase_user = firebase_auth.get_user(uid)
+                    firebase_user = firebase_auth.get_user(uid, app=get_app())
                     return User.create_firebase_user(firebase_user)
                 except FirebaseError:
                     return None
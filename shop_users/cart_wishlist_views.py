@@ -1,12 +1,11 @@
-from django.http import JsonResponse
+from anand_mobiles.responses import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from firebase_admin import firestore
 from shop_users.utils import user_required
 import json
 from datetime import datetime
 
-# Get Firebase client
-db = firestore.client()
+# Shared Firestore client, created on first use
+from anand_mobiles.firebase import db
 
 @user_required
 @csrf_exempt
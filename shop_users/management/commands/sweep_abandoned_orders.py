@@ -0,0 +1,218 @@
+"""
+Archive and delete abandoned checkout orders and long-idle cart items.
+
+create_razorpay_order writes a `pending_payment` order for every checkout attempt.
+Orders that never got paid are found with a collection-group query on status and
+age, written to a gzip NDJSON archive, and only then deleted (together with their
+events subcollection) using parallel batched writes. Cart items whose
+`updated_at` is older than the cart cutoff get the same treatment.
+
+Each delete carries a last_update_time precondition from the archived snapshot, so
+an order paid (or a cart item changed) between the two phases is skipped rather
+than deleted. A record's writes never span batches, so a skipped order keeps its
+events too.
+
+Run it from cron, e.g. hourly:
+    python manage.py sweep_abandoned_orders --order-age-hours 48 --cart-age-days 60
+
+Required indexes are listed in firestore.indexes.json.
+"""
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from google.api_core import exceptions
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+from anand_mobiles.firebase import get_db
+from anand_mobiles.firestore_utils import (
+    MAX_BATCH_SIZE, apply_operations, run_in_parallel, stream_query_pages, to_ndjson_line,
+)
+from shop_users.order_events import EVENTS_COLLECTION, _event_doc_id
+
+
+def _rfc3339(timestamp):
+    # Nanosecond precision: the precondition must match the stored update time exactly
+    if not isinstance(timestamp, DatetimeWithNanoseconds):
+        timestamp = DatetimeWithNanoseconds(
+            timestamp.year, timestamp.month, timestamp.day, timestamp.hour, timestamp.minute,
+            timestamp.second, timestamp.microsecond, tzinfo=timestamp.tzinfo)
+    return timestamp.rfc3339()
+
+
+class Command(BaseCommand):
+    help = 'Archive and delete abandoned pending_payment orders and idle cart items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order-age-hours', type=float, default=48,
+                            help='Sweep pending_payment orders older than this many hours (default: 48)')
+        parser.add_argument('--cart-age-days', type=float, default=60,
+                            help='Sweep cart items not updated for this many days (default: 60)')
+        parser.add_argument('--archive-dir', default=str(settings.BASE_DIR / 'archives'),
+                            help='Directory for the gzip NDJSON archives')
+        parser.add_argument('--page-size', type=int, default=500, help='Documents read per query page')
+        parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE,
+                            help=f'Writes per batch (max {MAX_BATCH_SIZE})')
+        parser.add_argument('--workers', type=int, default=8, help='Batches committed in parallel')
+        parser.add_argument('--skip-orders', action='store_true', help='Do not sweep orders')
+        parser.add_argument('--skip-carts', action='store_true', help='Do not sweep cart items')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Write the archive but do not delete anything')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        os.makedirs(options['archive_dir'], exist_ok=True)
+        run_stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+
+        if not options['skip_orders']:
+            cutoff = datetime.now() - timedelta(hours=options['order_age_hours'])
+            query = (db.collection_group('orders')
+                     .where('status', '==', 'pending_payment')
+                     .where('created_at', '<', cutoff))
+            self._sweep(db, 'orders', query, 'created_at', cutoff, run_stamp, options,
+                        delete_paths=self._order_delete_paths)
+
+        if not options['skip_carts']:
+            cutoff = datetime.now() - timedelta(days=options['cart_age_days'])
+            query = db.collection_group('cart').where('updated_at', '<', cutoff)
+            self._sweep(db, 'cart', query, 'updated_at', cutoff, run_stamp, options,
+                        delete_paths=lambda record: [record['path']])
+
+    @staticmethod
+    def _order_delete_paths(record):
+        # Event IDs are sequential, so the subcollection can be deleted without reading it
+        paths = [
+            f"{record['path']}/{EVENTS_COLLECTION}/{_event_doc_id(seq)}"
+            for seq in range(1, (record['data'].get('event_count') or 0) + 1)
+        ]
+        paths.append(record['path'])
+        return paths
+
+    def _sweep(self, db, label, query, order_field, cutoff, run_stamp, options, delete_paths):
+        archive_path = os.path.join(options['archive_dir'], f'{label}-{run_stamp}.ndjson.gz')
+        self.stdout.write(f'Sweeping {label} older than {cutoff:%Y-%m-%d %H:%M} -> {archive_path}')
+
+        # Phase 1: archive. The file is closed before anything is deleted.
+        started = time.perf_counter()
+        archived = 0
+        with gzip.open(archive_path, 'wt', encoding='utf-8') as archive:
+            for doc in stream_query_pages(query, page_size=options['page_size'], order_field=order_field):
+                archive.write(to_ndjson_line({
+                    'path': doc.reference.path,
+                    'id': doc.id,
+                    'update_time': _rfc3339(doc.update_time),
+                    'data': doc.to_dict(),
+                }))
+                archived += 1
+        scan_seconds = time.perf_counter() - started
+
+        if archived == 0:
+            os.remove(archive_path)
+            self.stdout.write(f'  No {label} to sweep')
+            return
+
+        self.stdout.write(f'  Archived {archived} {label} docs in {scan_seconds:.2f}s '
+                          f'({archived / max(scan_seconds, 1e-6):.0f} docs/s)')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('  Dry run: nothing deleted'))
+            return
+
+        # Phase 2: delete by replaying the archive, so memory use doesn't grow with the sweep
+        def record_operations():
+            with gzip.open(archive_path, 'rt', encoding='utf-8') as archive:
+                for line in archive:
+                    record = json.loads(line)
+                    unchanged = db.write_option(
+                        last_update_time=DatetimeWithNanoseconds.from_rfc3339(record['update_time']))
+                    paths = delete_paths(record)
+                    # The document itself (last path) only if it is as archived
+                    yield [('delete', db.document(path)) for path in paths[:-1]] + \
+                        [('delete', db.document(paths[-1]), unchanged)]
+
+        # Firestore rejects batches over MAX_BATCH_SIZE writes
+        batch_size = max(1, min(options['batch_size'], MAX_BATCH_SIZE))
+        stats = self._delete_records(db, record_operations(), batch_size, options['workers'])
+        elapsed = stats['elapsed_seconds']
+        self.stdout.write(
+            f"  Deleted {stats['committed']} docs in {stats['batches']} batches, {elapsed:.2f}s "
+            f"({stats['committed'] / max(elapsed, 1e-6):.0f} deletes/s)"
+        )
+        if stats['skipped']:
+            self.stdout.write(self.style.WARNING(
+                f"  Skipped {stats['skipped']} {label} changed since they were archived"
+            ))
+        if stats['failed']:
+            for error in stats['errors']:
+                self.stderr.write(f'  {error}')
+            self.stdout.write(self.style.ERROR(
+                f"  {stats['failed']} deletes failed; re-run the sweep to retry them"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'  {label} sweep complete'))
+
+    @staticmethod
+    def _record_batches(records, batch_size):
+        """Group per-record operation lists into batches of at most batch_size writes"""
+        batch, size = [], 0
+        for operations in records:
+            # A pending order has a handful of events, so a record fits in one batch
+            if batch and size + len(operations) > batch_size:
+                yield batch
+                batch, size = [], 0
+            batch.append(operations)
+            size += len(operations)
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _delete_records(db, records, batch_size, workers):
+        """
+        Commit each record's deletes atomically, skipping records whose precondition fails.
+
+        Returns:
+            dict: committed (documents), skipped (records), failed (documents), batches,
+            errors and elapsed_seconds
+        """
+        stats = {'committed': 0, 'skipped': 0, 'failed': 0, 'batches': 0, 'errors': [], 'elapsed_seconds': 0.0}
+        started = time.perf_counter()
+
+        def commit(operations):
+            batch = db.batch()
+            apply_operations(batch, operations)
+            batch.commit()
+
+        def commit_batch(batch_records):
+            try:
+                commit([operation for operations in batch_records for operation in operations])
+                return sum(len(operations) for operations in batch_records), 0
+            except exceptions.FailedPrecondition:
+                pass
+            # A record changed since it was archived; the whole batch was rejected, so
+            # commit its records one by one and skip the changed ones
+            committed = skipped = 0
+            for operations in batch_records:
+                try:
+                    commit(operations)
+                    committed += len(operations)
+                except exceptions.FailedPrecondition:
+                    skipped += 1
+            return committed, skipped
+
+        batches = enumerate(Command._record_batches(records, batch_size))
+        for (index, batch_records), result, error in run_in_parallel(lambda item: commit_batch(item[1]), batches,
+                                                                     max_workers=workers):
+            stats['batches'] += 1
+            if error is None:
+                stats['committed'] += result[0]
+                stats['skipped'] += result[1]
+            else:
+                stats['failed'] += sum(len(operations) for operations in batch_records)
+                stats['errors'].append(f'Batch {index}: {error}')
+
+        stats['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+        return stats
@@ -0,0 +1,237 @@
+"""
+Append-only event log for orders.
+
+Status changes are stored as individual documents under
+users/{user_id}/orders/{order_id}/events instead of being appended to the
+tracking_info.status_history array on the order document. The order itself only
+keeps a compact `current_status` map and an `event_count` sequence number, both
+updated in the same transaction as the event write so concurrent updates never
+lose an event.
+
+Orders created before the event log still carry the legacy status_history array;
+those entries are served as events 1..N and new events continue numbering after them.
+"""
+import logging
+from datetime import datetime
+from firebase_admin import firestore
+
+from anand_mobiles.firestore_utils import apply_operations
+
+logger = logging.getLogger(__name__)
+
+EVENTS_COLLECTION = 'events'
+DEFAULT_EVENTS_PAGE_SIZE = 20
+MAX_EVENTS_PAGE_SIZE = 100
+
+
+class OrderNotFoundError(Exception):
+    """Raised when an event is recorded against an order that does not exist"""
+    pass
+
+
+def _event_doc_id(seq):
+    # Zero-padded so the document IDs sort in append order
+    return f"{seq:010d}"
+
+
+def _legacy_history(order_data):
+    tracking_info = order_data.get('tracking_info') or {}
+    return tracking_info.get('status_history') or []
+
+
+def _build_event(seq, status, description, details):
+    event = {
+        'seq': seq,
+        'status': status,
+        'description': description,
+        'timestamp': datetime.now(),
+    }
+    event.update({key: value for key, value in details.items() if value is not None})
+    return event
+
+
+def _current_status(event, previous_status):
+    return {
+        # Events such as a partner assignment don't change the status
+        'status': event.get('status') or previous_status,
+        'description': event.get('description'),
+        'timestamp': event['timestamp'],
+        'seq': event['seq'],
+    }
+
+
+def add_initial_order_event(batch, order_ref, status, description, **details):
+    """
+    Queue the first event of a newly created order on an existing write batch.
+
+    Args:
+        batch: Firestore WriteBatch that also creates the order document
+        order_ref: DocumentReference of the new order
+        status (str): Initial order status
+        description (str): Human readable description of the event
+        **details: Extra fields stored on the event document
+
+    Returns:
+        dict: Fields to merge into the new order document (event_count, current_status)
+    """
+    event = _build_event(1, status, description, details)
+    batch.create(order_ref.collection(EVENTS_COLLECTION).document(_event_doc_id(1)), event)
+    return {
+        'event_count': 1,
+        'current_status': _current_status(event, status),
+    }
+
+
+@firestore.transactional
+def _append_event_in_transaction(transaction, order_ref, status, description, order_updates, writes, skip_if,
+                                 details):
+    snapshot = order_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        raise OrderNotFoundError(f'Order {order_ref.id} not found')
+
+    order_data = snapshot.to_dict()
+    if skip_if is not None and skip_if(order_data):
+        return None
+    last_seq = order_data.get('event_count')
+    if last_seq is None:
+        # Legacy order: keep numbering after the entries of the old history array
+        last_seq = len(_legacy_history(order_data))
+    seq = last_seq + 1
+
+    previous_status = (order_data.get('current_status') or {}).get('status') or order_data.get('status')
+    event = _build_event(seq, status, description, details)
+
+    transaction.create(order_ref.collection(EVENTS_COLLECTION).document(_event_doc_id(seq)), event)
+
+    update_payload = dict(order_updates)
+    update_payload['event_count'] = seq
+    update_payload['current_status'] = _current_status(event, previous_status)
+    transaction.update(order_ref, update_payload)
+    apply_operations(transaction, writes)
+
+    # A copy: the event dict was handed to transaction.create()
+    return {**event, 'event_id': _event_doc_id(seq)}
+
+
+def order_is_paid(order_data):
+    """Whether a payment was captured for the order, whatever its delivery status is now"""
+    # Orders paid before paid_at was recorded have the capture time in payment_details
+    return bool(order_data.get('paid_at') or (order_data.get('payment_details') or {}).get('captured_at'))
+
+
+def record_order_event(db, order_ref, status, description, order_updates=None, writes=None, skip_if=None,
+                       **details):
+    """
+    Append an event to an order and refresh its current_status in one transaction.
+
+    Args:
+        db: Firestore database client
+        order_ref: DocumentReference of the order
+        status (str): Status recorded on the event, or None if the event doesn't change the status
+        description (str): Human readable description of the event
+        order_updates (dict): Other order fields to update atomically with the event
+        writes (list): Other writes to commit atomically with the event, as
+            firestore_utils.apply_operations tuples (e.g. stock updates, cart deletes)
+        skip_if (callable): Called with the order data as read in the transaction; if it
+            returns True nothing is written
+        **details: Extra fields stored on the event document (updated_by, partner_id, notes, ...)
+
+    Returns:
+        dict: The event that was written, or None if skip_if skipped it
+
+    Raises:
+        OrderNotFoundError: If the order document does not exist
+    """
+    transaction = db.transaction()
+    return _append_event_in_transaction(transaction, order_ref, status, description, order_updates or {},
+                                        writes or [], skip_if, details)
+
+
+def split_tracking_info_update(update_data):
+    """
+    Rewrite a `tracking_info` map in an update payload as dotted field paths.
+
+    Updating the whole map would replace (or wipe) the legacy status_history array,
+    so only the individual tracking fields are sent and status_history is dropped;
+    history is written through record_order_event instead.
+    """
+    tracking_info = update_data.pop('tracking_info', None)
+    if isinstance(tracking_info, dict):
+        for key, value in tracking_info.items():
+            if key != 'status_history':
+                update_data[f'tracking_info.{key}'] = value
+    return update_data
+
+
+def _format_event(event):
+    timestamp = event.get('timestamp')
+    if timestamp and hasattr(timestamp, 'strftime'):
+        event['timestamp_formatted'] = timestamp.strftime('%m/%d/%Y at %I:%M %p')
+    return event
+
+
+def list_order_events(order_ref, order_data, before_seq=None, limit=DEFAULT_EVENTS_PAGE_SIZE):
+    """
+    Page through an order's events, newest first.
+
+    Args:
+        order_ref: DocumentReference of the order
+        order_data (dict): The order document data (used for legacy history and the event count)
+        before_seq (int): Only return events older than this sequence number (the cursor)
+        limit (int): Maximum number of events to return
+
+    Returns:
+        tuple: (events in chronological order, cursor for the next older page or None)
+    """
+    limit = max(1, min(int(limit), MAX_EVENTS_PAGE_SIZE))
+    event_docs = []
+    if order_data.get('event_count'):
+        event_docs = events_page_query(order_ref, before_seq, limit).stream()
+    return assemble_events_page(event_docs, order_data, before_seq, limit)
+
+
+def events_page_query(order_ref, before_seq=None, limit=DEFAULT_EVENTS_PAGE_SIZE):
+    """Query for one page of event documents, newest first (one extra to detect more)"""
+    limit = max(1, min(int(limit), MAX_EVENTS_PAGE_SIZE))
+    query = order_ref.collection(EVENTS_COLLECTION)
+    if before_seq is not None:
+        query = query.where('seq', '<', before_seq)
+    return query.order_by('seq', direction=firestore.Query.DESCENDING).limit(limit + 1)
+
+
+def assemble_events_page(event_docs, order_data, before_seq=None, limit=DEFAULT_EVENTS_PAGE_SIZE):
+    """
+    Combine fetched event documents with the legacy history into a page.
+
+    Lets async callers fetch the event page concurrently with the order itself.
+
+    Returns:
+        tuple: (events in chronological order, cursor for the next older page or None)
+    """
+    limit = max(1, min(int(limit), MAX_EVENTS_PAGE_SIZE))
+    legacy_history = _legacy_history(order_data)
+    events = []
+
+    # Event documents only exist once the order has an event count
+    if order_data.get('event_count'):
+        for event_doc in event_docs:
+            event = event_doc.to_dict()
+            event['event_id'] = event_doc.id
+            events.append(event)
+
+    # Top up from the legacy array once the event documents are exhausted
+    if len(events) <= limit and legacy_history:
+        upper = len(legacy_history) if before_seq is None else min(before_seq - 1, len(legacy_history))
+        for seq in range(upper, 0, -1):
+            if len(events) > limit:
+                break
+            event = dict(legacy_history[seq - 1])
+            event['seq'] = seq
+            events.append(event)
+
+    has_more = len(events) > limit
+    events = events[:limit]
+    next_cursor = events[-1]['seq'] if has_more and events else None
+
+    events.reverse()
+    return [_format_event(event) for event in events], next_cursor
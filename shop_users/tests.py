@@ -1,3 +1,190 @@
-from django.test import TestCase
+import json
+import types
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from django.conf import settings
+from django.test import Client, SimpleTestCase, override_settings
+from google.api_core import exceptions
+
+from anand_mobiles import fake_firestore
+
+
+def fake_razorpay(amount_paise):
+    """A razorpay module whose signatures always verify"""
+    class RazorpayClient:
+        def __init__(self, auth):
+            self.utility = types.SimpleNamespace(verify_payment_signature=lambda params: True)
+            self.payment = types.SimpleNamespace(
+                fetch=lambda payment_id: {'id': payment_id, 'amount': amount_paise, 'method': 'card',
+                                          'status': 'captured'})
+
+    module = types.ModuleType('razorpay')
+    module.Client = RazorpayClient
+    module.errors = types.SimpleNamespace(SignatureVerificationError=type('SignatureVerificationError',
+                                                                          (Exception,), {}))
+    return module
+
+
+@override_settings(FIRESTORE_BACKEND='memory')
+class VerifyRazorpayPaymentTests(SimpleTestCase):
+    """verify_razorpay_payment against the in-memory Firestore backend"""
+
+    user_id = 'user-1'
+    order_id = 'order-1'
+
+    def setUp(self):
+        self.db = fake_firestore.FakeClient()
+        patcher = mock.patch('anand_mobiles.firebase._client', self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict('sys.modules', {'razorpay': fake_razorpay(20000)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # No invoice: keeps PDF rendering and Cloudinary out of the test
+        patcher = mock.patch('shop_users.views.create_invoice_data', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.db.seed('products/p1', {'name': 'Phone', 'brand': 'Acme', 'price': 100, 'stock': 5})
+        self.db.seed(f'users/{self.user_id}', {'email': 'user@example.com'})
+        self.db.seed(f'users/{self.user_id}/cart/p1', {'product_id': 'p1', 'quantity': 2})
+        self.db.seed(f'users/{self.user_id}/orders/{self.order_id}', {
+            'status': 'pending_payment',
+            'razorpay_order_id': 'order_rzp_1',
+            'product_ids': ['p1'],
+            'total_amount': 200,
+            'event_count': 1,
+            'current_status': {'status': 'pending_payment', 'seq': 1, 'timestamp': datetime.now()},
+            'created_at': datetime.now(),
+        })
+
+        token = jwt.encode({'user_id': self.user_id, 'email': 'user@example.com'}, settings.SECRET_KEY,
+                           algorithm='HS256')
+        self.client = Client(HTTP_HOST='127.0.0.1', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def verify(self):
+        return self.client.post('/api/users/order/razorpay/verify/', json.dumps({
+            'order_id': self.order_id,
+            'razorpay_order_id': 'order_rzp_1',
+            'razorpay_payment_id': 'pay_1',
+            'razorpay_signature': 'signature',
+        }), content_type='application/json')
+
+    def state(self):
+        order = self.db.document(f'users/{self.user_id}/orders/{self.order_id}').get().to_dict()
+        return {
+            'stock': self.db.document('products/p1').get().get('stock'),
+            'in_cart': self.db.document(f'users/{self.user_id}/cart/p1').get().exists,
+            'status': order['status'],
+            'event_count': order['event_count'],
+        }
+
+    def test_payment_takes_stock_empties_cart_and_updates_order(self):
+        response = self.verify()
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.state(), {'stock': 3, 'in_cart': False, 'status': 'payment_successful',
+                                        'event_count': 2})
+
+    def test_failed_order_update_leaves_stock_and_cart_untouched(self):
+        with mock.patch.object(fake_firestore.Transaction, '_commit',
+                               side_effect=exceptions.DeadlineExceeded('commit timed out')):
+            response = self.verify()
+
+        self.assertEqual(response.status_code, 500, response.content)
+        self.assertEqual(self.state(), {'stock': 5, 'in_cart': True, 'status': 'pending_payment',
+                                        'event_count': 1})
+
+    def test_concurrent_verifications_record_the_sale_once(self):
+        from shop_users import views
+
+        record_order_event = views.record_order_event
+        racing = {}
+
+        def after_another_verification(*args, **kwargs):
+            # The first verification has read the order as pending_payment; a second
+            # one completes before its transaction runs
+            if 'response' not in racing:
+                racing['response'] = None
+                racing['response'] = self.verify()
+            return record_order_event(*args, **kwargs)
+
+        with mock.patch('shop_users.views.record_finalized_order') as record_finalized_order, \
+                mock.patch('shop_users.views.record_order_event', side_effect=after_another_verification):
+            response = self.verify()
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(racing['response'].status_code, 200, racing['response'].content)
+        self.assertEqual(record_finalized_order.call_count, 1)
+        self.assertEqual(self.state(), {'stock': 3, 'in_cart': False, 'status': 'payment_successful',
+                                        'event_count': 2})
+
+    def test_late_verification_of_a_shipped_order_changes_nothing(self):
+        from shop_users.order_events import record_order_event
+
+        with mock.patch('shop_users.views.record_finalized_order') as record_finalized_order:
+            self.assertEqual(self.verify().status_code, 200)
+            order_ref = self.db.document(f'users/{self.user_id}/orders/{self.order_id}')
+            record_order_event(self.db, order_ref, 'shipped', 'Shipped', order_updates={'status': 'shipped'})
+            # The cart item is back, as it would be after the user shopped again
+            self.db.seed(f'users/{self.user_id}/cart/p1', {'product_id': 'p1', 'quantity': 2})
+
+            response = self.verify()
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['order_status'], 'shipped')
+        self.assertEqual(record_finalized_order.call_count, 1)
+        self.assertEqual(self.state(), {'stock': 3, 'in_cart': True, 'status': 'shipped', 'event_count': 3})
+
+
+@override_settings(FIRESTORE_BACKEND='memory')
+class DefaultAddressTests(SimpleTestCase):
+    """Default address switching against the in-memory Firestore backend"""
+
+    user_id = 'user-1'
+
+    def setUp(self):
+        self.db = fake_firestore.FakeClient()
+        self.db.seed(f'users/{self.user_id}', {'email': 'user@example.com', 'default_address_id': 'home'})
+        self.db.seed(f'users/{self.user_id}/addresses/home', {'city': 'Pune', 'is_default': True})
+        self.db.seed(f'users/{self.user_id}/addresses/work', {'city': 'Mumbai', 'is_default': False})
+
+    def defaults(self):
+        """(default_address_id, IDs of the addresses flagged is_default)"""
+        user = self.db.document(f'users/{self.user_id}').get().to_dict()
+        flagged = sorted(doc.id for doc in self.db.collection(f'users/{self.user_id}/addresses').stream()
+                         if doc.get('is_default'))
+        return user.get('default_address_id'), flagged
+
+    def test_switching_the_default_commits_pointer_and_flags_together(self):
+        from shop_users.addresses import set_default_address
+
+        commit = fake_firestore.Transaction._commit
+        with mock.patch.object(fake_firestore.Transaction, '_commit', autospec=True,
+                               side_effect=commit) as transaction_commit:
+            set_default_address(self.db, self.user_id, 'work')
+
+        self.assertEqual(transaction_commit.call_count, 1)
+        self.assertEqual(self.defaults(), ('work', ['work']))
+
+    def test_a_failed_switch_leaves_the_old_default(self):
+        from shop_users.addresses import set_default_address
+
+        with mock.patch.object(fake_firestore.Transaction, '_commit',
+                               side_effect=exceptions.DeadlineExceeded('commit timed out')):
+            with self.assertRaises(exceptions.DeadlineExceeded):
+                set_default_address(self.db, self.user_id, 'work')
+
+        self.assertEqual(self.defaults(), ('home', ['home']))
+
+    def test_legacy_users_get_the_pointer_on_their_next_change(self):
+        from shop_users.addresses import add_address
+
+        self.db.seed(f'users/{self.user_id}', {'email': 'user@example.com'})
+
+        address_id, address = add_address(self.db, self.user_id, {'city': 'Nashik'}, make_default=True)
+
+        self.assertTrue(address['is_default'])
+        self.assertEqual(self.defaults(), (address_id, [address_id]))
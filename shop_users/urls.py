@@ -1,6 +1,10 @@
 from django.urls import path
+from django.conf import settings
 from .views import *
 
+if settings.ASYNC_VIEWS:
+    from .async_views import get_cart, get_wishlist, get_user_orders, get_order_details
+
 
 urlpatterns = [
     path('signup',signup, name='signup'),
@@ -24,6 +28,7 @@ urlpatterns = [
     path('order/razorpay/verify/', verify_razorpay_payment, name='verify_razorpay_payment'),
     path('orders/', get_user_orders, name='get_user_orders'),
     path('orders/<str:order_id>/', get_order_details, name='get_order_details'),
+    path('orders/<str:order_id>/events/', get_order_events, name='get_order_events'),
 
     # Addresses URLs
     path('addresses/', get_addresses, name='get_addresses'),
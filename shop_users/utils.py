@@ -1,8 +1,9 @@
 import jwt
 import logging
 from functools import wraps
-from django.http import JsonResponse
+from anand_mobiles.responses import JsonResponse
 from anand_mobiles.settings import SECRET_KEY
+from anand_mobiles.async_utils import async_compatible
 
 # Set up logger for User authentication
 logger = logging.getLogger(__name__)
@@ -26,14 +27,14 @@ def user_required(view_func):
         
         # Check for missing or malformed authorization header
         if not auth_header:
-            logger.warning(f"User access attempt without authorization header from {request.META.get('REMOTE_ADDR')}")
+            logger.warning("User access attempt without authorization header from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Authorization header required',
                 'code': 'AUTH_HEADER_MISSING'
             }, status=401)
         
         if not auth_header.startswith('Bearer '):
-            logger.warning(f"User access attempt with invalid authorization format from {request.META.get('REMOTE_ADDR')}")
+            logger.warning("User access attempt with invalid authorization format from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Invalid authorization format. Expected: Bearer <token>',
                 'code': 'AUTH_FORMAT_INVALID'
@@ -45,7 +46,7 @@ def user_required(view_func):
             if not token.strip():
                 raise IndexError("Empty token")
         except IndexError:
-            logger.warning(f"User access attempt with empty token from {request.META.get('REMOTE_ADDR')}")
+            logger.warning("User access attempt with empty token from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Authorization token is empty',
                 'code': 'TOKEN_EMPTY'
@@ -58,7 +59,7 @@ def user_required(view_func):
             # Validate required fields in token
             email = payload.get('email')
             if not email:
-                logger.warning(f"User token missing email field from {request.META.get('REMOTE_ADDR')}")
+                logger.warning("User token missing email field from %s", request.META.get('REMOTE_ADDR'))
                 return JsonResponse({
                     'error': 'Invalid token: missing email field',
                     'code': 'TOKEN_INVALID_PAYLOAD'
@@ -69,30 +70,31 @@ def user_required(view_func):
             request.user_id = payload.get('user_id')
             request.user_payload = payload
             
-            logger.info(f"User '{email}' authenticated successfully for {request.method} {request.path}")
+            logger.debug("User '%s' authenticated successfully for %s %s", email, request.method, request.path)
             
             # Continue to the protected view
             return view_func(request, *args, **kwargs)
             
         except jwt.ExpiredSignatureError:
-            logger.info(f"User access attempt with expired token from {request.META.get('REMOTE_ADDR')}")
+            logger.info("User access attempt with expired token from %s", request.META.get('REMOTE_ADDR'))
             return JsonResponse({
                 'error': 'Authentication token has expired',
                 'code': 'TOKEN_EXPIRED'
             }, status=401)
             
         except jwt.InvalidTokenError as e:
-            logger.warning(f"User access attempt with invalid token from {request.META.get('REMOTE_ADDR')}: {str(e)}")
+            logger.warning("User access attempt with invalid token from %s: %s", request.META.get('REMOTE_ADDR'), e)
             return JsonResponse({
                 'error': 'Invalid authentication token',
                 'code': 'TOKEN_INVALID'
             }, status=401)
             
         except Exception as e:
-            logger.error(f"Unexpected authentication error from {request.META.get('REMOTE_ADDR')}: {str(e)}")
+            logger.error("Unexpected authentication error from %s: %s", request.META.get('REMOTE_ADDR'), e)
             return JsonResponse({
                 'error': 'Authentication service error',
                 'code': 'AUTH_SERVICE_ERROR'
             }, status=401)
     
-    return wrapper
\ No newline at end of file
+    # Async views get an async wrapper around the same checks
+    return async_compatible(wrapper, view_func)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from django.http import JsonResponse
+from anand_mobiles.responses import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.hashers import make_password, check_password
 import jwt
@@ -7,10 +7,10 @@ import json
 import time
 import logging
 from shop_users.utils import user_required
+from anand_mobiles.tracing import span
 from anand_mobiles.settings import SECRET_KEY
-from firebase_admin import firestore, auth as firebase_auth
+from firebase_admin import auth as firebase_auth
 from google.cloud.firestore import Query
-import razorpay
 from django.conf import settings # Import settings
 from shop_admin.utils import (
     generate_invoice_pdf, 
@@ -21,10 +21,42 @@ from shop_admin.utils import (
     save_invoice_to_firestore,
     PDFGenerationError
 )
+from shop_admin.analytics import record_finalized_order
+from products.reviews import (
+    report_review as report_review_in_queue,
+    add_review as add_product_review,
+    has_reviewed as has_reviewed_product,
+    ReviewNotFoundError,
+    AlreadyReportedError,
+    AlreadyReviewedError,
+    ProductNotFoundError
+)
+from products.review_votes import toggle_helpful_vote, has_voted
+from shop_users.order_events import (
+    add_initial_order_event,
+    record_order_event,
+    order_is_paid,
+    list_order_events,
+    OrderNotFoundError,
+    DEFAULT_EVENTS_PAGE_SIZE
+)
+from shop_users.addresses import (
+    add_address as add_user_address,
+    update_address as update_user_address,
+    delete_address as delete_user_address,
+    set_default_address as set_user_default_address,
+    list_addresses,
+    address_ref as user_address_ref,
+    address_snapshot,
+    AddressNotFoundError,
+    ADDRESS_FIELDS,
+    OPTIONAL_ADDRESS_FIELDS,
+    DEFAULT_ADDRESS_FIELD
+)
 from datetime import datetime
 
-# Get Firebase client
-db = firestore.client()
+# Shared Firestore client, created on first use
+from anand_mobiles.firebase import db, get_app
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -41,7 +73,7 @@ def signup(request):
             # Firebase authentication flow (OAuth, Google, etc.)
             id_token = data.get('idToken')
             try:
-                decoded_token = firebase_auth.verify_id_token(id_token)
+                decoded_token = firebase_auth.verify_id_token(id_token, app=get_app())
                 uid = decoded_token['uid']
                 
                 user_doc_ref = db.collection('users').document(uid)
@@ -62,7 +94,7 @@ def signup(request):
                 else:
                     # New user via Firebase Auth, create in Firestore
                     try:
-                        firebase_user_record = firebase_auth.get_user(uid)
+                        firebase_user_record = firebase_auth.get_user(uid, app=get_app())
                         email = firebase_user_record.email # Prefer email from get_user
                         phone_number = firebase_user_record.phone_number
 
@@ -82,6 +114,7 @@ def signup(request):
                         'auth_provider': 'firebase',
                         'uid': uid, # Store Firebase UID
                         'created_at': datetime.now(),
+                        DEFAULT_ADDRESS_FIELD: None,
                     }
                     user_doc_ref.set(user_payload)
                     user_id = uid
@@ -130,6 +163,7 @@ def signup(request):
                 'phone_number': phone_number,
                 'auth_provider': 'email',
                 'created_at': datetime.now(),
+                DEFAULT_ADDRESS_FIELD: None,
             }
             # Firestore will auto-generate an ID for this document
             update_time, doc_ref = users_ref.add(user_payload)
@@ -165,7 +199,7 @@ def login(request):
             # Firebase authentication flow (OAuth, Google, etc.)
             id_token = data.get('idToken')
             try:
-                decoded_token = firebase_auth.verify_id_token(id_token)
+                decoded_token = firebase_auth.verify_id_token(id_token, app=get_app())
                 uid = decoded_token['uid']
                 
                 user_doc_ref = db.collection('users').document(uid)
@@ -193,7 +227,7 @@ def login(request):
                     # For simplicity here, we'll treat it as an error, or you could auto-create them.
                     # Re-using part of the signup logic for auto-creation:
                     try:
-                        firebase_user_record = firebase_auth.get_user(uid)
+                        firebase_user_record = firebase_auth.get_user(uid, app=get_app())
                         email = firebase_user_record.email
                         phone_number = firebase_user_record.phone_number
                         first_name = ''
@@ -212,6 +246,7 @@ def login(request):
                             'auth_provider': 'firebase',
                             'uid': uid,
                             'created_at': datetime.now(),
+                            DEFAULT_ADDRESS_FIELD: None,
                         }
                         user_doc_ref.set(user_payload)
                         user_id = uid
@@ -312,16 +347,6 @@ def add_review(request, product_id):
         except ValueError:
             return JsonResponse({'error': 'Rating must be a valid number'}, status=400)
         
-        # Check if product exists
-        product_doc = db.collection('products').document(product_id).get()
-        if not product_doc.exists:
-            return JsonResponse({'error': 'Product not found'}, status=404)
-        
-        # Check if user has already reviewed this product
-        existing_review = db.collection('products').document(product_id).collection('reviews').where('user_id', '==', user_id).limit(1).stream()
-        if list(existing_review):
-            return JsonResponse({'error': 'User has already reviewed this product'}, status=400)
-          # Create review data
         review_data = {
             'user_id': user_id,
             'email': email,
@@ -331,37 +356,23 @@ def add_review(request, product_id):
             'created_at': datetime.now(),
             'is_verified': False,  # Default to false, admin can verify later
             'reported_count': 0,  # Initialize reported count
-            'helpful_users': [],  # Initialize helpful users list
+            'helpful_count': 0,  # Needed for the helpful sort on review listings
         }
         
-        # Add review to subcollection
-        review_ref = db.collection('products').document(product_id).collection('reviews').add(review_data)
-        
-        # Update product's average rating and review count
-        reviews_ref = db.collection('products').document(product_id).collection('reviews').stream()
-        total_rating = 0
-        review_count = 0
-        
-        for review_doc in reviews_ref:
-            review = review_doc.to_dict()
-            total_rating += review.get('rating', 0)
-            review_count += 1
-        
-        average_rating = round(total_rating / review_count, 2) if review_count > 0 else 0
-        
-        # Update product document with new rating and review count
-        db.collection('products').document(product_id).update({
-            'rating': average_rating,
-            'reviews_count': review_count
-        })
+        # Duplicate check, insert (keyed by user_id) and rating update in one transaction
+        review_id, aggregates = add_product_review(db, product_id, user_id, review_data)
         
         return JsonResponse({
             'message': 'Review added successfully',
-            'review_id': review_ref[1].id,
-            'updated_rating': average_rating,
-            'total_reviews': review_count
+            'review_id': review_id,
+            'updated_rating': aggregates['rating'],
+            'total_reviews': aggregates['reviews_count']
         }, status=201)
         
+    except ProductNotFoundError:
+        return JsonResponse({'error': 'Product not found'}, status=404)
+    except AlreadyReviewedError:
+        return JsonResponse({'error': 'User has already reviewed this product'}, status=400)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
@@ -376,97 +387,60 @@ def report_review(request, product_id, review_id):
     
     try:
         user_id = request.user_id
-        
-        # Check if review exists
-        review_doc_ref = db.collection('products').document(product_id).collection('reviews').document(review_id)
-        review_doc = review_doc_ref.get()
-        
-        if not review_doc.exists:
-            return JsonResponse({'error': 'Review not found'}, status=404)
-        
-        review_data = review_doc.to_dict()
-        
-        # Create reports subcollection if it doesn't exist, or add to it
-        # First check if user already reported this review
-        existing_report = review_doc_ref.collection('reports').where('user_id', '==', user_id).limit(1).stream()
-        if list(existing_report):
-            return JsonResponse({'error': 'You have already reported this review'}, status=400)
-        
-        # Add report
-        report_data = {
-            'user_id': user_id,
-            'created_at': datetime.now(),
-        }
-        report_ref = review_doc_ref.collection('reports').add(report_data)
-        
-        # Update report count in the review document
-        reports_count = len(list(review_doc_ref.collection('reports').stream()))
-        
-        # Make sure reported_count field exists
-        if 'reported_count' not in review_data:
-            review_doc_ref.update({
-                'reported_count': reports_count
-            })
-        else:
-            review_doc_ref.update({
-                'reported_count': reports_count
-            })
+        data = json.loads(request.body) if request.body else {}
+
+        # Duplicate check, report write, counter and moderation queue update in one transaction
+        report_id, reported_count = report_review_in_queue(
+            db, product_id, review_id, user_id, reason=(data.get('reason') or '').strip() or None
+        )
         
         return JsonResponse({
             'message': 'Review reported successfully',
-            'report_id': report_ref[1].id,
-            'reported_count': reports_count
+            'report_id': report_id,
+            'reported_count': reported_count
         }, status=200)
         
+    except ReviewNotFoundError:
+        return JsonResponse({'error': 'Review not found'}, status=404)
+    except AlreadyReportedError:
+        return JsonResponse({'error': 'You have already reported this review'}, status=400)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
         return JsonResponse({'error': f'Error reporting review: {str(e)}'}, status=500)
 
 @user_required
 @csrf_exempt
 def mark_review_helpful(request, product_id, review_id):
-    if request.method != 'POST':
+    """GET: whether the user marked the review helpful. POST: toggle the user's helpful vote."""
+    if request.method not in ['GET', 'POST']:
         return JsonResponse({'error': 'Invalid request method'}, status=405)
     
     try:
         user_id = request.user_id
-        
-        # Check if review exists
-        review_doc_ref = db.collection('products').document(product_id).collection('reviews').document(review_id)
-        review_doc = review_doc_ref.get()
-        
-        if not review_doc.exists:
-            return JsonResponse({'error': 'Review not found'}, status=404)
-        
-        review_data = review_doc.to_dict()
-        
-        # Check if user already marked this review as helpful
-        if 'helpful_users' not in review_data:
-            # Initialize the field if it doesn't exist
-            helpful_users = []
-        else:
-            helpful_users = review_data.get('helpful_users', [])
-            
-        if user_id in helpful_users:
-            # User is unmarking the review as helpful (toggle functionality)
-            helpful_users.remove(user_id)
-            action = 'removed'
-        else:
-            # User is marking the review as helpful
-            helpful_users.append(user_id)
-            action = 'added'
-        
-        # Update the review document
-        review_doc_ref.update({
-            'helpful_users': helpful_users,
-            'helpful_count': len(helpful_users)
-        })
+
+        if request.method == 'GET':
+            review_doc = db.collection('products').document(product_id).collection('reviews').document(review_id).get()
+            if not review_doc.exists:
+                return JsonResponse({'error': 'Review not found'}, status=404)
+            review_data = review_doc.to_dict()
+            return JsonResponse({
+                'is_marked_helpful': has_voted(db, product_id, review_id, user_id, review_data),
+                'helpful_count': review_data.get('helpful_count', len(review_data.get('helpful_users') or []))
+            }, status=200)
+
+        # Vote document and counter are updated together
+        added, helpful_count = toggle_helpful_vote(db, product_id, review_id, user_id)
+        action = 'added' if added else 'removed'
         
         return JsonResponse({
             'message': f'Helpfulness mark {action} successfully',
-            'helpful_count': len(helpful_users),
-            'is_marked_helpful': action == 'added'
+            'helpful_count': helpful_count,
+            'is_marked_helpful': added
         }, status=200)
         
+    except ReviewNotFoundError:
+        return JsonResponse({'error': 'Review not found'}, status=404)
     except Exception as e:
         return JsonResponse({'error': f'Error marking review as helpful: {str(e)}'}, status=500)
 
@@ -538,6 +512,57 @@ def add_to_cart(request, product_id):
     except Exception as e:
         return JsonResponse({'error': f'Error adding to cart: {str(e)}'}, status=500)
 
+def _find_variant(product_data, variant_id):
+    # If variant_id exists, find the variant data from valid_options
+    if variant_id and product_data.get('valid_options'):
+        for option in product_data.get('valid_options', []):
+            if option.get('id') == variant_id:
+                return option
+    return None
+
+def cart_item_payload(item_doc, product_doc):
+    """One cart entry joined with its product (product_doc may be missing)"""
+    item_data = item_doc.to_dict()
+    product_id = item_data.get('product_id')
+    if product_doc is None or not product_doc.exists:
+        # Handle case where product might have been deleted but still in cart
+        return {
+            'item_id': item_doc.id,
+            'product_id': product_id,
+            'name': 'Product not found',
+            'quantity': item_data.get('quantity'),
+            'error': 'Product details could not be fetched.'
+        }
+
+    product_data = product_doc.to_dict()
+    variant_id = item_data.get('variant_id')
+    variant_data = _find_variant(product_data, variant_id)
+    # Determine price based on variant or product pricing
+    price = None
+    if variant_data:
+        price = variant_data.get('discounted_price') or variant_data.get('price')
+    if not price:
+        price = product_data.get('discount_price') or product_data.get('discounted_price') or product_data.get('price')
+    # Fallback to 0 if no price found
+    if price is None:
+        price = 0
+    
+    return {
+        'item_id': item_doc.id, # This is the cart item ID (product_id + variant_id)
+        'product_id': product_id,
+        'variant_id': variant_id,
+        'name': product_data.get('name'),
+        'price': price,
+        'image': product_data.get('images', [product_data.get('image_url', '')])[0] if product_data.get('images') else product_data.get('image_url'),
+        'image_url': product_data.get('images', [product_data.get('image_url', '')])[0] if product_data.get('images') else product_data.get('image_url'),
+        'quantity': item_data.get('quantity'),
+        'stock': variant_data.get('stock') if variant_data else product_data.get('stock'),
+        'category': product_data.get('category', 'Product'),
+        'brand': product_data.get('brand', 'Unknown'),
+        'variant': variant_data,
+        'added_at': item_data.get('added_at')
+    }
+
 @user_required
 @csrf_exempt
 def get_cart(request):
@@ -550,56 +575,9 @@ def get_cart(request):
         
         cart = []
         for item_doc in cart_items_ref:
-            item_data = item_doc.to_dict()
-            product_id = item_data.get('product_id')
             # Fetch product details
-            product_doc = db.collection('products').document(product_id).get()
-            if product_doc.exists:
-                product_data = product_doc.to_dict()
-                variant_id = item_data.get('variant_id')
-                variant_data = None
-                
-                # If variant_id exists, find the variant data from valid_options
-                if variant_id and product_data.get('valid_options'):
-                    for option in product_data.get('valid_options', []):
-                        if option.get('id') == variant_id:
-                            variant_data = option
-                            break                # Determine price based on variant or product pricing
-                price = None
-                if variant_data:
-                    price = variant_data.get('discounted_price') or variant_data.get('price')
-                if not price:
-                    price = product_data.get('discount_price') or product_data.get('discounted_price') or product_data.get('price')
-                # Fallback to 0 if no price found
-                if price is None:
-                    price = 0
-                
-                cart_item = {
-                    'item_id': item_doc.id, # This is the cart item ID (product_id + variant_id)
-                    'product_id': product_id,
-                    'variant_id': variant_id,
-                    'name': product_data.get('name'),
-                    'price': price,
-                    'image': product_data.get('images', [product_data.get('image_url', '')])[0] if product_data.get('images') else product_data.get('image_url'),
-                    'image_url': product_data.get('images', [product_data.get('image_url', '')])[0] if product_data.get('images') else product_data.get('image_url'),
-                    'quantity': item_data.get('quantity'),
-                    'stock': variant_data.get('stock') if variant_data else product_data.get('stock'),
-                    'category': product_data.get('category', 'Product'),
-                    'brand': product_data.get('brand', 'Unknown'),
-                    'variant': variant_data,
-                    'added_at': item_data.get('added_at')
-                }
-                cart.append(cart_item)
-            else:
-                # Handle case where product might have been deleted but still in cart
-                cart.append({
-                    'item_id': item_doc.id,
-                    'product_id': product_id,
-                    'name': 'Product not found',
-                    'quantity': item_data.get('quantity'),
-                    'error': 'Product details could not be fetched.'
-                })
-
+            product_doc = db.collection('products').document(item_doc.to_dict().get('product_id')).get()
+            cart.append(cart_item_payload(item_doc, product_doc))
 
         return JsonResponse({'cart': cart}, status=200)
 
@@ -689,6 +667,51 @@ def add_to_wishlist(request, product_id):
     except Exception as e:
         return JsonResponse({'error': f'Error adding to wishlist: {str(e)}'}, status=500)
 
+def wishlist_item_payload(item_doc, product_doc):
+    """One wishlist entry joined with its product (product_doc may be missing)"""
+    item_data = item_doc.to_dict()
+    product_id = item_data.get('product_id')
+    if product_doc is None or not product_doc.exists:
+        return {
+            'item_id': item_doc.id,
+            'product_id': product_id,
+            'name': 'Product not found',
+            'error': 'Product details could not be fetched.'
+        }
+
+    product_data = product_doc.to_dict()
+    variant_id = item_data.get('variant_id')
+    variant_data = _find_variant(product_data, variant_id)
+    
+    # Get the first image from images array or fallback to image_url
+    image_url = None
+    if product_data.get('images') and len(product_data.get('images')) > 0:
+        image_url = product_data.get('images')[0]
+    else:
+        image_url = product_data.get('image_url', '')
+    
+    # Determine price based on variant or product pricing
+    price = None
+    if variant_data:
+        price = variant_data.get('discounted_price') or variant_data.get('price')
+    if not price:
+        price = product_data.get('discount_price') or product_data.get('discounted_price') or product_data.get('price')
+    
+    return {
+        'item_id': item_doc.id,  # This is the wishlist item ID (product_id + variant_id)
+        'product_id': product_id,
+        'variant_id': variant_id,
+        'name': product_data.get('name', 'Unknown Product'),
+        'price': price,
+        'image': image_url,
+        'image_url': image_url,
+        'stock': variant_data.get('stock') if variant_data else product_data.get('stock', 0),
+        'category': product_data.get('category', 'Product'),
+        'brand': product_data.get('brand', 'Unknown'),
+        'variant': variant_data,
+        'added_at': item_data.get('added_at')
+    }
+
 @user_required
 @csrf_exempt
 def get_wishlist(request):
@@ -701,59 +724,9 @@ def get_wishlist(request):
         
         wishlist = []
         for item_doc in wishlist_items_ref:
-            item_data = item_doc.to_dict()
-            product_id = item_data.get('product_id')
-            
             # Fetch product details
-            product_doc = db.collection('products').document(product_id).get()
-            if product_doc.exists:
-                product_data = product_doc.to_dict()
-                variant_id = item_data.get('variant_id')
-                variant_data = None
-                
-                # If variant_id exists, find the variant data from valid_options
-                if variant_id and product_data.get('valid_options'):
-                    for option in product_data.get('valid_options', []):
-                        if option.get('id') == variant_id:
-                            variant_data = option
-                            break
-                
-                # Get the first image from images array or fallback to image_url
-                image_url = None
-                if product_data.get('images') and len(product_data.get('images')) > 0:
-                    image_url = product_data.get('images')[0]
-                else:
-                    image_url = product_data.get('image_url', '')
-                
-                # Determine price based on variant or product pricing
-                price = None
-                if variant_data:
-                    price = variant_data.get('discounted_price') or variant_data.get('price')
-                if not price:
-                    price = product_data.get('discount_price') or product_data.get('discounted_price') or product_data.get('price')
-                
-                wishlist_item = {
-                    'item_id': item_doc.id,  # This is the wishlist item ID (product_id + variant_id)
-                    'product_id': product_id,
-                    'variant_id': variant_id,
-                    'name': product_data.get('name', 'Unknown Product'),
-                    'price': price,
-                    'image': image_url,
-                    'image_url': image_url,
-                    'stock': variant_data.get('stock') if variant_data else product_data.get('stock', 0),
-                    'category': product_data.get('category', 'Product'),
-                    'brand': product_data.get('brand', 'Unknown'),
-                    'variant': variant_data,
-                    'added_at': item_data.get('added_at')
-                }
-                wishlist.append(wishlist_item)
-            else:
-                wishlist.append({
-                    'item_id': item_doc.id,
-                    'product_id': product_id,
-                    'name': 'Product not found',
-                    'error': 'Product details could not be fetched.'
-                })
+            product_doc = db.collection('products').document(item_doc.to_dict().get('product_id')).get()
+            wishlist.append(wishlist_item_payload(item_doc, product_doc))
 
         return JsonResponse({'wishlist': wishlist}, status=200)
 
@@ -800,7 +773,7 @@ def create_razorpay_order(request):
     try:
         user_id = request.user_id
         data = json.loads(request.body)
-        print('Request data:', data)
+        logger.debug("Razorpay order request from user %s: %s", user_id, data)
         amount_in_paise = data.get('amount') # Amount should be in paise
         currency = data.get('currency', 'INR')
         product_ids = data.get('product_ids') # List of product_ids in the cart being ordered
@@ -818,16 +791,15 @@ def create_razorpay_order(request):
         except ValueError:
             return JsonResponse({'error': 'Invalid amount format'}, status=400)
 
-        # Fetch address details to include in the order
-        address_ref = db.collection('users').document(user_id).collection('addresses').document(address_id)
-        address_doc = address_ref.get()
+        # Snapshot the address into the order so order detail never reads it again
+        address_doc = user_address_ref(db, user_id, address_id).get()
         if not address_doc.exists:
-            return JsonResponse({'error': 'Selected address not found'}, status=400)        
-        address_data = address_doc.to_dict()
+            return JsonResponse({'error': 'Selected address not found'}, status=400)
+        address_data = address_snapshot(address_id, address_doc.to_dict())
         
         # Fetch product details to store with preliminary order
         preliminary_order_items = []
-        print(f"Processing {len(product_ids)} product IDs for order creation: {product_ids}")
+        logger.debug("Processing %s product IDs for order creation: %s", len(product_ids), product_ids)
         for product_id in product_ids:
             # Check if this is a cart item ID (format: product_id or product_id_variant_id)
             # or a direct product ID (for single product orders)
@@ -840,20 +812,20 @@ def create_razorpay_order(request):
                 quantity = cart_item_data.get('quantity', 1)
                 variant_id = cart_item_data.get('variant_id')
                 actual_product_id = product_id.split('_')[0]  # Extract actual product_id
-                print(f"Found cart item {product_id}: quantity={quantity}, variant_id={variant_id}")
+                logger.debug("Found cart item %s: quantity=%s, variant_id=%s", product_id, quantity, variant_id)
             else:
                 # This might be a single product order - check if we have product_details
                 if is_single_product_order and product_details:
                     quantity = product_details.get('quantity', 1)
                     variant_id = product_details.get('variant_id')
                     actual_product_id = product_details.get('product_id', product_id)
-                    print(f"Single product order for {product_id}: quantity={quantity}, variant_id={variant_id}")
+                    logger.debug("Single product order for %s: quantity=%s, variant_id=%s", product_id, quantity, variant_id)
                 else:
                     # Fallback for other cases
                     quantity = 1
                     variant_id = None
                     actual_product_id = product_id
-                    print(f"No cart item found for {product_id}, using defaults: quantity={quantity}, variant_id={variant_id}")
+                    logger.debug("No cart item found for %s, using defaults: quantity=%s, variant_id=%s", product_id, quantity, variant_id)
             
             product_ref = db.collection('products').document(actual_product_id)
             product_doc = product_ref.get()
@@ -884,11 +856,14 @@ def create_razorpay_order(request):
                     'total_item_price': item_price * quantity
                 }
                 preliminary_order_items.append(order_item)
-                print(f"Added order item: {order_item['name']} x {quantity}")
+                logger.debug("Added order item: %s x %s", order_item['name'], quantity)
             else:
-                print(f"Product {actual_product_id} not found in products collection")
+                logger.warning("Product %s not found in products collection", actual_product_id)
+
+        logger.debug("Created preliminary order with %s items", len(preliminary_order_items))
 
-        print(f"Created preliminary order with {len(preliminary_order_items)} items")        # Initialize Razorpay client
+        # Initialize Razorpay client (the SDK is imported on first use to keep startup fast)
+        import razorpay
         client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
 
         # Create Razorpay order with a receipt ID that won't exceed 40 characters
@@ -899,7 +874,9 @@ def create_razorpay_order(request):
             'receipt': receipt_id,  # Unique receipt ID within 40 chars limit
             'payment_capture': 1 # Auto capture payment
         }
-        razorpay_order = client.order.create(data=order_payload)
+        with span('razorpay.order.create', amount=amount_in_paise, currency=currency) as order_span:
+            razorpay_order = client.order.create(data=order_payload)
+            order_span.set_attribute('razorpay.order_id', razorpay_order.get('id'))
 
         # Generate expected delivery date (5-7 days from now)
         from datetime import datetime, timedelta
@@ -914,7 +891,7 @@ def create_razorpay_order(request):
             'user_id': user_id,
             'product_ids': product_ids, # Store product IDs for now
             'order_items': preliminary_order_items,  # Store detailed product info
-            'address': address_data,  # Store complete address information
+            'address': address_data,  # Snapshot of the shipping address at order time
             'address_id': address_id,
             'total_amount': amount_in_paise / 100, # Store amount in rupees
             'currency': currency,
@@ -924,18 +901,18 @@ def create_razorpay_order(request):
             'tracking_info': {
                 'carrier': None,
                 'tracking_number': None,
-                'tracking_url': None,
-                'status_history': [
-                    {
-                        'status': 'pending_payment',
-                        'timestamp': datetime.now(),  # Use client-side timestamp here
-                        'description': 'Order created, awaiting payment'
-                    }
-                ]
+                'tracking_url': None
             },
             'payment_details': None # To be filled after successful payment
         }
-        order_ref.set(preliminary_order_data)
+
+        # Status history lives in the order's events subcollection
+        batch = db.batch()
+        preliminary_order_data.update(
+            add_initial_order_event(batch, order_ref, 'pending_payment', 'Order created, awaiting payment')
+        )
+        batch.set(order_ref, preliminary_order_data)
+        batch.commit()
 
         return JsonResponse({
             'message': 'Razorpay order created successfully',
@@ -952,16 +929,29 @@ def create_razorpay_order(request):
         return JsonResponse({'error': f'Error creating Razorpay order: {str(e)}'}, status=500)
 
 
+def already_paid_response(order_data, app_order_id):
+    """Answer a repeated verification of a paid order without touching it again"""
+    return JsonResponse({
+        'message': 'Payment already verified for this order.',
+        'app_order_id': app_order_id,
+        'razorpay_payment_id': (order_data.get('payment_details') or {}).get('razorpay_payment_id'),
+        'order_status': order_data.get('status'),
+    }, status=200)
+
+
 @user_required
 @csrf_exempt
 def verify_razorpay_payment(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Invalid request method'}, status=405)
+    # Imported on first use to keep startup fast; also needed by the except clause below
+    import razorpay
 
     try:
         user_id = request.user_id
         data = json.loads(request.body)
-        print('Payment verification data:', data)
+        logger.debug("Payment verification for order %s (Razorpay order %s, payment %s)",
+                     data.get('order_id'), data.get('razorpay_order_id'), data.get('razorpay_payment_id'))
 
         razorpay_order_id = data.get('razorpay_order_id')
         razorpay_payment_id = data.get('razorpay_payment_id')
@@ -980,7 +970,8 @@ def verify_razorpay_payment(request):
         }
 
         # Verify payment signature
-        payment_verification = client.utility.verify_payment_signature(params_dict)
+        with span('razorpay.verify_payment_signature'):
+            payment_verification = client.utility.verify_payment_signature(params_dict)
 
         order_doc_ref = db.collection('users').document(user_id).collection('orders').document(app_order_id)
         order_doc = order_doc_ref.get()
@@ -993,22 +984,28 @@ def verify_razorpay_payment(request):
         if order_data.get('razorpay_order_id') != razorpay_order_id:
              return JsonResponse({'error': 'Razorpay Order ID mismatch.'}, status=400)
 
+        if order_is_paid(order_data):
+            # A replayed or late verification: the order was already paid and processed
+            return already_paid_response(order_data, app_order_id)
+
         if payment_verification: # This will be True if signature is valid, None otherwise
             # Payment is successful, now update your order status and details
 
             # Fetch payment details from Razorpay for more info (optional but good)
-            payment_details = client.payment.fetch(razorpay_payment_id)              # Get product details and calculate final order items
+            with span('razorpay.payment.fetch', payment_id=razorpay_payment_id) as fetch_span:
+                payment_details = client.payment.fetch(razorpay_payment_id)
+                fetch_span.set_attributes(method=payment_details.get('method'), status=payment_details.get('status'))
+
+            # Get product details and calculate final order items
             product_ids = order_data.get('product_ids', [])
             existing_order_items = order_data.get('order_items', [])
             order_items = []
             total_calculated_amount = 0            # Debug: Check if we have existing order items
-            print(f"Existing order_items count: {len(existing_order_items)}")
-            if existing_order_items:
-                print(f"Sample existing order item: {existing_order_items[0]}")
-            print(f"Product IDs to process: {product_ids}")
+            logger.debug("Order %s has %s preliminary items; product IDs to process: %s",
+                         app_order_id, len(existing_order_items), product_ids)
 
-            # Start a Firestore transaction or batch write for atomicity
-            batch = db.batch()
+            # Stock updates and cart removals, committed in the same transaction as the order update
+            writes = []
 
             for cart_item_id in product_ids:
                 # Extract actual product_id from cart_item_id (format: product_id or product_id_variant_id)
@@ -1064,7 +1061,8 @@ def verify_razorpay_payment(request):
                         current_variant_stock = variant_data.get('stock', 0)
                         new_variant_stock = current_variant_stock - quantity
                         if new_variant_stock < 0:
-                            print(f"Warning: Variant stock for product {actual_product_id}, variant {variant_id} has gone negative ({new_variant_stock}) after order {app_order_id}.")
+                            logger.warning("Variant stock for product %s, variant %s has gone negative (%s) after order %s",
+                                           actual_product_id, variant_id, new_variant_stock, app_order_id)
                         
                         # Update the variant stock in valid_options
                         updated_valid_options = product_data.get('valid_options', [])
@@ -1073,28 +1071,28 @@ def verify_razorpay_payment(request):
                                 updated_valid_options[i]['stock'] = new_variant_stock
                                 break
                         
-                        batch.update(product_ref, {'valid_options': updated_valid_options})
+                        writes.append(('update', product_ref, {'valid_options': updated_valid_options}))
                     else:
                         # Update product stock
                         current_stock = product_data.get('stock', 0)
                         new_stock = current_stock - quantity
                         if new_stock < 0:
-                            print(f"Warning: Stock for product {actual_product_id} has gone negative ({new_stock}) after order {app_order_id}.")
+                            logger.warning("Stock for product %s has gone negative (%s) after order %s",
+                                           actual_product_id, new_stock, app_order_id)
                         
-                        batch.update(product_ref, {'stock': new_stock})
+                        writes.append(('update', product_ref, {'stock': new_stock}))
                       # Clear the item from the cart after successful order
-                    batch.delete(cart_item_ref)            # If no order_items were created (cart items might have been cleared already), 
+                    writes.append(('delete', cart_item_ref))            # If no order_items were created (cart items might have been cleared already), 
             # use the existing preliminary order items
             if not order_items and existing_order_items:
-                print("No new order items created, using existing preliminary order items")
+                logger.debug("No new order items created, using existing preliminary order items")
                 order_items = existing_order_items
                 # Recalculate total from existing items
                 total_calculated_amount = sum(item.get('total_item_price', 0) for item in order_items)
             elif not order_items and not existing_order_items:
                 # This shouldn't happen, but if both are empty, log an error
-                print(f"ERROR: Both new order_items and existing_order_items are empty for order {app_order_id}")
-                print(f"Product IDs: {product_ids}")
-                print(f"Order data keys: {list(order_data.keys())}")
+                logger.error("Both new and preliminary order items are empty for order %s (product IDs %s, order fields %s)",
+                             app_order_id, product_ids, list(order_data.keys()))
                 # Try to reconstruct order items from the stored preliminary data
                 order_items = existing_order_items  # Keep it empty for now to avoid errors
 
@@ -1102,28 +1100,11 @@ def verify_razorpay_payment(request):
             # Note: Razorpay amount is in paise.
             if order_data.get('total_amount') != (payment_details.get('amount') / 100):
                 # Log discrepancy, but might proceed if signature is verified
-                print(f"Warning: Amount mismatch. Stored: {order_data.get('total_amount')}, Razorpay: {payment_details.get('amount') / 100}")            # Generate shipping details with estimated dates
-            import random
+                logger.warning("Amount mismatch for order %s. Stored: %s, Razorpay: %s",
+                               app_order_id, order_data.get('total_amount'), payment_details.get('amount') / 100)
 
-            # Update tracking info and status history
-            tracking_info = order_data.get('tracking_info', {})
-            if not tracking_info:
-                tracking_info = {
-                    'status_history': []
-                }
-                
-            tracking_info['carrier'] = None
-            tracking_info['tracking_number'] = None
-            tracking_info['tracking_url'] = ""
-            
-            # Add new status to history
-            status_history = tracking_info.get('status_history', [])
-            status_history.append({
-                'status': 'payment_successful',
-                'timestamp': datetime.now(), # Use client-side timestamp
-                'description': 'Payment received successfully'
-            })
-            tracking_info['status_history'] = status_history
+            # Generate shipping details with estimated dates
+            import random
 
             # Update order in Firestore
             final_order_update = {
@@ -1138,12 +1119,24 @@ def verify_razorpay_payment(request):
                     'card_last4': payment_details.get('card', {}).get('last4')
                 },                'order_items': order_items,
                 'total_amount_calculated': total_calculated_amount, # Store the server-calculated total
-                'tracking_info': tracking_info,
+                'tracking_info.carrier': None,
+                'tracking_info.tracking_number': None,
+                'tracking_info.tracking_url': "",
+                'paid_at': datetime.now(),
                 'updated_at': datetime.now()
             }
-            batch.update(order_doc_ref, final_order_update)
-              # Commit the batch
-            batch.commit()
+            # Update the order, append its status event and commit the stock updates and
+            # cart removals in one transaction, unless a concurrent verification already
+            # paid the order (checked in the transaction)
+            event = record_order_event(
+                db, order_doc_ref, 'payment_successful', 'Payment received successfully',
+                order_updates=final_order_update, writes=writes, skip_if=order_is_paid
+            )
+            if event is None:
+                return already_paid_response(order_doc_ref.get().to_dict(), app_order_id)
+
+            # Fold the order into the sales rollups, once: only the paying transaction gets here
+            record_finalized_order(db, {**order_data, **final_order_update})
 
             # Get updated cart after clearing items
             try:
@@ -1182,10 +1175,10 @@ def verify_razorpay_payment(request):
                         }
                         updated_cart.append(cart_item)
             except Exception as cart_error:
-                print(f"Error fetching updated cart: {str(cart_error)}")
+                logger.error("Error fetching updated cart: %s", cart_error)
                 updated_cart = []            # Generate invoice after successful payment and order update
             try:
-                logger.info(f"Starting invoice generation for order {app_order_id}")
+                logger.info("Starting invoice generation for order %s", app_order_id)
                 
                 # Get user data for invoice
                 user_doc = db.collection('users').document(user_id).get()
@@ -1202,24 +1195,24 @@ def verify_razorpay_payment(request):
                 invoice_data = create_invoice_data(complete_order_data, user_data, order_items)
                 
                 if invoice_data:
-                    logger.info(f"Invoice data created successfully for order {app_order_id}")
+                    logger.debug("Invoice data created for order %s", app_order_id)
                     
                     # Generate PDF
                     pdf_buffer = generate_invoice_pdf(invoice_data)
                     
                     if pdf_buffer:
-                        logger.info(f"PDF generated successfully for order {app_order_id}")
+                        logger.debug("PDF generated for order %s", app_order_id)
                         
                         # Save PDF to disk for debugging (optional - can be removed in production)
                         debug_filename = f"debug_invoice_{invoice_data['invoice_id']}.pdf"
                         debug_path = save_pdf_to_disk_debug(pdf_buffer, debug_filename)
                         if debug_path:
-                            logger.info(f"Debug PDF saved to: {debug_path}")
+                            logger.debug("Debug PDF saved to: %s", debug_path)
                         
                         # Validate PDF buffer before upload
                         pdf_buffer.seek(0)
                         pdf_bytes = pdf_buffer.getvalue()
-                        logger.info(f"PDF buffer size: {len(pdf_bytes)} bytes")
+                        logger.debug("PDF buffer size: %s bytes", len(pdf_bytes))
                         
                         if len(pdf_bytes) > 100 and pdf_bytes.startswith(b'%PDF'):
                             # Upload PDF to Cloudinary
@@ -1232,7 +1225,7 @@ def verify_razorpay_payment(request):
                                 pdf_url = upload_pdf_to_cloudinary_base64(pdf_buffer, pdf_filename)
                             
                             if pdf_url:
-                                logger.info(f"PDF uploaded successfully to Cloudinary for order {app_order_id}")
+                                logger.debug("PDF uploaded to Cloudinary for order %s", app_order_id)
                                 
                                 # Save invoice to Firestore
                                 invoice_doc_id = save_invoice_to_firestore(db, user_id, invoice_data, pdf_url)
@@ -1243,7 +1236,7 @@ def verify_razorpay_payment(request):
                                         'invoice_id': invoice_data['invoice_id'],
                                         'invoice_pdf_url': pdf_url
                                     })
-                                    logger.info(f"Invoice generated and saved successfully: {invoice_data['invoice_id']}")
+                                    logger.info("Invoice %s generated for order %s", invoice_data['invoice_id'], app_order_id)
                                 else:
                                     logger.error("Failed to save invoice to Firestore")
                             else:
@@ -1257,15 +1250,10 @@ def verify_razorpay_payment(request):
                     
             except PDFGenerationError as pdf_error:
                 # Specific PDF generation error - don't fail the payment
-                logger.error(f"PDF generation error: {str(pdf_error)}")
-                print("Payment verification successful, but invoice generation failed")
+                logger.error("Payment verified but invoice generation failed for order %s: %s", app_order_id, pdf_error)
             except Exception as invoice_error:
                 # Log error but don't fail the payment verification
-                logger.error(f"Error generating invoice: {str(invoice_error)}")
-                import traceback
-                logger.error(f"Invoice error traceback: {traceback.format_exc()}")
-                print(f"Error generating invoice: {str(invoice_error)}")
-                print(f"Invoice error traceback: {traceback.format_exc()}")
+                logger.exception("Error generating invoice for order %s: %s", app_order_id, invoice_error)
 
             return JsonResponse({
                 'message': 'Payment verified successfully and order placed.',
@@ -1277,33 +1265,18 @@ def verify_razorpay_payment(request):
             }, status=200)
         else:
             # Payment verification failed
-            
-            # Update tracking info and status history
-            tracking_info = order_data.get('tracking_info', {})
-            if not tracking_info:
-                tracking_info = {
-                    'status_history': []
+            record_order_event(
+                db, order_doc_ref, 'payment_failed', 'Payment verification failed', skip_if=order_is_paid,
+                order_updates={
+                    'status': 'payment_failed',
+                    'payment_details': {
+                        'razorpay_payment_id': razorpay_payment_id,
+                        'razorpay_signature': razorpay_signature,
+                        'error_message': 'Signature verification failed'
+                    },
+                    'updated_at': datetime.now()
                 }
-                
-            # Add new status to history
-            status_history = tracking_info.get('status_history', [])
-            status_history.append({
-                'status': 'payment_failed',
-                'timestamp': datetime.now(), # Use client-side timestamp
-                'description': 'Payment verification failed'
-            })
-            tracking_info['status_history'] = status_history
-            
-            order_doc_ref.update({
-                'status': 'payment_failed',
-                'payment_details': {
-                    'razorpay_payment_id': razorpay_payment_id,
-                    'razorpay_signature': razorpay_signature,
-                    'error_message': 'Signature verification failed'
-                },
-                'tracking_info': tracking_info,
-                'updated_at': datetime.now()
-            })
+            )
             return JsonResponse({'error': 'Payment verification failed. Signature mismatch.'}, status=400)
 
     except json.JSONDecodeError:
@@ -1315,42 +1288,76 @@ def verify_razorpay_payment(request):
             app_order_id_for_error = data.get('order_id') # Attempt to get it again
             if app_order_id_for_error:
                 order_doc_ref_error = db.collection('users').document(user_id).collection('orders').document(app_order_id_for_error)
-                if order_doc_ref_error.get().exists:
-                    order_doc = order_doc_ref_error.get()
-                    order_data = order_doc.to_dict()
-                    
-                    # Update tracking info and status history
-                    tracking_info = order_data.get('tracking_info', {})
-                    if not tracking_info:
-                        tracking_info = {
-                            'status_history': []
-                        }
-                        
-                    # Add new status to history
-                    status_history = tracking_info.get('status_history', [])
-                    status_history.append({
-                        'status': 'payment_failed',
-                        'timestamp': datetime.now(), # Use client-side timestamp
-                        'description': 'Payment verification failed (Razorpay signature error)'
-                    })
-                    tracking_info['status_history'] = status_history
-                    
-                    order_doc_ref_error.update({
+                record_order_event(
+                    db, order_doc_ref_error, 'payment_failed',
+                    'Payment verification failed (Razorpay signature error)', skip_if=order_is_paid,
+                    order_updates={
                         'status': 'payment_failed',
                         'payment_details': {
                             'razorpay_payment_id': data.get('razorpay_payment_id'),
                             'error_message': 'Signature verification failed (Razorpay lib error)'
                         },
-                        'tracking_info': tracking_info,
                         'updated_at': datetime.now()
-                    })
+                    }
+                )
+        except OrderNotFoundError:
+            pass
         except Exception as e_inner:
-            print(f"Error updating order status after SignatureVerificationError: {e_inner}")
+            logger.error("Error updating order status after SignatureVerificationError: %s", e_inner)
 
         return JsonResponse({'error': f'Payment verification failed: {str(sve)}'}, status=400)
     except Exception as e:
         return JsonResponse({'error': f'Error verifying payment: {str(e)}'}, status=500)
 
+def order_summary_payload(order_doc):
+    """The order list entry for one order"""
+    order_data = order_doc.to_dict()
+    # Format timestamps for consistent display
+    created_at = order_data.get('created_at')
+    created_at_formatted = None
+    if created_at:
+        if hasattr(created_at, 'strftime'):
+            # Use the same format as get_order_details for consistency
+            created_at_formatted = created_at.strftime('%m/%d/%Y at %I:%M %p')
+        else:
+            # Handle string timestamps or other formats
+            created_at_formatted = str(created_at)
+        
+    # Get first item image for preview
+    order_items = order_data.get('order_items', [])
+    preview_image = None
+    if order_items and len(order_items) > 0:
+        preview_image = order_items[0].get('image_url')
+    # Calculate item count properly: sum up quantities of all items
+    item_count = 0
+    for item in order_items or []:
+        item_count += item.get('quantity', 1)
+    
+    # Format estimated delivery date
+    estimated_delivery = order_data.get('estimated_delivery')
+    estimated_delivery_formatted = None
+    if estimated_delivery:
+        if hasattr(estimated_delivery, 'strftime'):
+            estimated_delivery_formatted = estimated_delivery.isoformat()
+        else:
+            estimated_delivery_formatted = str(estimated_delivery)
+    
+    return {
+        'order_id': order_doc.id,
+        'status': order_data.get('status'),
+        'total_amount': order_data.get('total_amount'),
+        'currency': order_data.get('currency', 'INR'),
+        'created_at': created_at_formatted,
+        'item_count': item_count,
+        'preview_image': preview_image,
+        'tracking_info': order_data.get('tracking_info', {}),
+        'current_status': order_data.get('current_status'),
+        'estimated_delivery': estimated_delivery_formatted
+    }
+
+def user_orders_query(db_client, user_id):
+    return db_client.collection('users').document(user_id).collection('orders').order_by('created_at', direction=Query.DESCENDING)
+
 @user_required
 @csrf_exempt # GET requests are generally not CSRF vulnerable, but good practice if any state changes
 def get_user_orders(request):
@@ -1358,62 +1365,51 @@ def get_user_orders(request):
         return JsonResponse({'error': 'Invalid request method'}, status=405)
 
     try:
-        user_id = request.user_id
-        orders_ref = db.collection('users').document(user_id).collection('orders').order_by('created_at', direction=Query.DESCENDING).stream()
-        
-        orders_list = []
-        for order_doc in orders_ref:
-            order_data = order_doc.to_dict()            # Format timestamps for consistent display
-            created_at = order_data.get('created_at')
-            created_at_formatted = None
-            if created_at:
-                if hasattr(created_at, 'strftime'):
-                    # Use the same format as get_order_details for consistency
-                    created_at_formatted = created_at.strftime('%m/%d/%Y at %I:%M %p')
-                else:
-                    # Handle string timestamps or other formats
-                    created_at_formatted = str(created_at)
-                
-            # Get first item image for preview
-            order_items = order_data.get('order_items', [])
-            preview_image = None
-            if order_items and len(order_items) > 0:
-                preview_image = order_items[0].get('image_url')
-              # Calculate item count properly
-            item_count = 0
-            if order_items:
-                # Sum up quantities of all items
-                for item in order_items:
-                    item_count += item.get('quantity', 1)
-            
-            # Debug: print the item count calculation
-            print(f"Order {order_doc.id}: order_items count: {len(order_items) if order_items else 0}, calculated item_count: {item_count}")
-              # Format estimated delivery date
-            estimated_delivery = order_data.get('estimated_delivery')
-            estimated_delivery_formatted = None
-            if estimated_delivery:
-                if hasattr(estimated_delivery, 'strftime'):
-                    estimated_delivery_formatted = estimated_delivery.isoformat()
-                else:
-                    estimated_delivery_formatted = str(estimated_delivery)
-            
-            orders_list.append({
-                'order_id': order_doc.id,
-                'status': order_data.get('status'),
-                'total_amount': order_data.get('total_amount'),
-                'currency': order_data.get('currency', 'INR'),
-                'created_at': created_at_formatted,
-                'item_count': item_count,
-                'preview_image': preview_image,
-                'tracking_info': order_data.get('tracking_info', {}),
-                'estimated_delivery': estimated_delivery_formatted
-            })
-
+        orders_list = [order_summary_payload(order_doc) for order_doc in user_orders_query(db, request.user_id).stream()]
         return JsonResponse({'orders': orders_list}, status=200)
 
     except Exception as e:
         return JsonResponse({'error': f'Error fetching orders: {str(e)}'}, status=500)
 
+def order_details_payload(order_data, status_history, next_cursor):
+    """Format an order document for the order details response"""
+    # Format the timestamps for better readability
+    created_at = order_data.get('created_at')
+    if created_at:
+        if hasattr(created_at, 'strftime'):
+            order_data['created_at_formatted'] = created_at.strftime('%m/%d/%Y at %I:%M %p')
+    
+    # Format the payment capture timestamp
+    payment_details = order_data.get('payment_details', {})
+    if payment_details and payment_details.get('captured_at'):
+        captured_at = payment_details.get('captured_at')
+        if hasattr(captured_at, 'strftime'):
+            payment_details['captured_at_formatted'] = captured_at.strftime('%m/%d/%Y at %I:%M %p')
+    
+    # Format estimated delivery date
+    estimated_delivery = order_data.get('estimated_delivery')
+    if estimated_delivery:
+        if hasattr(estimated_delivery, 'strftime'):
+            order_data['estimated_delivery_formatted'] = estimated_delivery.strftime('%m/%d/%Y')
+    
+    # Only the latest page of status events is embedded, older ones are paged
+    # through the order events endpoint using status_history_cursor
+    tracking_info = order_data.get('tracking_info') or {}
+    tracking_info['status_history'] = status_history
+    order_data['tracking_info'] = tracking_info
+    order_data['status_history_cursor'] = next_cursor
+
+    # Include invoice information if available
+    invoice_info = {}
+    if 'invoice_id' in order_data:
+        invoice_info['invoice_id'] = order_data['invoice_id']
+    if 'invoice_pdf_url' in order_data:
+        invoice_info['invoice_pdf_url'] = order_data['invoice_pdf_url']
+    
+    if invoice_info:
+        order_data['invoice'] = invoice_info
+    return order_data
+
 @user_required
 @csrf_exempt # As above
 def get_order_details(request, order_id):
@@ -1434,54 +1430,40 @@ def get_order_details(request, order_id):
         if order_data.get('user_id') != user_id:
              return JsonResponse({'error': 'Order not found or access denied'}, status=404)
 
-        # Format the timestamps for better readability
-        created_at = order_data.get('created_at')
-        if created_at:
-            if hasattr(created_at, 'strftime'):
-                order_data['created_at_formatted'] = created_at.strftime('%m/%d/%Y at %I:%M %p')
-        
-        # Format the payment capture timestamp
-        payment_details = order_data.get('payment_details', {})
-        if payment_details and payment_details.get('captured_at'):
-            captured_at = payment_details.get('captured_at')
-            if hasattr(captured_at, 'strftime'):
-                payment_details['captured_at_formatted'] = captured_at.strftime('%m/%d/%Y at %I:%M %p')
-        
-        # Format estimated delivery date
-        estimated_delivery = order_data.get('estimated_delivery')
-        if estimated_delivery:
-            if hasattr(estimated_delivery, 'strftime'):
-                order_data['estimated_delivery_formatted'] = estimated_delivery.strftime('%m/%d/%Y')
-        
-        # Process status history timestamps
-        tracking_info = order_data.get('tracking_info', {})
-        status_history = tracking_info.get('status_history', [])
-        for status in status_history:
-            timestamp = status.get('timestamp')
-            if timestamp and hasattr(timestamp, 'strftime'):
-                status['timestamp_formatted'] = timestamp.strftime('%m/%d/%Y at %I:%M %p')
-          # Get shipping address if not already included
-        if 'address' not in order_data and 'address_id' in order_data:
-            address_id = order_data.get('address_id')
-            address_doc = db.collection('users').document(user_id).collection('addresses').document(address_id).get()
-            if address_doc.exists:
-                order_data['address'] = address_doc.to_dict()
-
-        # Include invoice information if available
-        invoice_info = {}
-        if 'invoice_id' in order_data:
-            invoice_info['invoice_id'] = order_data['invoice_id']
-        if 'invoice_pdf_url' in order_data:
-            invoice_info['invoice_pdf_url'] = order_data['invoice_pdf_url']
-        
-        if invoice_info:
-            order_data['invoice'] = invoice_info
-
-        return JsonResponse({'order_details': order_data}, status=200)
+        status_history, next_cursor = list_order_events(order_doc_ref, order_data)
+        return JsonResponse({'order_details': order_details_payload(order_data, status_history, next_cursor)}, status=200)
 
     except Exception as e:
         return JsonResponse({'error': f'Error fetching order details: {str(e)}'}, status=500)
 
+@user_required
+@csrf_exempt
+def get_order_events(request, order_id):
+    """Page through an order's status history, newest first. Pass ?before=<cursor> for older events."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    try:
+        user_id = request.user_id
+        before = request.GET.get('before')
+        limit = request.GET.get('limit', DEFAULT_EVENTS_PAGE_SIZE)
+        try:
+            before = int(before) if before else None
+            limit = int(limit)
+        except ValueError:
+            return JsonResponse({'error': 'before and limit must be integers'}, status=400)
+
+        order_doc_ref = db.collection('users').document(user_id).collection('orders').document(order_id)
+        order_doc = order_doc_ref.get()
+        if not order_doc.exists:
+            return JsonResponse({'error': 'Order not found or access denied'}, status=404)
+
+        events, next_cursor = list_order_events(order_doc_ref, order_doc.to_dict(), before_seq=before, limit=limit)
+        return JsonResponse({'order_id': order_id, 'events': events, 'next_cursor': next_cursor}, status=200)
+
+    except Exception as e:
+        return JsonResponse({'error': f'Error fetching order events: {str(e)}'}, status=500)
+
 # @user_required
 # @csrf_exempt # GET requests are generally not CSRF vulnerable, but good practice if any state changes
 # def get_user_orders(request):
@@ -1544,41 +1526,14 @@ def add_address(request):
         user_id = request.user_id
         data = json.loads(request.body)
 
-        required_fields = ['type', 'street_address', 'city', 'state', 'postal_code', 'phone_number']
-        if not all(field in data for field in required_fields):
-            return JsonResponse({'error': f'Missing one or more required fields: {", ".join(required_fields)}'}, status=400)
-
-        is_default = data.get('is_default', False)
-
-        addresses_ref = db.collection('users').document(user_id).collection('addresses')
-
-        # If this address is being set as default, unset other default addresses
-        if is_default:
-            default_addresses_query = addresses_ref.where('is_default', '==', True).stream()
-            batch = db.batch()
-            for addr_doc in default_addresses_query:
-                batch.update(addr_doc.reference, {'is_default': False})
-            batch.commit()
-
-        address_payload = {
-            'type': data['type'],
-            'street_address': data['street_address'],
-            'city': data['city'],
-            'state': data['state'],
-            'postal_code': data['postal_code'],
-            'phone_number': data['phone_number'],
-            'is_default': is_default,
-            'created_at': datetime.now(),
-            'updated_at': datetime.now(),
-        }
-        _, new_address_ref = addresses_ref.add(address_payload) # Use _ for unused update_time
-        
-        # Fetch the newly created document to get resolved timestamps
-        new_address_doc = new_address_ref.get()
-        response_address_data = new_address_doc.to_dict()
-        response_address_data['id'] = new_address_ref.id # Add the ID to the response data
+        if not all(field in data for field in ADDRESS_FIELDS):
+            return JsonResponse({'error': f'Missing one or more required fields: {", ".join(ADDRESS_FIELDS)}'}, status=400)
+
+        # One transaction: create the address and, if default, move the user's default pointer
+        address_id, response_address_data = add_user_address(db, user_id, data, make_default=bool(data.get('is_default', False)))
+        response_address_data['id'] = address_id
 
-        return JsonResponse({'message': 'Address added successfully', 'address_id': new_address_ref.id, 'address': response_address_data}, status=201)
+        return JsonResponse({'message': 'Address added successfully', 'address_id': address_id, 'address': response_address_data}, status=201)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
@@ -1590,15 +1545,8 @@ def get_addresses(request):
     if request.method != 'GET':
         return JsonResponse({'error': 'Invalid request method'}, status=405)
     try:
-        user_id = request.user_id
-        addresses_stream = db.collection('users').document(user_id).collection('addresses').order_by('is_default', direction=Query.DESCENDING).stream()
-        
-        addresses_list = []
-        for addr_doc in addresses_stream:
-            address_data = addr_doc.to_dict()
-            address_data['id'] = addr_doc.id
-            addresses_list.append(address_data)
-        
+        # Default first, from the user's default_address_id pointer
+        addresses_list = list_addresses(db, request.user_id)
         return JsonResponse({'addresses': addresses_list}, status=200)
     except Exception as e:
         return JsonResponse({'error': f'Error fetching addresses: {str(e)}'}, status=500)
@@ -1611,39 +1559,25 @@ def update_address(request, address_id):
     try:
         user_id = request.user_id
         data = json.loads(request.body)
-        address_ref = db.collection('users').document(user_id).collection('addresses').document(address_id)
 
-        if not address_ref.get().exists:
-            return JsonResponse({'error': 'Address not found'}, status=404)
-
-        is_default = data.get('is_default')
-        addresses_collection_ref = db.collection('users').document(user_id).collection('addresses')
-
-        # If this address is being set as default, unset other default addresses
-        if is_default is True:
-            default_addresses_query = addresses_collection_ref.where('is_default', '==', True).stream()
-            batch = db.batch()
-            for addr_doc in default_addresses_query:
-                if addr_doc.id != address_id: # Don't unset the current one if it's already default
-                    batch.update(addr_doc.reference, {'is_default': False})
-            batch.commit() # Commit this batch first
-        
         # Prepare payload, only update fields that are provided
         update_payload = {}
-        allowed_fields = ['type', 'street_address', 'city', 'state', 'postal_code', 'phone_number', 'is_default']
-        for field in allowed_fields:
+        for field in ADDRESS_FIELDS + OPTIONAL_ADDRESS_FIELDS:
             if field in data:
                 update_payload[field] = data[field]
-        
-        if not update_payload:
+
+        is_default = data.get('is_default')
+        if is_default not in (True, False):
+            is_default = None
+        if not update_payload and is_default is None:
             return JsonResponse({'error': 'No update data provided'}, status=400)
 
-        update_payload['updated_at'] = datetime.now()
-        address_ref.update(update_payload)
-        updated_address = address_ref.get().to_dict()
+        updated_address = update_user_address(db, user_id, address_id, update_payload, make_default=is_default)
         updated_address['id'] = address_id
 
         return JsonResponse({'message': 'Address updated successfully', 'address': updated_address}, status=200)
+    except AddressNotFoundError:
+        return JsonResponse({'error': 'Address not found'}, status=404)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
@@ -1655,20 +1589,11 @@ def delete_address(request, address_id):
     if request.method != 'DELETE':
         return JsonResponse({'error': 'Invalid request method'}, status=405)
     try:
-        user_id = request.user_id
-        address_ref = db.collection('users').document(user_id).collection('addresses').document(address_id)
-        address_doc = address_ref.get()
-
-        if not address_doc.exists:
-            return JsonResponse({'error': 'Address not found'}, status=404)
-        
-        # If deleting the default address, ideally the user should be prompted to set a new default.
-        # For now, we just delete it. Consider application logic for this.
-        # if address_doc.to_dict().get('is_default') is True:
-            # Potentially find another address and make it default, or leave no default.
-
-        address_ref.delete()
+        # Deleting the default clears the pointer; the user picks a new default
+        delete_user_address(db, request.user_id, address_id)
         return JsonResponse({'message': 'Address deleted successfully', 'address_id': address_id}, status=200)
+    except AddressNotFoundError:
+        return JsonResponse({'error': 'Address not found'}, status=404)
     except Exception as e:
         return JsonResponse({'error': f'Error deleting address: {str(e)}'}, status=500)
 
@@ -1678,26 +1603,10 @@ def set_default_address(request, address_id):
     if request.method != 'POST': # Using POST to make a specific address default
         return JsonResponse({'error': 'Invalid request method, use POST'}, status=405)
     try:
-        user_id = request.user_id
-        target_address_ref = db.collection('users').document(user_id).collection('addresses').document(address_id)
-
-        if not target_address_ref.get().exists:
-            return JsonResponse({'error': 'Target address not found'}, status=404)
-
-        addresses_collection_ref = db.collection('users').document(user_id).collection('addresses')
-        default_addresses_query = addresses_collection_ref.where('is_default', '==', True).stream()
-        
-        batch = db.batch()
-        # Unset current default(s)
-        for addr_doc in default_addresses_query:
-            if addr_doc.id != address_id:
-                batch.update(addr_doc.reference, {'is_default': False})
-        
-        # Set the new default
-        batch.update(target_address_ref, {'is_default': True, 'updated_at': datetime.now()})
-        batch.commit()
-
+        set_user_default_address(db, request.user_id, address_id)
         return JsonResponse({'message': f'Address {address_id} set as default successfully'}, status=200)
+    except AddressNotFoundError:
+        return JsonResponse({'error': 'Target address not found'}, status=404)
     except Exception as e:
         return JsonResponse({'error': f'Error setting default address: {str(e)}'}, status=500)
 
@@ -1812,20 +1721,9 @@ def check_user_review(request, product_id):
     
     try:
         user_id = request.user_id
-        print(f"Checking review for user {user_id} and product {product_id}")  # Debug log
-        
-        # Check if product exists
-        product_doc = db.collection('products').document(product_id).get()
-        if not product_doc.exists:
-            print(f"Product {product_id} not found")  # Debug log
-            return JsonResponse({'error': 'Product not found'}, status=404)
-        
-        # Check if user has already reviewed this product
-        existing_review = db.collection('products').document(product_id).collection('reviews').where('user_id', '==', user_id).limit(1).stream()
-        reviews_list = list(existing_review)
-        has_reviewed = len(reviews_list) > 0
         
-        print(f"Review check result: user {user_id}, product {product_id}, has_reviewed: {has_reviewed}, found {len(reviews_list)} reviews")  # Debug log
+        # Reviews are keyed by user ID, so this is a single document read
+        has_reviewed = has_reviewed_product(db, product_id, user_id)
         
         return JsonResponse({
             'has_reviewed': has_reviewed,
@@ -1834,7 +1732,6 @@ def check_user_review(request, product_id):
         }, status=200)
         
     except Exception as e:
-        print(f"Error in check_user_review: {str(e)}")  # Debug log
         return JsonResponse({'error': f'Error checking review status: {str(e)}'}, status=500)
 
 